@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from . import admin, auth, llm_config, novels, updates, writer, writer_config
+from . import admin, auth, llm_config, metrics, novels, updates, writer, writer_config
 
 api_router = APIRouter()
 
@@ -11,3 +11,4 @@ api_router.include_router(admin.router)
 api_router.include_router(updates.router)
 api_router.include_router(llm_config.router)
 api_router.include_router(writer_config.router)
+api_router.include_router(metrics.router)
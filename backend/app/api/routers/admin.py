@@ -1,20 +1,28 @@
 import logging
-from typing import List, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import func, select
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import case, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from ...core.config import settings
+from ...core.cpu_executor import cpu_executor
 from ...core.dependencies import get_current_admin
+from ...core.loop_monitor import loop_lag_monitor
 from ...db.session import get_session
-from ...models import NovelProject, UsageMetric, User
+from ...models import LLMUsageRecord, NovelProject, UsageMetric, User
 from ...schemas.admin import (
     AdminNovelSummary,
     DailyRequestLimit,
+    LLMUsageSummary,
+    RuntimeStats,
     Statistics,
     UpdateLogCreate,
     UpdateLogRead,
     UpdateLogUpdate,
+    VectorGCReport,
+    VectorReembedStatus,
 )
 from ...schemas.config import SystemConfigCreate, SystemConfigRead, SystemConfigUpdate
 from ...schemas.prompt import PromptCreate, PromptRead, PromptUpdate
@@ -31,12 +39,20 @@ from ...schemas.user import (
     UserUpdateAdmin,
 )
 from ...services.auth_service import AuthService
+from ...services.chapter_context_service import retrieval_cache
+from ...services.chapter_prefetch_service import chapter_prefetcher
+from ...services.llm_scheduler import llm_scheduler
+from ...services.request_dedup import operation_dedup
+from ...services.background_jobs import BackgroundJob, job_registry
 from ...services.admin_setting_service import AdminSettingService
 from ...services.config_service import ConfigService
 from ...services.novel_service import NovelService
 from ...services.prompt_service import PromptService
 from ...services.update_log_service import UpdateLogService
+from ...services.usage_buffer import daily_quota, usage_buffer
 from ...services.user_service import UserService
+from ...services.vector_maintenance_service import REEMBED_JOB_KIND, VectorMaintenanceService
+from ...services.vector_store_service import VectorStoreService
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/admin", tags=["Admin"])
@@ -78,11 +94,145 @@ async def read_statistics(
     novel_count = await session.scalar(select(func.count(NovelProject.id))) or 0
     user_count = await session.scalar(select(func.count(User.id))) or 0
     usage = await session.get(UsageMetric, "api_request_count")
-    api_request_count = usage.value if usage else 0
+    # 加上尚未写库的缓冲增量，统计数字不会滞后一个刷新周期
+    api_request_count = (usage.value if usage else 0) + usage_buffer.pending("api_request_count")
     logger.info("管理员获取统计数据：小说=%s，用户=%s，请求=%s", novel_count, user_count, api_request_count)
     return Statistics(novel_count=novel_count, user_count=user_count, api_request_count=api_request_count)
 
 
+@router.get("/runtime", response_model=RuntimeStats)
+async def read_runtime_stats(
+    _: None = Depends(get_current_admin),
+) -> RuntimeStats:
+    """进程运行时指标：事件循环延迟、CPU 卸载进程池、用量缓冲、检索缓存、下一章预取、请求去重、LLM 调度与后台任务概况。"""
+    job_counts: Dict[str, int] = {}
+    for job in job_registry.list():
+        job_counts[job.status] = job_counts.get(job.status, 0) + 1
+    return RuntimeStats(
+        event_loop=loop_lag_monitor.snapshot(),
+        cpu_executor=cpu_executor.stats(),
+        usage_buffer=usage_buffer.stats(),
+        daily_quota=daily_quota.stats(),
+        retrieval_cache=retrieval_cache.stats(),
+        chapter_prefetch=chapter_prefetcher.stats(),
+        request_dedup=operation_dedup.stats(),
+        llm_scheduler=llm_scheduler.stats(),
+        background_jobs=job_counts,
+    )
+
+
+@router.post("/vector-store/gc", response_model=VectorGCReport)
+async def collect_vector_garbage(
+    dry_run: bool = Query(False, description="仅统计孤儿向量，不执行删除"),
+    compact: bool = Query(True, description="删除后执行 VACUUM 回收磁盘空间"),
+    session: AsyncSession = Depends(get_session),
+    _: None = Depends(get_current_admin),
+) -> VectorGCReport:
+    """清理关系库中已不存在的项目与章节对应的向量数据，并按需压缩向量库文件。"""
+    if not settings.vector_store_enabled:
+        raise HTTPException(status_code=400, detail="向量库未启用")
+    try:
+        vector_store = VectorStoreService()
+    except RuntimeError as exc:
+        raise HTTPException(status_code=503, detail=f"向量库初始化失败: {exc}") from exc
+    report = await VectorMaintenanceService(session, vector_store).collect_garbage(dry_run=dry_run, compact=compact)
+    logger.info(
+        "管理员执行向量库回收：dry_run=%s 项目=%d 片段=%d 摘要=%d 回收字节=%d",
+        dry_run,
+        len(report.items),
+        report.chunks_deleted,
+        report.summaries_deleted,
+        report.reclaimed_bytes,
+    )
+    return report
+
+
+def _to_reembed_status(job: BackgroundJob) -> VectorReembedStatus:
+    return VectorReembedStatus(
+        job_id=job.id,
+        status=job.status,
+        phase=job.phase,
+        progress=job.progress,
+        counts=dict(job.counts),
+        embedding_model=job.result.get("embedding_model"),
+        message=job.message,
+        error=job.error,
+    )
+
+
+@router.post("/vector-store/reembed", response_model=VectorReembedStatus, status_code=status.HTTP_202_ACCEPTED)
+async def start_vector_reembed(
+    current_admin=Depends(get_current_admin),
+) -> VectorReembedStatus:
+    """启动后台任务，用当前嵌入模型重新生成旧模型写入的向量；已有任务运行时返回该任务。"""
+    if not settings.vector_store_enabled:
+        raise HTTPException(status_code=400, detail="向量库未启用")
+    job = VectorMaintenanceService.start_reembed(current_admin.id)
+    logger.info("管理员 %s 启动向量重新嵌入任务 %s", current_admin.username, job.id)
+    return _to_reembed_status(job)
+
+
+@router.get("/vector-store/reembed/{job_id}", response_model=VectorReembedStatus)
+async def get_vector_reembed(
+    job_id: str,
+    _: None = Depends(get_current_admin),
+) -> VectorReembedStatus:
+    """查询重新嵌入任务的进度与计数。"""
+    job = job_registry.get(job_id)
+    if not job or job.kind != REEMBED_JOB_KIND:
+        raise HTTPException(status_code=404, detail="重新嵌入任务不存在或已过期")
+    return _to_reembed_status(job)
+
+
+@router.get("/llm-usage", response_model=List[LLMUsageSummary])
+async def read_llm_usage(
+    days: int = Query(7, ge=1, le=90, description="统计最近多少天"),
+    session: AsyncSession = Depends(get_session),
+    _: None = Depends(get_current_admin),
+) -> List[LLMUsageSummary]:
+    """按用户、模型与接口汇总 LLM 调用的 token 用量与耗时，按输出 token 数倒序。"""
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    completion_total = func.coalesce(func.sum(LLMUsageRecord.completion_tokens), 0)
+    stmt = (
+        select(
+            LLMUsageRecord.user_id,
+            User.username,
+            LLMUsageRecord.model,
+            LLMUsageRecord.endpoint,
+            func.count(LLMUsageRecord.id).label("calls"),
+            func.sum(case((LLMUsageRecord.status != "ok", 1), else_=0)).label("failed_calls"),
+            func.coalesce(func.sum(LLMUsageRecord.prompt_tokens), 0).label("prompt_tokens"),
+            completion_total.label("completion_tokens"),
+            func.coalesce(func.sum(LLMUsageRecord.output_chars), 0).label("output_chars"),
+            func.coalesce(func.sum(LLMUsageRecord.duration_ms), 0).label("total_duration_ms"),
+            func.avg(LLMUsageRecord.duration_ms).label("avg_duration_ms"),
+            func.avg(LLMUsageRecord.ttft_ms).label("avg_ttft_ms"),
+        )
+        .outerjoin(User, User.id == LLMUsageRecord.user_id)
+        .where(LLMUsageRecord.created_at >= since)
+        .group_by(LLMUsageRecord.user_id, User.username, LLMUsageRecord.model, LLMUsageRecord.endpoint)
+        .order_by(completion_total.desc())
+    )
+    rows = (await session.execute(stmt)).all()
+    return [
+        LLMUsageSummary(
+            user_id=row.user_id,
+            username=row.username,
+            model=row.model,
+            endpoint=row.endpoint,
+            calls=row.calls,
+            failed_calls=int(row.failed_calls or 0),
+            prompt_tokens=int(row.prompt_tokens),
+            completion_tokens=int(row.completion_tokens),
+            output_chars=int(row.output_chars),
+            total_duration_seconds=round(float(row.total_duration_ms) / 1000, 2),
+            avg_duration_ms=round(float(row.avg_duration_ms or 0), 1),
+            avg_ttft_ms=round(float(row.avg_ttft_ms), 1) if row.avg_ttft_ms is not None else None,
+        )
+        for row in rows
+    ]
+
+
 @router.get("/users", response_model=List[UserSchema])
 async def list_users(
     service: UserService = Depends(get_user_service),
@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Header, HTTPException, Response, status
+
+from ...core.config import settings
+from ...core.metrics import PROMETHEUS_CONTENT_TYPE, metrics_registry
+
+router = APIRouter(tags=["Metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def export_metrics(authorization: str | None = Header(default=None)) -> Response:
+    """以 Prometheus 文本格式导出进程内指标；配置 METRICS_TOKEN 后需携带 Bearer Token。"""
+    if settings.metrics_token and authorization != f"Bearer {settings.metrics_token}":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="无效的指标访问凭证")
+    return Response(content=metrics_registry.render(), media_type=PROMETHEUS_CONTENT_TYPE)
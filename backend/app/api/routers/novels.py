@@ -2,9 +2,12 @@ import json
 import logging
 from typing import Dict, List
 
-from fastapi import APIRouter, Body, Depends, HTTPException, UploadFile, status
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Request, UploadFile, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from ...core.config import settings
+from ...core.cpu_executor import run_cpu_bound
 from ...core.dependencies import get_current_user
 from ...db.session import get_session
 from ...schemas.novel import (
@@ -14,16 +17,20 @@ from ...schemas.novel import (
     Chapter as ChapterSchema,
     ConverseRequest,
     ConverseResponse,
+    ImportJobStatus,
     NovelProject as NovelProjectSchema,
     NovelProjectSummary,
     NovelSectionResponse,
     NovelSectionType,
 )
 from ...schemas.user import UserInDB
-from ...services.import_service import ImportService
+from ...services.background_jobs import BackgroundJob, job_registry
+from ...services.import_service import IMPORT_JOB_KIND, ImportService
 from ...services.llm_service import LLMService
 from ...services.novel_service import NovelService
 from ...services.prompt_service import PromptService
+from ...services.request_dedup import IDEMPOTENCY_HEADER, operation_dedup, request_fingerprint, wait_for_disconnect
+from ...services.vector_store_service import VectorStoreService
 from ...utils.json_utils import remove_think_tags, sanitize_json_like_text, unwrap_markdown_json
 
 logger = logging.getLogger(__name__)
@@ -82,11 +89,90 @@ async def import_novel(
     session: AsyncSession = Depends(get_session),
     current_user: UserInDB = Depends(get_current_user),
 ) -> Dict[str, str]:
-    """上传并导入小说文件。"""
+    """上传并导入小说文件，章节落库后立即返回，AI 分析在后台任务中继续。"""
     import_service = ImportService(session)
-    project_id = await import_service.import_novel_from_file(current_user.id, file)
-    logger.info("用户 %s 导入项目 %s", current_user.id, project_id)
-    return {"id": project_id}
+    job = await import_service.import_novel_from_file(current_user.id, file)
+    project_id = job.result["project_id"]
+    logger.info("用户 %s 导入项目 %s，后台任务 %s", current_user.id, project_id, job.id)
+    return {"id": project_id, "job_id": job.id}
+
+
+def _get_import_job(job_id: str, user_id: int) -> BackgroundJob:
+    job = job_registry.get(job_id)
+    if not job or job.kind != IMPORT_JOB_KIND or job.user_id != user_id:
+        raise HTTPException(status_code=404, detail="导入任务不存在或已过期")
+    return job
+
+
+def _to_import_job_status(job: BackgroundJob) -> ImportJobStatus:
+    return ImportJobStatus(
+        job_id=job.id,
+        status=job.status,
+        phase=job.phase,
+        progress=job.progress,
+        counts=dict(job.counts),
+        project_id=job.result.get("project_id"),
+        message=job.message,
+        error=job.error,
+    )
+
+
+@router.get("/import/jobs/{job_id}", response_model=ImportJobStatus)
+async def get_import_job(
+    job_id: str,
+    current_user: UserInDB = Depends(get_current_user),
+) -> ImportJobStatus:
+    """查询导入任务的当前阶段、百分比与计数。"""
+    return _to_import_job_status(_get_import_job(job_id, current_user.id))
+
+
+@router.post("/import/jobs/{job_id}/cancel", response_model=ImportJobStatus)
+async def cancel_import_job(
+    job_id: str,
+    current_user: UserInDB = Depends(get_current_user),
+) -> ImportJobStatus:
+    """
+    取消进行中的导入任务，正在进行的 AI 分析流立即中止。
+    章节落库完成前取消会删除半成品项目；落库后取消则保留章节，项目以章节标题大纲转为 blueprint_ready。
+    """
+    job = _get_import_job(job_id, current_user.id)
+    if job.finished:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="导入任务已结束，无法取消")
+    job_registry.cancel(job.id)
+    # 取消在下一个 await 点生效，进程池中的解析步骤需等当前分块完成
+    await job.wait_until(lambda current: current.finished, timeout=10.0)
+    logger.info("用户 %s 取消了导入任务 %s", current_user.id, job.id)
+    return _to_import_job_status(job)
+
+
+@router.get("/import/jobs/{job_id}/events")
+async def stream_import_job(
+    job_id: str,
+    current_user: UserInDB = Depends(get_current_user),
+) -> StreamingResponse:
+    """以 SSE 推送导入进度，任务结束时发送 done 事件后关闭连接。"""
+    job = _get_import_job(job_id, current_user.id)
+
+    async def _event_stream():
+        seen_version = -1
+        while True:
+            if job.version > seen_version:
+                seen_version = job.version
+                payload = _to_import_job_status(job).model_dump_json()
+                yield f"event: progress\ndata: {payload}\n\n"
+                if job.finished:
+                    yield f"event: done\ndata: {payload}\n\n"
+                    return
+            changed = await job.wait_for_change(seen_version, timeout=15.0)
+            if not changed and not job.finished:
+                # 心跳注释，防止代理因长时间无数据而断开连接
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        _event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("", response_model=List[NovelProjectSummary])
@@ -145,6 +231,19 @@ async def delete_novels(
     novel_service = NovelService(session)
     await novel_service.delete_projects(project_ids, current_user.id)
     logger.info("用户 %s 删除项目 %s", current_user.id, project_ids)
+
+    # 同步清理向量库；失败不影响删除结果，残留数据由向量库回收任务兜底
+    if settings.vector_store_enabled:
+        try:
+            vector_store = VectorStoreService()
+        except RuntimeError as exc:
+            logger.warning("向量库初始化失败，跳过项目向量清理: %s", exc)
+        else:
+            for project_id in project_ids:
+                try:
+                    await vector_store.delete_project(project_id)
+                except Exception as exc:  # pragma: no cover - 清理失败仅记录
+                    logger.warning("清理项目 %s 的向量数据失败: %s", project_id, exc)
     return {"status": "success", "message": f"成功删除 {len(project_ids)} 个项目"}
 
 
@@ -191,7 +290,7 @@ async def converse_with_concept(
 
     try:
         normalized = unwrap_markdown_json(llm_response)
-        sanitized = sanitize_json_like_text(normalized)
+        sanitized = await run_cpu_bound(sanitize_json_like_text, normalized, cost=len(normalized))
         parsed = json.loads(sanitized)
     except json.JSONDecodeError as exc:
         logger.warning(
@@ -230,8 +329,25 @@ async def generate_blueprint(
     project_id: str,
     session: AsyncSession = Depends(get_session),
     current_user: UserInDB = Depends(get_current_user),
+    idempotency_key: str | None = Header(default=None, alias=IDEMPOTENCY_HEADER, max_length=255),
+    http_request: Request = None,
+) -> BlueprintGenerationResponse:
+    """根据完整对话生成可执行的小说蓝图；同一项目的蓝图生成仍在进行时，重复请求共享其结果。"""
+    return await operation_dedup.run(
+        (current_user.id, "blueprint_generate", project_id),
+        lambda: _generate_blueprint(project_id, session, current_user),
+        user_id=current_user.id,
+        fingerprint=request_fingerprint("blueprint_generate", project_id),
+        idempotency_key=idempotency_key,
+        until_disconnected=(lambda: wait_for_disconnect(http_request)) if http_request else None,
+    )
+
+
+async def _generate_blueprint(
+    project_id: str,
+    session: AsyncSession,
+    current_user: UserInDB,
 ) -> BlueprintGenerationResponse:
-    """根据完整对话生成可执行的小说蓝图。"""
     novel_service = NovelService(session)
     prompt_service = PromptService(session)
     llm_service = LLMService(session)
@@ -332,7 +448,7 @@ async def generate_blueprint(
     )
 
     blueprint_normalized = unwrap_markdown_json(blueprint_raw)
-    blueprint_sanitized = sanitize_json_like_text(blueprint_normalized)
+    blueprint_sanitized = await run_cpu_bound(sanitize_json_like_text, blueprint_normalized, cost=len(blueprint_normalized))
     try:
         blueprint_data = json.loads(blueprint_sanitized)
     except json.JSONDecodeError as exc:
@@ -3,15 +3,17 @@ import logging
 import os
 from typing import Dict, List, Optional
 
-from fastapi import APIRouter, Body, Depends, HTTPException
-from sqlalchemy import select
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Request
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ...core.config import settings
+from ...core.cpu_executor import run_cpu_bound
 from ...core.dependencies import get_current_user
-from ...db.session import get_session
+from ...db.session import AsyncSessionLocal, get_session
 from ...models.novel import Chapter, ChapterOutline
 from ...schemas.novel import (
+    ChapterGenerationStatus,
     DeleteChapterRequest,
     EditChapterRequest,
     EvaluateChapterRequest,
@@ -23,12 +25,23 @@ from ...schemas.novel import (
 )
 from ...schemas.user import UserInDB
 from ...services.chapter_context_service import ChapterContextService
+from ...services.chapter_prefetch_service import (
+    build_chapter_setup,
+    build_rag_query,
+    chapter_prefetcher,
+    save_pending_summaries,
+    setup_fingerprint,
+)
 from ...services.chapter_ingest_service import ChapterIngestionService
 from ...services.llm_service import LLMService
+from ...services.llm_telemetry import record_llm_retry
 from ...services.novel_service import NovelService
 from ...services.prompt_service import PromptService
-from ...services.vector_store_service import VectorStoreService
+from ...services.request_dedup import IDEMPOTENCY_HEADER, operation_dedup, request_fingerprint, wait_for_disconnect
+from ...services.vector_store_service import RetrievalFilter, VectorStoreService
 from ...utils.json_utils import remove_think_tags, sanitize_json_like_text, unwrap_markdown_json
+from ...utils.json_extract import recover_chapter_payload
+from ...utils.stream_json import ChapterStreamParser
 from ...repositories.system_config_repository import SystemConfigRepository
 
 router = APIRouter(prefix="/api/writer", tags=["Writer"])
@@ -39,22 +52,59 @@ async def _load_project_schema(service: NovelService, project_id: str, user_id:
     return await service.get_project_schema(project_id, user_id)
 
 
-def _extract_tail_excerpt(text: Optional[str], limit: int = 500) -> str:
-    """截取章节结尾文本，默认保留 500 字。"""
-    if not text:
-        return ""
-    stripped = text.strip()
-    if len(stripped) <= limit:
-        return stripped
-    return stripped[-limit:]
-
-
 @router.post("/novels/{project_id}/chapters/generate", response_model=NovelProjectSchema)
 async def generate_chapter(
     project_id: str,
     request: GenerateChapterRequest,
     session: AsyncSession = Depends(get_session),
     current_user: UserInDB = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(default=None, alias=IDEMPOTENCY_HEADER, max_length=255),
+    http_request: Request = None,
+) -> NovelProjectSchema:
+    # 同一章节的生成仍在进行时，重复请求等待并共享其结果，不再发起新的 LLM 调用；
+    # 客户端全部断开后中止生成，上游流随之关闭
+    return await operation_dedup.run(
+        (current_user.id, "chapter_generate", project_id, request.chapter_number),
+        lambda: _generate_chapter_or_fail(project_id, request, session, current_user),
+        user_id=current_user.id,
+        fingerprint=request_fingerprint("chapter_generate", project_id, request),
+        idempotency_key=idempotency_key,
+        until_disconnected=(lambda: wait_for_disconnect(http_request)) if http_request else None,
+    )
+
+
+async def _generate_chapter_or_fail(
+    project_id: str,
+    request: GenerateChapterRequest,
+    session: AsyncSession,
+    current_user: UserInDB,
+) -> NovelProjectSchema:
+    try:
+        return await _generate_chapter(project_id, request, session, current_user)
+    except BaseException:
+        # 生成被取消（客户端断开）或意外出错时不让章节停留在 generating；
+        # 请求会话可能正处于被打断的查询中，改用独立会话，并只更新仍处于 generating 的记录
+        async with AsyncSessionLocal() as cleanup_session:
+            result = await cleanup_session.execute(
+                update(Chapter)
+                .where(
+                    Chapter.project_id == project_id,
+                    Chapter.chapter_number == request.chapter_number,
+                    Chapter.status == ChapterGenerationStatus.GENERATING.value,
+                )
+                .values(status=ChapterGenerationStatus.FAILED.value)
+            )
+            await cleanup_session.commit()
+        if result.rowcount:
+            logger.warning("项目 %s 第 %s 章生成中断，状态已标记为 failed", project_id, request.chapter_number)
+        raise
+
+
+async def _generate_chapter(
+    project_id: str,
+    request: GenerateChapterRequest,
+    session: AsyncSession,
+    current_user: UserInDB,
 ) -> NovelProjectSchema:
     novel_service = NovelService(session)
     prompt_service = PromptService(session)
@@ -67,67 +117,21 @@ async def generate_chapter(
         logger.warning("项目 %s 未找到第 %s 章纲要，生成流程终止", project_id, request.chapter_number)
         raise HTTPException(status_code=404, detail="蓝图中未找到对应章节纲要")
 
+    # 指纹在修改本章状态之前计算，与预取时看到的项目状态一致
+    fingerprint = setup_fingerprint(project, request.chapter_number)
     chapter = await novel_service.get_or_create_chapter(project_id, request.chapter_number)
     chapter.real_summary = None
     chapter.selected_version_id = None
     chapter.status = "generating"
     await session.commit()
 
-    outlines_map = {item.chapter_number: item for item in project.outlines}
-    # 收集所有可用的历史章节摘要，便于在 Prompt 中提供前情背景
-    completed_chapters = []
-    latest_prev_number = -1
-    previous_summary_text = ""
-    previous_tail_excerpt = ""
-    for existing in project.chapters:
-        if existing.chapter_number >= request.chapter_number:
-            continue
-        if existing.selected_version is None or not existing.selected_version.content:
-            continue
-        if not existing.real_summary:
-            summary = await llm_service.get_summary(
-                existing.selected_version.content,
-                temperature=0.15,
-                user_id=current_user.id,
-                timeout=180.0,
-            )
-            existing.real_summary = remove_think_tags(summary)
-            await session.commit()
-        completed_chapters.append(
-            {
-                "chapter_number": existing.chapter_number,
-                "title": outlines_map.get(existing.chapter_number).title if outlines_map.get(existing.chapter_number) else f"第{existing.chapter_number}章",
-                "summary": existing.real_summary,
-            }
-        )
-        if existing.chapter_number > latest_prev_number:
-            latest_prev_number = existing.chapter_number
-            previous_summary_text = existing.real_summary or ""
-            previous_tail_excerpt = _extract_tail_excerpt(existing.selected_version.content)
-
-    project_schema = await novel_service._serialize_project(project)
-    blueprint_dict = project_schema.blueprint.model_dump()
-
-    if "relationships" in blueprint_dict and blueprint_dict["relationships"]:
-        for relation in blueprint_dict["relationships"]:
-            if "character_from" in relation:
-                relation["from"] = relation.pop("character_from")
-            if "character_to" in relation:
-                relation["to"] = relation.pop("character_to")
-
-    # 蓝图中禁止携带章节级别的细节信息，避免重复传输大段场景或对话内容
-    banned_blueprint_keys = {
-        "chapter_outline",
-        "chapter_summaries",
-        "chapter_details",
-        "chapter_dialogues",
-        "chapter_events",
-        "conversation_history",
-        "character_timelines",
-    }
-    for key in banned_blueprint_keys:
-        if key in blueprint_dict:
-            blueprint_dict.pop(key, None)
+    # 选定上一章版本时已在后台预取本章的前置数据，校验通过则直接使用
+    setup = await chapter_prefetcher.take(project_id, request.chapter_number, fingerprint)
+    if setup is None:
+        setup = await build_chapter_setup(session, novel_service, llm_service, project, request.chapter_number, current_user.id)
+    else:
+        logger.info("项目 %s 第 %s 章使用预取的生成上下文", project_id, request.chapter_number)
+        await save_pending_summaries(session, project, setup)
 
     writer_prompt = await prompt_service.get_prompt("writing")
     if not writer_prompt:
@@ -148,14 +152,13 @@ async def generate_chapter(
 
     outline_title = outline.title or f"第{outline.chapter_number}章"
     outline_summary = outline.summary or "暂无摘要"
-    query_parts = [outline_title, outline_summary]
-    if request.writing_notes:
-        query_parts.append(request.writing_notes)
-    rag_query = "\n".join(part for part in query_parts if part)
-    rag_context = await context_service.retrieve_for_generation(
+    # 只检索当前章节之前的内容，重写前文章节时不让后续章节的剧情混入提示词
+    rag_context = await context_service.retrieve_with_notes(
         project_id=project_id,
-        query_text=rag_query or outline.title or outline.summary or "",
+        query_text=build_rag_query(outline),
+        writing_notes=request.writing_notes,
         user_id=current_user.id,
+        filters=RetrievalFilter(max_chapter=request.chapter_number - 1),
     )
     chunk_count = len(rag_context.chunks) if rag_context and rag_context.chunks else 0
     summary_count = len(rag_context.summaries) if rag_context and rag_context.summaries else 0
@@ -168,13 +171,13 @@ async def generate_chapter(
     )
     # print("rag_context:",rag_context)
     # 将蓝图、前情、RAG 检索结果拼装成结构化段落，供模型理解
-    blueprint_text = json.dumps(blueprint_dict, ensure_ascii=False, indent=2)
+    blueprint_text = setup.blueprint_text
     completed_lines = [
         f"- 第{item['chapter_number']}章 - {item['title']}:{item['summary']}"
-        for item in completed_chapters
+        for item in setup.completed_chapters
     ]
-    previous_summary_text = previous_summary_text or "暂无可用摘要"
-    previous_tail_excerpt = previous_tail_excerpt or "暂无上一章结尾内容"
+    previous_summary_text = setup.previous_summary_text or "暂无可用摘要"
+    previous_tail_excerpt = setup.previous_tail_excerpt or "暂无上一章结尾内容"
     completed_section = "\n".join(completed_lines) if completed_lines else "暂无前情摘要"
     rag_chunks_text = "\n\n".join(rag_context.chunk_texts()) if rag_context.chunks else "未检索到章节片段"
     rag_summaries_text = "\n".join(rag_context.summary_lines()) if rag_context.summaries else "未检索到章节摘要"
@@ -216,7 +219,9 @@ async def generate_chapter(
                 else:
                     current_user_content = prompt_input
                 
-                response = await llm_service.get_llm_response(
+                # 边接收边剥离 <think> 并解码正文，流结束后无需再整段扫描
+                stream_parser = ChapterStreamParser()
+                await llm_service.get_llm_response(
                     system_prompt=current_prompt,
                     conversation_history=[{"role": "user", "content": current_user_content}],
                     temperature=0.9,
@@ -224,12 +229,18 @@ async def generate_chapter(
                     timeout=600.0,
                     response_format=None,  # Claude API不支持response_format参数
                     max_tokens=16000,  # 确保有足够的token生成完整章节
+                    stream_parser=stream_parser,
                 )
-                cleaned = remove_think_tags(response)
+                cleaned = stream_parser.text.strip()
                 normalized = unwrap_markdown_json(cleaned)
-                sanitized = sanitize_json_like_text(normalized)  # 清理未转义的控制字符
+                sanitized = normalized
                 try:
-                    result = json.loads(sanitized)
+                    try:
+                        # 合法 JSON 清洗前后完全一致，先直接解析，失败再清理未转义的控制字符
+                        result = json.loads(normalized)
+                    except json.JSONDecodeError:
+                        sanitized = await run_cpu_bound(sanitize_json_like_text, normalized, cost=len(normalized))
+                        result = json.loads(sanitized)
                     logger.info(
                         "项目 %s 第 %s 章第 %s 个版本生成成功（尝试 %d/%d，目标字数 %d）",
                         project_id,
@@ -251,61 +262,22 @@ async def generate_chapter(
                     # 记录响应内容的前500字符，便于调试
                     logger.debug("响应内容预览: %s", sanitized[:500])
                     
-                    import re
-                    
-                    # 检查是否是纯文本响应（没有JSON结构）
-                    if not sanitized.strip().startswith('{'):
+                    if stream_parser.truncated:
+                        logger.info("流式解析得到被截断的正文，直接采用，长度: %d", len(stream_parser.content))
+                        return {"full_content": stream_parser.content}
+
+                    result, strategy = recover_chapter_payload(sanitized)
+                    if strategy == "plain_text":
                         logger.warning("LLM返回的不是JSON格式，将作为纯文本处理")
-                        return {"full_content": sanitized}
-                    
-                    # 尝试修复被截断的JSON（补全缺失的引号和括号）
-                    repaired = sanitized.rstrip()
-                    if repaired and not repaired.endswith('}'):
-                        # 检查是否在字符串值中被截断
-                        if repaired.count('"') % 2 == 1:  # 奇数个引号，说明字符串未闭合
-                            repaired += '"'
-                        # 补全缺失的闭合括号
-                        open_braces = repaired.count('{') - repaired.count('}')
-                        repaired += '}' * open_braces
-                        
-                        # 尝试解析修复后的JSON
-                        try:
-                            result = json.loads(repaired)
-                            logger.info("成功修复并解析JSON")
-                            return result
-                        except json.JSONDecodeError:
-                            logger.debug("修复JSON失败，继续使用正则提取")
-                    
-                    # 方案1：尝试提取完整的full_content字段（有闭合引号）
-                    match = re.search(r'"(?:full_)?content"\s*:\s*"((?:[^"\\]|\\.)*)"', sanitized, re.DOTALL)
-                    if match:
-                        try:
-                            # 直接使用提取的内容，不做unicode_escape解码
-                            # 因为JSON中的转义字符已经被json.loads处理过了
-                            extracted = match.group(1)
-                            # 只处理基本的转义序列
-                            extracted = extracted.replace('\\n', '\n').replace('\\t', '\t').replace('\\"', '"').replace('\\\\', '\\')
-                            logger.info("成功通过正则提取完整的content字段，长度: %d", len(extracted))
-                            return { "full_content": extracted }
-                        except Exception as e:
-                            logger.warning("正则提取后处理失败: %s", e)
-                    
-                    # 方案2：尝试提取被截断的content字段（没有闭合引号，提取到字符串末尾）
-                    match_incomplete = re.search(r'"(?:full_)?content"\s*:\s*"(.*)$', sanitized, re.DOTALL)
-                    if match_incomplete:
-                        try:
-                            # 移除末尾可能的不完整字符和多余的括号/引号
-                            raw_content = match_incomplete.group(1).rstrip('"}]')
-                            # 处理基本的转义序列，不使用unicode_escape
-                            extracted = raw_content.replace('\\n', '\n').replace('\\t', '\t').replace('\\"', '"').replace('\\\\', '\\')
-                            logger.info("成功提取被截断的content字段，长度: %d", len(extracted))
-                            return { "full_content": extracted }
-                        except Exception as e:
-                            logger.warning("提取被截断content失败: %s", e)
-                    
-                    # 方案3：完全无法解析，返回原始内容
-                    logger.error("无法从响应中提取章节内容，返回原始文本")
-                    return {"content": sanitized}
+                    elif strategy == "repaired":
+                        logger.info("成功修复并解析JSON")
+                    elif strategy == "content_field":
+                        logger.info("成功通过正则提取完整的content字段，长度: %d", len(result["full_content"]))
+                    elif strategy == "truncated_content":
+                        logger.info("成功提取被截断的content字段，长度: %d", len(result["full_content"]))
+                    else:
+                        logger.error("无法从响应中提取章节内容，返回原始文本")
+                    return result
                     
             except HTTPException as http_exc:
                 # 检查是否是token限制异常
@@ -318,6 +290,7 @@ async def generate_chapter(
                             idx + 1,
                             target_words,
                         )
+                        record_llm_retry("token_limit")
                         continue  # 继续下一次重试
                     else:
                         logger.error(
@@ -502,6 +475,7 @@ async def select_chapter_version(
             ingestion_service = ChapterIngestionService(llm_service=llm_service, vector_store=vector_store)
             outline = next((item for item in project.outlines if item.chapter_number == chapter.chapter_number), None)
             chapter_title = outline.title if outline and outline.title else f"第{chapter.chapter_number}章"
+            character_names = [character.name for character in project.characters]
             
             total_chunks = 0
             successful_chunks = 0
@@ -509,10 +483,11 @@ async def select_chapter_version(
             
             try:
                 # 先统计章节会被切成多少块
-                content_chunks = ingestion_service._split_into_chunks(selected.content)
+                content_chunks = await ingestion_service._split_into_chunks(selected.content)
                 total_chunks = len(content_chunks)
                 
                 # 尝试生成所有块的向量
+                embedding_model = await llm_service.get_embedding_model_id()
                 chunk_records = []
                 for index, chunk_text in enumerate(content_chunks):
                     embedding = await llm_service.get_embedding(
@@ -530,9 +505,11 @@ async def select_chapter_version(
                             "chapter_title": chapter_title,
                             "content": chunk_text,
                             "embedding": embedding,
+                            "embedding_model": embedding_model,
                             "metadata": {
                                 "chunk_id": record_id,
                                 "length": len(chunk_text),
+                                "characters": ChapterIngestionService.character_tags(chunk_text, character_names),
                             },
                         })
                     else:
@@ -624,6 +601,11 @@ async def select_chapter_version(
                     detail=f"向量同步失败: {str(exc)}"
                 ) from exc
 
+        # 选定版本后用户通常紧接着生成下一章，纲要已存在时在后台预取其生成上下文
+        next_number = chapter.chapter_number + 1
+        if any(item.chapter_number == next_number for item in project.outlines):
+            chapter_prefetcher.schedule(project_id, next_number, current_user.id)
+
     return await _load_project_schema(novel_service, project_id, current_user.id)
 
 
@@ -633,6 +615,24 @@ async def evaluate_chapter(
     request: EvaluateChapterRequest,
     session: AsyncSession = Depends(get_session),
     current_user: UserInDB = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(default=None, alias=IDEMPOTENCY_HEADER, max_length=255),
+    http_request: Request = None,
+) -> NovelProjectSchema:
+    return await operation_dedup.run(
+        (current_user.id, "chapter_evaluate", project_id, request.chapter_number),
+        lambda: _evaluate_chapter(project_id, request, session, current_user),
+        user_id=current_user.id,
+        fingerprint=request_fingerprint("chapter_evaluate", project_id, request),
+        idempotency_key=idempotency_key,
+        until_disconnected=(lambda: wait_for_disconnect(http_request)) if http_request else None,
+    )
+
+
+async def _evaluate_chapter(
+    project_id: str,
+    request: EvaluateChapterRequest,
+    session: AsyncSession,
+    current_user: UserInDB,
 ) -> NovelProjectSchema:
     novel_service = NovelService(session)
     prompt_service = PromptService(session)
@@ -725,7 +725,7 @@ async def generate_chapter_outline(
         timeout=360.0,
     )
     normalized = unwrap_markdown_json(remove_think_tags(response))
-    sanitized = sanitize_json_like_text(normalized)
+    sanitized = await run_cpu_bound(sanitize_json_like_text, normalized, cost=len(normalized))
     try:
         data = json.loads(sanitized)
     except json.JSONDecodeError as exc:
@@ -904,6 +904,7 @@ async def edit_chapter(
             content=chapter.selected_version.content,
             summary=chapter.real_summary,
             user_id=current_user.id,
+            character_names=[character.name for character in project.characters],
         )
         logger.info("项目 %s 第 %s 章更新内容已同步至向量库", project_id, chapter.chapter_number)
 
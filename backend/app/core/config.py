@@ -1,12 +1,30 @@
 from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional
 
 from pydantic import AliasChoices, AnyUrl, Field, HttpUrl, validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from sqlalchemy.engine import URL, make_url
 
 
+def parse_user_weights(value: Optional[str]) -> Dict[int, float]:
+    """解析“用户ID:权重”以逗号分隔的配置，如 ``1:4,7:2``。"""
+    weights: Dict[int, float] = {}
+    for item in (value or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        raw_user, _, raw_weight = item.partition(":")
+        try:
+            user_id, weight = int(raw_user), float(raw_weight)
+        except ValueError:
+            user_id, weight = 0, 0.0
+        if weight <= 0:
+            raise ValueError(f"LLM_USER_WEIGHTS 格式应为 用户ID:权重（权重大于 0），无法解析: {item}")
+        weights[user_id] = weight
+    return weights
+
+
 class Settings(BaseSettings):
     """应用全局配置，所有可调参数集中于此，统一加载自环境变量。"""
 
@@ -77,6 +95,18 @@ class Settings(BaseSettings):
         validation_alias=AliasChoices("WRITER_CHAPTER_VERSION_COUNT", "WRITER_CHAPTER_VERSIONS"),
         description="每次生成章节的候选版本数量",
     )
+    writer_prefetch_ttl: float = Field(
+        default=900.0,
+        ge=0,
+        env="WRITER_PREFETCH_TTL",
+        description="选定章节版本后预取下一章生成上下文，预取结果的有效期（秒）；0 表示关闭预取",
+    )
+    idempotency_replay_ttl: float = Field(
+        default=600.0,
+        ge=0,
+        env="IDEMPOTENCY_REPLAY_TTL",
+        description="携带 Idempotency-Key 的生成类请求成功后，结果可按相同的键重放的时长（秒）；0 表示不保留",
+    )
     embedding_provider: str = Field(
         default="openai",
         env="EMBEDDING_PROVIDER",
@@ -123,18 +153,98 @@ class Settings(BaseSettings):
         env="VECTOR_DB_AUTH_TOKEN",
         description="libsql 访问令牌",
     )
+    vector_shard_mode: str = Field(
+        default="none",
+        env="VECTOR_SHARD_MODE",
+        description="向量库分片方式：none 为单文件，project 为每个项目一个文件，bucket 为按项目哈希分桶；仅对 file: 地址生效",
+    )
+    vector_shard_buckets: int = Field(
+        default=64,
+        ge=1,
+        env="VECTOR_SHARD_BUCKETS",
+        description="bucket 分片模式下的分桶数量",
+    )
+    vector_shard_max_open: int = Field(
+        default=32,
+        ge=1,
+        env="VECTOR_SHARD_MAX_OPEN",
+        description="同时保持打开的分片文件句柄上限，超出后关闭最久未使用的分片",
+    )
+    vector_snapshots_enabled: bool = Field(
+        default=True,
+        env="VECTOR_SNAPSHOTS_ENABLED",
+        description="应用层相似度计算时是否使用按项目持久化的 mmap 向量快照（仅 file: 向量库）",
+    )
+    vector_reembed_rate: float = Field(
+        default=5.0,
+        gt=0,
+        env="VECTOR_REEMBED_RATE",
+        description="切换嵌入模型后重新嵌入任务每秒最多发起的嵌入请求数",
+    )
+    vector_reembed_batch_size: int = Field(
+        default=32,
+        ge=1,
+        env="VECTOR_REEMBED_BATCH_SIZE",
+        description="重新嵌入任务每批读取并回写的记录数",
+    )
     vector_top_k_chunks: int = Field(
         default=5,
         ge=0,
         env="VECTOR_TOP_K_CHUNKS",
         description="剧情 chunk 检索条数",
     )
+    vector_mmr_enabled: bool = Field(
+        default=False,
+        env="VECTOR_MMR_ENABLED",
+        description="是否对检索到的剧情 chunk 做最大边际相关（MMR）去重重排",
+    )
+    vector_mmr_candidates: int = Field(
+        default=20,
+        ge=1,
+        env="VECTOR_MMR_CANDIDATES",
+        description="MMR 重排前召回的候选 chunk 数，应大于 chunk 检索条数",
+    )
+    vector_mmr_lambda: float = Field(
+        default=0.7,
+        ge=0.0,
+        le=1.0,
+        env="VECTOR_MMR_LAMBDA",
+        description="MMR 中相关度的权重，1 为只看相关度，越小越偏向多样性",
+    )
+    vector_merge_adjacent_chunks: bool = Field(
+        default=True,
+        env="VECTOR_MERGE_ADJACENT_CHUNKS",
+        description="是否把同一章节中相邻的 chunk 合并为一段连续文本（去掉重叠部分）",
+    )
     vector_top_k_summaries: int = Field(
         default=3,
         ge=0,
         env="VECTOR_TOP_K_SUMMARIES",
         description="章节摘要检索条数",
     )
+    vector_retrieval_cache_size: int = Field(
+        default=256,
+        ge=0,
+        env="VECTOR_RETRIEVAL_CACHE_SIZE",
+        description="章节上下文检索结果缓存的最大条目数，按项目写入代数失效；0 表示关闭",
+    )
+    vector_hybrid_search: bool = Field(
+        default=True,
+        env="VECTOR_HYBRID_SEARCH",
+        description="是否在向量检索之外结合 FTS5 全文检索，并以倒数排名融合合并结果",
+    )
+    vector_hybrid_candidates: int = Field(
+        default=20,
+        ge=1,
+        env="VECTOR_HYBRID_CANDIDATES",
+        description="混合检索时向量与全文两路各自召回的候选条数",
+    )
+    vector_rrf_k: int = Field(
+        default=60,
+        ge=1,
+        env="VECTOR_RRF_K",
+        description="倒数排名融合的平滑常数 k，越大越弱化名次靠前条目的优势",
+    )
     vector_chunk_size: int = Field(
         default=480,
         ge=128,
@@ -147,6 +257,147 @@ class Settings(BaseSettings):
         env="VECTOR_CHUNK_OVERLAP",
         description="章节分块重叠字数",
     )
+    vector_chunk_strategy: str = Field(
+        default="native",
+        env="VECTOR_CHUNK_STRATEGY",
+        description="章节分块策略：native 为内置边界切分器，按段落与句子边界切分，速度略快于 LangChain；langchain 为 LangChain 递归切分器",
+    )
+    vector_chunk_unit: str = Field(
+        default="chars",
+        env="VECTOR_CHUNK_UNIT",
+        description="章节分块的计量单位：chars 按字数，tokens 按嵌入模型的 token 数",
+    )
+    vector_chunk_tokens: int = Field(
+        default=512,
+        ge=32,
+        env="VECTOR_CHUNK_TOKENS",
+        description="按 token 分块时每段的 token 预算",
+    )
+    vector_chunk_overlap_tokens: int = Field(
+        default=64,
+        ge=0,
+        env="VECTOR_CHUNK_OVERLAP_TOKENS",
+        description="按 token 分块时相邻片段的重叠 token 数",
+    )
+    embedding_max_input_tokens: int = Field(
+        default=0,
+        ge=0,
+        env="EMBEDDING_MAX_INPUT_TOKENS",
+        description="嵌入接口单次输入的 token 上限，超出时截断；0 表示使用已知模型的默认上限",
+    )
+    import_embed_chapters: bool = Field(
+        default=False,
+        env="IMPORT_EMBED_CHAPTERS",
+        description="导入小说后是否在后台将全部章节写入向量库",
+    )
+    import_read_block_size: int = Field(
+        default=1024 * 1024,
+        ge=4096,
+        env="IMPORT_READ_BLOCK_SIZE",
+        description="导入文件按块读取与解码的字节数",
+    )
+    import_max_file_mb: int = Field(
+        default=100,
+        ge=1,
+        env="IMPORT_MAX_FILE_MB",
+        description="单个导入文件的大小上限（MB）",
+    )
+
+    # -------------------- 运行时性能配置 --------------------
+    cpu_executor_workers: int = Field(
+        default=2,
+        ge=0,
+        env="CPU_EXECUTOR_WORKERS",
+        description="CPU 密集任务卸载进程池大小，0 表示在事件循环线程内直接执行",
+    )
+    cpu_offload_min_chars: int = Field(
+        default=20000,
+        ge=0,
+        env="CPU_OFFLOAD_MIN_CHARS",
+        description="文本长度低于该值时不卸载到进程池，避免序列化开销大于计算本身",
+    )
+    loop_lag_sample_interval: float = Field(
+        default=0.5,
+        ge=0,
+        env="LOOP_LAG_SAMPLE_INTERVAL",
+        description="事件循环延迟采样间隔（秒），0 表示关闭监控",
+    )
+    loop_lag_warn_ms: float = Field(
+        default=200.0,
+        ge=0,
+        env="LOOP_LAG_WARN_MS",
+        description="事件循环单次阻塞超过该毫秒数时记录告警",
+    )
+    db_slow_query_ms: float = Field(
+        default=500.0,
+        ge=0,
+        env="DB_SLOW_QUERY_MS",
+        description="单条 SQL 耗时超过该毫秒数时记录慢查询日志，0 表示关闭",
+    )
+    llm_stream_usage: bool = Field(
+        default=True,
+        env="LLM_STREAM_USAGE",
+        description="流式调用时请求上游在末尾返回 token 用量（stream_options.include_usage），上游不支持时可关闭",
+    )
+    llm_provider_concurrency: int = Field(
+        default=16,
+        ge=0,
+        env="LLM_PROVIDER_CONCURRENCY",
+        description="每个 LLM 提供方（服务地址 + API Key）同时执行的调用上限，0 表示不限制",
+    )
+    llm_provider_tokens_per_minute: int = Field(
+        default=0,
+        ge=0,
+        env="LLM_PROVIDER_TOKENS_PER_MINUTE",
+        description="每个 LLM 提供方每分钟可消耗的 token 预算（输入加输出），0 表示不限制",
+    )
+    llm_queue_max_waiting: int = Field(
+        default=64,
+        ge=0,
+        env="LLM_QUEUE_MAX_WAITING",
+        description="每个提供方排队中的交互调用上限，超出时直接返回 429，0 表示不限制",
+    )
+    llm_queue_timeout: float = Field(
+        default=180.0,
+        ge=0,
+        env="LLM_QUEUE_TIMEOUT",
+        description="交互调用在调度队列中的最长等待秒数，超时返回 429，0 表示不限制；后台调用不受限制",
+    )
+    llm_background_share: float = Field(
+        default=0.5,
+        gt=0,
+        le=1,
+        env="LLM_BACKGROUND_SHARE",
+        description="后台调用（摘要、嵌入与后台任务）最多占用的并发名额比例，至少保留 1 个",
+    )
+    llm_rate_limit_cooldown: float = Field(
+        default=10.0,
+        ge=0,
+        env="LLM_RATE_LIMIT_COOLDOWN",
+        description="上游返回 429 且未给出 Retry-After 时，该提供方暂停放行新调用的秒数",
+    )
+    llm_user_weights: str = Field(
+        default="",
+        env="LLM_USER_WEIGHTS",
+        description="按用户设置公平排队的权重，格式为 用户ID:权重 并以逗号分隔（如 1:4,7:2），未列出的用户权重为 1",
+    )
+    metrics_token: Optional[str] = Field(
+        default=None,
+        env="METRICS_TOKEN",
+        description="访问 /metrics 所需的 Bearer Token，留空表示不校验",
+    )
+    usage_flush_interval: float = Field(
+        default=5.0,
+        gt=0,
+        env="USAGE_FLUSH_INTERVAL",
+        description="用量计数在内存中累积后批量写库的间隔（秒）",
+    )
+    daily_quota_reserve_block: int = Field(
+        default=5,
+        ge=1,
+        env="DAILY_QUOTA_RESERVE_BLOCK",
+        description="每日限额一次从数据库预占的次数，用完前的调用无需写库",
+    )
 
     # -------------------- Linux.do OAuth 配置 --------------------
     linuxdo_client_id: Optional[str] = Field(default=None, env="LINUXDO_CLIENT_ID", description="Linux.do OAuth Client ID")
@@ -199,6 +450,37 @@ class Settings(BaseSettings):
             raise ValueError("EMBEDDING_PROVIDER 仅支持 openai 或 ollama")
         return candidate
 
+    @validator("llm_user_weights", pre=True)
+    def _normalize_llm_user_weights(cls, value: Optional[str]) -> str:
+        """启动时校验用户权重配置的格式。"""
+        candidate = (value or "").strip()
+        parse_user_weights(candidate)
+        return candidate
+
+    @validator("vector_chunk_strategy", pre=True)
+    def _normalize_vector_chunk_strategy(cls, value: Optional[str]) -> str:
+        """限制章节分块策略的取值范围。"""
+        candidate = (value or "native").strip().lower()
+        if candidate not in {"native", "langchain"}:
+            raise ValueError("VECTOR_CHUNK_STRATEGY 仅支持 native 或 langchain")
+        return candidate
+
+    @validator("vector_shard_mode", pre=True)
+    def _normalize_vector_shard_mode(cls, value: Optional[str]) -> str:
+        """限制向量库分片方式的取值范围。"""
+        candidate = (value or "none").strip().lower()
+        if candidate not in {"none", "project", "bucket"}:
+            raise ValueError("VECTOR_SHARD_MODE 仅支持 none、project 或 bucket")
+        return candidate
+
+    @validator("vector_chunk_unit", pre=True)
+    def _normalize_vector_chunk_unit(cls, value: Optional[str]) -> str:
+        """限制章节分块计量单位的取值范围。"""
+        candidate = (value or "chars").strip().lower()
+        if candidate not in {"chars", "tokens"}:
+            raise ValueError("VECTOR_CHUNK_UNIT 仅支持 chars 或 tokens")
+        return candidate
+
     @validator("logging_level", pre=True)
     def _normalize_logging_level(cls, value: Optional[str]) -> str:
         """规范日志级别配置。"""
@@ -246,6 +528,11 @@ class Settings(BaseSettings):
         """辅助属性：判断当前连接串是否指向 SQLite，用于差异化初始化流程。"""
         return make_url(self.sqlalchemy_database_uri).get_backend_name() == "sqlite"
 
+    @property
+    def llm_user_weight_map(self) -> Dict[int, float]:
+        """解析后的用户排队权重（用户 ID -> 权重）。"""
+        return parse_user_weights(self.llm_user_weights)
+
     @property
     def vector_store_enabled(self) -> bool:
         """是否已经配置向量库，用于在业务逻辑中快速判断。"""
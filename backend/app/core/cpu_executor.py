@@ -0,0 +1,115 @@
+"""
+CPU 密集任务的进程池卸载。
+
+应用只运行单个 uvicorn worker，正则扫描、JSON 清洗、文本切分等纯 Python 计算会持有 GIL
+并阻塞事件循环，因此统一交给独立进程执行。被调用的函数必须定义在模块顶层且只依赖
+``app.utils`` 这类轻量模块，避免子进程导入整套应用；小输入直接在当前线程执行，省去进程间序列化开销。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class CpuExecutor:
+    """惰性创建的进程池封装，记录提交、内联执行与失败次数。"""
+
+    def __init__(self, *, max_workers: int, inline_threshold: int) -> None:
+        self._max_workers = max_workers
+        self._inline_threshold = inline_threshold
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self._stats = {"submitted": 0, "inline": 0, "completed": 0, "failed": 0, "pool_restarts": 0}
+        self._busy_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_workers > 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # fork 会复制事件循环与数据库连接所在的线程状态，统一使用 spawn 启动干净的子进程
+            self._pool = ProcessPoolExecutor(
+                max_workers=self._max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            logger.info("CPU 卸载进程池已启动: workers=%d", self._max_workers)
+        return self._pool
+
+    async def run(self, func: Callable[..., T], *args: Any, cost: Optional[int] = None, **kwargs: Any) -> T:
+        """在进程池中执行 func；cost 低于阈值或进程池被禁用时直接在当前线程执行。"""
+        call = functools.partial(func, *args, **kwargs)
+        if not self.enabled or (cost is not None and cost < self._inline_threshold):
+            self._stats["inline"] += 1
+            return call()
+
+        loop = asyncio.get_running_loop()
+        self._stats["submitted"] += 1
+        self._pending += 1
+        started = time.perf_counter()
+        try:
+            try:
+                result = await loop.run_in_executor(self._get_pool(), call)
+            except BrokenProcessPool:
+                # 子进程异常退出（如被 OOM killer 杀死）后进程池不可再用，重建后重试一次
+                logger.error("CPU 卸载进程池已损坏，重建后重试: func=%s", getattr(func, "__qualname__", func))
+                self._reset_pool()
+                result = await loop.run_in_executor(self._get_pool(), call)
+        except Exception:
+            self._stats["failed"] += 1
+            raise
+        finally:
+            self._pending -= 1
+            self._busy_seconds += time.perf_counter() - started
+        self._stats["completed"] += 1
+        return result
+
+    def _reset_pool(self) -> None:
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        self._stats["pool_restarts"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "max_workers": self._max_workers,
+            "inline_threshold": self._inline_threshold,
+            "pending": self._pending,
+            "busy_seconds": round(self._busy_seconds, 3),
+            **self._stats,
+        }
+
+    async def shutdown(self) -> None:
+        """应用关闭时回收子进程，未开始的任务直接取消。"""
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            await asyncio.to_thread(pool.shutdown, True, cancel_futures=True)
+            logger.info("CPU 卸载进程池已关闭")
+
+
+cpu_executor = CpuExecutor(
+    max_workers=settings.cpu_executor_workers,
+    inline_threshold=settings.cpu_offload_min_chars,
+)
+
+
+async def run_cpu_bound(func: Callable[..., T], *args: Any, cost: Optional[int] = None, **kwargs: Any) -> T:
+    """模块级快捷入口，等价于 ``cpu_executor.run``。"""
+    return await cpu_executor.run(func, *args, cost=cost, **kwargs)
+
+
+__all__ = ["CpuExecutor", "cpu_executor", "run_cpu_bound"]
@@ -0,0 +1,105 @@
+"""
+HTTP 请求指标：纯 ASGI 中间件，按路由模板统计请求数、耗时与请求/响应体大小。
+
+路由标签取自匹配到的路由模板（如 ``/api/novels/{project_id}``），而不是实际路径，
+避免项目 ID 等路径参数让标签数量无限增长；未匹配任何路由的请求统一记为 ``unmatched``。
+匹配结果同时写入 ``current_route``，供 LLM 遥测等下游逻辑区分调用来源。
+"""
+
+from __future__ import annotations
+
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, MutableMapping, Optional
+
+from starlette.routing import Match
+
+from .metrics import metrics_registry
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+
+# 当前请求的 "METHOD /route/template"，后台任务创建时会继承请求上下文
+current_route: ContextVar[Optional[str]] = ContextVar("current_route", default=None)
+
+UNMATCHED_ROUTE = "unmatched"
+
+# 请求/响应体大小分桶（字节），上限覆盖整本小说导入
+_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+HTTP_REQUESTS = metrics_registry.counter(
+    "http_requests_total", "HTTP 请求次数", ("method", "route", "status")
+)
+HTTP_DURATION = metrics_registry.histogram(
+    "http_request_duration_seconds", "HTTP 请求从进入到响应体发送完毕的耗时", ("method", "route")
+)
+HTTP_REQUEST_SIZE = metrics_registry.histogram(
+    "http_request_size_bytes", "HTTP 请求体大小", ("method", "route"), buckets=_SIZE_BUCKETS
+)
+HTTP_RESPONSE_SIZE = metrics_registry.histogram(
+    "http_response_size_bytes", "HTTP 响应体大小", ("method", "route"), buckets=_SIZE_BUCKETS
+)
+HTTP_IN_PROGRESS = metrics_registry.gauge(
+    "http_requests_in_progress", "正在处理中的 HTTP 请求数", ("method",)
+)
+
+
+def resolve_route_template(scope: Scope) -> Optional[str]:
+    """按应用路由表匹配当前请求，返回路由模板；405 等部分匹配同样返回对应模板。"""
+    router = getattr(scope.get("app"), "router", None)
+    partial: Optional[str] = None
+    for route in getattr(router, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", None)
+        if match == Match.PARTIAL and partial is None:
+            partial = getattr(route, "path", None)
+    return partial
+
+
+class HTTPMetricsMiddleware:
+    """统计每个请求的耗时与体积；流式响应以最后一个分片发送完毕为结束时间。"""
+
+    def __init__(self, app: Callable[[Scope, Receive, Send], Awaitable[None]]) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = resolve_route_template(scope) or UNMATCHED_ROUTE
+        token = current_route.set(f"{method} {route}")
+        state: Dict[str, int] = {"status": 500, "request_bytes": 0, "response_bytes": 0}
+
+        async def receive_wrapper() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                state["request_bytes"] += len(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["response_bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc(method=method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            HTTP_IN_PROGRESS.dec(method=method)
+            HTTP_REQUESTS.inc(method=method, route=route, status=state["status"])
+            HTTP_DURATION.observe(duration, method=method, route=route)
+            HTTP_REQUEST_SIZE.observe(state["request_bytes"], method=method, route=route)
+            HTTP_RESPONSE_SIZE.observe(state["response_bytes"], method=method, route=route)
+            current_route.reset(token)
+
+
+__all__ = ["HTTPMetricsMiddleware", "current_route", "resolve_route_template", "UNMATCHED_ROUTE"]
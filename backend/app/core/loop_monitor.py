@@ -0,0 +1,121 @@
+"""
+事件循环延迟监控：周期性 sleep 固定间隔，实际唤醒时间与预期之差即为事件循环被阻塞的时长。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from .config import settings
+from .metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG = metrics_registry.histogram(
+    "event_loop_lag_seconds",
+    "事件循环调度延迟采样",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.2, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+LOOP_STALLS = metrics_registry.counter("event_loop_stalls_total", "事件循环阻塞超过告警阈值的次数")
+
+
+def _to_ms(seconds: float) -> float:
+    return round(seconds * 1000, 2)
+
+
+def _percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class EventLoopLagMonitor:
+    """后台采样事件循环延迟，保留最近一段窗口用于计算分位数。"""
+
+    def __init__(self, *, interval: float, warn_threshold: float, window: int = 240) -> None:
+        self._interval = interval
+        self._warn_threshold = warn_threshold
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+        self._max_lag = 0.0
+        self._total_samples = 0
+        self._stalls = 0
+        self._last_stall_at: Optional[float] = None
+        self._last_stall_lag = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self._interval > 0
+
+    def start(self) -> None:
+        if not self.enabled or (self._task and not self._task.done()):
+            return
+        self._task = asyncio.create_task(self._run(), name="event-loop-lag-monitor")
+        logger.info(
+            "事件循环延迟监控已启动: interval=%.2fs warn=%.0fms",
+            self._interval,
+            self._warn_threshold * 1000,
+        )
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self._interval
+            await asyncio.sleep(self._interval)
+            self.record(max(0.0, loop.time() - expected))
+
+    def record(self, lag: float) -> None:
+        self._samples.append(lag)
+        self._total_samples += 1
+        self._max_lag = max(self._max_lag, lag)
+        LOOP_LAG.observe(lag)
+        if lag >= self._warn_threshold:
+            self._stalls += 1
+            LOOP_STALLS.inc()
+            self._last_stall_at = time.time()
+            self._last_stall_lag = lag
+            logger.warning("事件循环阻塞 %.0fms，期间所有请求都无法得到响应", lag * 1000)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """导出毫秒为单位的统计数据，分位数只基于最近窗口内的样本。"""
+        ordered = sorted(self._samples)
+        return {
+            "enabled": self.enabled,
+            "interval_ms": _to_ms(self._interval),
+            "samples": self._total_samples,
+            "window": len(ordered),
+            "current_ms": _to_ms(self._samples[-1]) if self._samples else 0.0,
+            "mean_ms": _to_ms(sum(ordered) / len(ordered)) if ordered else 0.0,
+            "p50_ms": _to_ms(_percentile(ordered, 0.50)),
+            "p95_ms": _to_ms(_percentile(ordered, 0.95)),
+            "p99_ms": _to_ms(_percentile(ordered, 0.99)),
+            "max_ms": _to_ms(self._max_lag),
+            "stall_threshold_ms": _to_ms(self._warn_threshold),
+            "stalls": self._stalls,
+            "last_stall_at": self._last_stall_at,
+            "last_stall_ms": _to_ms(self._last_stall_lag),
+        }
+
+
+loop_lag_monitor = EventLoopLagMonitor(
+    interval=settings.loop_lag_sample_interval,
+    warn_threshold=settings.loop_lag_warn_ms / 1000,
+)
+
+
+__all__ = ["EventLoopLagMonitor", "loop_lag_monitor"]
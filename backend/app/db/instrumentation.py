@@ -0,0 +1,127 @@
+"""
+数据库指标：通过 SQLAlchemy 引擎事件统计每条 SQL 的耗时并记录慢查询，
+连接池层面统计获取连接的等待时间、连接占用时长与池内连接数。
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import time
+from typing import Type
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+from ..core.config import settings
+from ..core.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+_QUERY_START_KEY = "metrics_query_start"
+_CHECKOUT_AT_KEY = "metrics_checkout_at"
+_OPERATIONS = frozenset({"SELECT", "INSERT", "UPDATE", "DELETE", "BEGIN", "COMMIT", "ROLLBACK", "PRAGMA"})
+_WHITESPACE_RUN = re.compile(r"\s+")
+# 慢查询日志中语句的最大长度，参数不写入日志以免泄露正文与密钥
+_SLOW_LOG_STATEMENT_CHARS = 500
+
+DB_QUERY_DURATION = metrics_registry.histogram(
+    "db_query_duration_seconds", "单条 SQL 的执行耗时", ("operation",)
+)
+DB_QUERY_ERRORS = metrics_registry.counter("db_query_errors_total", "执行失败的 SQL 数", ("operation",))
+DB_SLOW_QUERIES = metrics_registry.counter(
+    "db_slow_queries_total", "耗时超过 DB_SLOW_QUERY_MS 的 SQL 数", ("operation",)
+)
+DB_POOL_WAIT = metrics_registry.histogram("db_pool_checkout_wait_seconds", "从连接池获取连接的等待时间")
+DB_POOL_HOLD = metrics_registry.histogram("db_pool_connection_hold_seconds", "连接从借出到归还的占用时长")
+DB_POOL_CONNECTIONS = metrics_registry.gauge("db_pool_connections", "连接池内的连接数", ("state",))
+
+
+def _operation(statement: str) -> str:
+    head = statement.lstrip()[:16].split(None, 1)
+    keyword = head[0].upper() if head else ""
+    return keyword if keyword in _OPERATIONS else "OTHER"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault(_QUERY_START_KEY, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    starts = conn.info.get(_QUERY_START_KEY)
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    operation = _operation(statement)
+    DB_QUERY_DURATION.observe(elapsed, operation=operation)
+    threshold = settings.db_slow_query_ms
+    if threshold and elapsed * 1000 >= threshold:
+        DB_SLOW_QUERIES.inc(operation=operation)
+        logger.warning(
+            "慢查询 %.0fms (executemany=%s): %s",
+            elapsed * 1000,
+            executemany,
+            _WHITESPACE_RUN.sub(" ", statement).strip()[:_SLOW_LOG_STATEMENT_CHARS],
+        )
+
+
+def _handle_error(exception_context) -> None:
+    connection = exception_context.connection
+    if connection is not None:
+        starts = connection.info.get(_QUERY_START_KEY)
+        if starts:
+            starts.pop()
+    DB_QUERY_ERRORS.inc(operation=_operation(exception_context.statement or ""))
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy) -> None:
+    connection_record.info[_CHECKOUT_AT_KEY] = time.perf_counter()
+
+
+def _on_checkin(dbapi_connection, connection_record) -> None:
+    checkout_at = connection_record.info.pop(_CHECKOUT_AT_KEY, None)
+    if checkout_at is not None:
+        DB_POOL_HOLD.observe(time.perf_counter() - checkout_at)
+
+
+def instrumented_pool_class(base: Type[Pool]) -> Type[Pool]:
+    """
+    生成记录获取连接等待时间的连接池子类。
+
+    池事件只在拿到连接之后触发，无法反映排队时间，因此在 ``_do_get`` 外层计时；
+    对 NullPool 而言等待时间即为新建连接的耗时。
+    """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return base._do_get(self)
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - started)
+
+    return type(f"Instrumented{base.__name__}", (base,), {"_do_get": _do_get})
+
+
+def _register_pool_gauges(engine: Engine) -> None:
+    # 只有 QueuePool 一类维护固定大小的连接池，NullPool 等没有这些统计；
+    # 回调每次都从 engine 读取连接池，dispose 重建连接池后依然有效
+    if not all(hasattr(engine.pool, name) for name in ("size", "checkedout", "checkedin", "overflow")):
+        return
+    DB_POOL_CONNECTIONS.set_function(lambda: engine.pool.size(), state="size")
+    DB_POOL_CONNECTIONS.set_function(lambda: engine.pool.checkedout(), state="checked_out")
+    DB_POOL_CONNECTIONS.set_function(lambda: engine.pool.checkedin(), state="idle")
+    DB_POOL_CONNECTIONS.set_function(lambda: max(0, engine.pool.overflow()), state="overflow")
+
+
+def instrument_engine(engine: Engine) -> None:
+    """为同步引擎（异步引擎请传入 ``engine.sync_engine``）挂载查询与连接池指标。"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    event.listen(engine.pool, "checkout", _on_checkout)
+    event.listen(engine.pool, "checkin", _on_checkin)
+    _register_pool_gauges(engine)
+
+
+__all__ = ["instrument_engine", "instrumented_pool_class"]
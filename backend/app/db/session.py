@@ -1,9 +1,10 @@
 from collections.abc import AsyncGenerator
 
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 
 from ..core.config import settings
+from .instrumentation import instrument_engine, instrumented_pool_class
 
 # 根据不同数据库驱动调整连接池参数，确保在多数据库环境下表现稳定
 engine_kwargs = {"echo": settings.debug}
@@ -12,13 +13,19 @@ if settings.is_sqlite_backend:
     engine_kwargs.update(
         pool_pre_ping=False,
         connect_args={"check_same_thread": False},
-        poolclass=NullPool,
+        poolclass=instrumented_pool_class(NullPool),
     )
 else:
     # MySQL 场景保持健康检查与连接复用，适用于生产环境的长连接需求
-    engine_kwargs.update(pool_pre_ping=True, pool_recycle=3600)
+    engine_kwargs.update(
+        pool_pre_ping=True,
+        pool_recycle=3600,
+        poolclass=instrumented_pool_class(AsyncAdaptedQueuePool),
+    )
 
 engine = create_async_engine(settings.sqlalchemy_database_uri, **engine_kwargs)
+# 查询耗时、慢查询与连接池指标，经 /metrics 导出
+instrument_engine(engine.sync_engine)
 
 # 统一的 Session 工厂，禁用 expire_on_commit 方便返回模型对象
 AsyncSessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
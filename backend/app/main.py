@@ -8,8 +8,15 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from .core.config import settings
+from .core.cpu_executor import cpu_executor
+from .core.http_metrics import HTTPMetricsMiddleware
+from .core.loop_monitor import loop_lag_monitor
 from .db.init_db import init_db
+from .services.background_jobs import job_registry
+from .services.chapter_prefetch_service import chapter_prefetcher
 from .services.prompt_service import PromptService
+from .services.usage_buffer import daily_quota, usage_buffer
+from .services.vector_store_service import backfill_vector_terms, close_vector_shards
 from .db.session import AsyncSessionLocal
 from .api.routers import api_router
 
@@ -71,7 +78,18 @@ async def lifespan(app: FastAPI):
     async with AsyncSessionLocal() as session:
         prompt_service = PromptService(session)
         await prompt_service.preload()
+    # 历史向量记录的全文索引只在启动时补建一次，请求路径上的建表检查不再扫描全表
+    await backfill_vector_terms()
+    loop_lag_monitor.start()
+    usage_buffer.start()
     yield
+    await job_registry.shutdown()
+    await chapter_prefetcher.shutdown()
+    await usage_buffer.shutdown()
+    await daily_quota.release_all()
+    await cpu_executor.shutdown()
+    await close_vector_shards()
+    await loop_lag_monitor.stop()
 
 
 app = FastAPI(
@@ -89,6 +107,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# 最后添加的中间件位于最外层，请求耗时因此包含 CORS 与异常处理
+app.add_middleware(HTTPMetricsMiddleware)
 
 app.include_router(api_router)
 
@@ -2,6 +2,7 @@
 
 from .admin_setting import AdminSetting
 from .llm_config import LLMConfig
+from .llm_usage_record import LLMUsageRecord
 from .novel import (
     BlueprintCharacter,
     BlueprintRelationship,
@@ -23,6 +24,7 @@ from .system_config import SystemConfig
 __all__ = [
     "AdminSetting",
     "LLMConfig",
+    "LLMUsageRecord",
     "NovelConversation",
     "NovelBlueprint",
     "BlueprintCharacter",
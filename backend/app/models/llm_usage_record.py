@@ -0,0 +1,26 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import DateTime, Float, ForeignKey, Integer, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..db.base import Base
+
+
+class LLMUsageRecord(Base):
+    """单次 LLM 调用的用量与耗时明细，用于统计生成时间与 token 花费的去向。"""
+
+    __tablename__ = "llm_usage_records"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), index=True)
+    user_id: Mapped[Optional[int]] = mapped_column(ForeignKey("users.id", ondelete="SET NULL"), index=True)
+    model: Mapped[Optional[str]] = mapped_column(String(128))
+    endpoint: Mapped[Optional[str]] = mapped_column(String(255))
+    status: Mapped[str] = mapped_column(String(32), nullable=False)
+    finish_reason: Mapped[Optional[str]] = mapped_column(String(32))
+    prompt_tokens: Mapped[Optional[int]] = mapped_column(Integer)
+    completion_tokens: Mapped[Optional[int]] = mapped_column(Integer)
+    output_chars: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    ttft_ms: Mapped[Optional[float]] = mapped_column(Float)
+    duration_ms: Mapped[float] = mapped_column(Float, nullable=False)
@@ -1,12 +1,59 @@
-from typing import Any, Generic, Iterable, Optional, TypeVar
+from typing import Any, Generic, Iterable, Optional, Sequence, TypeVar
 
-from sqlalchemy import select
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import InstrumentedAttribute
 
 ModelType = TypeVar("ModelType")
 
 
+async def execute_increment_upsert(
+    session: AsyncSession,
+    model: type,
+    values: dict[str, Any],
+    *,
+    conflict_columns: Sequence[str],
+    counter: str,
+) -> None:
+    """“插入或累加”：行不存在时插入 values，已存在时在数据库端执行 counter = counter + 新值。
+
+    MySQL 与 SQLite 使用各自的原子 upsert；其他数据库先条件更新，未命中再在保存点内插入，
+    插入因并发写入撞上唯一约束时回退保存点并重新更新。
+    """
+    column = getattr(model, counter)
+    dialect = session.get_bind().dialect.name
+    if dialect == "mysql":
+        stmt = mysql_insert(model).values(**values)
+        await session.execute(stmt.on_duplicate_key_update({counter: column + stmt.inserted[counter]}))
+        return
+    if dialect == "sqlite":
+        stmt = sqlite_insert(model).values(**values)
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=list(conflict_columns),
+                set_={counter: column + stmt.excluded[counter]},
+            )
+        )
+        return
+
+    increment = (
+        update(model)
+        .where(*(getattr(model, name) == values[name] for name in conflict_columns))
+        .values({counter: column + values[counter]})
+        .execution_options(synchronize_session=False)
+    )
+    if (await session.execute(increment)).rowcount:
+        return
+    try:
+        async with session.begin_nested():
+            await session.execute(insert(model).values(**values))
+    except IntegrityError:
+        await session.execute(increment)
+
+
 class BaseRepository(Generic[ModelType]):
     """通用仓储基类，封装常见的增删改查操作。"""
 
@@ -1,8 +1,8 @@
-from typing import Optional
+from typing import Mapping, Optional
 
 from sqlalchemy import select
 
-from .base import BaseRepository
+from .base import BaseRepository, execute_increment_upsert
 from ..models import UsageMetric
 
 
@@ -17,3 +17,14 @@ class UsageMetricRepository(BaseRepository[UsageMetric]):
             self.session.add(instance)
             await self.session.flush()
         return instance
+
+    async def increment_many(self, deltas: Mapping[str, int]) -> None:
+        """在数据库端原子累加多个计数器，不需要先读出当前值。"""
+        for key, amount in deltas.items():
+            await execute_increment_upsert(
+                self.session,
+                UsageMetric,
+                {"key": key, "value": amount},
+                conflict_columns=["key"],
+                counter="value",
+            )
@@ -4,7 +4,7 @@ from typing import Iterable, Optional
 from sqlalchemy import func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from .base import BaseRepository
+from .base import BaseRepository, execute_increment_upsert
 from ..models import User, UserDailyRequest
 
 
@@ -56,6 +56,53 @@ class UserRepository(BaseRepository[User]):
         value = result.scalars().first()
         return value or 0
 
+    async def reserve_daily_requests(self, user_id: int, day: date, amount: int, limit: int) -> int:
+        """在不超过 limit 的前提下原子地预占至多 amount 次当日额度，返回实际预占的次数。"""
+        await execute_increment_upsert(
+            self.session,
+            UserDailyRequest,
+            {"user_id": user_id, "request_date": day, "request_count": 0},
+            conflict_columns=["user_id", "request_date"],
+            counter="request_count",
+        )
+        while amount > 0:
+            # 条件更新保证多进程并发预占时总数也不会越过上限
+            stmt = (
+                update(UserDailyRequest)
+                .where(
+                    UserDailyRequest.user_id == user_id,
+                    UserDailyRequest.request_date == day,
+                    UserDailyRequest.request_count + amount <= limit,
+                )
+                .values(request_count=UserDailyRequest.request_count + amount)
+                .execution_options(synchronize_session=False)
+            )
+            result = await self.session.execute(stmt)
+            if result.rowcount:
+                return amount
+            used = await self.session.scalar(
+                select(UserDailyRequest.request_count).where(
+                    UserDailyRequest.user_id == user_id,
+                    UserDailyRequest.request_date == day,
+                )
+            )
+            amount = min(amount, limit - (used or 0))
+        return 0
+
+    async def release_daily_requests(self, user_id: int, day: date, amount: int) -> None:
+        """归还预占后未使用的额度。"""
+        stmt = (
+            update(UserDailyRequest)
+            .where(
+                UserDailyRequest.user_id == user_id,
+                UserDailyRequest.request_date == day,
+                UserDailyRequest.request_count >= amount,
+            )
+            .values(request_count=UserDailyRequest.request_count - amount)
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.execute(stmt)
+
     async def count_users(self) -> int:
         stmt = select(func.count(User.id))
         result = await self.session.execute(stmt)
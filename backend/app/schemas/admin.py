@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -10,6 +10,144 @@ class Statistics(BaseModel):
     api_request_count: int
 
 
+class EventLoopLagStats(BaseModel):
+    enabled: bool
+    interval_ms: float
+    samples: int = Field(..., description="累计采样次数")
+    window: int = Field(..., description="参与分位数计算的最近样本数")
+    current_ms: float
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float = Field(..., description="启动以来的最大阻塞时长")
+    stall_threshold_ms: float
+    stalls: int = Field(..., description="超过告警阈值的次数")
+    last_stall_at: Optional[float] = None
+    last_stall_ms: float
+
+
+class CpuExecutorStats(BaseModel):
+    enabled: bool
+    max_workers: int
+    inline_threshold: int
+    pending: int
+    busy_seconds: float
+    submitted: int
+    inline: int
+    completed: int
+    failed: int
+    pool_restarts: int
+
+
+class UsageBufferStats(BaseModel):
+    interval_seconds: float
+    pending: Dict[str, int] = Field(default_factory=dict, description="尚未写库的计数增量")
+    flushes: int
+    flushed_total: int
+    pending_rows: int = Field(..., description="尚未写库的明细记录数")
+    flushed_rows: int
+    dropped_rows: int = Field(..., description="积压超限被丢弃的明细记录数")
+    failed_flushes: int
+    last_flush_at: Optional[float] = None
+    last_error: Optional[str] = None
+
+
+class DailyQuotaStats(BaseModel):
+    block_size: int
+    reserved_users: int = Field(..., description="持有未用完预占额度的用户数")
+    reserved_remaining: int
+    local_grants: int = Field(..., description="直接从预占额度中扣减、未访问数据库的次数")
+    reservations: int
+    rejections: int
+    refunds: int = Field(..., description="调用未获调度器放行而退还的额度次数")
+
+
+class RetrievalCacheStats(BaseModel):
+    enabled: bool
+    max_entries: int
+    entries: int
+    hits: int = Field(..., description="跳过查询向量生成与检索的次数")
+    misses: int
+    evictions: int
+    hit_rate: float
+
+
+class ChapterPrefetchStats(BaseModel):
+    enabled: bool
+    ttl_seconds: float
+    entries: int
+    pending: int = Field(..., description="正在执行的预取任务数")
+    scheduled: int
+    hits: int = Field(..., description="生成章节时直接使用预取结果的次数")
+    misses: int
+    stale: int = Field(..., description="预取后项目、纲要或前文已变化而作废的次数")
+    failed: int
+
+
+class RequestDedupStats(BaseModel):
+    replay_ttl_seconds: float
+    inflight: int = Field(..., description="正在执行的去重操作数")
+    replay_entries: int = Field(..., description="可按幂等键重放的已完成结果数")
+    started: int
+    attached: int = Field(..., description="重复请求合并到进行中操作的次数")
+    replayed: int = Field(..., description="按幂等键重放已完成结果的次数")
+    conflicts: int = Field(..., description="幂等键被用于不同请求而拒绝的次数")
+    aborted: int = Field(..., description="等待结果的客户端全部断开而取消的操作数")
+
+
+class LLMProviderQueueStats(BaseModel):
+    provider: str = Field(..., description="服务地址主机名与 API Key 摘要")
+    max_concurrency: int
+    concurrency_limit: int = Field(..., description="当前生效的并发上限，上游限流后减半并逐步恢复")
+    in_flight: Dict[str, int] = Field(default_factory=dict, description="按优先级统计的执行中调用数")
+    queued: Dict[str, int] = Field(default_factory=dict, description="按优先级统计的排队调用数")
+    tokens_available: Optional[int] = Field(None, description="token 桶余额，未设置预算时为空")
+    cooldown_seconds: float = Field(..., description="上游限流后剩余的冷却时长")
+    dispatched: int
+    rate_limited: int = Field(..., description="上游返回 429 的次数")
+
+
+class LLMSchedulerStats(BaseModel):
+    enabled: bool
+    max_concurrency: int
+    tokens_per_minute: int
+    max_queue: int
+    queue_timeout_seconds: float
+    background_share: float
+    weighted_users: int = Field(..., description="配置了公平排队权重的用户数")
+    rejected: int = Field(..., description="排队已满或等待超时而返回 429 的调用数")
+    promoted: int = Field(..., description="排队过久提升为交互优先级的后台调用数")
+    providers: List[LLMProviderQueueStats] = Field(default_factory=list)
+
+
+class RuntimeStats(BaseModel):
+    event_loop: EventLoopLagStats
+    cpu_executor: CpuExecutorStats
+    usage_buffer: UsageBufferStats
+    daily_quota: DailyQuotaStats
+    retrieval_cache: RetrievalCacheStats
+    chapter_prefetch: ChapterPrefetchStats
+    request_dedup: RequestDedupStats
+    llm_scheduler: LLMSchedulerStats
+    background_jobs: Dict[str, int] = Field(default_factory=dict, description="按状态统计的后台任务数")
+
+
+class LLMUsageSummary(BaseModel):
+    user_id: Optional[int] = None
+    username: Optional[str] = None
+    model: Optional[str] = None
+    endpoint: Optional[str] = None
+    calls: int
+    failed_calls: int = Field(..., description="状态不是 ok 的调用次数（截断、空响应、异常、取消、限流）")
+    prompt_tokens: int
+    completion_tokens: int
+    output_chars: int
+    total_duration_seconds: float
+    avg_duration_ms: float
+    avg_ttft_ms: Optional[float] = None
+
+
 class DailyRequestLimit(BaseModel):
     limit: int = Field(..., ge=0, description="匿名用户每日可用次数")
 
@@ -48,3 +186,40 @@ class AdminNovelSummary(BaseModel):
     completed_chapters: int
     total_chapters: int
     total_word_count: int = 0
+
+
+class VectorCleanupItem(BaseModel):
+    project_id: str
+    reason: str = Field(..., description="project_deleted：项目已删除；chapters_deleted：章节与大纲均已不存在")
+    chapters: List[int] = Field(default_factory=list)
+    chunks: int
+    summaries: int
+    payload_bytes: int = Field(..., description="被清理行的正文、向量与元数据字节数")
+
+
+class VectorGCReport(BaseModel):
+    dry_run: bool
+    scanned_projects: int
+    scanned_rows: int
+    items: List[VectorCleanupItem] = Field(default_factory=list)
+    chunks_deleted: int
+    summaries_deleted: int
+    payload_bytes: int
+    compacted: bool
+    size_before: int = Field(0, description="压缩前的数据库大小（字节）")
+    size_after: int = Field(0, description="压缩后的数据库大小（字节）")
+    reclaimed_bytes: int = 0
+    elapsed_seconds: float
+
+
+class VectorReembedStatus(BaseModel):
+    """向量重新嵌入后台任务的进度快照。"""
+
+    job_id: str
+    status: str
+    phase: str
+    progress: float = 0.0
+    counts: Dict[str, int] = Field(default_factory=dict)
+    embedding_model: Optional[str] = Field(None, description="迁移目标模型，格式为“提供方:模型名”")
+    message: Optional[str] = None
+    error: Optional[str] = None
@@ -119,6 +119,19 @@ class ChapterGenerationResponse(BaseModel):
     chapter_versions: List[Dict[str, Any]]
 
 
+class ImportJobStatus(BaseModel):
+    """小说导入后台任务的进度快照。"""
+
+    job_id: str
+    status: str
+    phase: str
+    progress: float = 0.0
+    counts: Dict[str, int] = {}
+    project_id: Optional[str] = None
+    message: Optional[str] = None
+    error: Optional[str] = None
+
+
 class NovelSectionType(str, Enum):
     OVERVIEW = "overview"
     WORLD_SETTING = "world_setting"
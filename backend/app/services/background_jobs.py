@@ -0,0 +1,211 @@
+"""
+进程内后台任务注册表：负责托管耗时流程（如小说导入）的执行、阶段进度与订阅通知。
+
+任务只保存在当前进程内存中，重启后不会恢复；已结束的任务会在保留期后被清理。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+TERMINAL_STATUSES = frozenset({JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED})
+
+
+@dataclass
+class BackgroundJob:
+    """单个后台任务的状态快照，所有字段变更都会唤醒订阅者。"""
+
+    id: str
+    kind: str
+    user_id: Optional[int]
+    status: str = JOB_PENDING
+    phase: str = "queued"
+    progress: float = 0.0
+    counts: Dict[str, int] = field(default_factory=dict)
+    result: Dict[str, Any] = field(default_factory=dict)
+    message: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    version: int = 0
+    _changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+    _task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def update(
+        self,
+        *,
+        phase: Optional[str] = None,
+        progress: Optional[float] = None,
+        message: Optional[str] = None,
+        **counts: int,
+    ) -> None:
+        """更新阶段、百分比与计数，并通知所有等待者。"""
+        if phase is not None:
+            self.phase = phase
+        if progress is not None:
+            # 进度只增不减，避免前端进度条回退
+            self.progress = max(self.progress, min(100.0, round(progress, 1)))
+        if message is not None:
+            self.message = message
+        if counts:
+            self.counts.update(counts)
+        self._notify()
+
+    def set_result(self, **values: Any) -> None:
+        self.result.update(values)
+        self._notify()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """导出可序列化的状态字典，供轮询接口与 SSE 推送复用。"""
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "phase": self.phase,
+            "progress": self.progress,
+            "counts": dict(self.counts),
+            "result": dict(self.result),
+            "message": self.message,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+    async def wait_for_change(self, seen_version: int, timeout: Optional[float] = None) -> bool:
+        """等待状态版本号超过 seen_version，超时返回 False。"""
+        while self.version <= seen_version:
+            if self.finished:
+                return self.version > seen_version
+            event = self._changed
+            try:
+                await asyncio.wait_for(event.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    async def wait_until(self, predicate: Callable[["BackgroundJob"], bool], timeout: Optional[float] = None) -> bool:
+        """等待直到 predicate 成立或任务结束。"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not predicate(self) and not self.finished:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            await self.wait_for_change(self.version, timeout=remaining)
+        return predicate(self)
+
+    def _notify(self) -> None:
+        self.version += 1
+        self.updated_at = time.time()
+        # 替换事件对象，使已唤醒的等待者在下一轮等待新的变更
+        previous, self._changed = self._changed, asyncio.Event()
+        previous.set()
+
+
+class BackgroundJobRegistry:
+    """后台任务注册表，负责创建、调度、取消与过期清理。"""
+
+    def __init__(self, *, retention_seconds: float = 3600.0) -> None:
+        self._jobs: Dict[str, BackgroundJob] = {}
+        self._retention_seconds = retention_seconds
+
+    def create(self, kind: str, user_id: Optional[int] = None) -> BackgroundJob:
+        self._prune()
+        job = BackgroundJob(id=uuid.uuid4().hex, kind=kind, user_id=user_id)
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[BackgroundJob]:
+        return self._jobs.get(job_id)
+
+    def list(self, *, kind: Optional[str] = None, user_id: Optional[int] = None) -> List[BackgroundJob]:
+        return [
+            job
+            for job in self._jobs.values()
+            if (kind is None or job.kind == kind) and (user_id is None or job.user_id == user_id)
+        ]
+
+    def start(self, job: BackgroundJob, runner: Callable[[BackgroundJob], Awaitable[None]]) -> BackgroundJob:
+        """在事件循环中启动任务，统一处理成功、失败与取消三种结局。"""
+
+        async def _run() -> None:
+            job.status = JOB_RUNNING
+            job.update(phase=job.phase)
+            try:
+                await runner(job)
+            except asyncio.CancelledError:
+                job.status = JOB_CANCELLED
+                job.error = job.error or "任务已取消"
+                logger.warning("后台任务已取消: kind=%s job=%s phase=%s", job.kind, job.id, job.phase)
+            except Exception as exc:
+                job.status = JOB_FAILED
+                job.error = getattr(exc, "detail", None) or str(exc) or exc.__class__.__name__
+                logger.exception("后台任务失败: kind=%s job=%s phase=%s", job.kind, job.id, job.phase)
+            else:
+                job.status = JOB_SUCCEEDED
+                job.progress = 100.0
+                logger.info("后台任务完成: kind=%s job=%s", job.kind, job.id)
+            finally:
+                job.finished_at = time.time()
+                job.update()
+
+        job._task = asyncio.create_task(_run(), name=f"{job.kind}:{job.id}")
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        job = self._jobs.get(job_id)
+        if not job or job.finished or not job._task:
+            return False
+        job._task.cancel()
+        return True
+
+    async def shutdown(self) -> None:
+        """应用关闭时取消仍在运行的任务，避免悬挂协程。"""
+        tasks = [job._task for job in self._jobs.values() if job._task and not job._task.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+            logger.info("已取消 %d 个运行中的后台任务", len(tasks))
+
+    def _prune(self) -> None:
+        now = time.time()
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished and job.finished_at and now - job.finished_at > self._retention_seconds
+        ]
+        for job_id in expired:
+            self._jobs.pop(job_id, None)
+
+
+job_registry = BackgroundJobRegistry()
+
+
+__all__ = [
+    "BackgroundJob",
+    "BackgroundJobRegistry",
+    "job_registry",
+    "JOB_PENDING",
+    "JOB_RUNNING",
+    "JOB_SUCCEEDED",
+    "JOB_FAILED",
+    "JOB_CANCELLED",
+]
@@ -1,21 +1,31 @@
-from __future__ import annotations
-
 """
 章节上下文组装服务：负责调用向量库检索上下文，并对结果做基础格式化。
 
+同一章节反复重新生成时检索条件完全相同，检索结果按（项目、写入代数、嵌入模型、查询摘要、条数、过滤条件）
+缓存在进程内，命中时跳过查询向量生成与两路检索；向量库的任何写入都会递增项目代数，旧结果自然失效。
+
 所有关键步骤均包含中文注释，方便团队理解 RAG 流程。
 """
 
+from __future__ import annotations
+
+import hashlib
 import logging
-from dataclasses import dataclass
-from typing import List, Optional
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Hashable, List, Optional, Sequence
 
 from ..core.config import settings
+from ..core.cpu_executor import run_cpu_bound
 from ..services.llm_service import LLMService
-from .vector_store_service import RetrievedChunk, RetrievedSummary, VectorStoreService
+from ..utils.hybrid_search import reciprocal_rank_fusion
+from ..utils.mmr import VECTORIZED, mmr_select, rank_relevance
+from .vector_store_service import RetrievalFilter, RetrievedChunk, RetrievedSummary, VectorStoreService
 
 logger = logging.getLogger(__name__)
 
+_MIN_OVERLAP = 4
+
 
 @dataclass
 class ChapterRAGContext:
@@ -45,6 +55,55 @@ class ChapterRAGContext:
         return lines
 
 
+class RetrievalCache:
+    """检索结果的 LRU 缓存；缓存的上下文由多次请求共享，调用方只读不改。"""
+
+    def __init__(self, *, max_entries: int) -> None:
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, ChapterRAGContext]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_entries > 0
+
+    def get(self, key: Hashable) -> Optional[ChapterRAGContext]:
+        context = self._entries.get(key)
+        if context is None:
+            self._misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return context
+
+    def put(self, key: Hashable, context: ChapterRAGContext) -> None:
+        self._entries[key] = context
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._hits + self._misses
+        return {
+            "enabled": self.enabled,
+            "max_entries": self._max_entries,
+            "entries": len(self._entries),
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+retrieval_cache = RetrievalCache(max_entries=settings.vector_retrieval_cache_size)
+
+
 class ChapterContextService:
     """章节上下文服务，整合查询、格式化与容错逻辑。"""
 
@@ -65,28 +124,55 @@ class ChapterContextService:
         user_id: int,
         top_k_chunks: Optional[int] = None,
         top_k_summaries: Optional[int] = None,
+        filters: Optional[RetrievalFilter] = None,
     ) -> ChapterRAGContext:
-        """根据章节摘要构造检索向量，并返回 RAG 上下文。"""
+        """根据章节摘要构造检索向量，结合全文检索（若启用）返回 RAG 上下文。
+
+        ``filters`` 在向量库中限定章节窗口与角色标签，例如重写前文章节时排除其后的章节。
+        """
         query = self._normalize(query_text)
         if not settings.vector_store_enabled or not self._vector_store:
             logger.error("向量库未启用或初始化失败，跳过检索: project=%s", project_id)
             return ChapterRAGContext(query=query, chunks=[], summaries=[])
 
+        embedding_model = await self._llm_service.get_embedding_model_id()
+        cache_key: Optional[Hashable] = None
+        if retrieval_cache.enabled:
+            generation = await self._vector_store.generation(project_id)
+            cache_key = (
+                project_id,
+                generation,
+                embedding_model,
+                hashlib.sha1(query.encode("utf-8")).hexdigest(),
+                top_k_chunks or settings.vector_top_k_chunks,
+                top_k_summaries or settings.vector_top_k_summaries,
+                filters,
+            )
+            cached = retrieval_cache.get(cache_key)
+            if cached is not None:
+                logger.info(
+                    "章节上下文命中检索缓存: project=%s generation=%s chunks=%d summaries=%d",
+                    project_id,
+                    generation,
+                    len(cached.chunks),
+                    len(cached.summaries),
+                )
+                return cached
+
         # get_embedding 会自动根据配置选择正确的模型
         embedding = await self._llm_service.get_embedding(query, user_id=user_id)
         if not embedding:
             logger.warning("检索查询向量生成失败: project=%s chapter_query=%s", project_id, query)
             return ChapterRAGContext(query=query, chunks=[], summaries=[])
 
-        chunks = await self._vector_store.query_chunks(
-            project_id=project_id,
-            embedding=embedding,
-            top_k=top_k_chunks,
-        )
+        chunks = await self._retrieve_chunks(project_id, query, embedding, embedding_model, top_k_chunks, filters)
         summaries = await self._vector_store.query_summaries(
             project_id=project_id,
             embedding=embedding,
             top_k=top_k_summaries,
+            query_text=query,
+            filters=filters,
+            embedding_model=embedding_model,
         )
         logger.info(
             "章节上下文检索完成: project=%s chunks=%d summaries=%d query_preview=%s",
@@ -95,7 +181,127 @@ class ChapterContextService:
             len(summaries),
             query[:80],
         )
-        return ChapterRAGContext(query=query, chunks=chunks, summaries=summaries)
+        context = ChapterRAGContext(query=query, chunks=chunks, summaries=summaries)
+        if cache_key is not None:
+            retrieval_cache.put(cache_key, context)
+        return context
+
+    async def retrieve_with_notes(
+        self,
+        *,
+        project_id: str,
+        query_text: str,
+        writing_notes: Optional[str],
+        user_id: int,
+        filters: Optional[RetrievalFilter] = None,
+    ) -> ChapterRAGContext:
+        """纲要查询与写作要求分别检索，再按倒数排名融合。
+
+        纲要查询与下一章预取使用的查询一致，可直接命中检索缓存；写作要求只在生成时才知道，单独检索。
+        """
+        context = await self.retrieve_for_generation(
+            project_id=project_id,
+            query_text=query_text,
+            user_id=user_id,
+            filters=filters,
+        )
+        notes = self._normalize(writing_notes or "")
+        if not notes:
+            return context
+        notes_context = await self.retrieve_for_generation(
+            project_id=project_id,
+            query_text=notes,
+            user_id=user_id,
+            filters=filters,
+        )
+        # 缓存中的上下文由多次请求共享，融合结果放入新对象
+        chunks = reciprocal_rank_fusion(
+            [context.chunks, notes_context.chunks],
+            key=lambda chunk: (chunk.chapter_number, chunk.chunk_index),
+            k=settings.vector_rrf_k,
+        )
+        summaries = reciprocal_rank_fusion(
+            [context.summaries, notes_context.summaries],
+            key=lambda summary: summary.chapter_number,
+            k=settings.vector_rrf_k,
+        )
+        return ChapterRAGContext(
+            query=f"{context.query}\n{notes}",
+            chunks=[chunk for chunk, _ in chunks[:settings.vector_top_k_chunks]],
+            summaries=[summary for summary, _ in summaries[:settings.vector_top_k_summaries]],
+        )
+
+    async def _retrieve_chunks(
+        self,
+        project_id: str,
+        query: str,
+        embedding: Sequence[float],
+        embedding_model: str,
+        top_k: Optional[int],
+        filters: Optional[RetrievalFilter],
+    ) -> List[RetrievedChunk]:
+        """检索剧情 chunk；启用 MMR 时先超量召回带向量的候选，再挑选彼此不重复的片段。"""
+        top_k = top_k or settings.vector_top_k_chunks
+        if not settings.vector_mmr_enabled or top_k <= 0:
+            chunks = await self._vector_store.query_chunks(  # type: ignore[union-attr]
+                project_id=project_id,
+                embedding=embedding,
+                top_k=top_k,
+                query_text=query,
+                filters=filters,
+                embedding_model=embedding_model,
+            )
+        else:
+            candidates = await self._vector_store.query_chunks(  # type: ignore[union-attr]
+                project_id=project_id,
+                embedding=embedding,
+                top_k=max(top_k, settings.vector_mmr_candidates),
+                query_text=query,
+                with_embeddings=True,
+                filters=filters,
+                embedding_model=embedding_model,
+            )
+            # 候选已按检索排名（混合检索时为倒数排名融合）排序，相关度按名次折算，避免退回纯余弦排序
+            # numpy 矩阵实现在当前线程毫秒内完成；纯 Python 实现较慢，交给进程池避免阻塞事件循环
+            selected = await run_cpu_bound(
+                mmr_select,
+                list(embedding),
+                [candidate.embedding or [] for candidate in candidates],
+                top_k,
+                settings.vector_mmr_lambda,
+                rank_relevance(len(candidates), settings.vector_rrf_k),
+                cost=0 if VECTORIZED else None,
+            )
+            chunks = [replace(candidates[index], embedding=None) for index in selected]
+            logger.debug(
+                "MMR 重排完成: project=%s candidates=%d selected=%s",
+                project_id,
+                len(candidates),
+                selected,
+            )
+        if settings.vector_merge_adjacent_chunks:
+            chunks = self._merge_adjacent(chunks)
+        return chunks
+
+    @staticmethod
+    def _merge_adjacent(chunks: List[RetrievedChunk]) -> List[RetrievedChunk]:
+        """把同一章节中 chunk_index 连续的片段合并为一段，合并结果排在组内最靠前片段的位置。"""
+        by_chapter: Dict[int, List[int]] = {}
+        for position, chunk in enumerate(chunks):
+            by_chapter.setdefault(chunk.chapter_number, []).append(position)
+
+        merged: Dict[int, RetrievedChunk] = {}
+        for positions in by_chapter.values():
+            positions.sort(key=lambda position: chunks[position].chunk_index)
+            group = [positions[0]]
+            for position in positions[1:] + [-1]:
+                previous = chunks[group[-1]]
+                if position >= 0 and chunks[position].chunk_index == previous.chunk_index + 1:
+                    group.append(position)
+                    continue
+                merged[min(group)] = _merge_group([chunks[member] for member in group])
+                group = [position]
+        return [merged[position] for position in sorted(merged)]
 
     @staticmethod
     def _normalize(text: str) -> str:
@@ -103,7 +309,32 @@ class ChapterContextService:
         return " ".join(text.split())
 
 
+def _merge_group(group: List[RetrievedChunk]) -> RetrievedChunk:
+    if len(group) == 1:
+        return group[0]
+    content = group[0].content
+    for chunk in group[1:]:
+        content = _join_overlapping(content, chunk.content)
+    return replace(
+        group[0],
+        content=content,
+        score=min(chunk.score for chunk in group),
+        metadata={**group[0].metadata, "merged_chunk_indexes": [chunk.chunk_index for chunk in group]},
+    )
+
+
+def _join_overlapping(head: str, tail: str) -> str:
+    """拼接相邻片段：tail 的开头与 head 的结尾重叠时只保留一份，否则以换行分隔。"""
+    # 过短的“重叠”多半是巧合（如引号加句号），不当作切分时的重叠处理
+    for size in range(min(len(head), len(tail)), _MIN_OVERLAP - 1, -1):
+        if head.endswith(tail[:size]):
+            return head + tail[size:]
+    return f"{head}\n{tail}"
+
+
 __all__ = [
     "ChapterContextService",
     "ChapterRAGContext",
+    "RetrievalCache",
+    "retrieval_cache",
 ]
@@ -7,19 +7,16 @@ from __future__ import annotations
 """
 
 import logging
-from typing import Dict, List, Optional, Sequence
+from typing import List, Optional, Sequence
 
 from ..core.config import settings
+from ..core.cpu_executor import run_cpu_bound
 from ..services.llm_service import LLMService
 from ..services.vector_store_service import VectorStoreService
+from ..utils.text_chunker import split_into_chunks, split_into_token_chunks
 
 logger = logging.getLogger(__name__)
 
-try:  # noqa: SIM105 - 提示缺少可选依赖
-    from langchain_text_splitters import RecursiveCharacterTextSplitter
-except ImportError:  # pragma: no cover - 未安装时会走后备方案
-    RecursiveCharacterTextSplitter = None  # type: ignore[assignment]
-
 
 class ChapterIngestionService:
     """封装章节内容与摘要的向量化与入库流程。"""
@@ -32,7 +29,6 @@ class ChapterIngestionService:
     ) -> None:
         self._llm_service = llm_service
         self._vector_store = vector_store or VectorStoreService()
-        self._text_splitter = self._init_text_splitter()
 
     async def ingest_chapter(
         self,
@@ -43,8 +39,12 @@ class ChapterIngestionService:
         content: str,
         summary: Optional[str],
         user_id: int,
+        character_names: Sequence[str] = (),
     ) -> None:
-        """将章节正文与摘要写入向量库，供后续 RAG 检索使用。"""
+        """将章节正文与摘要写入向量库，供后续 RAG 检索使用。
+
+        ``character_names`` 为项目角色名单，片段中出现的角色会写入 metadata 的 ``characters`` 标签，供检索过滤。
+        """
         if not settings.vector_store_enabled:
             logger.warning("向量库未启用，跳过章节向量写入: project=%s chapter=%s", project_id, chapter_number)
             return
@@ -52,7 +52,7 @@ class ChapterIngestionService:
             logger.warning("章节正文为空，跳过向量写入: project=%s chapter=%s", project_id, chapter_number)
             return
 
-        chunks = self._split_into_chunks(content)
+        chunks = await self._split_into_chunks(content)
         if not chunks:
             logger.warning("章节正文切分后为空，跳过向量写入: project=%s chapter=%s", project_id, chapter_number)
             return
@@ -65,6 +65,7 @@ class ChapterIngestionService:
         )
         await self._vector_store.delete_by_chapters(project_id, [chapter_number])
 
+        embedding_model = await self._llm_service.get_embedding_model_id()
         chunk_records = []
         failed_chunks = 0
         for index, chunk_text in enumerate(chunks):
@@ -91,9 +92,11 @@ class ChapterIngestionService:
                     "chapter_title": title,
                     "content": chunk_text,
                     "embedding": embedding,
+                    "embedding_model": embedding_model,
                     "metadata": {
                         "chunk_id": record_id,
                         "length": len(chunk_text),
+                        "characters": self.character_tags(chunk_text, character_names),
                     },
                 }
             )
@@ -134,6 +137,7 @@ class ChapterIngestionService:
                                 "title": title,
                                 "summary": cleaned_summary,
                                 "embedding": summary_embedding,
+                                "embedding_model": embedding_model,
                             }
                         ]
                     )
@@ -160,114 +164,31 @@ class ChapterIngestionService:
         )
         await self._vector_store.delete_by_chapters(project_id, list(chapter_numbers))
 
-    def _split_into_chunks(self, text: str) -> List[str]:
-        """按照配置的 chunk 大小与重叠度切分章节正文。"""
-        normalized = text.strip()
-        if not normalized:
-            return []
-
-        if self._text_splitter:
-            parts = [segment.strip() for segment in self._text_splitter.split_text(normalized)]
-            filtered = [part for part in parts if part]
-            if filtered:
-                logger.debug(
-                    "使用 LangChain 文本切分器完成分段: count=%d chunk_size=%d overlap=%d",
-                    len(filtered),
-                    settings.vector_chunk_size,
-                    settings.vector_chunk_overlap,
-                )
-                return filtered
-
-        return self._legacy_split(normalized)
-
     @staticmethod
-    def _find_split_offset(segment: str) -> Optional[int]:
-        """在片段内部寻找更自然的分割点，优先换行，其次常见标点。"""
-        candidates: Dict[str, int] = {}
-        newline_pos = segment.rfind("\n\n")
-        if newline_pos == -1:
-            newline_pos = segment.rfind("\n")
-        if newline_pos > 0:
-            candidates["newline"] = newline_pos
-
-        punctuation_marks = ["。", "！", "？", "!", "?", ".", ";", "；"]
-        for mark in punctuation_marks:
-            idx = segment.rfind(mark)
-            if idx > 0:
-                candidates.setdefault("punctuation", idx + len(mark))
-
-        if not candidates:
-            return None
-
-        # 选择最接近末尾但又不过短的分割点
-        best_offset = max(candidates.values())
-        if best_offset < len(segment) * 0.4:
-            return None
-        return best_offset
-
-    def _init_text_splitter(self) -> Optional["RecursiveCharacterTextSplitter"]:
-        """初始化 LangChain 文本切分器，可根据配置动态调整。"""
-        if RecursiveCharacterTextSplitter is None:
-            logger.warning("未安装 langchain-text-splitters，章节切分将回退至内置策略。")
-            return None
-
-        chunk_size = settings.vector_chunk_size
-        overlap = min(settings.vector_chunk_overlap, chunk_size // 2)
-        separators = [
-            "\n\n",
-            "\n",
-            "。", "！", "？",
-            "!", "?", "；", ";",
-            "，", ",",
-            " ",
-        ]
-        splitter = RecursiveCharacterTextSplitter(
-            separators=separators,
-            chunk_size=chunk_size,
-            chunk_overlap=overlap,
-            keep_separator=False,
-            strip_whitespace=True,
-        )
-        logger.info(
-            "已初始化 LangChain 文本切分器: chunk_size=%d overlap=%d",
-            chunk_size,
-            overlap,
-        )
-        return splitter
-
-    def _legacy_split(self, text: str) -> List[str]:
-        """内置切分策略，作为 LangChain 缺失时的后备方案。"""
-        chunk_size = settings.vector_chunk_size
-        overlap = min(settings.vector_chunk_overlap, chunk_size // 2)
-
-        chunks: List[str] = []
-        start = 0
-        total_length = len(text)
-
-        while start < total_length:
-            end = min(total_length, start + chunk_size)
-            segment = text[start:end]
-
-            split_offset = self._find_split_offset(segment)
-            if split_offset is not None and start + split_offset < total_length:
-                end = start + split_offset
-                segment = text[start:end]
-
-            chunk_text = segment.strip()
-            if chunk_text:
-                chunks.append(chunk_text)
-
-            if end >= total_length:
-                break
-            start = max(0, end - overlap)
-
-        logger.debug(
-            "使用内置策略完成章节切分: count=%d chunk_size=%d overlap=%d",
-            len(chunks),
-            chunk_size,
-            overlap,
+    def character_tags(text: str, character_names: Sequence[str]) -> List[str]:
+        """返回片段中出现过的角色名，按名单顺序去重。"""
+        return [name for name in dict.fromkeys(character_names) if name and name in text]
+
+    async def _split_into_chunks(self, text: str) -> List[str]:
+        """按照配置的 chunk 大小与重叠度切分章节正文，长章节在进程池中完成。"""
+        if settings.vector_chunk_unit == "tokens":
+            # 只传模型名，分词器在执行切分的进程内按模型创建并缓存
+            return await run_cpu_bound(
+                split_into_token_chunks,
+                text,
+                settings.vector_chunk_tokens,
+                settings.vector_chunk_overlap_tokens,
+                await self._llm_service.get_embedding_model(),
+                cost=len(text),
+            )
+        return await run_cpu_bound(
+            split_into_chunks,
+            text,
+            settings.vector_chunk_size,
+            settings.vector_chunk_overlap,
+            settings.vector_chunk_strategy,
+            cost=len(text),
         )
-        return chunks
 
 
 __all__ = ["ChapterIngestionService"]
@@ -0,0 +1,351 @@
+"""
+章节生成前置准备与下一章预取。
+
+生成章节前需要补齐前文章节摘要、提取上一章摘要与结尾、整理世界蓝图，并按章节纲要检索 RAG 上下文。
+用户选定第 N 章版本后，下一步几乎总是生成第 N+1 章，且其纲要已经存在，因此选定版本后在后台预先完成这些准备：
+前置数据保存在短时有效的进程内缓存中，纲要部分的检索结果（含查询向量）写入章节上下文服务的检索缓存，
+写作要求在生成时单独检索后与之融合。生成接口按指纹校验后直接取用，项目、纲要或前文任一变化都会使预取结果作废并回退为现场准备。
+
+SQLite 只有一把写锁，后台写入会与用户的下一个请求争抢，因此在 SQLite 上预取不写库：
+补写的前文摘要随预取结果交给生成请求，在其会话中落库。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..db.session import AsyncSessionLocal
+from ..models.novel import ChapterOutline, NovelProject
+from ..utils.json_utils import remove_think_tags
+from .chapter_context_service import ChapterContextService, retrieval_cache
+from .llm_scheduler import background_priority
+from .llm_service import LLMService
+from .novel_service import NovelService
+from .vector_store_service import RetrievalFilter, VectorStoreService
+
+logger = logging.getLogger(__name__)
+
+_MAX_PREFETCH_ENTRIES = 256
+
+# 蓝图中禁止携带章节级别的细节信息，避免重复传输大段场景或对话内容
+_BANNED_BLUEPRINT_KEYS = {
+    "chapter_outline",
+    "chapter_summaries",
+    "chapter_details",
+    "chapter_dialogues",
+    "chapter_events",
+    "conversation_history",
+    "character_timelines",
+}
+
+
+@dataclass
+class ChapterSetup:
+    """生成某一章之前准备好的提示词素材。"""
+
+    project_id: str
+    chapter_number: int
+    fingerprint: str
+    completed_chapters: List[Dict[str, Any]]
+    previous_summary_text: str
+    previous_tail_excerpt: str
+    blueprint_text: str
+    created_at: float
+    # 准备时补写但尚未落库的前文摘要（章节号 -> 摘要），由使用方在自己的会话中写入
+    pending_summaries: Dict[int, str] = field(default_factory=dict)
+
+
+def extract_tail_excerpt(text: Optional[str], limit: int = 500) -> str:
+    """截取章节结尾文本，默认保留 500 字。"""
+    if not text:
+        return ""
+    stripped = text.strip()
+    if len(stripped) <= limit:
+        return stripped
+    return stripped[-limit:]
+
+
+def build_rag_query(outline: ChapterOutline) -> str:
+    """由章节纲要拼出检索查询；写作要求不计入，以便生成时命中预取的检索结果。"""
+    outline_title = outline.title or f"第{outline.chapter_number}章"
+    outline_summary = outline.summary or "暂无摘要"
+    query_parts = [outline_title, outline_summary]
+    rag_query = "\n".join(part for part in query_parts if part)
+    return rag_query or outline.title or outline.summary or ""
+
+
+def setup_fingerprint(project: NovelProject, chapter_number: int) -> str:
+    """前置数据的有效性指纹：项目更新时间、本章纲要，以及此前每章选定版本的正文摘要。
+
+    蓝图、纲要与版本变更都会刷新项目更新时间；直接编辑正文不会，因此同时计入正文摘要。
+    不计入章节摘要，准备过程本身会补写缺失的摘要。
+    """
+    digest = hashlib.sha1()
+    updated_at = project.updated_at.isoformat() if project.updated_at else ""
+    digest.update(f"{project.id}|{chapter_number}|{updated_at}".encode("utf-8"))
+    outline = next((item for item in project.outlines if item.chapter_number == chapter_number), None)
+    if outline is not None:
+        digest.update(f"|{outline.title}|{outline.summary}".encode("utf-8"))
+    for chapter in sorted(project.chapters, key=lambda item: item.chapter_number):
+        if chapter.chapter_number >= chapter_number:
+            continue
+        version = chapter.selected_version
+        digest.update(f"|{chapter.chapter_number}:{chapter.selected_version_id}:".encode("utf-8"))
+        if version is not None and version.content:
+            digest.update(hashlib.sha1(version.content.encode("utf-8")).digest())
+    return digest.hexdigest()
+
+
+async def build_chapter_setup(
+    session: AsyncSession,
+    novel_service: NovelService,
+    llm_service: LLMService,
+    project: NovelProject,
+    chapter_number: int,
+    user_id: int,
+    *,
+    persist_summaries: bool = True,
+) -> ChapterSetup:
+    """补齐前文章节摘要，并整理上一章摘要、结尾与世界蓝图。
+
+    ``persist_summaries`` 为 False 时补写的摘要不写库，记录在结果的 ``pending_summaries`` 中。
+    """
+    fingerprint = setup_fingerprint(project, chapter_number)
+    outlines_map = {item.chapter_number: item for item in project.outlines}
+    # 收集所有可用的历史章节摘要，便于在 Prompt 中提供前情背景
+    completed_chapters: List[Dict[str, Any]] = []
+    latest_prev_number = -1
+    previous_summary_text = ""
+    previous_tail_excerpt = ""
+    pending_summaries: Dict[int, str] = {}
+    for existing in project.chapters:
+        if existing.chapter_number >= chapter_number:
+            continue
+        if existing.selected_version is None or not existing.selected_version.content:
+            continue
+        summary_text = existing.real_summary
+        if not summary_text:
+            summary = await llm_service.get_summary(
+                existing.selected_version.content,
+                temperature=0.15,
+                user_id=user_id,
+                timeout=180.0,
+            )
+            summary_text = remove_think_tags(summary)
+            if persist_summaries:
+                existing.real_summary = summary_text
+                await session.commit()
+            else:
+                # 不赋值到模型上，避免后续查询自动 flush 出写操作
+                pending_summaries[existing.chapter_number] = summary_text
+        completed_chapters.append(
+            {
+                "chapter_number": existing.chapter_number,
+                "title": outlines_map.get(existing.chapter_number).title if outlines_map.get(existing.chapter_number) else f"第{existing.chapter_number}章",
+                "summary": summary_text,
+            }
+        )
+        if existing.chapter_number > latest_prev_number:
+            latest_prev_number = existing.chapter_number
+            previous_summary_text = summary_text or ""
+            previous_tail_excerpt = extract_tail_excerpt(existing.selected_version.content)
+
+    blueprint_dict = novel_service._build_blueprint_schema(project).model_dump()
+    if "relationships" in blueprint_dict and blueprint_dict["relationships"]:
+        for relation in blueprint_dict["relationships"]:
+            if "character_from" in relation:
+                relation["from"] = relation.pop("character_from")
+            if "character_to" in relation:
+                relation["to"] = relation.pop("character_to")
+    for key in _BANNED_BLUEPRINT_KEYS:
+        if key in blueprint_dict:
+            blueprint_dict.pop(key, None)
+
+    return ChapterSetup(
+        project_id=project.id,
+        chapter_number=chapter_number,
+        fingerprint=fingerprint,
+        completed_chapters=completed_chapters,
+        previous_summary_text=previous_summary_text,
+        previous_tail_excerpt=previous_tail_excerpt,
+        blueprint_text=json.dumps(blueprint_dict, ensure_ascii=False, indent=2),
+        created_at=time.monotonic(),
+        pending_summaries=pending_summaries,
+    )
+
+
+async def save_pending_summaries(session: AsyncSession, project: NovelProject, setup: ChapterSetup) -> None:
+    """把预取时补写但未落库的前文摘要写入调用方会话；期间已有摘要的章节保持不变。"""
+    if not setup.pending_summaries:
+        return
+    for existing in project.chapters:
+        summary = setup.pending_summaries.get(existing.chapter_number)
+        if summary and not existing.real_summary:
+            existing.real_summary = summary
+    await session.commit()
+
+
+class ChapterPrefetcher:
+    """下一章预取：调度后台准备任务，并以（项目、章节号）为键短时缓存准备结果。"""
+
+    def __init__(self, *, ttl_seconds: float, max_entries: int = _MAX_PREFETCH_ENTRIES) -> None:
+        self._ttl = ttl_seconds
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, int], ChapterSetup]" = OrderedDict()
+        self._pending: Dict[Tuple[str, int], asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._scheduled = 0
+        self._hits = 0
+        self._misses = 0
+        self._stale = 0
+        self._failed = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._ttl > 0
+
+    def schedule(self, project_id: str, chapter_number: int, user_id: int) -> bool:
+        """在后台为指定章节准备生成上下文；同一章节已有任务在执行时不重复调度。"""
+        key = (project_id, chapter_number)
+        if not self.enabled or key in self._pending:
+            return False
+        # 任务复制创建时的上下文：预取没有用户在等待，其中的摘要与嵌入调用按后台优先级排队
+        with background_priority():
+            task = asyncio.create_task(self._run(project_id, chapter_number, user_id), name=f"chapter-prefetch:{project_id}:{chapter_number}")
+        self._pending[key] = task
+        self._tasks.add(task)
+        task.add_done_callback(lambda done: self._finish(key, done))
+        self._scheduled += 1
+        return True
+
+    async def take(self, project_id: str, chapter_number: int, fingerprint: str) -> Optional[ChapterSetup]:
+        """取出与指纹一致且未过期的准备结果；预取仍在执行时先等待其完成，取出后即从缓存中移除。"""
+        key = (project_id, chapter_number)
+        task = self._pending.get(key)
+        if task is not None:
+            # 生成请求被取消时不连带取消预取任务
+            await asyncio.wait([task])
+        setup = self._entries.pop(key, None)
+        if setup is None:
+            self._misses += 1
+            return None
+        if setup.fingerprint != fingerprint or time.monotonic() - setup.created_at > self._ttl:
+            self._stale += 1
+            return None
+        self._hits += 1
+        return setup
+
+    def discard(self, project_id: str) -> None:
+        for key in [key for key in self._entries if key[0] == project_id]:
+            self._entries.pop(key, None)
+
+    async def shutdown(self) -> None:
+        """应用关闭时取消尚未完成的预取任务。"""
+        tasks = [task for task in self._tasks if not task.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "ttl_seconds": self._ttl,
+            "entries": len(self._entries),
+            "pending": len(self._pending),
+            "scheduled": self._scheduled,
+            "hits": self._hits,
+            "misses": self._misses,
+            "stale": self._stale,
+            "failed": self._failed,
+        }
+
+    def _finish(self, key: Tuple[str, int], task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if self._pending.get(key) is task:
+            self._pending.pop(key, None)
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is not None:
+            self._failed += 1
+            logger.warning("预取章节上下文失败: project=%s chapter=%s error=%s", key[0], key[1], exc)
+
+    def _store(self, setup: ChapterSetup) -> None:
+        key = (setup.project_id, setup.chapter_number)
+        self._entries[key] = setup
+        self._entries.move_to_end(key)
+        now = time.monotonic()
+        for expired in [key for key, entry in self._entries.items() if now - entry.created_at > self._ttl]:
+            self._entries.pop(expired, None)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    async def _run(self, project_id: str, chapter_number: int, user_id: int) -> None:
+        """后台任务入口：请求结束后会话即关闭，因此使用独立的数据库会话。"""
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as session:
+            novel_service = NovelService(session)
+            llm_service = LLMService(session)
+            project = await novel_service.ensure_project_owner(project_id, user_id)
+            outline = next((item for item in project.outlines if item.chapter_number == chapter_number), None)
+            if outline is None:
+                return
+
+            setup = await build_chapter_setup(
+                session,
+                novel_service,
+                llm_service,
+                project,
+                chapter_number,
+                user_id,
+                persist_summaries=not settings.is_sqlite_backend,
+            )
+            self._store(setup)
+
+            # 检索结果写入检索缓存，生成时以相同的查询与过滤条件命中
+            if settings.vector_store_enabled and retrieval_cache.enabled:
+                try:
+                    vector_store = VectorStoreService()
+                except RuntimeError as exc:
+                    logger.warning("向量库初始化失败，跳过预取检索: %s", exc)
+                else:
+                    context_service = ChapterContextService(llm_service=llm_service, vector_store=vector_store)
+                    await context_service.retrieve_for_generation(
+                        project_id=project_id,
+                        query_text=build_rag_query(outline),
+                        user_id=user_id,
+                        filters=RetrievalFilter(max_chapter=chapter_number - 1),
+                    )
+        logger.info(
+            "已预取第 %s 章生成上下文: project=%s elapsed=%.3fs",
+            chapter_number,
+            project_id,
+            time.perf_counter() - started,
+        )
+
+
+chapter_prefetcher = ChapterPrefetcher(ttl_seconds=settings.writer_prefetch_ttl)
+
+
+__all__ = [
+    "ChapterPrefetcher",
+    "ChapterSetup",
+    "build_chapter_setup",
+    "build_rag_query",
+    "chapter_prefetcher",
+    "extract_tail_excerpt",
+    "save_pending_summaries",
+    "setup_fingerprint",
+]
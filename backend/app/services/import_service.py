@@ -1,23 +1,71 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
-import re
-from typing import Dict, List, Optional, Tuple
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 from fastapi import HTTPException, UploadFile, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..models import Chapter
-from ..schemas.novel import Blueprint
+from ..core.config import settings
+from ..core.cpu_executor import run_cpu_bound
+from ..db.session import AsyncSessionLocal
+from ..schemas.novel import Blueprint, ChapterOutline as ChapterOutlineSchema
+from ..services.background_jobs import BackgroundJob, job_registry
+from ..services.chapter_ingest_service import ChapterIngestionService
+from ..services.llm_scheduler import background_priority
 from ..services.llm_service import LLMService
 from ..services.novel_service import NovelService
 from ..services.prompt_service import PromptService
+from ..services.vector_store_service import VectorStoreService
 from ..utils.json_utils import remove_think_tags, sanitize_json_like_text, unwrap_markdown_json
+from ..utils.novel_text import iter_novel_chapters, sample_novel_file, survey_novel_file
+from ..utils.text_stream import IncrementalEncodingDetector
 
 logger = logging.getLogger(__name__)
 
 
+IMPORT_JOB_KIND = "novel_import"
+
+# 各阶段在总进度中所占的百分比区间
+IMPORT_PHASE_RANGES: Dict[str, Tuple[float, float]] = {
+    "parse": (0.0, 10.0),
+    "persist": (10.0, 30.0),
+    "character_scan": (30.0, 40.0),
+    "census": (40.0, 55.0),
+    "analysis": (55.0, 85.0),
+    "embed": (85.0, 100.0),
+}
+
+
+def _phase_progress(phase: str, fraction: float = 0.0) -> float:
+    start, end = IMPORT_PHASE_RANGES[phase]
+    return start + (end - start) * max(0.0, min(1.0, fraction))
+
+
+@dataclass
+class SpooledNovelFile:
+    """落盘到临时文件的上传小说，按需多次流式读取章节，读取过程中只保留当前块与当前章。"""
+
+    path: str
+    filename: str
+    encoding: str
+    size: int
+
+    def iter_chapters(self) -> Iterator[Tuple[str, str]]:
+        return iter_novel_chapters(self.path, self.encoding, settings.import_read_block_size)
+
+    def discard(self) -> None:
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
 class ImportService:
     """处理小说文件导入、分章与AI分析的服务。"""
 
@@ -26,77 +74,156 @@ class ImportService:
         self.novel_service = NovelService(session)
         self.llm_service = LLMService(session)
         self.prompt_service = PromptService(session)
+        # 导入流程中已创建的项目，供中断时收尾
+        self._project_id: Optional[str] = None
 
-    async def import_novel_from_file(self, user_id: int, file: UploadFile) -> str:
+    async def import_novel_from_file(self, user_id: int, file: UploadFile) -> BackgroundJob:
         """
-        导入小说文件，执行分章、分析并创建项目。
-        返回新创建的项目ID。
+        将上传文件分块落盘并启动后台导入任务。
+        章节落库后立即返回任务（result 中带 project_id），AI 分析在后台继续补全。
         """
-        content = await self._read_file_content(file)
-        if not content:
-            raise HTTPException(status_code=400, detail="文件内容为空")
+        source = await self._spool_upload(file)
+        try:
+            job = job_registry.create(IMPORT_JOB_KIND, user_id)
+            job.update(phase="parse", progress=0.0, message="导入任务已创建")
+            # 任务复制启动时的上下文：导入中的分析、摘要与嵌入调用按后台优先级排队，不挤占交互调用
+            with background_priority():
+                job_registry.start(job, lambda current: self._run_import_job(current, user_id, source))
+        except Exception:
+            source.discard()
+            raise
+
+        await job.wait_until(lambda current: "project_id" in current.result)
+        if "project_id" not in job.result:
+            raise HTTPException(status_code=500, detail=job.error or "导入失败，请重试")
+        return job
 
-        # 1. 智能分段（分章）
-        chapters = self._split_into_chapters(content)
-        if not chapters:
-            # 如果无法分章，将整个文件作为一个章节
-            chapters = [("第一章 全文", content)]
+    @staticmethod
+    async def _run_import_job(job: BackgroundJob, user_id: int, source: SpooledNovelFile) -> None:
+        """后台任务入口：请求结束后会话即关闭，因此任务内使用独立的数据库会话。"""
+        try:
+            async with AsyncSessionLocal() as session:
+                service = ImportService(session)
+                try:
+                    await service._import_pipeline(job, user_id, source)
+                except (Exception, asyncio.CancelledError):
+                    await service._settle_interrupted_import(job, user_id)
+                    raise
+        finally:
+            source.discard()
+
+    async def _settle_interrupted_import(self, job: BackgroundJob, user_id: int) -> None:
+        """
+        导入失败或被取消后为已创建的项目收尾，避免项目停留在 importing/analyzing：
+        章节尚未全部落库时删除半成品项目；已落库时以章节标题大纲作为蓝图，项目转为 blueprint_ready。
+        """
+        project_id = self._project_id
+        if project_id is None:
+            return
+        try:
+            await self.session.rollback()
+            if "project_id" not in job.result:
+                await self.novel_service.delete_projects([project_id], user_id)
+                logger.warning("导入中断于章节落库阶段，已删除半成品项目 %s", project_id)
+                return
+            project = await self.novel_service.ensure_project_owner(project_id, user_id)
+            if project.status in {"importing", "analyzing"}:
+                project.status = "blueprint_ready"
+                await self.session.commit()
+                job.update(message="AI 分析未完成，已保留章节与标题大纲")
+                logger.warning("导入项目 %s 的 AI 分析中断，已按章节标题大纲收尾", project_id)
+        except Exception:
+            logger.exception("导入中断后收尾项目 %s 失败", project_id)
+
+    async def _import_pipeline(self, job: BackgroundJob, user_id: int, source: SpooledNovelFile) -> None:
+        # 1. 智能分段（分章）：在进程池中流式扫描，只回传标题、正文长度与候选人名
+        job.update(phase="parse", progress=_phase_progress("parse"), message="正在解析章节")
+        survey = await run_cpu_bound(
+            survey_novel_file,
+            source.path,
+            source.encoding,
+            settings.import_read_block_size,
+            150, # 扩大到150，广撒网
+        )
+        chapter_titles = survey.titles
+        potential_characters = survey.potential_characters
+        total_chapters = len(chapter_titles)
+        if not total_chapters:
+            raise ValueError("未能从文件中解析出任何章节")
+        job.update(
+            progress=_phase_progress("parse", 1.0),
+            chapters_total=total_chapters,
+            characters_candidates=len(potential_characters),
+        )
 
         # 2. 准备分析用的文本样本
-        # 策略改进：混合采样 (均匀剧情采样 + 角色高光采样)
-        
-        # A. 均匀剧情采样 (约 30k 字)
-        MAX_PLOT_CHARS = 30000
-        MAX_CHAPTER_CHARS = 1000
-        
-        plot_sample_text = ""
-        chapter_titles = [title for title, _ in chapters]
-        total_chapters = len(chapters)
-        
-        # 预提取人名 (基于全文)
-        potential_characters = self._extract_potential_characters(content, top_n=150) # 扩大到150，广撒网
-        
-        # 确定要采样的章节索引 (均匀分布)
-        indices = []
-        if total_chapters <= 10:
-            indices = list(range(total_chapters))
-        else:
-            indices.extend([0, 1, 2]) # 前3章
-            last_indices = [total_chapters - 2, total_chapters - 1] # 后2章
-            
-            start_mid = 3
-            end_mid = total_chapters - 2
-            mid_count = end_mid - start_mid
-            
-            if mid_count > 0:
-                target_mid_samples = 25 # 中间取25章
-                step = max(1, mid_count // target_mid_samples)
-                for i in range(start_mid, end_mid, step):
-                    indices.append(i)
-            
-            indices.extend(last_indices)
-            indices = sorted(list(set(indices)))
-
-        for i in indices:
-            if 0 <= i < len(chapters):
-                title, body = chapters[i]
-                clean_body = body[:MAX_CHAPTER_CHARS].strip()
-                plot_sample_text += f"第{i+1}章 {title}\n{clean_body}\n\n"
-        
-        if len(plot_sample_text) > MAX_PLOT_CHARS:
-            plot_sample_text = plot_sample_text[:MAX_PLOT_CHARS] + "...\n(截断)"
-            
-        # B. 角色高光采样 (约 20k-30k 字)
-        # 为每个潜在角色提取一段精彩片段
+        # 策略改进：混合采样 (均匀剧情采样 + 角色高光采样)，与章节落库并行在进程池中完成
+        # B. 角色高光采样 (约 20k-30k 字)：为每个潜在角色提取一段精彩片段
         # 优化：Top 150 采样，窗口适当缩小，只求证明存在
-        char_highlights_text = self._extract_character_highlights(content, potential_characters, context_window=200)
-        
-        # 3. 分阶段分析
+        sampling = asyncio.create_task(
+            run_cpu_bound(
+                sample_novel_file,
+                source.path,
+                source.encoding,
+                settings.import_read_block_size,
+                survey.body_lengths,
+                potential_characters,
+                200,
+            )
+        )
+        try:
+            # 3. 先落库章节，让用户尽快看到项目，AI 分析结果随后补全
+            job.update(phase="persist", progress=_phase_progress("persist"), message="正在保存章节")
+            fallback_title = source.filename.rsplit('.', 1)[0]
+            initial_prompt = f"导入自文件: {source.filename}"
+            project = await self.novel_service.create_project(user_id, fallback_title, initial_prompt)
+            self._project_id = project.id
+            await self.novel_service.replace_blueprint(
+                project.id,
+                Blueprint(
+                    title=fallback_title,
+                    chapter_outline=[
+                        ChapterOutlineSchema(chapter_number=i, title=chap_title, summary="")
+                        for i, chap_title in enumerate(chapter_titles, 1)
+                    ],
+                ),
+            )
+            project.status = "importing"
+            await self.session.commit()
+
+            async def _on_batch(persisted: int) -> None:
+                job.update(
+                    progress=_phase_progress("persist", persisted / total_chapters),
+                    chapters_persisted=persisted,
+                )
+
+            await self.novel_service.bulk_import_chapters(
+                project.id,
+                source.iter_chapters(),
+                metadata={"source": "file_import"},
+                on_batch=_on_batch,
+            )
+            project.status = "analyzing"
+            await self.session.commit()
+            job.set_result(project_id=project.id)
+            logger.info("导入项目 %s 章节已落库，共 %d 章，开始 AI 分析", project.id, total_chapters)
+
+            job.update(phase="character_scan", progress=_phase_progress("character_scan"), message="正在提取角色片段")
+            plot_sample_text, char_highlights_text = await sampling
+        finally:
+            if not sampling.done():
+                sampling.cancel()
+        job.update(progress=_phase_progress("character_scan", 1.0))
+
+        # 4. 分阶段分析
         # 阶段一：先筛选出确定的角色名单 (Stable Census)
+        job.update(phase="census", progress=_phase_progress("census"), message="正在甄别角色名单")
         verified_characters = await self._filter_characters_only(user_id, potential_characters, char_highlights_text)
         logger.info(f"角色筛选完成，潜在 {len(potential_characters)} -> 确认 {len(verified_characters)}")
-        
+        job.update(progress=_phase_progress("census", 1.0), characters_verified=len(verified_characters))
+
         # 阶段二：详细分析 (Deep Profiling)
+        job.update(phase="analysis", progress=_phase_progress("analysis"), message="正在分析世界观与大纲")
         blueprint_data = await self._analyze_content(
             user_id, 
             plot_sample_text, 
@@ -105,25 +232,19 @@ class ImportService:
             char_highlights_text,
             verified_characters   # 传入确定的名单
         )
-        
-        # 4. 创建项目
-        title = blueprint_data.title or file.filename.rsplit('.', 1)[0]
-        initial_prompt = f"导入自文件: {file.filename}"
-        project = await self.novel_service.create_project(user_id, title, initial_prompt)
-        
+
         # 5. 保存蓝图
         # 确保 blueprint_data 中的 chapter_outline 包含所有章节（如果AI没返回全部）
         if blueprint_data.chapter_outline:
             # 建立映射以合并AI生成的摘要和实际章节列表
             ai_outlines = {o.chapter_number: o for o in blueprint_data.chapter_outline}
             final_outlines = []
-            for i, (chap_title, _) in enumerate(chapters, 1):
+            for i, chap_title in enumerate(chapter_titles, 1):
                 if i in ai_outlines:
                     outline = ai_outlines[i]
                     outline.title = chap_title # 优先使用解析出的真实标题
                 else:
                     # AI未生成的章节，使用默认占位
-                    from ..schemas.novel import ChapterOutline as ChapterOutlineSchema
                     outline = ChapterOutlineSchema(
                         chapter_number=i,
                         title=chap_title,
@@ -131,195 +252,111 @@ class ImportService:
                     )
                 final_outlines.append(outline)
             blueprint_data.chapter_outline = final_outlines
-        
+        else:
+            blueprint_data.chapter_outline = [
+                ChapterOutlineSchema(chapter_number=i, title=chap_title, summary="")
+                for i, chap_title in enumerate(chapter_titles, 1)
+            ]
+
         await self.novel_service.replace_blueprint(project.id, blueprint_data)
-        
-        # 6. 保存章节内容
-        for i, (chap_title, chap_content) in enumerate(chapters, 1):
-            chapter = await self.novel_service.get_or_create_chapter(project.id, i)
-            # 创建初始版本
-            await self.novel_service.replace_chapter_versions(
-                chapter, 
-                [chap_content], 
-                metadata=[{"source": "file_import"}]
-            )
-            # 自动选择第一个版本（即导入的内容）
-            await self.novel_service.select_chapter_version(chapter, 0)
 
         # 更新项目状态
+        project.title = blueprint_data.title or fallback_title
         project.status = "blueprint_ready"
         await self.session.commit()
-        
-        return project.id
+        job.update(progress=_phase_progress("analysis", 1.0), message="AI 分析完成")
+
+        # 6. 可选：导入章节写入向量库
+        if settings.import_embed_chapters and settings.vector_store_enabled:
+            character_names = [
+                str(character["name"])
+                for character in blueprint_data.characters
+                if isinstance(character, dict) and character.get("name")
+            ]
+            await self._embed_chapters(
+                job,
+                user_id,
+                project.id,
+                source.iter_chapters(),
+                total_chapters,
+                character_names,
+            )
 
-    async def _read_file_content(self, file: UploadFile) -> str:
-        content_bytes = await file.read()
+        job.update(phase="completed", progress=100.0, message="导入完成")
+
+    async def _embed_chapters(
+        self,
+        job: BackgroundJob,
+        user_id: int,
+        project_id: str,
+        chapters: Iterable[Tuple[str, str]],
+        total: int,
+        character_names: Sequence[str] = (),
+    ) -> None:
+        """将导入章节逐章写入向量库，单章失败不影响整体导入；片段按蓝图角色名单打上角色标签。"""
+        job.update(phase="embed", progress=_phase_progress("embed"), message="正在写入向量库")
         try:
-            return content_bytes.decode('utf-8')
-        except UnicodeDecodeError:
+            vector_store = VectorStoreService()
+        except RuntimeError as exc:
+            logger.warning("向量库初始化失败，跳过导入章节向量化: %s", exc)
+            return
+        ingestion_service = ChapterIngestionService(llm_service=self.llm_service, vector_store=vector_store)
+        for index, (chap_title, chap_content) in enumerate(chapters, 1):
             try:
-                return content_bytes.decode('gbk')
-            except UnicodeDecodeError:
-                raise HTTPException(status_code=400, detail="文件编码不支持，请使用 UTF-8 或 GBK")
+                await ingestion_service.ingest_chapter(
+                    project_id=project_id,
+                    chapter_number=index,
+                    title=chap_title,
+                    content=chap_content,
+                    summary=None,
+                    user_id=user_id,
+                    character_names=character_names,
+                )
+            except Exception as exc:
+                logger.warning("导入章节向量化失败: project=%s chapter=%s error=%s", project_id, index, exc)
+            job.update(progress=_phase_progress("embed", index / total), chapters_embedded=index)
 
-    def _extract_potential_characters(self, content: str, top_n: int = 100) -> List[str]:
-        """
-        基于正则和统计，从全文中提取最可能的人名。
-        策略：寻找 "XXX说"、"XXX道" 等高频对话模式。
-        """
-        # 常见对话引导词
-        verbs = r"(?:说|道|问|回答|冷笑|大笑|苦笑|点头|摇头|叹气|叹道|解释|怒道|吼道|低语|传音|喊道|叫道|哭道|骂道)"
-        
-        # 模式1: 名字+动词 (e.g. "张三笑道")
-        # 限制名字长度为2-4字，排除单字名以减少误报
-        p1 = fr"([\u4e00-\u9fa5]{{2,4}}){verbs}"
-        
-        # 模式2: 名字+空格/标点+说 (e.g. "张三：") - 剧本模式或特定排版
-        p2 = r"([\u4e00-\u9fa5]{2,4})[：:]\s*“"
-        
-        # 模式3: “...”+名字+说 (e.g. “...”张三说道。)
-        # 这种比较难用简单正则匹配准确，暂略
-        
-        matches = []
-        matches.extend(re.findall(p1, content))
-        matches.extend(re.findall(p2, content))
-        
-        # 统计频率
-        from collections import Counter
-        counter = Counter(matches)
-        
-        # 过滤黑名单（非人名的常用词）
-        stop_words = {
-            "自己", "怎么", "于是", "接着", "忽然", "突然", "虽然", "既然", "如果", "只要", "为了", 
-            "并且", "而且", "不仅", "甚至", "难道", "毕竟", "到底", "终于", "立刻", "马上", 
-            "缓缓", "轻轻", "大声", "小声", "连忙", "赶紧", "不禁", "不由", "只能", "只好", 
-            "众人", "大家", "某人", "那个", "这个", "什么", "此时", "此刻", "随后", "然后",
-            "原来", "其实", "顺便", "根本", "简直", "仿佛", "好像", "似乎", "一直", "曾经",
-            "已经", "正在", "准备", "开始", "继续", "重新", "互相", "彼此", "对方", "两者",
-            "一人", "两人", "三人", "四人", "五人", "少年", "少女", "男子", "女子", "老者", 
-            "老头", "大汉", "青年", "中年", "小孩", "丫头", "家伙", "兄弟", "姐妹", "师父",
-            "师兄", "师弟", "师姐", "师妹", "陛下", "殿下", "娘娘", "将军", "大人", "掌门",
-            "宗主", "长老", "护法", "弟子", "属下", "奴才", "微臣", "老夫", "老朽", "在下",
-            "贫道", "本座", "本王", "本宫", "朕", "寡人", "哀家", "这时候", "那个时候",
-            "一声", "一把", "一眼", "一手", "一步", "一下", "一脚", "一口", "一个", "一名", "一位",
-            "今日", "明日", "昨日", "每天", "白天", "晚上", "半夜", "清晨", "黄昏", "刚刚", "刚才",
-            "这里", "那里", "哪里", "那边", "这边", "里面", "外面", "前面", "后面", "上面", "下面",
-            "左边", "右边", "中间", "周围", "四处", "到处", "满脸", "满身", "全身", "浑身",
-            "双手", "双眼", "双脚", "双腿", "两眼", "两手", "两脚", "两腿", "心中", "心里", "心头",
-            "手中", "手里", "手头", "眼中", "眼里", "口中", "嘴里", "身上", "身下", "身边", "身旁",
-            "此时此刻", "不得不", "能不能", "是不是", "会不会", "有没有", "想了想", "摇了摇头", "点了点头"
-        }
-        
-        candidates = []
-        for name, count in counter.most_common():
-            if name not in stop_words and count >= 2: # 至少出现2次
-                candidates.append(name)
-                if len(candidates) >= top_n:
-                    break
-                    
-        return candidates
-
-    def _extract_character_highlights(self, content: str, characters: List[str], context_window: int = 300) -> str:
+    async def _spool_upload(self, file: UploadFile) -> SpooledNovelFile:
         """
-        为每个潜在角色提取一段“高光时刻”。
-        优先选择对话密集或有动作描写的段落。
+        按块把上传内容写入临时文件，同时增量校验编码（优先 UTF-8，其次 GBK），
+        全程不在内存中保留整份文件。
         """
-        highlights = []
-        used_ranges = [] # 记录已使用的文本范围 (start, end)，避免重复
-        
-        # 简单的去重辅助函数
-        def is_overlapping(start, end):
-            for s, e in used_ranges:
-                if not (end < s or start > e): # 如果有交集
-                    return True
-            return False
-
-        for char in characters:
-            # 查找该角色的所有出现位置
-            # 为了性能，限制查找前N个匹配
-            matches = list(re.finditer(re.escape(char), content))
-            if not matches:
-                continue
-                
-            best_score = -1
-            best_snippet = ""
-            best_range = (0, 0)
-            
-            # 简单的评分机制：找对话最多的片段
-            # 只需要检查前几个和中间几个出现位置，不必遍历所有，节省时间
-            # 采样点：前3次，中间3次，最后3次
-            sample_indices = []
-            total = len(matches)
-            if total <= 10:
-                sample_indices = range(total)
-            else:
-                sample_indices = list(range(3)) + list(range(total//2 - 1, total//2 + 2)) + list(range(total-3, total))
-                
-            for idx in sample_indices:
-                if idx < 0 or idx >= total: continue
-                
-                m = matches[idx]
-                start = max(0, m.start() - context_window)
-                end = min(len(content), m.end() + context_window)
-                
-                # 如果这个范围已经被大幅占用了，跳过
-                if is_overlapping(start + 50, end - 50): # 允许边缘少量重叠
-                    continue
-                    
-                snippet = content[start:end]
-                
-                # 评分：双引号数量（对话）+ 标点符号丰富度
-                score = snippet.count('“') * 2 + snippet.count('”') * 2 + snippet.count('！') + snippet.count('？')
-                
-                if score > best_score:
-                    best_score = score
-                    best_snippet = snippet
-                    best_range = (start, end)
-            
-            if best_snippet:
-                # 清理首尾不完整的句子
-                # 简单处理：找到第一个换行符和最后一个换行符
-                first_nl = best_snippet.find('\n')
-                last_nl = best_snippet.rfind('\n')
-                if first_nl != -1 and last_nl != -1 and first_nl < last_nl:
-                    clean_snippet = best_snippet[first_nl:last_nl].strip()
-                else:
-                    clean_snippet = best_snippet.strip()
-                
-                if len(clean_snippet) > 50: # 太短的不要
-                    highlights.append(f"--- 【{char}】的出场片段 ---\n{clean_snippet}\n")
-                    used_ranges.append(best_range)
-        
-        return "\n".join(highlights)
+        block_size = settings.import_read_block_size
+        max_bytes = settings.import_max_file_mb * 1024 * 1024
+        detector = IncrementalEncodingDetector(("utf-8", "gbk"))
+        fd, path = tempfile.mkstemp(prefix="arboris-import-", suffix=".txt")
+        size = 0
+        has_text = False
+        try:
+            with os.fdopen(fd, "wb") as sink:
+                while True:
+                    block = await file.read(block_size)
+                    if not block:
+                        break
+                    size += len(block)
+                    if size > max_bytes:
+                        raise HTTPException(
+                            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"文件过大，最大支持 {settings.import_max_file_mb} MB",
+                        )
+                    has_text = has_text or bool(block.strip())
+                    detector.feed(block)
+                    sink.write(block)
+            if not has_text:
+                raise HTTPException(status_code=400, detail="文件内容为空")
+            encoding = detector.finish()
+            if encoding is None:
+                raise HTTPException(status_code=400, detail="文件编码不支持，请使用 UTF-8 或 GBK")
+        except BaseException:
+            os.unlink(path)
+            raise
 
-    def _split_into_chapters(self, content: str) -> List[Tuple[str, str]]:
-        """
-        使用正则匹配章节标题。
-        支持格式：
-        第1章
-        第一章
-        Chapter 1
-        """
-        # 正则表达式匹配行首的章节标题
-        # 常见格式：第xxx章、Chapter xxx、xxx、(xxx)
-        pattern = r"(^\s*第[0-9零一二三四五六七八九十百千]+[章卷回节].*|^\s*Chapter\s+[0-9]+.*)"
-        
-        # 使用 split 保留分隔符（即标题）
-        parts = re.split(pattern, content, flags=re.MULTILINE)
-        
-        chapters = []
-        # split 后第一个元素通常是标题前的内容（序章或前言），如果非空也算一章
-        if parts[0].strip():
-             chapters.append(("序章", parts[0].strip()))
-             
-        # 后续元素是 标题, 内容, 标题, 内容...
-        for i in range(1, len(parts), 2):
-            title = parts[i].strip()
-            body = parts[i+1].strip() if i+1 < len(parts) else ""
-            if body:
-                chapters.append((title, body))
-                
-        return chapters
+        return SpooledNovelFile(
+            path=path,
+            filename=file.filename or "未命名.txt",
+            encoding=encoding,
+            size=size,
+        )
 
     async def _filter_characters_only(self, user_id: int, potential_characters: List[str], char_highlights: str) -> List[str]:
         """
@@ -454,7 +491,7 @@ class ImportService:
             
             response = remove_think_tags(response)
             normalized = unwrap_markdown_json(response)
-            sanitized = sanitize_json_like_text(normalized)
+            sanitized = await run_cpu_bound(sanitize_json_like_text, normalized, cost=len(normalized))
             data = json.loads(sanitized)
             
             # --- 数据标准化处理 (Robustness Fixes) ---
@@ -0,0 +1,506 @@
+"""
+LLM 调用调度：按提供方限制并发与 token 速率，在用户之间公平排队，并在超限时向客户端施加背压。
+
+所有流式对话与嵌入调用在发往上游前先向调度器申请名额。提供方以“服务地址 + API Key 摘要”区分，
+使用自定义 Key 的用户各自独立计数。每个提供方维护两级优先级队列：交互调用（对话、生成、评估）优先于
+后台调用（摘要、嵌入，以及导入、预取、重新嵌入等后台任务内的全部调用）；同一优先级内按用户做
+加权的起始时间公平排队（SFQ），以预估 token 数除以用户权重为代价，批量生成或导入的用户不会挤占其他用户的名额；
+用户权重由 LLM_USER_WEIGHTS 配置，权重为 2 的用户在同等负载下获得约两倍的名额。
+后台调用最多占用一定比例的并发名额，排队过久的后台调用会提升为交互优先级，避免饿死。
+
+交互调用排队已满或等待超时时直接返回 429 与 Retry-After，而不是把请求压给上游换来 503；
+上游返回 429 时该提供方进入冷却期并将并发上限减半，之后每完成一次调用恢复一个名额。
+
+状态只保存在当前进程内存中，多 worker 部署时每个进程分别计数。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import heapq
+import itertools
+import logging
+import math
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from fastapi import HTTPException, status
+
+from ..core.config import settings
+from ..core.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BACKGROUND = "background"
+_PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND)
+
+# 后台调用排队超过该秒数后按交互优先级参与调度
+_BACKGROUND_AGING_SECONDS = 60.0
+# 无法推算等待时长时建议客户端的重试间隔（秒）
+_DEFAULT_RETRY_AFTER = 5
+# 用户虚拟完成时间表超过该条数时清理已落后于虚拟时钟的条目
+_MAX_USER_TAGS = 1024
+
+_QUEUE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+LLM_QUEUE_WAIT = metrics_registry.histogram(
+    "llm_scheduler_queue_seconds",
+    "LLM 调用在调度队列中的等待时长",
+    ("provider", "priority"),
+    buckets=_QUEUE_BUCKETS,
+)
+LLM_QUEUE_DEPTH = metrics_registry.gauge(
+    "llm_scheduler_queued", "正在排队的 LLM 调用数", ("provider", "priority")
+)
+LLM_IN_FLIGHT = metrics_registry.gauge(
+    "llm_scheduler_in_flight", "已放行、正在执行的 LLM 调用数", ("provider", "priority")
+)
+LLM_REJECTED = metrics_registry.counter(
+    "llm_scheduler_rejected_total", "因排队已满或等待超时被拒绝的 LLM 调用数", ("provider", "priority", "reason")
+)
+LLM_UPSTREAM_RATE_LIMITED = metrics_registry.counter(
+    "llm_upstream_rate_limited_total", "上游返回 429 的 LLM 调用数", ("provider",)
+)
+
+_priority_override: ContextVar[Optional[str]] = ContextVar("llm_priority_override", default=None)
+
+
+@contextmanager
+def background_priority() -> Iterator[None]:
+    """该上下文内（含其中创建的任务）发起的 LLM 调用一律按后台优先级排队。"""
+    token = _priority_override.set(PRIORITY_BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority_override.reset(token)
+
+
+def provider_key(base_url: Optional[str], api_key: Optional[str]) -> str:
+    """提供方标识：服务地址的主机部分加 API Key 摘要，速率限制通常按 Key 计算。"""
+    host = (urlparse(base_url).netloc or base_url) if base_url else "default"
+    digest = hashlib.sha1((api_key or "").encode("utf-8")).hexdigest()[:8]
+    return f"{host}#{digest}"
+
+
+def retry_after_from(exc: BaseException) -> Optional[float]:
+    """从上游 429 响应头中读取建议的重试间隔（秒）。"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value:
+            try:
+                return max(float(value) * scale, 0.0)
+            except ValueError:
+                continue
+    return None
+
+
+@dataclass(eq=False)
+class _Waiter:
+    user_key: str
+    priority: str
+    cost: int
+    virtual_start: float
+    enqueued_at: float
+    future: asyncio.Future
+    cancelled: bool = False
+
+
+@dataclass(eq=False)
+class LLMTicket:
+    """一次已放行的调用；调用结束后用 charge 记录实际 token 数，多退少补提供方的 token 预算。"""
+
+    provider: str
+    priority: str
+    cost: int
+    queued_seconds: float
+    actual_tokens: Optional[int] = None
+    rate_limited: bool = False
+    _queue: Optional["_ProviderQueue"] = field(default=None, repr=False)
+    _scheduler: Optional["LLMScheduler"] = field(default=None, repr=False)
+
+    def charge(self, tokens: int) -> None:
+        self.actual_tokens = max(int(tokens), 0)
+
+    def on_rate_limited(self, retry_after: Optional[float]) -> int:
+        """上游返回 429：让提供方进入冷却并返回建议客户端等待的秒数。"""
+        self.rate_limited = True
+        self.actual_tokens = 0
+        if self._scheduler is None or self._queue is None:
+            return math.ceil(retry_after) if retry_after else _DEFAULT_RETRY_AFTER
+        return self._scheduler._on_rate_limited(self._queue, retry_after)
+
+
+class _ProviderQueue:
+    """单个提供方的名额、token 桶与分优先级的公平队列。"""
+
+    def __init__(self, name: str, *, max_concurrency: int, tokens_per_minute: int) -> None:
+        self.name = name
+        self.label = name.split("#", 1)[0]
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.tokens = float(tokens_per_minute)
+        self.refilled_at = time.monotonic()
+        self.cooldown_until = 0.0
+        self.heaps: Dict[str, List[Tuple[float, int, _Waiter]]] = {priority: [] for priority in _PRIORITIES}
+        self.queued: Dict[str, int] = {priority: 0 for priority in _PRIORITIES}
+        self.in_flight: Dict[str, int] = {priority: 0 for priority in _PRIORITIES}
+        self.virtual_clock: Dict[str, float] = {priority: 0.0 for priority in _PRIORITIES}
+        self.user_tags: Dict[Tuple[str, str], float] = {}
+        self.wakeup: Optional[asyncio.TimerHandle] = None
+        self.dispatched = 0
+        self.rate_limited = 0
+
+    @property
+    def total_in_flight(self) -> int:
+        return sum(self.in_flight.values())
+
+    def refill(self, now: float) -> None:
+        if self.tokens_per_minute <= 0:
+            return
+        rate = self.tokens_per_minute / 60.0
+        self.tokens = min(float(self.tokens_per_minute), self.tokens + (now - self.refilled_at) * rate)
+        self.refilled_at = now
+
+    def head(self, priority: str) -> Optional[_Waiter]:
+        heap = self.heaps[priority]
+        while heap and heap[0][2].cancelled:
+            heapq.heappop(heap)
+        return heap[0][2] if heap else None
+
+    def retry_after(self, now: float) -> int:
+        if self.cooldown_until > now:
+            return max(math.ceil(self.cooldown_until - now), 1)
+        if self.tokens_per_minute > 0 and self.tokens < 0:
+            return max(math.ceil(-self.tokens / (self.tokens_per_minute / 60.0)), 1)
+        return _DEFAULT_RETRY_AFTER
+
+    def stats(self, now: float) -> Dict[str, Any]:
+        self.refill(now)
+        return {
+            "provider": self.name,
+            "max_concurrency": self.max_concurrency,
+            "concurrency_limit": self.limit,
+            "in_flight": dict(self.in_flight),
+            "queued": dict(self.queued),
+            "tokens_available": round(self.tokens) if self.tokens_per_minute > 0 else None,
+            "cooldown_seconds": round(max(self.cooldown_until - now, 0.0), 2),
+            "dispatched": self.dispatched,
+            "rate_limited": self.rate_limited,
+        }
+
+
+class LLMScheduler:
+    """按提供方调度 LLM 调用：并发与 token 速率预算、两级优先级、按用户公平排队与背压。"""
+
+    def __init__(
+        self,
+        *,
+        max_concurrency: int,
+        tokens_per_minute: int,
+        max_queue: int,
+        queue_timeout: float,
+        background_share: float,
+        rate_limit_cooldown: float,
+        user_weights: Optional[Dict[int, float]] = None,
+    ) -> None:
+        self._max_concurrency = max_concurrency
+        self._tokens_per_minute = tokens_per_minute
+        self._max_queue = max_queue
+        self._queue_timeout = queue_timeout
+        self._background_share = background_share
+        self._rate_limit_cooldown = rate_limit_cooldown
+        self._user_weights = dict(user_weights or {})
+        self._providers: Dict[str, _ProviderQueue] = {}
+        self._sequence = itertools.count()
+        self._rejected = 0
+        self._promoted = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_concurrency > 0 or self._tokens_per_minute > 0
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        provider: str,
+        *,
+        user_id: Optional[int],
+        priority: str = PRIORITY_INTERACTIVE,
+        cost: int = 0,
+        on_rejected: Optional[Callable[[], None]] = None,
+    ) -> AsyncIterator[LLMTicket]:
+        """申请一个调用名额，退出上下文时归还。
+
+        ``priority`` 为调用本身的默认优先级，处于 :func:`background_priority` 上下文时一律降为后台；
+        ``cost`` 为预估的输入与输出 token 总数，用于公平排队与 token 预算。
+        交互调用排队已满或等待超时时抛出 429；未获放行（被拒绝或排队中被取消）时先调用 ``on_rejected``，
+        调用方可借此撤销为本次调用预扣的资源，如每日额度。
+        """
+        priority = _priority_override.get() or priority
+        if not self.enabled:
+            yield LLMTicket(provider=provider, priority=priority, cost=cost, queued_seconds=0.0)
+            return
+        queue = self._provider(provider)
+        user_key = "system" if user_id is None else str(user_id)
+        weight = self._user_weights.get(user_id, 1.0) if user_id is not None else 1.0
+        try:
+            ticket = await self._acquire(queue, user_key, priority, cost, weight)
+        except BaseException:
+            if on_rejected is not None:
+                on_rejected()
+            raise
+        try:
+            yield ticket
+        finally:
+            self._release(queue, ticket)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "enabled": self.enabled,
+            "max_concurrency": self._max_concurrency,
+            "tokens_per_minute": self._tokens_per_minute,
+            "max_queue": self._max_queue,
+            "queue_timeout_seconds": self._queue_timeout,
+            "background_share": self._background_share,
+            "weighted_users": len(self._user_weights),
+            "rejected": self._rejected,
+            "promoted": self._promoted,
+            "providers": [queue.stats(now) for queue in self._providers.values()],
+        }
+
+    def _provider(self, name: str) -> _ProviderQueue:
+        queue = self._providers.get(name)
+        if queue is None:
+            queue = _ProviderQueue(
+                name, max_concurrency=self._max_concurrency, tokens_per_minute=self._tokens_per_minute
+            )
+            self._providers[name] = queue
+        return queue
+
+    async def _acquire(
+        self,
+        queue: _ProviderQueue,
+        user_key: str,
+        priority: str,
+        cost: int,
+        weight: float = 1.0,
+    ) -> LLMTicket:
+        interactive = priority == PRIORITY_INTERACTIVE
+        if interactive and self._max_queue and queue.queued[priority] >= self._max_queue:
+            self._reject(queue, priority, "queue_full", "AI 服务繁忙，排队请求已满，请稍后重试")
+
+        waiter = self._enqueue(queue, user_key, priority, cost, weight)
+        self._dispatch(queue)
+        if not waiter.future.done():
+            timeout = self._queue_timeout if interactive and self._queue_timeout > 0 else None
+            try:
+                # asyncio.wait 不会取消 future，超时与放行同时发生时以放行为准
+                await asyncio.wait({waiter.future}, timeout=timeout)
+            except asyncio.CancelledError:
+                if waiter.future.done():
+                    # 刚放行就被取消，名额与预占的 token 原样归还
+                    unused = self._ticket(queue, waiter)
+                    unused.charge(0)
+                    self._release(queue, unused)
+                else:
+                    self._withdraw(queue, waiter)
+                raise
+            if not waiter.future.done():
+                self._withdraw(queue, waiter)
+                self._reject(queue, priority, "queue_timeout", "AI 服务繁忙，排队等待超时，请稍后重试")
+        ticket = self._ticket(queue, waiter)
+        LLM_QUEUE_WAIT.observe(ticket.queued_seconds, provider=queue.label, priority=priority)
+        if ticket.queued_seconds >= 1.0:
+            logger.info(
+                "LLM 调用排队 %.2fs 后放行: provider=%s priority=%s user=%s",
+                ticket.queued_seconds,
+                queue.name,
+                priority,
+                user_key,
+            )
+        return ticket
+
+    def _ticket(self, queue: _ProviderQueue, waiter: _Waiter) -> LLMTicket:
+        return LLMTicket(
+            provider=queue.name,
+            priority=waiter.priority,
+            cost=waiter.cost,
+            queued_seconds=time.monotonic() - waiter.enqueued_at,
+            _queue=queue,
+            _scheduler=self,
+        )
+
+    def _enqueue(self, queue: _ProviderQueue, user_key: str, priority: str, cost: int, weight: float = 1.0) -> _Waiter:
+        # 加权起始时间公平排队：虚拟起始时间取队列虚拟时钟与该用户上一次调用虚拟完成时间中的较大者，
+        # 虚拟完成时间按代价除以权重推进，权重越大的用户虚拟时间走得越慢、放行得越频繁
+        clock = queue.virtual_clock[priority]
+        tag_key = (priority, user_key)
+        virtual_start = max(clock, queue.user_tags.get(tag_key, 0.0))
+        queue.user_tags[tag_key] = virtual_start + max(cost, 1) / weight
+        if len(queue.user_tags) > _MAX_USER_TAGS:
+            for key in [key for key, tag in queue.user_tags.items() if tag <= queue.virtual_clock[key[0]]]:
+                queue.user_tags.pop(key, None)
+
+        waiter = _Waiter(
+            user_key=user_key,
+            priority=priority,
+            cost=cost,
+            virtual_start=virtual_start,
+            enqueued_at=time.monotonic(),
+            future=asyncio.get_running_loop().create_future(),
+        )
+        heapq.heappush(queue.heaps[priority], (virtual_start, next(self._sequence), waiter))
+        queue.queued[priority] += 1
+        LLM_QUEUE_DEPTH.inc(provider=queue.label, priority=priority)
+        return waiter
+
+    def _withdraw(self, queue: _ProviderQueue, waiter: _Waiter) -> None:
+        waiter.cancelled = True
+        waiter.future.cancel()
+        queue.queued[waiter.priority] -= 1
+        LLM_QUEUE_DEPTH.dec(provider=queue.label, priority=waiter.priority)
+        # 撤下的可能是阻塞队首的大请求，后面的请求也许已经可以放行
+        self._dispatch(queue)
+
+    def _reject(self, queue: _ProviderQueue, priority: str, reason: str, detail: str) -> None:
+        self._rejected += 1
+        LLM_REJECTED.inc(provider=queue.label, priority=priority, reason=reason)
+        retry_after = queue.retry_after(time.monotonic())
+        logger.warning(
+            "LLM 调用被调度器拒绝: provider=%s priority=%s reason=%s retry_after=%ss",
+            queue.name,
+            priority,
+            reason,
+            retry_after,
+        )
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=detail,
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    def _dispatch(self, queue: _ProviderQueue) -> None:
+        now = time.monotonic()
+        queue.refill(now)
+        while True:
+            waiter, promoted = self._next_waiter(queue, now)
+            if waiter is None or not self._can_start(queue, waiter, promoted, now):
+                return
+            heapq.heappop(queue.heaps[waiter.priority])
+            queue.queued[waiter.priority] -= 1
+            queue.in_flight[waiter.priority] += 1
+            queue.virtual_clock[waiter.priority] = waiter.virtual_start
+            if queue.tokens_per_minute > 0:
+                queue.tokens -= waiter.cost
+            queue.dispatched += 1
+            if promoted:
+                self._promoted += 1
+            LLM_QUEUE_DEPTH.dec(provider=queue.label, priority=waiter.priority)
+            LLM_IN_FLIGHT.inc(provider=queue.label, priority=waiter.priority)
+            waiter.future.set_result(True)
+
+    def _next_waiter(self, queue: _ProviderQueue, now: float) -> Tuple[Optional[_Waiter], bool]:
+        background = queue.head(PRIORITY_BACKGROUND)
+        if background is not None and now - background.enqueued_at >= _BACKGROUND_AGING_SECONDS:
+            return background, True
+        interactive = queue.head(PRIORITY_INTERACTIVE)
+        if interactive is not None:
+            return interactive, False
+        return background, False
+
+    def _can_start(self, queue: _ProviderQueue, waiter: _Waiter, promoted: bool, now: float) -> bool:
+        if queue.cooldown_until > now:
+            self._wake_at(queue, queue.cooldown_until - now)
+            return False
+        if queue.max_concurrency > 0:
+            if queue.total_in_flight >= queue.limit:
+                return False
+            background_slots = max(1, int(queue.limit * self._background_share))
+            if (
+                waiter.priority == PRIORITY_BACKGROUND
+                and not promoted
+                and queue.in_flight[PRIORITY_BACKGROUND] >= background_slots
+            ):
+                return False
+        if queue.tokens_per_minute > 0:
+            # 超过桶容量的大请求在桶满时放行，余额记为负数，由后续调用偿还
+            needed = min(float(waiter.cost), float(queue.tokens_per_minute))
+            if queue.tokens < needed:
+                self._wake_at(queue, (needed - queue.tokens) / (queue.tokens_per_minute / 60.0))
+                return False
+        return True
+
+    def _wake_at(self, queue: _ProviderQueue, delay: float) -> None:
+        loop = asyncio.get_running_loop()
+        when = loop.time() + max(delay, 0.01)
+        if queue.wakeup is not None:
+            if queue.wakeup.when() <= when:
+                return
+            queue.wakeup.cancel()
+
+        def _wake() -> None:
+            queue.wakeup = None
+            self._dispatch(queue)
+
+        queue.wakeup = loop.call_at(when, _wake)
+
+    def _release(self, queue: _ProviderQueue, ticket: LLMTicket) -> None:
+        queue.in_flight[ticket.priority] -= 1
+        LLM_IN_FLIGHT.dec(provider=queue.label, priority=ticket.priority)
+        if queue.tokens_per_minute > 0 and ticket.actual_tokens is not None:
+            queue.refill(time.monotonic())
+            queue.tokens = min(float(queue.tokens_per_minute), queue.tokens + ticket.cost - ticket.actual_tokens)
+        if not ticket.rate_limited and queue.limit < queue.max_concurrency:
+            queue.limit += 1
+        self._dispatch(queue)
+
+    def _on_rate_limited(self, queue: _ProviderQueue, retry_after: Optional[float]) -> int:
+        now = time.monotonic()
+        delay = retry_after if retry_after is not None else self._rate_limit_cooldown
+        queue.cooldown_until = max(queue.cooldown_until, now + delay)
+        if queue.max_concurrency > 0:
+            queue.limit = max(1, queue.limit // 2)
+        queue.rate_limited += 1
+        LLM_UPSTREAM_RATE_LIMITED.inc(provider=queue.label)
+        logger.warning(
+            "上游返回 429，提供方进入冷却: provider=%s cooldown=%.1fs concurrency_limit=%d",
+            queue.name,
+            delay,
+            queue.limit,
+        )
+        return queue.retry_after(now)
+
+
+llm_scheduler = LLMScheduler(
+    max_concurrency=settings.llm_provider_concurrency,
+    tokens_per_minute=settings.llm_provider_tokens_per_minute,
+    max_queue=settings.llm_queue_max_waiting,
+    queue_timeout=settings.llm_queue_timeout,
+    background_share=settings.llm_background_share,
+    rate_limit_cooldown=settings.llm_rate_limit_cooldown,
+    user_weights=settings.llm_user_weight_map,
+)
+
+
+__all__ = [
+    "LLMScheduler",
+    "LLMTicket",
+    "PRIORITY_BACKGROUND",
+    "PRIORITY_INTERACTIVE",
+    "background_priority",
+    "llm_scheduler",
+    "provider_key",
+    "retry_after_from",
+]
@@ -1,22 +1,48 @@
+import asyncio
 import logging
 import os
+from contextlib import aclosing
 from typing import Any, Dict, List, Optional
 
 import httpx
 from fastapi import HTTPException, status
-from openai import APIConnectionError, APITimeoutError, AsyncOpenAI, InternalServerError
+from openai import APIConnectionError, APIError, APITimeoutError, AsyncOpenAI, InternalServerError, RateLimitError
 
 from ..core.config import settings
+from ..core.metrics import timed
 from ..repositories.llm_config_repository import LLMConfigRepository
 from ..repositories.system_config_repository import SystemConfigRepository
 from ..repositories.user_repository import UserRepository
 from ..services.admin_setting_service import AdminSettingService
 from ..services.prompt_service import PromptService
+from ..services.llm_telemetry import (
+    STATUS_CANCELLED,
+    STATUS_EMPTY,
+    STATUS_ERROR,
+    STATUS_OK,
+    STATUS_RATE_LIMITED,
+    STATUS_TRUNCATED,
+    LLM_SERVICE_DURATION,
+    LLMCallTelemetry,
+)
+from ..services.llm_scheduler import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    llm_scheduler,
+    provider_key,
+    retry_after_from,
+)
+from ..services.usage_buffer import daily_quota
 from ..services.usage_service import UsageService
 from ..utils.llm_tool import ChatMessage, LLMClient
+from ..utils.stream_json import ChapterStreamParser
+from ..utils.tokenizer import get_tokenizer, max_input_tokens
 
 logger = logging.getLogger(__name__)
 
+# 未指定 max_tokens 时为调度器预占的输出 token 数，调用结束后按实际用量结算
+_COMPLETION_TOKENS_ESTIMATE = 2000
+
 try:  # pragma: no cover - 运行环境未安装时兼容
     from ollama import AsyncClient as OllamaAsyncClient
 except ImportError:  # pragma: no cover - Ollama 为可选依赖
@@ -35,6 +61,7 @@ class LLMService:
         self.usage_service = UsageService(session)
         self._embedding_dimensions: Dict[str, int] = {}
 
+    @timed(LLM_SERVICE_DURATION, operation="get_llm_response")
     async def get_llm_response(
         self,
         system_prompt: str,
@@ -45,6 +72,7 @@ class LLMService:
         timeout: float = 300.0,
         response_format: Optional[str] = "json_object",
         max_tokens: Optional[int] = None,
+        stream_parser: Optional[ChapterStreamParser] = None,
     ) -> str:
         messages = [{"role": "system", "content": system_prompt}, *conversation_history]
         return await self._stream_and_collect(
@@ -54,8 +82,10 @@ class LLMService:
             timeout=timeout,
             response_format=response_format,
             max_tokens=max_tokens,
+            stream_parser=stream_parser,
         )
 
+    @timed(LLM_SERVICE_DURATION, operation="get_summary")
     async def get_summary(
         self,
         chapter_content: str,
@@ -75,7 +105,13 @@ class LLMService:
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": chapter_content},
         ]
-        return await self._stream_and_collect(messages, temperature=temperature, user_id=user_id, timeout=timeout)
+        return await self._stream_and_collect(
+            messages,
+            temperature=temperature,
+            user_id=user_id,
+            timeout=timeout,
+            priority=PRIORITY_BACKGROUND,
+        )
 
     async def _stream_and_collect(
         self,
@@ -86,70 +122,146 @@ class LLMService:
         timeout: float,
         response_format: Optional[str] = None,
         max_tokens: Optional[int] = None,
+        stream_parser: Optional[ChapterStreamParser] = None,
+        priority: str = PRIORITY_INTERACTIVE,
     ) -> str:
+        """流式调用并拼接完整输出；传入 stream_parser 时每个分片同步交给它增量解析。
+
+        调用前先向调度器申请所属提供方的名额，排队已满、等待超时或上游限流时返回 429。
+        """
         config = await self._resolve_llm_config(user_id)
         client = LLMClient(api_key=config["api_key"], base_url=config.get("base_url"))
 
         chat_messages = [ChatMessage(role=msg["role"], content=msg["content"]) for msg in messages]
+        tokenizer = get_tokenizer(config.get("model"))
+        prompt_tokens = sum(tokenizer.count(msg["content"] or "") for msg in messages)
 
-        full_response = ""
+        chunks: List[str] = []
         finish_reason = None
 
-        logger.info(
-            "Streaming LLM response: model=%s user_id=%s messages=%d",
-            config.get("model"),
-            user_id,
-            len(messages),
-        )
+        async with llm_scheduler.slot(
+            provider_key(config.get("base_url"), config["api_key"]),
+            user_id=user_id,
+            priority=priority,
+            cost=prompt_tokens + (max_tokens or _COMPLETION_TOKENS_ESTIMATE),
+            # 未获放行的调用没有发往上游，退还已占用的每日额度
+            on_rejected=(lambda: daily_quota.refund(user_id)) if config["quota_charged"] else None,
+        ) as ticket:
+            # 遥测从放行后开始计时，排队时长单独记入调度器指标
+            telemetry = LLMCallTelemetry(model=config.get("model"), user_id=user_id)
 
-        try:
-            async for part in client.stream_chat(
+            logger.info(
+                "Streaming LLM response: model=%s user_id=%s messages=%d queued=%.2fs",
+                config.get("model"),
+                user_id,
+                len(messages),
+                ticket.queued_seconds,
+            )
+
+            stream = client.stream_chat(
                 messages=chat_messages,
                 model=config.get("model"),
                 temperature=temperature,
                 timeout=int(timeout),
                 response_format=response_format,
                 max_tokens=max_tokens,
-            ):
-                if part.get("content"):
-                    full_response += part["content"]
-                if part.get("finish_reason"):
-                    finish_reason = part["finish_reason"]
-        except InternalServerError as exc:
-            detail = "AI 服务内部错误，请稍后重试"
-            response = getattr(exc, "response", None)
-            if response is not None:
-                try:
-                    payload = response.json()
-                    error_data = payload.get("error", {}) if isinstance(payload, dict) else {}
-                    detail = error_data.get("message_zh") or error_data.get("message") or detail
-                except Exception:
-                    detail = str(exc) or detail
-            else:
-                detail = str(exc) or detail
-            logger.error(
-                "LLM stream internal error: model=%s user_id=%s detail=%s",
-                config.get("model"),
-                user_id,
-                detail,
-                exc_info=exc,
+                include_usage=settings.llm_stream_usage,
             )
-            raise HTTPException(status_code=503, detail=detail)
-        except (httpx.RemoteProtocolError, httpx.ReadTimeout, APIConnectionError, APITimeoutError) as exc:
-            if isinstance(exc, httpx.RemoteProtocolError):
-                detail = "AI 服务连接被意外中断，请稍后重试"
-            elif isinstance(exc, (httpx.ReadTimeout, APITimeoutError)):
-                detail = "AI 服务响应超时，请稍后重试"
-            else:
-                detail = "无法连接到 AI 服务，请稍后重试"
-            logger.error(
-                "LLM stream failed: model=%s user_id=%s detail=%s",
-                config.get("model"),
-                user_id,
-                detail,
-                exc_info=exc,
+            try:
+                # aclosing 保证任何原因退出循环（含客户端断开导致的任务取消）都会关闭上游流
+                async with aclosing(stream):
+                    async for part in stream:
+                        content = part.get("content")
+                        if content:
+                            telemetry.on_chunk(content)
+                            chunks.append(content)
+                            if stream_parser is not None:
+                                stream_parser.feed(content)
+                        if part.get("finish_reason"):
+                            finish_reason = part["finish_reason"]
+                        if part.get("usage"):
+                            telemetry.on_usage(part["usage"])
+            except RateLimitError as exc:
+                telemetry.finish(STATUS_RATE_LIMITED)
+                retry_after = ticket.on_rate_limited(retry_after_from(exc))
+                logger.warning(
+                    "LLM provider rate limited: model=%s user_id=%s retry_after=%ss",
+                    config.get("model"),
+                    user_id,
+                    retry_after,
+                )
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="AI 服务请求过于频繁，请稍后重试",
+                    headers={"Retry-After": str(retry_after)},
+                ) from exc
+            except InternalServerError as exc:
+                telemetry.finish(STATUS_ERROR)
+                detail = "AI 服务内部错误，请稍后重试"
+                response = getattr(exc, "response", None)
+                if response is not None:
+                    try:
+                        payload = response.json()
+                        error_data = payload.get("error", {}) if isinstance(payload, dict) else {}
+                        detail = error_data.get("message_zh") or error_data.get("message") or detail
+                    except Exception:
+                        detail = str(exc) or detail
+                else:
+                    detail = str(exc) or detail
+                logger.error(
+                    "LLM stream internal error: model=%s user_id=%s detail=%s",
+                    config.get("model"),
+                    user_id,
+                    detail,
+                    exc_info=exc,
+                )
+                raise HTTPException(status_code=503, detail=detail)
+            except (httpx.RemoteProtocolError, httpx.ReadTimeout, APIConnectionError, APITimeoutError) as exc:
+                telemetry.finish(STATUS_ERROR)
+                if isinstance(exc, httpx.RemoteProtocolError):
+                    detail = "AI 服务连接被意外中断，请稍后重试"
+                elif isinstance(exc, (httpx.ReadTimeout, APITimeoutError)):
+                    detail = "AI 服务响应超时，请稍后重试"
+                else:
+                    detail = "无法连接到 AI 服务，请稍后重试"
+                logger.error(
+                    "LLM stream failed: model=%s user_id=%s detail=%s",
+                    config.get("model"),
+                    user_id,
+                    detail,
+                    exc_info=exc,
+                )
+                raise HTTPException(status_code=503, detail=detail) from exc
+            except asyncio.CancelledError:
+                telemetry.estimate_completion("".join(chunks))
+                telemetry.finish(STATUS_CANCELLED, finish_reason)
+                ticket.charge(prompt_tokens + (telemetry.completion_tokens or 0))
+                logger.warning(
+                    "LLM stream cancelled: model=%s user_id=%s chars=%d",
+                    config.get("model"),
+                    user_id,
+                    telemetry.output_chars,
+                )
+                raise
+            except Exception:
+                telemetry.finish(STATUS_ERROR, finish_reason)
+                raise
+
+            full_response = "".join(chunks)
+            # 按实际用量结算 token 预算，上游未返回用量时按文本估算
+            ticket.charge(
+                (telemetry.prompt_tokens or prompt_tokens)
+                + (telemetry.completion_tokens if telemetry.completion_tokens is not None else tokenizer.count(full_response))
             )
-            raise HTTPException(status_code=503, detail=detail) from exc
+
+        if stream_parser is not None:
+            stream_parser.finish()
+        if finish_reason == "length":
+            telemetry.finish(STATUS_TRUNCATED, finish_reason)
+        elif not full_response:
+            telemetry.finish(STATUS_EMPTY, finish_reason)
+        else:
+            telemetry.finish(STATUS_OK, finish_reason)
 
         logger.debug(
             "LLM response collected: model=%s user_id=%s finish_reason=%s preview=%s",
@@ -193,7 +305,8 @@ class LLMService:
         )
         return full_response
 
-    async def _resolve_llm_config(self, user_id: Optional[int]) -> Dict[str, Optional[str]]:
+    async def _resolve_llm_config(self, user_id: Optional[int]) -> Dict[str, Any]:
+        """返回调用所用的 API Key、地址与模型；使用系统默认 Key 时先占用每日额度，并以 quota_charged 标记。"""
         if user_id:
             config = await self.llm_repo.get_by_user(user_id)
             if config and config.llm_provider_api_key:
@@ -201,6 +314,7 @@ class LLMService:
                     "api_key": config.llm_provider_api_key,
                     "base_url": config.llm_provider_url,
                     "model": config.llm_provider_model,
+                    "quota_charged": False,
                 }
 
         # 检查每日使用次数限制
@@ -218,8 +332,9 @@ class LLMService:
                 detail="未配置默认 LLM API Key，请联系管理员配置系统默认 API Key 或在个人设置中配置自定义 API Key"
             )
 
-        return {"api_key": api_key, "base_url": base_url, "model": model}
+        return {"api_key": api_key, "base_url": base_url, "model": model, "quota_charged": bool(user_id)}
 
+    @timed(LLM_SERVICE_DURATION, operation="get_embedding")
     async def get_embedding(
         self,
         text: str,
@@ -229,12 +344,9 @@ class LLMService:
     ) -> List[float]:
         """生成文本向量，用于章节 RAG 检索，支持 openai 与 ollama 双提供方。"""
         provider = await self._get_config_value("embedding.provider") or "openai"
-        default_model = (
-            await self._get_config_value("ollama.embedding_model") or "nomic-embed-text:latest"
-            if provider == "ollama"
-            else await self._get_config_value("embedding.model") or "text-embedding-3-large"
-        )
-        target_model = model or default_model
+        target_model = model or await self.get_embedding_model(provider)
+        text = self._fit_embedding_input(text, target_model)
+        input_tokens = get_tokenizer(target_model).count(text)
 
         if provider == "ollama":
             if OllamaAsyncClient is None:
@@ -246,17 +358,20 @@ class LLMService:
                 or await self._get_config_value("embedding.base_url")
             )
             client = OllamaAsyncClient(host=base_url)
-            try:
-                response = await client.embeddings(model=target_model, prompt=text)
-            except Exception as exc:  # pragma: no cover - 本地服务调用失败
-                logger.error(
-                    "Ollama 嵌入请求失败: model=%s base_url=%s error=%s",
-                    target_model,
-                    base_url,
-                    exc,
-                    exc_info=True,
-                )
-                return []
+            async with llm_scheduler.slot(
+                provider_key(base_url, None), user_id=user_id, priority=PRIORITY_BACKGROUND, cost=input_tokens
+            ):
+                try:
+                    response = await client.embeddings(model=target_model, prompt=text)
+                except Exception as exc:  # pragma: no cover - 本地服务调用失败
+                    logger.error(
+                        "Ollama 嵌入请求失败: model=%s base_url=%s error=%s",
+                        target_model,
+                        base_url,
+                        exc,
+                        exc_info=True,
+                    )
+                    return []
             embedding: Optional[List[float]]
             if isinstance(response, dict):
                 embedding = response.get("embedding")
@@ -272,43 +387,47 @@ class LLMService:
             api_key = await self._get_config_value("embedding.api_key") or config["api_key"]
             base_url = await self._get_config_value("embedding.base_url") or config.get("base_url")
             client = AsyncOpenAI(api_key=api_key, base_url=base_url)
-            try:
-                response = await client.embeddings.create(
-                    input=text,
-                    model=target_model,
-                )
-            except openai.RateLimitError as exc:  # pragma: no cover - 速率限制错误
-                logger.error(
-                    "OpenAI 速率限制错误: model=%s base_url=%s user_id=%s error=%s",
-                    target_model,
-                    base_url,
-                    user_id,
-                    exc,
-                    exc_info=True,
-                )
-                return []  # 返回空列表，允许跳过此 chunk
-            except openai.APIError as exc:  # pragma: no cover - API 错误（余额不足等）
-                error_msg = str(exc)
-                logger.error(
-                    "OpenAI API 错误: model=%s base_url=%s user_id=%s error=%s",
-                    target_model,
-                    base_url,
-                    user_id,
-                    exc,
-                    exc_info=True,
-                )
-                # 返回空列表，允许调用者决定如何处理
-                return []
-            except Exception as exc:  # pragma: no cover - 网络或鉴权失败
-                logger.error(
-                    "OpenAI 嵌入请求失败: model=%s base_url=%s user_id=%s error=%s",
-                    target_model,
-                    base_url,
-                    user_id,
-                    exc,
-                    exc_info=True,
-                )
-                return []  # 返回空列表，允许跳过此 chunk
+            async with llm_scheduler.slot(
+                provider_key(base_url, api_key), user_id=user_id, priority=PRIORITY_BACKGROUND, cost=input_tokens
+            ) as ticket:
+                try:
+                    response = await client.embeddings.create(
+                        input=text,
+                        model=target_model,
+                    )
+                except RateLimitError as exc:  # pragma: no cover - 速率限制错误
+                    logger.error(
+                        "OpenAI 速率限制错误: model=%s base_url=%s user_id=%s error=%s",
+                        target_model,
+                        base_url,
+                        user_id,
+                        exc,
+                        exc_info=True,
+                    )
+                    ticket.on_rate_limited(retry_after_from(exc))
+                    return []  # 返回空列表，允许跳过此 chunk
+                except APIError as exc:  # pragma: no cover - API 错误（余额不足等）
+                    error_msg = str(exc)
+                    logger.error(
+                        "OpenAI API 错误: model=%s base_url=%s user_id=%s error=%s",
+                        target_model,
+                        base_url,
+                        user_id,
+                        exc,
+                        exc_info=True,
+                    )
+                    # 返回空列表，允许调用者决定如何处理
+                    return []
+                except Exception as exc:  # pragma: no cover - 网络或鉴权失败
+                    logger.error(
+                        "OpenAI 嵌入请求失败: model=%s base_url=%s user_id=%s error=%s",
+                        target_model,
+                        base_url,
+                        user_id,
+                        exc,
+                        exc_info=True,
+                    )
+                    return []  # 返回空列表，允许跳过此 chunk
             if not response.data:
                 logger.warning("OpenAI 嵌入请求返回空数据: model=%s user_id=%s", target_model, user_id)
                 return []
@@ -326,15 +445,41 @@ class LLMService:
             self._embedding_dimensions[target_model] = dimension
         return embedding
 
-    async def get_embedding_dimension(self, model: Optional[str] = None) -> Optional[int]:
-        """获取嵌入向量维度，优先返回缓存结果，其次读取配置。"""
+    async def get_embedding_model(self, provider: Optional[str] = None) -> str:
+        """返回当前配置的嵌入模型名称，按 token 切分章节时据此选择分词器。"""
+        provider = provider or await self._get_config_value("embedding.provider") or "openai"
+        if provider == "ollama":
+            return await self._get_config_value("ollama.embedding_model") or "nomic-embed-text:latest"
+        return await self._get_config_value("embedding.model") or "text-embedding-3-large"
+
+    async def get_embedding_model_id(self) -> str:
+        """返回“提供方:模型名”形式的嵌入模型标识，写入向量库用于区分不同模型生成的向量。"""
         provider = await self._get_config_value("embedding.provider") or "openai"
-        default_model = (
-            await self._get_config_value("ollama.embedding_model") or "nomic-embed-text:latest"
-            if provider == "ollama"
-            else await self._get_config_value("embedding.model") or "text-embedding-3-large"
+        return f"{provider}:{await self.get_embedding_model(provider)}"
+
+    @staticmethod
+    def _fit_embedding_input(text: str, model: str) -> str:
+        """超出模型输入上限的文本按 token 截断，避免提供方报错或静默截断。"""
+        limit = settings.embedding_max_input_tokens or max_input_tokens(model)
+        if not limit or len(text) * 4 <= limit:
+            # 字节级 BPE 最坏每个 UTF-8 字节一个 token，足够短的文本无需计数
+            return text
+        tokenizer = get_tokenizer(model)
+        tokens = tokenizer.count(text)
+        if tokens <= limit:
+            return text
+        logger.warning(
+            "嵌入输入超出模型上限，已截断: model=%s tokens=%d limit=%d chars=%d",
+            model,
+            tokens,
+            limit,
+            len(text),
         )
-        target_model = model or default_model
+        return tokenizer.truncate(text, limit)
+
+    async def get_embedding_dimension(self, model: Optional[str] = None) -> Optional[int]:
+        """获取嵌入向量维度，优先返回缓存结果，其次读取配置。"""
+        target_model = model or await self.get_embedding_model()
         if target_model in self._embedding_dimensions:
             return self._embedding_dimensions[target_model]
         vector_size_str = await self._get_config_value("embedding.model_vector_size")
@@ -343,14 +488,12 @@ class LLMService:
     async def _enforce_daily_limit(self, user_id: int) -> None:
         limit_str = await self.admin_setting_service.get("daily_request_limit", "100")
         limit = int(limit_str or 10)
-        used = await self.user_repo.get_daily_request(user_id)
-        if used >= limit:
+        # 在当前会话中预占，原因见 DailyQuotaReserver.acquire
+        if not await daily_quota.acquire(user_id, limit, session=self.session):
             raise HTTPException(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 detail="今日请求次数已达上限，请明日再试或设置自定义 API Key。",
             )
-        await self.user_repo.increment_daily_request(user_id)
-        await self.session.commit()
 
     async def _get_config_value(self, key: str) -> Optional[str]:
         record = await self.system_config_repo.get_by_key(key)
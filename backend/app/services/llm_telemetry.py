@@ -0,0 +1,176 @@
+"""
+LLM 调用遥测：记录首 token 延迟、输出速率、token 用量与总耗时。
+
+聚合指标写入进程内注册表（/metrics 导出），逐次明细经 usage_buffer 批量落库到 llm_usage_records，
+便于按用户、模型与接口分析生成时间和花费。接口标签取自 HTTP 指标中间件写入的路由上下文。
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from ..core.http_metrics import current_route
+from ..core.metrics import metrics_registry
+from ..models import LLMUsageRecord
+from ..utils.tokenizer import get_tokenizer
+from .usage_buffer import usage_buffer
+
+logger = logging.getLogger(__name__)
+
+STATUS_OK = "ok"
+STATUS_TRUNCATED = "truncated"
+STATUS_EMPTY = "empty"
+STATUS_ERROR = "error"
+STATUS_CANCELLED = "cancelled"
+STATUS_RATE_LIMITED = "rate_limited"
+
+_TOKEN_RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300, 500)
+
+LLM_REQUESTS = metrics_registry.counter(
+    "llm_requests_total", "LLM 流式调用次数", ("model", "endpoint", "status")
+)
+LLM_DURATION = metrics_registry.histogram(
+    "llm_request_duration_seconds", "LLM 调用从发起到结束的总耗时", ("model", "endpoint")
+)
+LLM_TTFT = metrics_registry.histogram(
+    "llm_time_to_first_token_seconds", "LLM 调用首个内容分片的到达延迟", ("model", "endpoint")
+)
+LLM_TOKEN_RATE = metrics_registry.histogram(
+    "llm_output_tokens_per_second",
+    "首 token 之后的输出速率",
+    ("model", "endpoint"),
+    buckets=_TOKEN_RATE_BUCKETS,
+)
+LLM_PROMPT_TOKENS = metrics_registry.counter(
+    "llm_prompt_tokens_total", "上游返回的输入 token 总数", ("model", "endpoint")
+)
+LLM_COMPLETION_TOKENS = metrics_registry.counter(
+    "llm_completion_tokens_total", "上游返回的输出 token 总数", ("model", "endpoint")
+)
+LLM_CANCELLED_TOKENS = metrics_registry.counter(
+    "llm_cancelled_completion_tokens_total",
+    "调用被取消（如客户端断开）前已输出的 token 数，上游未返回用量时按已收到的文本估算",
+    ("model", "endpoint"),
+)
+LLM_RETRIES = metrics_registry.counter(
+    "llm_retries_total", "业务层因截断等原因发起的重试次数", ("endpoint", "reason")
+)
+# LLMService 方法整体耗时，包含配置读取、配额检查与嵌入调用，与上面只覆盖流式阶段的指标互补
+LLM_SERVICE_DURATION = metrics_registry.histogram(
+    "llm_service_call_duration_seconds", "LLMService 公开方法的整体耗时", ("operation",)
+)
+
+
+def _endpoint_label() -> str:
+    return current_route.get() or "background"
+
+
+def record_llm_retry(reason: str) -> None:
+    LLM_RETRIES.inc(endpoint=_endpoint_label(), reason=reason)
+
+
+class LLMCallTelemetry:
+    """跟踪一次流式调用；finish 只生效一次，重复调用会被忽略。"""
+
+    def __init__(self, *, model: Optional[str], user_id: Optional[int]) -> None:
+        self.model = model or "unknown"
+        self.user_id = user_id
+        self.endpoint = _endpoint_label()
+        self.output_chars = 0
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        self.completion_estimated = False
+        self._started = time.perf_counter()
+        self._first_token_at: Optional[float] = None
+        self._finished = False
+
+    def on_chunk(self, content: str) -> None:
+        if self._first_token_at is None:
+            self._first_token_at = time.perf_counter()
+        self.output_chars += len(content)
+
+    def on_usage(self, usage: Dict[str, Any]) -> None:
+        self.prompt_tokens = usage.get("prompt_tokens")
+        self.completion_tokens = usage.get("completion_tokens")
+
+    def estimate_completion(self, text: str) -> None:
+        """上游未返回用量（流被中途取消）时按已收到的文本估算输出 token 数。"""
+        if self.completion_tokens is None and text:
+            self.completion_tokens = get_tokenizer(self.model).count(text)
+            self.completion_estimated = True
+
+    @property
+    def ttft(self) -> Optional[float]:
+        if self._first_token_at is None:
+            return None
+        return self._first_token_at - self._started
+
+    def finish(self, status: str, finish_reason: Optional[str] = None) -> None:
+        if self._finished:
+            return
+        self._finished = True
+        ended = time.perf_counter()
+        duration = ended - self._started
+        labels = {"model": self.model, "endpoint": self.endpoint}
+
+        LLM_REQUESTS.inc(status=status, **labels)
+        LLM_DURATION.observe(duration, **labels)
+        ttft = self.ttft
+        if ttft is not None:
+            LLM_TTFT.observe(ttft, **labels)
+        if self.prompt_tokens:
+            LLM_PROMPT_TOKENS.inc(self.prompt_tokens, **labels)
+        tokens_per_second = None
+        if self.completion_tokens and status == STATUS_CANCELLED:
+            LLM_CANCELLED_TOKENS.inc(self.completion_tokens, **labels)
+        if self.completion_tokens and not self.completion_estimated:
+            LLM_COMPLETION_TOKENS.inc(self.completion_tokens, **labels)
+            streaming = ended - self._first_token_at if self._first_token_at is not None else 0.0
+            if streaming > 0:
+                tokens_per_second = self.completion_tokens / streaming
+                LLM_TOKEN_RATE.observe(tokens_per_second, **labels)
+
+        usage_buffer.add_row(
+            LLMUsageRecord,
+            {
+                "user_id": self.user_id,
+                "model": self.model[:128],
+                "endpoint": self.endpoint[:255],
+                "status": status,
+                "finish_reason": finish_reason,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "output_chars": self.output_chars,
+                "ttft_ms": round(ttft * 1000, 1) if ttft is not None else None,
+                "duration_ms": round(duration * 1000, 1),
+            },
+        )
+        logger.info(
+            "LLM call telemetry: model=%s endpoint=%s status=%s ttft=%s duration=%.2fs "
+            "prompt_tokens=%s completion_tokens=%s%s tokens_per_second=%s chars=%d",
+            self.model,
+            self.endpoint,
+            status,
+            f"{ttft:.2f}s" if ttft is not None else "-",
+            duration,
+            self.prompt_tokens,
+            self.completion_tokens,
+            "(估算)" if self.completion_estimated else "",
+            f"{tokens_per_second:.1f}" if tokens_per_second is not None else "-",
+            self.output_chars,
+        )
+
+
+__all__ = [
+    "LLMCallTelemetry",
+    "LLM_SERVICE_DURATION",
+    "record_llm_retry",
+    "STATUS_OK",
+    "STATUS_TRUNCATED",
+    "STATUS_EMPTY",
+    "STATUS_ERROR",
+    "STATUS_CANCELLED",
+    "STATUS_RATE_LIMITED",
+]
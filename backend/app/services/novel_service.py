@@ -3,7 +3,7 @@ from __future__ import annotations
 import json
 import uuid
 from datetime import datetime, timezone
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
 
 _PREFERRED_CONTENT_KEYS: tuple[str, ...] = (
     "full_content",      # 最高优先级：完整章节内容
@@ -442,6 +442,76 @@ class NovelService:
         await self._touch_project(chapter.project_id)
         return selected
 
+    async def bulk_import_chapters(
+        self,
+        project_id: str,
+        chapters: Iterable[tuple[str, str]],
+        *,
+        start_number: int = 1,
+        batch_size: int = 200,
+        metadata: Optional[Dict] = None,
+        on_batch: Optional[Callable[[int], Awaitable[None]]] = None,
+    ) -> int:
+        """批量写入导入章节：每批一次提交，章节直接指向唯一的导入版本。
+
+        与逐章调用 get_or_create_chapter / replace_chapter_versions / select_chapter_version
+        相比，提交次数从每章 6 次降为每批 1 次。chapters 可以是生成器，按批消费。
+        """
+        persisted = 0
+        number = start_number
+        batch: List[tuple[int, str]] = []
+
+        async def _flush() -> None:
+            nonlocal persisted
+            if not batch:
+                return
+            rows = [
+                Chapter(
+                    project_id=project_id,
+                    chapter_number=chapter_number,
+                    status=ChapterGenerationStatus.SUCCESSFUL.value,
+                )
+                for chapter_number, _ in batch
+            ]
+            self.session.add_all(rows)
+            await self.session.flush()
+            versions = []
+            for chapter, (_, content) in zip(rows, batch):
+                text_content = _normalize_version_content(content, None)
+                chapter.word_count = len(text_content)
+                versions.append(
+                    ChapterVersion(
+                        chapter_id=chapter.id,
+                        content=text_content,
+                        metadata=metadata,
+                        version_label="v1",
+                    )
+                )
+            self.session.add_all(versions)
+            await self.session.flush()
+            for chapter, version in zip(rows, versions):
+                chapter.selected_version_id = version.id
+            await self.session.commit()
+            # 释放已提交对象，避免大文件导入时 identity map 持续膨胀
+            for chapter in rows:
+                self.session.expunge(chapter)
+            for version in versions:
+                self.session.expunge(version)
+            persisted += len(batch)
+            batch.clear()
+            if on_batch:
+                await on_batch(persisted)
+
+        for _title, content in chapters:
+            batch.append((number, content))
+            number += 1
+            if len(batch) >= batch_size:
+                await _flush()
+        await _flush()
+
+        await self._touch_project(project_id)
+        return persisted
+
     async def add_chapter_evaluation(self, chapter: Chapter, version: Optional[ChapterVersion], feedback: str, decision: Optional[str] = None) -> None:
         evaluation = ChapterEvaluation(
             chapter_id=chapter.id,
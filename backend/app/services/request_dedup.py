@@ -0,0 +1,238 @@
+"""
+耗时写作请求的去重：单飞合并与幂等键重放。
+
+前端重试或代理重发会让章节生成、章节评估、蓝图生成等接口收到重复请求，每份副本都会启动多路长时间的 LLM 调用，
+并相互覆盖写入结果。这里按（用户、操作、项目、章节）做单飞：同一操作仍在执行时，重复请求等待并共享它的结果；
+等待结果的客户端全部断开后取消操作，及时中止上游 LLM 流。
+请求携带 ``Idempotency-Key`` 头时，成功结果在有效期内保留，用相同的键重发直接重放结果；
+同一个键用于不同的请求（操作或请求体不同）时返回 422。
+
+状态只保存在当前进程内存中，多 worker 部署时仅对落在同一进程的重复请求生效。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+from fastapi import HTTPException, Request, status
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+# 非标准状态码（nginx 约定），表示客户端在响应前断开；客户端已不在，仅出现在访问日志与指标中
+CLIENT_CLOSED_REQUEST = 499
+_MAX_REPLAY_ENTRIES = 1024
+
+
+@dataclass
+class _Replay:
+    fingerprint: str
+    result: Any
+    expires_at: float
+
+
+def request_fingerprint(operation: str, *parts: Any) -> str:
+    """请求指纹：操作名与请求参数（模型对象取其 JSON）的摘要，用于识别幂等键被挪作他用。"""
+    digest = hashlib.sha1(operation.encode("utf-8"))
+    for part in parts:
+        text = part.model_dump_json() if hasattr(part, "model_dump_json") else repr(part)
+        digest.update(b"\x00" + text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+@dataclass
+class _Flight:
+    """一次进行中的操作：实际执行的任务、仍在等待结果的连接数与需要保存重放结果的幂等键。"""
+
+    task: asyncio.Task
+    waiters: int = 0
+    replay_keys: Dict[Tuple[int, str], str] = field(default_factory=dict)
+
+
+async def wait_for_disconnect(request: Request) -> None:
+    """等待客户端断开连接；请求体已被读取后，ASGI receive 只会在断开时返回。"""
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+class OperationDeduplicator:
+    """进行中操作的单飞表与幂等结果的短期缓存。
+
+    操作在独立任务中执行，发起请求与后来挂上的重复请求都只是等待者；
+    所有等待者的客户端都断开后取消任务，上游 LLM 流随之关闭，不再为无人读取的输出付费。
+    """
+
+    def __init__(self, *, replay_ttl: float, max_replays: int = _MAX_REPLAY_ENTRIES) -> None:
+        self._replay_ttl = replay_ttl
+        self._max_replays = max_replays
+        self._inflight: Dict[Hashable, _Flight] = {}
+        self._replays: "OrderedDict[Tuple[int, str], _Replay]" = OrderedDict()
+        self._started = 0
+        self._attached = 0
+        self._replayed = 0
+        self._conflicts = 0
+        self._aborted = 0
+
+    async def run(
+        self,
+        operation_key: Hashable,
+        factory: Callable[[], Awaitable[T]],
+        *,
+        user_id: int,
+        fingerprint: str,
+        idempotency_key: Optional[str] = None,
+        until_disconnected: Optional[Callable[[], Awaitable[None]]] = None,
+    ) -> T:
+        """执行或合并一次操作。
+
+        ``operation_key`` 标识单飞范围，应包含用户 ID，避免其他用户挂到不属于自己的操作上；
+        ``fingerprint`` 为请求指纹，只用于幂等键的一致性校验；
+        ``until_disconnected`` 返回的协程在客户端断开时结束，通常传入 :func:`wait_for_disconnect`。
+        """
+        scoped_key = (user_id, idempotency_key) if idempotency_key else None
+        if scoped_key is not None:
+            replay = self._lookup_replay(scoped_key)
+            known = replay.fingerprint if replay else self._inflight_fingerprint(scoped_key)
+            if known is not None and known != fingerprint:
+                self._conflicts += 1
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail=f"{IDEMPOTENCY_HEADER} 已用于另一个请求，请为新请求生成新的键",
+                )
+            if replay is not None:
+                self._replayed += 1
+                logger.info("幂等键命中，重放已完成的结果: user=%s operation=%s", user_id, operation_key)
+                return replay.result
+
+        flight = self._inflight.get(operation_key)
+        leader = flight is None
+        if flight is None:
+            # 任务复制当前上下文，遥测中的接口标签保持不变
+            flight = _Flight(task=asyncio.create_task(factory(), name=f"operation:{operation_key}"))
+            self._inflight[operation_key] = flight
+            flight.task.add_done_callback(lambda done: self._finish(operation_key, flight))
+            self._started += 1
+        else:
+            self._attached += 1
+            logger.info("相同操作仍在执行，等待其结果: user=%s operation=%s", user_id, operation_key)
+        if scoped_key is not None:
+            flight.replay_keys[scoped_key] = fingerprint
+        return await self._wait(operation_key, flight, leader, until_disconnected)
+
+    async def _wait(
+        self,
+        operation_key: Hashable,
+        flight: _Flight,
+        leader: bool,
+        until_disconnected: Optional[Callable[[], Awaitable[None]]],
+    ) -> Any:
+        flight.waiters += 1
+        waiting = True
+        watcher = asyncio.ensure_future(until_disconnected()) if until_disconnected else None
+        try:
+            if watcher is not None:
+                await asyncio.wait({flight.task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+                if not flight.task.done():
+                    waiting = False
+                    self._release(operation_key, flight, "客户端已断开")
+                    if not leader:
+                        raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="客户端已断开")
+            # 发起请求的会话由任务使用，断开后仍等待任务结束再返回，避免会话先于任务关闭
+            await asyncio.wait({flight.task})
+        except asyncio.CancelledError:
+            if waiting:
+                waiting = False
+                # 发起请求本身被取消时其会话即将关闭，任务无法继续，只能一并取消
+                self._release(operation_key, flight, "请求已取消", force=leader)
+            raise
+        finally:
+            if waiting:
+                flight.waiters -= 1
+            if watcher is not None:
+                watcher.cancel()
+        if flight.task.cancelled():
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="相同的请求已中断，请稍后重试")
+        return flight.task.result()
+
+    def _release(self, operation_key: Hashable, flight: _Flight, reason: str, *, force: bool = False) -> None:
+        flight.waiters -= 1
+        if flight.task.done() or (flight.waiters > 0 and not force):
+            return
+        self._aborted += 1
+        logger.warning("%s，取消进行中的操作: operation=%s waiters=%d", reason, operation_key, flight.waiters)
+        flight.task.cancel()
+
+    def _finish(self, operation_key: Hashable, flight: _Flight) -> None:
+        if self._inflight.get(operation_key) is flight:
+            self._inflight.pop(operation_key, None)
+        if flight.task.cancelled() or flight.task.exception() is not None:
+            return
+        result = flight.task.result()
+        for scoped_key, fingerprint in flight.replay_keys.items():
+            self._store_replay(scoped_key, fingerprint, result)
+
+    def _inflight_fingerprint(self, scoped_key: Tuple[int, str]) -> Optional[str]:
+        for flight in self._inflight.values():
+            if scoped_key in flight.replay_keys:
+                return flight.replay_keys[scoped_key]
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        self._prune()
+        return {
+            "replay_ttl_seconds": self._replay_ttl,
+            "inflight": len(self._inflight),
+            "replay_entries": len(self._replays),
+            "started": self._started,
+            "attached": self._attached,
+            "replayed": self._replayed,
+            "conflicts": self._conflicts,
+            "aborted": self._aborted,
+        }
+
+    def _lookup_replay(self, scoped_key: Tuple[int, str]) -> Optional[_Replay]:
+        replay = self._replays.get(scoped_key)
+        if replay is None:
+            return None
+        if replay.expires_at <= time.monotonic():
+            self._replays.pop(scoped_key, None)
+            return None
+        return replay
+
+    def _store_replay(self, scoped_key: Tuple[int, str], fingerprint: str, result: Any) -> None:
+        if self._replay_ttl <= 0:
+            return
+        self._replays[scoped_key] = _Replay(fingerprint, result, time.monotonic() + self._replay_ttl)
+        self._replays.move_to_end(scoped_key)
+        self._prune()
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        for key in [key for key, replay in self._replays.items() if replay.expires_at <= now]:
+            self._replays.pop(key, None)
+        while len(self._replays) > self._max_replays:
+            self._replays.popitem(last=False)
+
+
+operation_dedup = OperationDeduplicator(replay_ttl=settings.idempotency_replay_ttl)
+
+
+__all__ = [
+    "IDEMPOTENCY_HEADER",
+    "OperationDeduplicator",
+    "operation_dedup",
+    "request_fingerprint",
+    "wait_for_disconnect",
+]
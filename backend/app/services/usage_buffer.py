@@ -0,0 +1,261 @@
+"""
+用量计数的进程内缓冲与每日限额预占。
+
+- ``UsageCounterBuffer``：调用方只在内存中累加，后台按固定间隔用一条原子 upsert
+  把增量写入 usage_metrics，进程退出前再落盘一次，避免每次 LLM 调用都去争抢同一行；
+  LLM 调用明细等只追加的记录也在同一轮中批量插入。
+- ``DailyQuotaReserver``：每次从数据库预占一小块当日额度，块内的调用只扣减内存计数；
+  预占本身是带上限条件的原子更新，多进程部署下总次数同样不会越过限额。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import date
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..db.session import AsyncSessionLocal
+from ..repositories.usage_metric_repository import UsageMetricRepository
+from ..repositories.user_repository import UserRepository
+
+logger = logging.getLogger(__name__)
+
+# 明细记录的积压上限，数据库长时间不可用时丢弃最旧的记录，避免内存无限增长
+_MAX_PENDING_ROWS = 10000
+
+
+class UsageCounterBuffer:
+    """按计数键累积增量、按表累积明细行，定期批量写库；写库失败时全部回填，等待下一轮重试。"""
+
+    def __init__(self, *, interval: float, session_factory: Callable = AsyncSessionLocal) -> None:
+        self._interval = interval
+        self._session_factory = session_factory
+        self._pending: Dict[str, int] = {}
+        self._rows: Deque[Tuple[type, Dict[str, Any]]] = deque(maxlen=_MAX_PENDING_ROWS)
+        self._dropped_rows = 0
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._flushes = 0
+        self._flushed_total = 0
+        self._flushed_rows = 0
+        self._failed_flushes = 0
+        self._last_flush_at: Optional[float] = None
+        self._last_error: Optional[str] = None
+
+    def add(self, key: str, amount: int = 1) -> None:
+        self._pending[key] = self._pending.get(key, 0) + amount
+
+    def add_row(self, model: type, values: Dict[str, Any]) -> None:
+        """登记一行待批量插入的明细记录。"""
+        if len(self._rows) == self._rows.maxlen:
+            self._dropped_rows += 1
+        self._rows.append((model, values))
+
+    def pending(self, key: str) -> int:
+        """尚未写入数据库的增量，读取统计时需要与库中数值相加。"""
+        return self._pending.get(key, 0)
+
+    def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run(), name="usage-counter-flush")
+        logger.info("用量计数缓冲已启动: interval=%.1fs", self._interval)
+
+    async def shutdown(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            await self.flush()
+
+    async def flush(self) -> int:
+        """把当前累积的增量与明细写入数据库，返回本次写入的计数增量总和。"""
+        async with self._flush_lock:
+            if not self._pending and not self._rows:
+                return 0
+            batch, self._pending = self._pending, {}
+            rows = list(self._rows)
+            self._rows.clear()
+            grouped: Dict[type, List[Dict[str, Any]]] = {}
+            for model, values in rows:
+                grouped.setdefault(model, []).append(values)
+            try:
+                async with self._session_factory() as session:
+                    if batch:
+                        await UsageMetricRepository(session).increment_many(batch)
+                    for model, values in grouped.items():
+                        await session.execute(insert(model), values)
+                    await session.commit()
+            except Exception as exc:  # noqa: BLE001 - 任何写库异常都不能丢失计数
+                for key, amount in batch.items():
+                    self.add(key, amount)
+                pending_rows = list(self._rows)
+                self._rows.clear()
+                for model, values in rows + pending_rows:
+                    self.add_row(model, values)
+                self._failed_flushes += 1
+                self._last_error = str(exc)
+                logger.warning("用量计数写库失败，将在下一轮重试: %s", exc)
+                return 0
+            total = sum(batch.values())
+            self._flushes += 1
+            self._flushed_total += total
+            self._flushed_rows += len(rows)
+            self._last_flush_at = time.time()
+            self._last_error = None
+            return total
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "interval_seconds": self._interval,
+            "pending": dict(self._pending),
+            "flushes": self._flushes,
+            "flushed_total": self._flushed_total,
+            "pending_rows": len(self._rows),
+            "flushed_rows": self._flushed_rows,
+            "dropped_rows": self._dropped_rows,
+            "failed_flushes": self._failed_flushes,
+            "last_flush_at": self._last_flush_at,
+            "last_error": self._last_error,
+        }
+
+
+class DailyQuotaReserver:
+    """
+    每日限额的预占式检查。
+
+    额度按块预占并计入数据库，块用完前的调用只在内存中扣减；管理员调低限额后，
+    已预占但未用完的块仍可继续使用，最多多出 block_size - 1 次。
+    """
+
+    def __init__(self, *, block_size: int, session_factory: Callable = AsyncSessionLocal) -> None:
+        self._block_size = block_size
+        self._session_factory = session_factory
+        self._blocks: Dict[int, Tuple[date, int]] = {}
+        # 当日额度已耗尽的用户及当时的限额，限额未变时直接拒绝，不再访问数据库
+        self._exhausted: Dict[int, Tuple[date, int]] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._local_grants = 0
+        self._reservations = 0
+        self._rejections = 0
+        self._refunds = 0
+
+    def _take_local(self, user_id: int, today: date) -> bool:
+        day, remaining = self._blocks.get(user_id, (today, 0))
+        if day != today or remaining <= 0:
+            return False
+        self._blocks[user_id] = (today, remaining - 1)
+        self._local_grants += 1
+        return True
+
+    async def acquire(self, user_id: int, limit: int, session: Optional[AsyncSession] = None) -> bool:
+        """占用一次当日额度，额度已用尽时返回 False。
+
+        传入调用方的会话时，预占新额度块在该会话中执行并提交，调用方此前的待写入改动随之一并提交。
+        调用方的事务可能已经持有写锁（SQLite 上 autoflush 之后即是如此），另开连接预占会等待自身持有的锁直到超时。
+        """
+        today = date.today()
+        if self._take_local(user_id, today):
+            return True
+        if self._exhausted.get(user_id) == (today, limit):
+            self._rejections += 1
+            return False
+
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        async with lock:
+            # 等锁期间其他协程可能已经预占了新的额度块
+            if self._take_local(user_id, today):
+                return True
+            stale_day, stale_remaining = self._blocks.pop(user_id, (today, 0))
+            if session is not None:
+                granted = await self._reserve(session, user_id, today, limit, stale_day, stale_remaining)
+            else:
+                async with self._session_factory() as own_session:
+                    granted = await self._reserve(own_session, user_id, today, limit, stale_day, stale_remaining)
+
+        if granted <= 0:
+            self._exhausted[user_id] = (today, limit)
+            self._rejections += 1
+            return False
+        self._exhausted.pop(user_id, None)
+        self._reservations += 1
+        self._blocks[user_id] = (today, granted - 1)
+        return True
+
+    def refund(self, user_id: int) -> None:
+        """退还一次当日额度，用于已占用额度但未发往上游的调用（如调度器排队被拒）。
+
+        额度退回内存中的预占块，供该用户下一次调用使用，进程退出时随未用完的块一并归还数据库。
+        """
+        today = date.today()
+        day, remaining = self._blocks.get(user_id, (None, 0))
+        if day != today:
+            # 占用额度后已跨天，预占块属于前一天，不再退还
+            return
+        self._blocks[user_id] = (today, remaining + 1)
+        self._exhausted.pop(user_id, None)
+        self._refunds += 1
+
+    async def _reserve(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        today: date,
+        limit: int,
+        stale_day: date,
+        stale_remaining: int,
+    ) -> int:
+        repo = UserRepository(session)
+        if stale_remaining > 0 and stale_day != today:
+            await repo.release_daily_requests(user_id, stale_day, stale_remaining)
+        granted = await repo.reserve_daily_requests(user_id, today, self._block_size, limit)
+        await session.commit()
+        return granted
+
+    async def release_all(self) -> None:
+        """进程退出前归还未用完的预占额度，让库中计数回到真实使用次数。"""
+        blocks = [(user_id, day, remaining) for user_id, (day, remaining) in self._blocks.items() if remaining > 0]
+        self._blocks.clear()
+        if not blocks:
+            return
+        try:
+            async with self._session_factory() as session:
+                repo = UserRepository(session)
+                for user_id, day, remaining in blocks:
+                    await repo.release_daily_requests(user_id, day, remaining)
+                await session.commit()
+        except Exception as exc:  # noqa: BLE001 - 退出阶段只记录，不影响关闭流程
+            logger.warning("归还每日预占额度失败: %s", exc)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "block_size": self._block_size,
+            "reserved_users": sum(1 for _, remaining in self._blocks.values() if remaining > 0),
+            "reserved_remaining": sum(remaining for _, remaining in self._blocks.values()),
+            "local_grants": self._local_grants,
+            "reservations": self._reservations,
+            "rejections": self._rejections,
+            "refunds": self._refunds,
+        }
+
+
+usage_buffer = UsageCounterBuffer(interval=settings.usage_flush_interval)
+daily_quota = DailyQuotaReserver(block_size=settings.daily_quota_reserve_block)
+
+
+__all__ = ["UsageCounterBuffer", "DailyQuotaReserver", "usage_buffer", "daily_quota"]
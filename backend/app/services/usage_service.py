@@ -1,6 +1,7 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..repositories.usage_metric_repository import UsageMetricRepository
+from .usage_buffer import usage_buffer
 
 
 class UsageService:
@@ -10,12 +11,11 @@ class UsageService:
         self.session = session
         self.repo = UsageMetricRepository(session)
 
-    async def increment(self, key: str) -> None:
-        counter = await self.repo.get_or_create(key)
-        counter.value += 1
-        await self.session.commit()
+    async def increment(self, key: str, amount: int = 1) -> None:
+        # 只在内存中累加，由 usage_buffer 定期批量写库
+        usage_buffer.add(key, amount)
 
     async def get_value(self, key: str) -> int:
         counter = await self.repo.get_or_create(key)
         await self.session.commit()
-        return counter.value
+        return counter.value + usage_buffer.pending(key)
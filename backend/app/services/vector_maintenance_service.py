@@ -0,0 +1,253 @@
+"""
+向量库维护：
+
+- 对照关系库找出孤儿向量（项目已删除，或章节与大纲都已不存在），分批删除并压缩数据库文件；
+  管理员接口与命令行脚本 ``vector_gc.py`` 共用本服务。
+- 切换嵌入模型或提供方后，在后台按项目把旧模型生成的向量重新嵌入。每批回写即标记新模型，
+  任务中断后重新启动只处理剩余的行；检索只比较同一模型的向量，迁移期间已迁移的部分照常可用。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..db.session import AsyncSessionLocal
+from ..models.novel import Chapter, ChapterOutline, NovelProject
+from ..schemas.admin import VectorCleanupItem, VectorGCReport
+from .background_jobs import BackgroundJob, job_registry
+from .llm_scheduler import background_priority
+from .llm_service import LLMService
+from .vector_store_service import ChapterVectorUsage, VectorStoreService
+
+logger = logging.getLogger(__name__)
+
+# 关系库 IN 查询与按章节删除向量时每批处理的数量
+_LOOKUP_BATCH_SIZE = 500
+_CHAPTER_BATCH_SIZE = 200
+_EMBEDDING_TABLES = ("rag_chunks", "rag_summaries")
+
+REEMBED_JOB_KIND = "vector_reembed"
+
+
+def _batched(items: Sequence, size: int) -> Iterable[Sequence]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class _RateLimiter:
+    """按固定间隔放行请求，限制每秒请求数。"""
+
+    def __init__(self, rate: float) -> None:
+        self._interval = 1.0 / rate
+        self._next_at = 0.0
+
+    async def wait(self) -> None:
+        now = time.monotonic()
+        if self._next_at > now:
+            await asyncio.sleep(self._next_at - now)
+        self._next_at = max(now, self._next_at) + self._interval
+
+
+class VectorMaintenanceService:
+    """向量库孤儿数据回收。"""
+
+    def __init__(self, session: AsyncSession, vector_store: VectorStoreService) -> None:
+        self.session = session
+        self.vector_store = vector_store
+
+    async def collect_garbage(self, *, dry_run: bool = False, compact: bool = True) -> VectorGCReport:
+        """扫描并清理孤儿向量；dry_run 只报告不删除，compact 在删除后执行 VACUUM 回收磁盘空间。"""
+        started = time.perf_counter()
+        usage = await self.vector_store.inventory()
+        by_project: Dict[str, List[ChapterVectorUsage]] = defaultdict(list)
+        for item in usage:
+            by_project[item.project_id].append(item)
+
+        existing_projects, known_chapters = await self._load_relational_state(list(by_project))
+        items: List[VectorCleanupItem] = []
+        for project_id, chapters in sorted(by_project.items()):
+            if project_id not in existing_projects:
+                orphaned = chapters
+                reason = "project_deleted"
+            else:
+                valid = known_chapters.get(project_id, set())
+                orphaned = [item for item in chapters if item.chapter_number not in valid]
+                reason = "chapters_deleted"
+            if not orphaned:
+                continue
+            items.append(
+                VectorCleanupItem(
+                    project_id=project_id,
+                    reason=reason,
+                    chapters=sorted(item.chapter_number for item in orphaned),
+                    chunks=sum(item.chunks for item in orphaned),
+                    summaries=sum(item.summaries for item in orphaned),
+                    payload_bytes=sum(item.payload_bytes for item in orphaned),
+                )
+            )
+
+        if not dry_run:
+            for item in items:
+                if item.reason == "project_deleted":
+                    await self.vector_store.delete_project(item.project_id)
+                else:
+                    for chapters in _batched(item.chapters, _CHAPTER_BATCH_SIZE):
+                        await self.vector_store.delete_by_chapters(item.project_id, list(chapters))
+                logger.info(
+                    "已清理孤儿向量: project=%s reason=%s chapters=%d chunks=%d summaries=%d bytes=%d",
+                    item.project_id,
+                    item.reason,
+                    len(item.chapters),
+                    item.chunks,
+                    item.summaries,
+                    item.payload_bytes,
+                )
+
+        report = VectorGCReport(
+            dry_run=dry_run,
+            scanned_projects=len(by_project),
+            scanned_rows=sum(item.chunks + item.summaries for item in usage),
+            items=items,
+            chunks_deleted=sum(item.chunks for item in items),
+            summaries_deleted=sum(item.summaries for item in items),
+            payload_bytes=sum(item.payload_bytes for item in items),
+            compacted=False,
+            elapsed_seconds=0.0,
+        )
+        if compact and not dry_run:
+            result = await self.vector_store.compact(full=True)
+            report.compacted = True
+            report.size_before = result.size_before
+            report.size_after = result.size_after
+            report.reclaimed_bytes = result.reclaimed_bytes
+        report.elapsed_seconds = round(time.perf_counter() - started, 3)
+        return report
+
+    @staticmethod
+    def start_reembed(user_id: Optional[int] = None) -> BackgroundJob:
+        """启动重新嵌入后台任务；已有任务未结束时直接返回该任务，保证同一时间只有一个迁移在进行。"""
+        for job in job_registry.list(kind=REEMBED_JOB_KIND):
+            if not job.finished:
+                return job
+        job = job_registry.create(REEMBED_JOB_KIND, user_id)
+        job.update(phase="scan", progress=0.0, message="重新嵌入任务已创建")
+        with background_priority():
+            job_registry.start(job, VectorMaintenanceService._run_reembed_job)
+        return job
+
+    @staticmethod
+    async def _run_reembed_job(job: BackgroundJob) -> None:
+        """后台任务入口：请求结束后会话即关闭，因此任务内使用独立的数据库会话。"""
+        async with AsyncSessionLocal() as session:
+            await VectorMaintenanceService(session, VectorStoreService()).reembed(job)
+
+    async def reembed(self, job: BackgroundJob) -> None:
+        """把不是由当前嵌入模型生成的片段与摘要逐项目重新嵌入，最近更新的项目优先。"""
+        llm_service = LLMService(self.session)
+        target = await llm_service.get_embedding_model_id()
+        job.set_result(embedding_model=target)
+        backlog = await self.vector_store.embedding_backlog(target)
+        total = sum(backlog.values())
+        job.update(
+            phase="reembed",
+            message=f"待迁移 {len(backlog)} 个项目、{total} 条向量",
+            projects_total=len(backlog),
+            projects_done=0,
+            rows_total=total,
+            rows_done=0,
+            rows_failed=0,
+        )
+        if not total:
+            job.update(phase="completed", message="所有向量均由当前模型生成，无需迁移")
+            return
+
+        limiter = _RateLimiter(settings.vector_reembed_rate)
+        done = failed = 0
+        for position, project_id in enumerate(await self._migration_order(list(backlog)), 1):
+            current = await llm_service.get_embedding_model_id()
+            if current != target:
+                raise RuntimeError(f"嵌入模型已由 {target} 变更为 {current}，请重新启动迁移任务")
+            job.update(message=f"正在迁移项目 {project_id}（{position}/{len(backlog)}）")
+            for table in _EMBEDDING_TABLES:
+                after_id = ""
+                while True:
+                    rows = await self.vector_store.stale_embeddings(
+                        table,
+                        project_id=project_id,
+                        embedding_model=target,
+                        after_id=after_id,
+                        limit=settings.vector_reembed_batch_size,
+                    )
+                    if not rows:
+                        break
+                    after_id = rows[-1][0]
+                    embeddings: Dict[str, List[float]] = {}
+                    for record_id, text in rows:
+                        embedding: List[float] = []
+                        if text.strip():
+                            await limiter.wait()
+                            embedding = await llm_service.get_embedding(text)
+                        if embedding:
+                            embeddings[record_id] = embedding
+                        else:
+                            failed += 1
+                    if not embeddings:
+                        # 整批失败通常意味着嵌入服务不可用，中止任务，恢复后重新启动即可继续
+                        raise RuntimeError("嵌入服务整批请求失败，迁移已中止，可稍后重新启动继续迁移")
+                    await self.vector_store.update_embeddings(
+                        table,
+                        project_id=project_id,
+                        embedding_model=target,
+                        embeddings=embeddings,
+                    )
+                    done += len(embeddings)
+                    job.update(progress=(done + failed) / total * 100, rows_done=done, rows_failed=failed)
+            job.update(projects_done=position)
+
+        # 失败的行保留旧模型标记，再次启动任务时会重试
+        message = f"迁移完成：成功 {done} 条，失败 {failed} 条"
+        job.update(phase="completed", message=message)
+        logger.info("向量重新嵌入完成: model=%s projects=%d done=%d failed=%d", target, len(backlog), done, failed)
+
+    async def _migration_order(self, project_ids: List[str]) -> List[str]:
+        """按项目最近更新时间倒序排列，活跃项目先迁移；关系库中已不存在的项目排在最后。"""
+        updated: Dict[str, datetime] = {}
+        for batch in _batched(project_ids, _LOOKUP_BATCH_SIZE):
+            result = await self.session.execute(
+                select(NovelProject.id, NovelProject.updated_at).where(NovelProject.id.in_(batch))
+            )
+            for project_id, updated_at in result:
+                updated[project_id] = updated_at
+        ordered = sorted(
+            updated,
+            key=lambda project_id: (updated[project_id] is not None, updated[project_id] or datetime.min),
+            reverse=True,
+        )
+        return ordered + sorted(project_id for project_id in project_ids if project_id not in updated)
+
+    async def _load_relational_state(self, project_ids: List[str]) -> Tuple[Set[str], Dict[str, Set[int]]]:
+        """返回仍存在的项目，以及每个项目已有正文或大纲的章节号（导入的章节只有大纲）。"""
+        existing: Set[str] = set()
+        chapters: Dict[str, Set[int]] = defaultdict(set)
+        for batch in _batched(project_ids, _LOOKUP_BATCH_SIZE):
+            result = await self.session.execute(select(NovelProject.id).where(NovelProject.id.in_(batch)))
+            existing.update(result.scalars())
+            for model in (Chapter, ChapterOutline):
+                result = await self.session.execute(
+                    select(model.project_id, model.chapter_number).where(model.project_id.in_(batch))
+                )
+                for project_id, chapter_number in result:
+                    chapters[project_id].add(chapter_number)
+        return existing, chapters
+
+
+__all__ = ["REEMBED_JOB_KIND", "VectorMaintenanceService"]
@@ -0,0 +1,245 @@
+"""
+项目向量快照：应用层相似度计算（libsql 不支持向量函数时）的预热数据。
+
+某项目某张向量表中同一维度的全部向量预先归一化，按行连续写成 float32 文件，记录 ID 写入旁路 JSON；
+首次访问时以只读 mmap 映射，余弦距离退化为一次矩阵乘法，无需逐行读取并解码 BLOB。
+
+快照文件名带有项目的写入代数（向量库 rag_generations 表），任何写入都会递增代数，旧快照随之失效；
+进程重启后只要代数未变即可直接映射磁盘上的快照。映射页由操作系统页缓存共享，多个 worker 进程共用同一份物理内存。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import heapq
+import json
+import logging
+import math
+import mmap
+import os
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Collection, List, Optional, Sequence, Tuple
+
+try:  # noqa: SIM105 - 可选依赖
+    import numpy as np
+except ImportError:  # pragma: no cover - 未安装时使用纯 Python 实现
+    np = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+# 是否使用 numpy 的矩阵实现；纯 Python 扫描耗时随项目规模线性增长，调用方据此决定是否卸载到进程池
+VECTORIZED = np is not None
+
+_VECTOR_SUFFIX = ".f32"
+_SIDECAR_SUFFIX = ".json"
+_MAX_OPEN_SNAPSHOTS = 64
+
+
+def _project_digest(project_id: str) -> str:
+    # 项目 ID 取摘要，避免特殊字符出现在文件名中
+    return hashlib.sha1(project_id.encode("utf-8")).hexdigest()[:20]
+
+
+def snapshot_stem(table: str, project_id: str, dim: int) -> str:
+    """快照文件名前缀，同一表、项目与维度的各代快照共用。"""
+    return f"{table}_{_project_digest(project_id)}_d{dim}"
+
+
+def _snapshot_paths(directory: Path, stem: str, generation: int) -> Tuple[Path, Path]:
+    base = directory / f"{stem}_g{generation}"
+    return base.with_name(base.name + _VECTOR_SUFFIX), base.with_name(base.name + _SIDECAR_SUFFIX)
+
+
+def write_snapshot(
+    directory: Path,
+    stem: str,
+    generation: int,
+    ids: Sequence[str],
+    blobs: Sequence[bytes],
+    dim: int,
+) -> None:
+    """把向量归一化后写入快照并删除同前缀的旧代数快照；阻塞调用，应在线程中执行。
+
+    先写旁路 JSON，再原子替换向量文件，读取方以向量文件存在作为快照完整的标志。
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    vector_path, sidecar_path = _snapshot_paths(directory, stem, generation)
+    sidecar = {"generation": generation, "dim": dim, "count": len(ids), "ids": list(ids)}
+    tmp_sidecar = sidecar_path.with_name(f"{sidecar_path.name}.{os.getpid()}.tmp")
+    tmp_sidecar.write_text(json.dumps(sidecar, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_sidecar, sidecar_path)
+
+    tmp_vectors = vector_path.with_name(f"{vector_path.name}.{os.getpid()}.tmp")
+    with open(tmp_vectors, "wb") as sink:
+        if np is not None and blobs:
+            matrix = np.frombuffer(b"".join(blobs), dtype=np.float32).reshape(len(blobs), dim)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0).tofile(sink)
+        else:
+            for blob in blobs:
+                vector = array("f")
+                vector.frombytes(blob)
+                norm = math.sqrt(sum(value * value for value in vector))
+                sink.write(array("f", (value / norm if norm else 0.0 for value in vector)).tobytes())
+    os.replace(tmp_vectors, vector_path)
+
+    current = {vector_path.name, sidecar_path.name}
+    for stale in directory.glob(f"{stem}_g*"):
+        if stale.name in current or stale.name.endswith(".tmp"):
+            continue
+        try:
+            stale.unlink()
+        except OSError:  # pragma: no cover - 其他进程仍在使用时保留
+            pass
+
+
+class VectorSnapshot:
+    """一份已映射到内存的快照，向量已归一化。"""
+
+    def __init__(self, vector_path: Path, sidecar_path: Path) -> None:
+        self.vector_path = vector_path
+        self.sidecar_path = sidecar_path
+        sidecar = json.loads(sidecar_path.read_text(encoding="utf-8"))
+        self.ids: List[str] = sidecar["ids"]
+        self.dim: int = sidecar["dim"]
+        self.generation: int = sidecar["generation"]
+        expected = len(self.ids) * self.dim * 4
+        self._file = open(vector_path, "rb")
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            if size != expected:
+                raise ValueError(f"快照大小不符: expected={expected} actual={size}")
+            # 空文件无法映射，没有向量时不建立映射
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if expected else None
+        except Exception:
+            self._file.close()
+            raise
+        if self._mmap is None:
+            self._matrix = None
+        elif np is not None:
+            self._matrix = np.frombuffer(self._mmap, dtype=np.float32).reshape(len(self.ids), self.dim)
+        else:
+            self._matrix = memoryview(self._mmap).cast("f")
+
+    def nearest(
+        self,
+        query: Sequence[float],
+        top_k: int,
+        allowed: Optional[Collection[str]] = None,
+    ) -> List[Tuple[str, float]]:
+        """返回余弦距离最小的 top_k 条 (记录 ID, 距离)；``allowed`` 不为空时只在这些 ID 中挑选。"""
+        if self._matrix is None or top_k <= 0 or len(query) != self.dim:
+            return []
+        query_norm = math.sqrt(sum(value * value for value in query))
+        if np is not None:
+            candidates = np.arange(len(self.ids))
+            if allowed is not None:
+                candidates = candidates[np.fromiter((record_id in allowed for record_id in self.ids), dtype=bool, count=len(self.ids))]
+            if not len(candidates):
+                return []
+            if query_norm == 0:
+                similarity = np.zeros(len(candidates), dtype=np.float32)
+            else:
+                similarity = self._matrix[candidates] @ (np.asarray(query, dtype=np.float32) / query_norm)
+            k = min(top_k, len(candidates))
+            best = np.argpartition(-similarity, k - 1)[:k]
+            best = best[np.argsort(-similarity[best], kind="stable")]
+            return [(self.ids[candidates[index]], 1.0 - float(similarity[index])) for index in best]
+
+        unit = [value / query_norm for value in query] if query_norm else [0.0] * self.dim
+        scored = []
+        for row, record_id in enumerate(self.ids):
+            if allowed is not None and record_id not in allowed:
+                continue
+            start = row * self.dim
+            similarity = sum(a * b for a, b in zip(self._matrix[start:start + self.dim], unit))
+            scored.append((1.0 - similarity, record_id))
+        return [(record_id, distance) for distance, record_id in heapq.nsmallest(top_k, scored)]
+
+    def close(self) -> None:
+        # 视图仍引用映射时关闭会报错，先释放视图
+        matrix, self._matrix = self._matrix, None
+        if isinstance(matrix, memoryview):
+            matrix.release()
+        del matrix
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:  # pragma: no cover - 仍有查询持有视图时交给垃圾回收
+                pass
+        self._file.close()
+
+
+def nearest_in_snapshot(
+    vector_path: str,
+    sidecar_path: str,
+    query: Sequence[float],
+    top_k: int,
+    allowed: Optional[Collection[str]] = None,
+) -> List[Tuple[str, float]]:
+    """在 CPU 卸载进程池中调用：子进程自行映射快照文件后计算最近邻，映射页与主进程共用页缓存。"""
+    snapshot = VectorSnapshot(Path(vector_path), Path(sidecar_path))
+    try:
+        return snapshot.nearest(query, top_k, allowed)
+    finally:
+        snapshot.close()
+
+
+class VectorSnapshotStore:
+    """快照目录与已映射快照的 LRU 缓存（以表、项目、维度为键）。"""
+
+    def __init__(self, directory: Path, *, max_open: int = _MAX_OPEN_SNAPSHOTS) -> None:
+        self.directory = directory
+        self._max_open = max_open
+        self._open: "OrderedDict[Tuple[str, str, int], VectorSnapshot]" = OrderedDict()
+
+    def get(self, table: str, project_id: str, dim: int, generation: int) -> Optional[VectorSnapshot]:
+        """返回与当前代数一致的快照：先查已映射的缓存，再查磁盘；都没有时返回 None。"""
+        key = (table, project_id, dim)
+        snapshot = self._open.get(key)
+        if snapshot is not None:
+            if snapshot.generation == generation:
+                self._open.move_to_end(key)
+                return snapshot
+            self._open.pop(key).close()
+
+        vector_path, sidecar_path = _snapshot_paths(self.directory, snapshot_stem(table, project_id, dim), generation)
+        if not vector_path.exists() or not sidecar_path.exists():
+            return None
+        try:
+            snapshot = VectorSnapshot(vector_path, sidecar_path)
+        except (OSError, ValueError, KeyError) as exc:
+            logger.warning("读取向量快照失败，将重新生成: %s error=%s", vector_path.name, exc)
+            return None
+        self._open[key] = snapshot
+        while len(self._open) > self._max_open:
+            _, evicted = self._open.popitem(last=False)
+            evicted.close()
+        return snapshot
+
+    def discard(self, project_id: str) -> None:
+        """关闭并删除项目的全部快照，删除项目时调用。"""
+        for key in [key for key in self._open if key[1] == project_id]:
+            self._open.pop(key).close()
+        for path in self.directory.glob(f"*_{_project_digest(project_id)}_d*"):
+            try:
+                path.unlink()
+            except OSError:  # pragma: no cover - 删除失败仅记录
+                logger.debug("删除向量快照失败: %s", path.name)
+
+    def close_all(self) -> None:
+        while self._open:
+            _, snapshot = self._open.popitem()
+            snapshot.close()
+
+
+__all__ = [
+    "VECTORIZED",
+    "VectorSnapshot",
+    "VectorSnapshotStore",
+    "nearest_in_snapshot",
+    "snapshot_stem",
+    "write_snapshot",
+]
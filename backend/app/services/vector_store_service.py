@@ -3,18 +3,37 @@ from __future__ import annotations
 """
 基于 libsql 的向量检索服务，封装章节内容的存储与查询。
 
+除向量相似度外，剧情片段与章节摘要还各自维护一张 FTS5 全文索引（中文按二元组切词），
+查询时两路结果按倒数排名融合，弥补嵌入模型对人名、地名、法宝名等专有名词匹配不佳的问题。
+
+本地文件向量库可开启分片（VECTOR_SHARD_MODE）：每个项目或每个哈希桶使用独立的 libsql 文件，
+按需打开并以 LRU 缓存句柄，各分片独立建表；按项目分片时删除项目只需删除对应文件。
+
+在应用层计算相似度时（libsql 不支持向量函数），按项目把向量持久化为 mmap 快照，
+以 rag_generations 表中的写入代数判定是否过期，重启后无需逐行解码 BLOB（见 vector_snapshots）。
+
 本文件中的注释均使用中文，便于团队成员快速理解 RAG 相关逻辑。
 """
 
+import asyncio
+import functools
+import hashlib
 import json
 import logging
 import math
+import re
 from array import array
-from dataclasses import dataclass
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, replace
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Sequence
+from typing import Any, AsyncContextManager, AsyncIterator, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple, TypeVar
 
 from ..core.config import settings
+from ..core.cpu_executor import run_cpu_bound
+from ..core.metrics import metrics_registry, timed
+from ..utils.hybrid_search import build_match_query, lexical_terms, project_token, reciprocal_rank_fusion, scoped_match_query
+from .vector_snapshots import VECTORIZED, VectorSnapshotStore, nearest_in_snapshot, snapshot_stem, write_snapshot
 
 try:  # noqa: SIM105 - 明确区分依赖缺失的情况
     import libsql_client
@@ -23,6 +42,12 @@ except ImportError:  # pragma: no cover - 在未安装依赖时提供友好提
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+VECTOR_STORE_DURATION = metrics_registry.histogram(
+    "vector_store_operation_duration_seconds", "向量库读写操作耗时（含应用层相似度回退）", ("operation",)
+)
+
 
 @dataclass
 class RetrievedChunk:
@@ -33,6 +58,8 @@ class RetrievedChunk:
     chapter_title: Optional[str]
     score: float
     metadata: Dict[str, Any]
+    chunk_index: int = 0
+    embedding: Optional[List[float]] = None
 
 
 @dataclass
@@ -45,10 +72,293 @@ class RetrievedSummary:
     score: float
 
 
+@dataclass(frozen=True)
+class RetrievalFilter:
+    """检索过滤条件，全部下推到 SQL 的 WHERE 子句。
+
+    章节范围命中 (project_id, chapter_number) 复合索引，只扫描窗口内的行；
+    角色标签匹配片段 metadata 中的 ``characters`` 列表（任一命中即可），只作用于剧情片段。
+    ``embedding_model`` 与 ``embedding_dim`` 由检索方法按查询向量自动填充：只比较同一嵌入模型生成的向量，
+    未记录模型的历史数据按向量维度匹配。
+    """
+
+    min_chapter: Optional[int] = None
+    max_chapter: Optional[int] = None
+    exclude_chapters: Tuple[int, ...] = ()
+    characters: Tuple[str, ...] = ()
+    embedding_model: Optional[str] = None
+    embedding_dim: Optional[int] = None
+
+    def for_embedding(self, embedding_model: Optional[str], embedding_dim: int) -> "RetrievalFilter":
+        return replace(self, embedding_model=embedding_model, embedding_dim=embedding_dim)
+
+    def to_sql(self, table: str, *, with_characters: bool = True) -> Tuple[str, Dict[str, Any]]:
+        """返回追加在 ``WHERE project_id = :project_id`` 之后的条件片段与对应参数。"""
+        clauses: List[str] = []
+        params: Dict[str, Any] = {}
+        if self.min_chapter is not None:
+            clauses.append(f"{table}.chapter_number >= :filter_min_chapter")
+            params["filter_min_chapter"] = self.min_chapter
+        if self.max_chapter is not None:
+            clauses.append(f"{table}.chapter_number <= :filter_max_chapter")
+            params["filter_max_chapter"] = self.max_chapter
+        if self.exclude_chapters:
+            names = [f"filter_exclude_{idx}" for idx in range(len(self.exclude_chapters))]
+            clauses.append(f"{table}.chapter_number NOT IN ({','.join(':' + name for name in names)})")
+            params.update(zip(names, self.exclude_chapters))
+        if with_characters and self.characters:
+            names = [f"filter_character_{idx}" for idx in range(len(self.characters))]
+            clauses.append(
+                f"EXISTS (SELECT 1 FROM json_each({table}.metadata, '$.characters') AS tag "
+                f"WHERE tag.value IN ({','.join(':' + name for name in names)}))"
+            )
+            params.update(zip(names, self.characters))
+        if self.embedding_dim is not None:
+            dimension_clause = f"length({table}.embedding) = :filter_embedding_bytes"
+            params["filter_embedding_bytes"] = self.embedding_dim * 4
+            if self.embedding_model is not None:
+                clauses.append(
+                    f"({table}.embedding_model = :filter_embedding_model "
+                    f"OR ({table}.embedding_model IS NULL AND {dimension_clause}))"
+                )
+                params["filter_embedding_model"] = self.embedding_model
+            else:
+                clauses.append(dimension_clause)
+        return "".join(f"\n          AND {clause}" for clause in clauses), params
+
+
+@dataclass
+class ChapterVectorUsage:
+    """某项目某章节在向量库中的行数与负载字节数（正文、向量与元数据长度之和，不含索引开销）。"""
+
+    project_id: str
+    chapter_number: int
+    chunks: int = 0
+    summaries: int = 0
+    payload_bytes: int = 0
+
+
+@dataclass
+class CompactionResult:
+    """压缩前后数据库文件的大小（page_count × page_size，分片模式下为全部分片之和）。"""
+
+    size_before: int = 0
+    size_after: int = 0
+    files: int = 0
+
+    @property
+    def reclaimed_bytes(self) -> int:
+        return max(0, self.size_before - self.size_after)
+
+
+_DELETE_BATCH_SIZE = 500
+# 支持重新嵌入的表及其参与嵌入的文本列（与入库时生成向量所用的文本一致）
+_EMBEDDING_TEXT_COLUMNS = {"rag_chunks": "content", "rag_summaries": "summary"}
+_SAFE_SHARD_NAME = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+# 进程内已完成建表与列迁移的向量库地址（单库或分片文件）→ 全文索引是否可用；
+# 服务实例按请求创建，只有首个实例执行 DDL 与 PRAGMA 检查，其余实例直接复用结果
+_ready_schemas: Dict[str, bool] = {}
+
+
+class _ShardPool:
+    """分片文件到 VectorStoreService 实例的 LRU 缓存。
+
+    句柄在首次访问时打开，超出上限时关闭最久未使用且当前无人借用的分片；
+    正在被借用的分片不会被关闭，因此打开数量可能短暂超过上限。
+    """
+
+    def __init__(self, directory: Path, *, mode: str, buckets: int, max_open: int) -> None:
+        self.directory = directory
+        self.mode = mode
+        self._buckets = buckets
+        self._max_open = max_open
+        self._open: "OrderedDict[Path, VectorStoreService]" = OrderedDict()
+        self._leases: Dict[Path, int] = {}
+        self._lock = asyncio.Lock()
+
+    def shard_path(self, project_id: str) -> Path:
+        if self.mode == "project":
+            name = project_id if _SAFE_SHARD_NAME.match(project_id) else hashlib.sha1(project_id.encode("utf-8")).hexdigest()
+            return self.directory / f"project_{name}.db"
+        bucket = int(hashlib.sha1(project_id.encode("utf-8")).hexdigest()[:8], 16) % self._buckets
+        return self.directory / f"bucket_{bucket:03d}.db"
+
+    def shard_paths(self) -> List[Path]:
+        """列出目录中已存在的全部分片文件，供巡检与压缩逐个处理。"""
+        return sorted(self.directory.glob("*.db"))
+
+    def lease(self, project_id: str, *, create: bool) -> AsyncContextManager[Optional["VectorStoreService"]]:
+        """借用项目所在分片；create 为假且分片文件不存在时返回 None，避免只读查询创建空文件。"""
+        return self.lease_path(self.shard_path(project_id), create=create)
+
+    @asynccontextmanager
+    async def lease_path(self, path: Path, *, create: bool) -> AsyncIterator[Optional["VectorStoreService"]]:
+        async with self._lock:
+            store = self._open.get(path)
+            if store is None:
+                if not create and not path.exists():
+                    store = None
+                else:
+                    store = VectorStoreService(url=f"file:{path}")
+                    self._open[path] = store
+                    logger.debug("已打开向量库分片: %s (open=%d)", path.name, len(self._open))
+            if store is not None:
+                self._open.move_to_end(path)
+                self._leases[path] = self._leases.get(path, 0) + 1
+                await self._evict()
+        try:
+            yield store
+        finally:
+            if store is not None:
+                self._leases[path] -= 1
+
+    async def _evict(self) -> None:
+        while len(self._open) > self._max_open:
+            victim = next((path for path in self._open if not self._leases.get(path)), None)
+            if victim is None:
+                return
+            store = self._open.pop(victim)
+            self._leases.pop(victim, None)
+            await store.close()
+            logger.debug("已关闭最久未使用的向量库分片: %s", victim.name)
+
+    async def drop(self, project_id: str) -> bool:
+        """删除项目独占的分片文件（含 WAL/SHM/journal），返回是否删除了文件；仅 project 模式可用。"""
+        if self.mode != "project":
+            return False
+        path = self.shard_path(project_id)
+        async with self._lock:
+            if self._leases.get(path):
+                logger.warning("向量库分片仍在使用，暂不删除: %s", path.name)
+                return False
+            store = self._open.pop(path, None)
+            self._leases.pop(path, None)
+            if store is not None:
+                await store.close()
+            _ready_schemas.pop(f"file:{path}", None)
+            removed = False
+            for suffix in ("", "-wal", "-shm", "-journal"):
+                candidate = path.with_name(path.name + suffix)
+                if candidate.exists():
+                    candidate.unlink()
+                    removed = True
+        return removed
+
+    async def close_all(self) -> None:
+        async with self._lock:
+            stores = list(self._open.values())
+            self._open.clear()
+            self._leases.clear()
+        for store in stores:
+            await store.close()
+
+
+_shard_pool: Optional[_ShardPool] = None
+
+
+def _get_shard_pool() -> Optional[_ShardPool]:
+    """按配置创建进程级的分片池；未开启分片或向量库不是本地文件时返回 None。"""
+    global _shard_pool
+    if settings.vector_shard_mode == "none" or not settings.vector_store_enabled:
+        return None
+    url = settings.vector_db_url or ""
+    if not url.startswith("file:"):
+        logger.warning("向量库分片仅支持 file: 地址，当前地址将按单库使用: %s", url)
+        return None
+    if _shard_pool is None:
+        base = Path(url.split("file:", 1)[1]).expanduser().resolve()
+        directory = base.with_name(f"{base.stem}_shards")
+        directory.mkdir(parents=True, exist_ok=True)
+        _shard_pool = _ShardPool(
+            directory,
+            mode=settings.vector_shard_mode,
+            buckets=settings.vector_shard_buckets,
+            max_open=settings.vector_shard_max_open,
+        )
+        logger.info("向量库分片已启用: mode=%s dir=%s", settings.vector_shard_mode, directory)
+    return _shard_pool
+
+
+_snapshot_store: Optional[VectorSnapshotStore] = None
+
+
+def _get_snapshot_store() -> Optional[VectorSnapshotStore]:
+    """按配置创建进程级的向量快照目录；未开启或向量库不是本地文件时返回 None。"""
+    global _snapshot_store
+    url = settings.vector_db_url or ""
+    if not settings.vector_snapshots_enabled or not url.startswith("file:"):
+        return None
+    if _snapshot_store is None:
+        base = Path(url.split("file:", 1)[1]).expanduser().resolve()
+        _snapshot_store = VectorSnapshotStore(base.with_name(f"{base.stem}_snapshots"))
+        logger.info("向量快照目录: %s", _snapshot_store.directory)
+    return _snapshot_store
+
+
+async def close_vector_shards() -> None:
+    """应用关闭时关闭所有已打开的分片句柄与已映射的向量快照。"""
+    if _shard_pool is not None:
+        await _shard_pool.close_all()
+    if _snapshot_store is not None:
+        _snapshot_store.close_all()
+
+
+async def backfill_vector_terms() -> None:
+    """应用启动时为历史记录补建一次全文索引；失败只记录日志，不阻止服务启动。"""
+    if not settings.vector_store_enabled:
+        return
+    try:
+        await VectorStoreService().backfill_terms()
+    except Exception as exc:  # pragma: no cover - 补建失败不影响向量检索
+        logger.warning("启动时补建全文索引失败: %s", exc)
+
+
+def _sharded(empty: Optional[Callable[[], Any]] = None) -> Callable[[Callable[..., Awaitable[Any]]], Callable[..., Awaitable[Any]]]:
+    """分片模式下把调用转发到项目所在分片实例上执行同一方法（不重复计时）。
+
+    写入按记录的 project_id 分组后逐个分片执行；``empty`` 不为空表示只读操作，
+    分片文件尚不存在时直接返回 ``empty()``，不创建新文件。
+    """
+
+    def decorator(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        @functools.wraps(func)
+        async def wrapper(self: "VectorStoreService", *args: Any, **kwargs: Any) -> Any:
+            if self._shards is None:
+                return await func(self, *args, **kwargs)
+            if "records" in kwargs:
+                groups: Dict[str, List[Dict[str, Any]]] = {}
+                for record in kwargs.pop("records"):
+                    groups.setdefault(record.get("project_id"), []).append(record)
+                for project_id, records in groups.items():
+                    async with self._shards.lease(project_id, create=True) as shard:
+                        await func(shard, *args, records=records, **kwargs)
+                return None
+            project_id = kwargs["project_id"] if "project_id" in kwargs else args[0]
+            async with self._shards.lease(project_id, create=empty is None) as shard:
+                if shard is None:
+                    return empty() if empty is not None else None
+                return await func(shard, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
 class VectorStoreService:
     """libsql 向量库操作工具，确保不同小说项目的数据隔离。"""
 
-    def __init__(self) -> None:
+    def __init__(self, url: Optional[str] = None) -> None:
+        """``url`` 为空时按配置连接；开启分片时本实例只负责路由，分片实例由分片池以具体文件地址创建。"""
+        self._fts_ready = False
+        self._url: Optional[str] = None
+        self._shards: Optional[_ShardPool] = None
+        if url is None and settings.vector_store_enabled:
+            self._shards = _get_shard_pool()
+            if self._shards is not None:
+                self._client = None
+                self._schema_ready = True
+                return
+
         if not settings.vector_store_enabled:
             logger.warning("未开启向量库配置，RAG 检索将被跳过。")
             self._client = None
@@ -58,13 +368,14 @@ class VectorStoreService:
         if libsql_client is None:  # pragma: no cover - 运行环境缺少依赖
             raise RuntimeError("缺少 libsql-client 依赖，请先在环境中安装。")
 
-        url = settings.vector_db_url
+        url = url or settings.vector_db_url
         if url and url.startswith("file:"):
             path_part = url.split("file:", 1)[1]
             resolved = Path(path_part).expanduser().resolve()
             resolved.parent.mkdir(parents=True, exist_ok=True)
             url = f"file:{resolved}"
             logger.info("向量库使用本地文件: %s", resolved)
+        self._url = url
 
         try:
             logger.info("初始化 libsql 客户端: url=%s", url)
@@ -81,11 +392,17 @@ class VectorStoreService:
             logger.info("libsql 客户端初始化成功，等待建表。")
 
     async def ensure_schema(self) -> None:
-        """初始化向量表结构，保证系统首次运行即可使用。"""
+        """初始化向量表结构，保证系统首次运行即可使用；同一地址在进程内只检查一次。"""
         if not self._client or self._schema_ready:
             return
+        if self._url in _ready_schemas:
+            self._fts_ready = _ready_schemas[self._url]
+            self._schema_ready = True
+            return
 
         statements = [
+            # 只对尚未建表的新库生效；已有库在下一次 VACUUM 后切换为增量回收模式
+            "PRAGMA auto_vacuum = INCREMENTAL",
             """
             CREATE TABLE IF NOT EXISTS rag_chunks (
                 id TEXT PRIMARY KEY,
@@ -96,6 +413,8 @@ class VectorStoreService:
                 content TEXT NOT NULL,
                 embedding BLOB NOT NULL,
                 metadata TEXT,
+                embedding_model TEXT,
+                embedding_dim INTEGER,
                 created_at INTEGER DEFAULT (unixepoch())
             )
             """,
@@ -111,6 +430,8 @@ class VectorStoreService:
                 title TEXT NOT NULL,
                 summary TEXT NOT NULL,
                 embedding BLOB NOT NULL,
+                embedding_model TEXT,
+                embedding_dim INTEGER,
                 created_at INTEGER DEFAULT (unixepoch())
             )
             """,
@@ -118,25 +439,127 @@ class VectorStoreService:
             CREATE INDEX IF NOT EXISTS idx_rag_summaries_project
             ON rag_summaries(project_id, chapter_number)
             """,
+            # 项目写入代数：片段或摘要的任何写入都会递增，用于判定向量快照是否过期
+            """
+            CREATE TABLE IF NOT EXISTS rag_generations (
+                project_id TEXT PRIMARY KEY,
+                generation INTEGER NOT NULL DEFAULT 0
+            )
+            """,
         ]
 
         try:
             for sql in statements:
                 await self._client.execute(sql)  # type: ignore[union-attr]
+            await self._ensure_model_columns()
             logger.info("已确保向量库表结构存在。")
         except Exception as exc:  # pragma: no cover - 初始化失败时记录日志
             logger.error("创建向量库表结构失败: %s", exc)
         else:
             self._schema_ready = True
+            await self._ensure_fts_schema()
+            if self._url:
+                _ready_schemas[self._url] = self._fts_ready
 
+    async def _ensure_model_columns(self) -> None:
+        """为旧版本创建的表补充嵌入模型与维度列；历史行保持 NULL，由重新嵌入任务迁移。
+
+        与建表语句一起受进程级的 ``_ready_schemas`` 保护，每个库地址只做一次 PRAGMA 检查。
+        """
+        for table in _EMBEDDING_TEXT_COLUMNS:
+            result = await self._client.execute(f"PRAGMA table_info({table})")  # type: ignore[union-attr]
+            columns = {row.get("name") for row in self._iter_rows(result)}
+            for column, column_type in (("embedding_model", "TEXT"), ("embedding_dim", "INTEGER")):
+                if column not in columns:
+                    await self._client.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")  # type: ignore[union-attr]
+                    logger.info("已为向量表补充列: table=%s column=%s", table, column)
+
+    async def _ensure_fts_schema(self) -> None:
+        """创建全文索引表；建表前已写入的数据由 ``backfill_terms`` 统一补建，不在请求路径上扫描。
+
+        FTS 表的 rowid 由记录 ID 哈希得到，不依赖主表 rowid（VACUUM 可能重排无整数主键表的 rowid），
+        record_id 列用于回连主表；运行环境的 SQLite 未编译 FTS5 时仅记录警告并退回纯向量检索。
+        """
+        statements = [
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS rag_chunks_fts
+            USING fts5(project_key, terms, record_id UNINDEXED, tokenize = 'unicode61')
+            """,
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS rag_summaries_fts
+            USING fts5(project_key, terms, record_id UNINDEXED, tokenize = 'unicode61')
+            """,
+        ]
+        try:
+            for sql in statements:
+                await self._client.execute(sql)  # type: ignore[union-attr]
+        except Exception as exc:  # pragma: no cover - 依赖 SQLite 编译选项
+            logger.warning("创建全文索引失败，检索将仅使用向量相似度: %s", exc)
+            return
+        self._fts_ready = True
+
+    async def backfill_terms(self) -> int:
+        """为全文索引建立之前写入的历史记录补建索引，返回补建行数；分片模式下逐个分片处理。"""
+        if self._shards is None:
+            return await self._backfill_terms()
+        total = 0
+        for path in self._shards.shard_paths():
+            async with self._shards.lease_path(path, create=False) as shard:
+                if shard is not None:
+                    total += await shard._backfill_terms()
+        return total
+
+    async def _backfill_terms(self) -> int:
+        if not self._client:
+            return 0
+
+        await self.ensure_schema()
+        if not self._fts_ready:
+            return 0
+        backfills = [
+            ("rag_chunks", "content"),
+            ("rag_summaries", "title || '\n' || summary"),
+        ]
+        total = 0
+        for table, text_expr in backfills:
+            sql = f"""
+            SELECT id, project_id, {text_expr} AS body
+            FROM {table}
+            WHERE id NOT IN (SELECT record_id FROM {table}_fts)
+            """
+            try:
+                result = await self._client.execute(sql)  # type: ignore[union-attr]
+                rows = self._iter_rows(result)
+                for row in rows:
+                    await self._index_terms(table, row.get("id"), row.get("project_id"), row.get("body"))
+            except Exception as exc:  # pragma: no cover - 补建失败不影响向量检索
+                logger.warning("补建全文索引失败: table=%s error=%s", table, exc)
+            else:
+                if rows:
+                    logger.info("已为 %d 条历史记录补建全文索引: table=%s", len(rows), table)
+                total += len(rows)
+        return total
+
+    @timed(VECTOR_STORE_DURATION, operation="query_chunks")
+    @_sharded(empty=list)
     async def query_chunks(
         self,
         *,
         project_id: str,
         embedding: Sequence[float],
         top_k: Optional[int] = None,
+        query_text: Optional[str] = None,
+        with_embeddings: bool = False,
+        filters: Optional[RetrievalFilter] = None,
+        embedding_model: Optional[str] = None,
     ) -> List[RetrievedChunk]:
-        """根据查询向量检索剧情片段，结果已按相似度排序。"""
+        """根据查询向量检索剧情片段，结果已按相关度排序。
+
+        提供 ``query_text`` 且启用混合检索时，向量与全文两路各取若干候选，按倒数排名融合后截取前 top_k 条；
+        返回条目的 score 始终是与查询向量的余弦距离。``with_embeddings`` 为真时一并返回片段向量，供重排使用；
+        ``filters`` 限定章节范围与角色标签，两路检索都在 SQL 中过滤。
+        ``embedding_model`` 为生成查询向量的模型标识，只与同一模型写入的片段比较（见 ``RetrievalFilter``）。
+        """
         if not self._client or not embedding:
             return []
 
@@ -144,17 +567,66 @@ class VectorStoreService:
         top_k = top_k or settings.vector_top_k_chunks
         if top_k <= 0:
             return []
+        filters = (filters or RetrievalFilter()).for_embedding(embedding_model, len(embedding))
+
+        match = self._match_query(query_text)
+        if match is None:
+            return await self._query_chunks_by_vector(
+                project_id=project_id,
+                embedding=embedding,
+                top_k=top_k,
+                with_embeddings=with_embeddings,
+                filters=filters,
+            )
 
+        depth = max(top_k, settings.vector_hybrid_candidates)
+        vector_hits = await self._query_chunks_by_vector(
+            project_id=project_id,
+            embedding=embedding,
+            top_k=depth,
+            with_embeddings=with_embeddings,
+            filters=filters,
+        )
+        lexical_hits = await self._query_by_terms(
+            "rag_chunks",
+            project_id=project_id,
+            match=match,
+            top_k=depth,
+            filters=filters,
+        )
+        return await self._fuse(
+            "rag_chunks",
+            vector_hits,
+            [(record_id, self._chunk_from_row(row)) for record_id, row in lexical_hits],
+            key=self._chunk_key,
+            embedding=embedding,
+            top_k=top_k,
+            with_embeddings=with_embeddings,
+        )
+
+    async def _query_chunks_by_vector(
+        self,
+        *,
+        project_id: str,
+        embedding: Sequence[float],
+        top_k: int,
+        with_embeddings: bool = False,
+        filters: Optional[RetrievalFilter] = None,
+    ) -> List[RetrievedChunk]:
         blob = self._to_f32_blob(embedding)
-        sql = """
+        embedding_column = "embedding," if with_embeddings else ""
+        where, filter_params = (filters or RetrievalFilter()).to_sql("rag_chunks")
+        sql = f"""
         SELECT
             content,
             chapter_number,
+            chunk_index,
             chapter_title,
-            COALESCE(metadata, '{}') AS metadata,
+            COALESCE(metadata, '{{}}') AS metadata,
+            {embedding_column}
             vector_distance_cosine(embedding, :query) AS distance
         FROM rag_chunks
-        WHERE project_id = :project_id
+        WHERE project_id = :project_id{where}
         ORDER BY distance ASC
         LIMIT :limit
         """
@@ -165,6 +637,7 @@ class VectorStoreService:
                     "project_id": project_id,
                     "query": blob,
                     "limit": top_k,
+                    **filter_params,
                 },
             )
         except Exception as exc:  # pragma: no cover - 查询异常时仅记录
@@ -174,31 +647,27 @@ class VectorStoreService:
                     project_id=project_id,
                     embedding=embedding,
                     top_k=top_k,
+                    with_embeddings=with_embeddings,
+                    filters=filters,
                 )
             logger.warning("向量检索剧情片段失败: %s", exc)
             return []
 
-        items: List[RetrievedChunk] = []
-        for row in self._iter_rows(result):
-            items.append(
-                RetrievedChunk(
-                    content=row.get("content", ""),
-                    chapter_number=row.get("chapter_number", 0),
-                    chapter_title=row.get("chapter_title"),
-                    score=row.get("distance", 0.0),
-                    metadata=self._parse_metadata(row.get("metadata")),
-                )
-            )
-        return items
+        return [self._chunk_from_row(row) for row in self._iter_rows(result)]
 
+    @timed(VECTOR_STORE_DURATION, operation="query_summaries")
+    @_sharded(empty=list)
     async def query_summaries(
         self,
         *,
         project_id: str,
         embedding: Sequence[float],
         top_k: Optional[int] = None,
+        query_text: Optional[str] = None,
+        filters: Optional[RetrievalFilter] = None,
+        embedding_model: Optional[str] = None,
     ) -> List[RetrievedSummary]:
-        """根据查询向量检索章节摘要列表。"""
+        """根据查询向量检索章节摘要列表，其余参数的用法与 ``query_chunks`` 相同（角色标签除外）。"""
         if not self._client or not embedding:
             return []
 
@@ -206,16 +675,58 @@ class VectorStoreService:
         top_k = top_k or settings.vector_top_k_summaries
         if top_k <= 0:
             return []
+        filters = (filters or RetrievalFilter()).for_embedding(embedding_model, len(embedding))
+
+        match = self._match_query(query_text)
+        if match is None:
+            return await self._query_summaries_by_vector(
+                project_id=project_id,
+                embedding=embedding,
+                top_k=top_k,
+                filters=filters,
+            )
 
+        depth = max(top_k, settings.vector_hybrid_candidates)
+        vector_hits = await self._query_summaries_by_vector(
+            project_id=project_id,
+            embedding=embedding,
+            top_k=depth,
+            filters=filters,
+        )
+        lexical_hits = await self._query_by_terms(
+            "rag_summaries",
+            project_id=project_id,
+            match=match,
+            top_k=depth,
+            filters=filters,
+        )
+        return await self._fuse(
+            "rag_summaries",
+            vector_hits,
+            [(record_id, self._summary_from_row(row)) for record_id, row in lexical_hits],
+            key=lambda summary: summary.chapter_number,
+            embedding=embedding,
+            top_k=top_k,
+        )
+
+    async def _query_summaries_by_vector(
+        self,
+        *,
+        project_id: str,
+        embedding: Sequence[float],
+        top_k: int,
+        filters: Optional[RetrievalFilter] = None,
+    ) -> List[RetrievedSummary]:
         blob = self._to_f32_blob(embedding)
-        sql = """
+        where, filter_params = (filters or RetrievalFilter()).to_sql("rag_summaries", with_characters=False)
+        sql = f"""
         SELECT
             chapter_number,
             title,
             summary,
             vector_distance_cosine(embedding, :query) AS distance
         FROM rag_summaries
-        WHERE project_id = :project_id
+        WHERE project_id = :project_id{where}
         ORDER BY distance ASC
         LIMIT :limit
         """
@@ -226,6 +737,7 @@ class VectorStoreService:
                     "project_id": project_id,
                     "query": blob,
                     "limit": top_k,
+                    **filter_params,
                 },
             )
         except Exception as exc:  # pragma: no cover - 查询异常时仅记录
@@ -235,28 +747,111 @@ class VectorStoreService:
                     project_id=project_id,
                     embedding=embedding,
                     top_k=top_k,
+                    filters=filters,
                 )
             logger.warning("向量检索章节摘要失败: %s", exc)
             return []
 
-        items: List[RetrievedSummary] = []
-        for row in self._iter_rows(result):
-            items.append(
-                RetrievedSummary(
-                    chapter_number=row.get("chapter_number", 0),
-                    title=row.get("title", ""),
-                    summary=row.get("summary", ""),
-                    score=row.get("distance", 0.0),
-                )
-            )
-        return items
+        return [self._summary_from_row(row) for row in self._iter_rows(result)]
+
+    def _match_query(self, query_text: Optional[str]) -> Optional[str]:
+        """返回全文检索的 MATCH 表达式；未启用混合检索或查询中没有可用检索词时返回 None。"""
+        if not query_text or not self._fts_ready or not settings.vector_hybrid_search:
+            return None
+        return build_match_query(query_text)
+
+    async def _query_by_terms(
+        self,
+        table: str,
+        *,
+        project_id: str,
+        match: str,
+        top_k: int,
+        filters: Optional[RetrievalFilter] = None,
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        """全文检索召回候选，按 BM25 排序（项目标记列权重为 0），返回 (记录 ID, 行数据)。"""
+        where, filter_params = (filters or RetrievalFilter()).to_sql("c", with_characters=table == "rag_chunks")
+        columns = {
+            "rag_chunks": "c.content, c.chapter_number, c.chunk_index, c.chapter_title, COALESCE(c.metadata, '{}') AS metadata",
+            "rag_summaries": "c.chapter_number, c.title, c.summary",
+        }[table]
+        sql = f"""
+        SELECT c.id AS id, {columns}
+        FROM {table}_fts
+        JOIN {table} AS c ON c.id = {table}_fts.record_id
+        WHERE {table}_fts MATCH :match
+          AND c.project_id = :project_id{where}
+        ORDER BY bm25({table}_fts, 0.0, 1.0)
+        LIMIT :limit
+        """
+        params = {
+            "match": scoped_match_query(project_id, match),
+            "project_id": project_id,
+            "limit": top_k,
+            **filter_params,
+        }
+        try:
+            result = await self._client.execute(sql, params)  # type: ignore[union-attr]
+        except Exception as exc:  # pragma: no cover - 全文检索失败时退回纯向量结果
+            logger.warning("全文检索失败: table=%s error=%s", table, exc)
+            return []
+        return [(row.get("id"), row) for row in self._iter_rows(result)]
+
+    async def _fuse(
+        self,
+        table: str,
+        vector_hits: List[T],
+        lexical_hits: List[Tuple[str, T]],
+        *,
+        key: Callable[[T], Hashable],
+        embedding: Sequence[float],
+        top_k: int,
+        with_embeddings: bool = False,
+    ) -> List[T]:
+        """倒数排名融合两路结果，并为仅由全文检索召回的条目补算余弦距离，保持 score 含义一致。"""
+        fused = reciprocal_rank_fusion(
+            [vector_hits, [item for _, item in lexical_hits]],
+            key=key,
+            k=settings.vector_rrf_k,
+        )[:top_k]
+        vector_keys = {key(item) for item in vector_hits}
+        lexical_ids = {key(item): record_id for record_id, item in lexical_hits}
+        missing = {lexical_ids[key(item)]: item for item, _ in fused if key(item) not in vector_keys}
+        if missing:
+            stored = await self._fetch_embeddings(table, list(missing))
+            for record_id, item in missing.items():
+                stored_embedding = self._from_f32_blob(stored.get(record_id))
+                item.score = self._cosine_distance(embedding, stored_embedding)  # type: ignore[attr-defined]
+                if with_embeddings:
+                    item.embedding = stored_embedding  # type: ignore[attr-defined]
+        logger.debug(
+            "混合检索融合完成: table=%s vector=%d lexical=%d lexical_only=%d",
+            table,
+            len(vector_hits),
+            len(lexical_hits),
+            len(missing),
+        )
+        return [item for item, _ in fused]
 
+    async def _fetch_embeddings(self, table: str, record_ids: Sequence[str]) -> Dict[str, Any]:
+        placeholders = ",".join(":id_" + str(idx) for idx in range(len(record_ids)))
+        params = {f"id_{idx}": record_id for idx, record_id in enumerate(record_ids)}
+        sql = f"SELECT id, embedding FROM {table} WHERE id IN ({placeholders})"
+        try:
+            result = await self._client.execute(sql, params)  # type: ignore[union-attr]
+        except Exception as exc:  # pragma: no cover - 读取失败时距离按最大值处理
+            logger.warning("读取候选向量失败: table=%s error=%s", table, exc)
+            return {}
+        return {row.get("id"): row.get("embedding") for row in self._iter_rows(result)}
+
+    @timed(VECTOR_STORE_DURATION, operation="upsert_chunks")
+    @_sharded()
     async def upsert_chunks(
         self,
         *,
         records: Iterable[Dict[str, Any]],
     ) -> None:
-        """批量写入章节片段，供后续检索使用。"""
+        """批量写入章节片段，供后续检索使用；记录中的 ``embedding_model`` 为生成向量的模型标识，维度按向量长度记录。"""
         if not self._client:
             return
 
@@ -270,7 +865,9 @@ class VectorStoreService:
             chapter_title,
             content,
             embedding,
-            metadata
+            metadata,
+            embedding_model,
+            embedding_dim
         ) VALUES (
             :id,
             :project_id,
@@ -279,13 +876,17 @@ class VectorStoreService:
             :chapter_title,
             :content,
             :embedding,
-            :metadata
+            :metadata,
+            :embedding_model,
+            :embedding_dim
         )
         ON CONFLICT(id) DO UPDATE SET
             content=excluded.content,
             embedding=excluded.embedding,
             metadata=excluded.metadata,
-            chapter_title=excluded.chapter_title
+            chapter_title=excluded.chapter_title,
+            embedding_model=excluded.embedding_model,
+            embedding_dim=excluded.embedding_dim
         """
         payload = []
         for item in records:
@@ -295,6 +896,8 @@ class VectorStoreService:
                     **item,
                     "embedding": self._to_f32_blob(embedding),
                     "metadata": json.dumps(item.get("metadata") or {}, ensure_ascii=False),
+                    "embedding_model": item.get("embedding_model"),
+                    "embedding_dim": len(embedding),
                 }
             )
 
@@ -307,13 +910,17 @@ class VectorStoreService:
             except Exception as exc:  # pragma: no cover - 单条写入失败时记录日志
                 logger.error("写入 rag_chunks 失败: %s", exc)
             else:
+                await self._index_terms("rag_chunks", item.get("id"), item.get("project_id"), item.get("content"))
                 logger.debug(
                     "已写入章节片段: project=%s chapter=%s chunk=%s",
                     item.get("project_id"),
                     item.get("chapter_number"),
                     item.get("chunk_index"),
                 )
+        await self._bump_generation(item.get("project_id") for item in payload)
 
+    @timed(VECTOR_STORE_DURATION, operation="upsert_summaries")
+    @_sharded()
     async def upsert_summaries(
         self,
         *,
@@ -331,19 +938,25 @@ class VectorStoreService:
             chapter_number,
             title,
             summary,
-            embedding
+            embedding,
+            embedding_model,
+            embedding_dim
         ) VALUES (
             :id,
             :project_id,
             :chapter_number,
             :title,
             :summary,
-            :embedding
+            :embedding,
+            :embedding_model,
+            :embedding_dim
         )
         ON CONFLICT(id) DO UPDATE SET
             summary=excluded.summary,
             embedding=excluded.embedding,
-            title=excluded.title
+            title=excluded.title,
+            embedding_model=excluded.embedding_model,
+            embedding_dim=excluded.embedding_dim
         """
 
         payload = []
@@ -353,6 +966,8 @@ class VectorStoreService:
                 {
                     **item,
                     "embedding": self._to_f32_blob(embedding),
+                    "embedding_model": item.get("embedding_model"),
+                    "embedding_dim": len(embedding),
                 }
             )
 
@@ -365,12 +980,21 @@ class VectorStoreService:
             except Exception as exc:  # pragma: no cover - 单条写入失败时记录日志
                 logger.error("写入 rag_summaries 失败: %s", exc)
             else:
+                await self._index_terms(
+                    "rag_summaries",
+                    item.get("id"),
+                    item.get("project_id"),
+                    f"{item.get('title') or ''}\n{item.get('summary') or ''}",
+                )
                 logger.debug(
                     "已写入章节摘要: project=%s chapter=%s",
                     item.get("project_id"),
                     item.get("chapter_number"),
                 )
+        await self._bump_generation(item.get("project_id") for item in payload)
 
+    @timed(VECTOR_STORE_DURATION, operation="delete_by_chapters")
+    @_sharded(empty=lambda: None)
     async def delete_by_chapters(self, project_id: str, chapter_numbers: Sequence[int]) -> None:
         """根据章节编号批量删除对应的上下文数据。"""
         if not self._client or not chapter_numbers:
@@ -393,8 +1017,19 @@ class VectorStoreService:
           AND chapter_number IN ({placeholders})
         """
         try:
+            if self._fts_ready:
+                # 全文索引的 rowid 由记录 ID 计算，先取出待删记录的 ID 再按 rowid 删除
+                for table in ("rag_chunks", "rag_summaries"):
+                    id_sql = f"""
+                    SELECT id FROM {table}
+                    WHERE project_id = :project_id
+                      AND chapter_number IN ({placeholders})
+                    """
+                    result = await self._client.execute(id_sql, params)  # type: ignore[union-attr]
+                    await self._delete_terms(table, [row.get("id") for row in self._iter_rows(result)])
             await self._client.execute(chunk_sql, params)  # type: ignore[union-attr]
             await self._client.execute(summary_sql, params)  # type: ignore[union-attr]
+            await self._bump_generation([project_id])
             logger.info(
                 "已删除章节向量: project=%s chapters=%s",
                 project_id,
@@ -403,6 +1038,335 @@ class VectorStoreService:
         except Exception as exc:  # pragma: no cover - 删除失败时记录日志
             logger.error("删除章节向量失败: project=%s chapters=%s error=%s", project_id, chapter_numbers, exc)
 
+    async def _bump_generation(self, project_ids: Iterable[Optional[str]]) -> None:
+        """递增项目写入代数，使该项目已有的向量快照失效。"""
+        for project_id in {project_id for project_id in project_ids if project_id}:
+            try:
+                await self._client.execute(  # type: ignore[union-attr]
+                    """
+                    INSERT INTO rag_generations (project_id, generation) VALUES (:project_id, 1)
+                    ON CONFLICT(project_id) DO UPDATE SET generation = generation + 1
+                    """,
+                    {"project_id": project_id},
+                )
+            except Exception as exc:  # pragma: no cover - 失败时快照可能滞后一次写入
+                logger.warning("递增项目写入代数失败: project=%s error=%s", project_id, exc)
+
+    @_sharded(empty=lambda: 0)
+    async def generation(self, project_id: str) -> int:
+        """返回项目的写入代数，片段或摘要每次写入、删除都会递增；可作为检索结果缓存的失效依据。"""
+        if not self._client:
+            return 0
+
+        await self.ensure_schema()
+        return await self._generation(project_id)
+
+    async def _generation(self, project_id: str) -> int:
+        result = await self._client.execute(  # type: ignore[union-attr]
+            "SELECT generation FROM rag_generations WHERE project_id = :project_id",
+            {"project_id": project_id},
+        )
+        row = next(iter(self._iter_rows(result)), None)
+        return int(row.get("generation") or 0) if row else 0
+
+    async def _index_terms(self, table: str, record_id: Optional[str], project_id: Optional[str], text: Optional[str]) -> None:
+        """写入或替换一条记录的全文索引；索引失败只影响全文召回，不影响向量数据。"""
+        if not self._fts_ready or not record_id or not project_id:
+            return
+        rowid = self._fts_rowid(record_id)
+        try:
+            await self._client.execute(  # type: ignore[union-attr]
+                f"DELETE FROM {table}_fts WHERE rowid = :rowid",
+                {"rowid": rowid},
+            )
+            await self._client.execute(  # type: ignore[union-attr]
+                f"""
+                INSERT INTO {table}_fts (rowid, project_key, terms, record_id)
+                VALUES (:rowid, :project_key, :terms, :record_id)
+                """,
+                {
+                    "rowid": rowid,
+                    "project_key": project_token(project_id),
+                    "terms": lexical_terms(text),
+                    "record_id": record_id,
+                },
+            )
+        except Exception as exc:  # pragma: no cover - 索引失败时记录日志
+            logger.warning("写入全文索引失败: table=%s id=%s error=%s", table, record_id, exc)
+
+    async def _delete_terms(self, table: str, record_ids: Sequence[str]) -> None:
+        if not record_ids:
+            return
+        placeholders = ",".join(":rowid_" + str(idx) for idx in range(len(record_ids)))
+        params = {f"rowid_{idx}": self._fts_rowid(record_id) for idx, record_id in enumerate(record_ids)}
+        await self._client.execute(  # type: ignore[union-attr]
+            f"DELETE FROM {table}_fts WHERE rowid IN ({placeholders})",
+            params,
+        )
+
+    @staticmethod
+    def _fts_rowid(record_id: str) -> int:
+        """由记录 ID 派生稳定的 64 位 rowid，便于按 ID 直接定位全文索引行。"""
+        digest = hashlib.blake2b(record_id.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big", signed=True)
+
+    def _chunk_from_row(self, row: Dict[str, Any]) -> RetrievedChunk:
+        return RetrievedChunk(
+            content=row.get("content", ""),
+            chapter_number=row.get("chapter_number", 0),
+            chapter_title=row.get("chapter_title"),
+            score=row.get("distance", 0.0),
+            metadata=self._parse_metadata(row.get("metadata")),
+            chunk_index=row.get("chunk_index", 0),
+            embedding=self._from_f32_blob(row["embedding"]) if row.get("embedding") else None,
+        )
+
+    @staticmethod
+    def _summary_from_row(row: Dict[str, Any]) -> RetrievedSummary:
+        return RetrievedSummary(
+            chapter_number=row.get("chapter_number", 0),
+            title=row.get("title", ""),
+            summary=row.get("summary", ""),
+            score=row.get("distance", 0.0),
+        )
+
+    @staticmethod
+    def _chunk_key(chunk: RetrievedChunk) -> Hashable:
+        return (chunk.chapter_number, chunk.content)
+
+    @timed(VECTOR_STORE_DURATION, operation="delete_project")
+    async def delete_project(self, project_id: str) -> None:
+        """删除项目的全部片段、摘要、全文索引与向量快照；按项目分片时直接删除分片文件。"""
+        snapshots = _get_snapshot_store()
+        if snapshots is not None:
+            snapshots.discard(project_id)
+        if self._shards is not None and await self._shards.drop(project_id):
+            logger.info("已删除项目向量分片文件: project=%s", project_id)
+            return
+        await self._delete_project_rows(project_id)
+
+    @_sharded(empty=lambda: None)
+    async def _delete_project_rows(self, project_id: str) -> None:
+        if not self._client:
+            return
+
+        await self.ensure_schema()
+        # 分批删除，避免大项目的单条 DELETE 长时间持有写锁
+        statements = [
+            (
+                "DELETE FROM rag_chunks WHERE rowid IN "
+                "(SELECT rowid FROM rag_chunks WHERE project_id = :project_id LIMIT :limit)"
+            ),
+            (
+                "DELETE FROM rag_summaries WHERE rowid IN "
+                "(SELECT rowid FROM rag_summaries WHERE project_id = :project_id LIMIT :limit)"
+            ),
+        ]
+        params: Dict[str, Any] = {"project_id": project_id, "limit": _DELETE_BATCH_SIZE}
+        if self._fts_ready:
+            statements[:0] = [
+                (
+                    f"DELETE FROM {table}_fts WHERE rowid IN "
+                    f"(SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH :match LIMIT :limit)"
+                )
+                for table in ("rag_chunks", "rag_summaries")
+            ]
+            params["match"] = f"project_key:{project_token(project_id)}"
+        try:
+            for sql in statements:
+                while True:
+                    result = await self._client.execute(sql, params)  # type: ignore[union-attr]
+                    if getattr(result, "rows_affected", 0) < _DELETE_BATCH_SIZE:
+                        break
+                    await asyncio.sleep(0)
+            await self._bump_generation([project_id])
+            logger.info("已删除项目向量: project=%s", project_id)
+        except Exception as exc:  # pragma: no cover - 删除失败时记录日志
+            logger.error("删除项目向量失败: project=%s error=%s", project_id, exc)
+
+    async def inventory(self) -> List[ChapterVectorUsage]:
+        """按项目与章节统计向量库中的行数与负载字节数，分片模式下汇总全部分片。"""
+        if self._shards is None:
+            return await self._inventory()
+        usage: List[ChapterVectorUsage] = []
+        for path in self._shards.shard_paths():
+            async with self._shards.lease_path(path, create=False) as shard:
+                if shard is not None:
+                    usage.extend(await shard._inventory())
+        return usage
+
+    async def _inventory(self) -> List[ChapterVectorUsage]:
+        if not self._client:
+            return []
+
+        await self.ensure_schema()
+        queries = {
+            "chunks": """
+            SELECT project_id, chapter_number, COUNT(*) AS row_count,
+                   SUM(length(content) + length(embedding) + COALESCE(length(metadata), 0)) AS payload
+            FROM rag_chunks
+            GROUP BY project_id, chapter_number
+            """,
+            "summaries": """
+            SELECT project_id, chapter_number, COUNT(*) AS row_count,
+                   SUM(length(title) + length(summary) + length(embedding)) AS payload
+            FROM rag_summaries
+            GROUP BY project_id, chapter_number
+            """,
+        }
+        usage: Dict[Tuple[str, int], ChapterVectorUsage] = {}
+        for kind, sql in queries.items():
+            result = await self._client.execute(sql)  # type: ignore[union-attr]
+            for row in self._iter_rows(result):
+                key = (row.get("project_id"), row.get("chapter_number"))
+                item = usage.setdefault(key, ChapterVectorUsage(project_id=key[0], chapter_number=key[1]))
+                setattr(item, kind, getattr(item, kind) + (row.get("row_count") or 0))
+                item.payload_bytes += row.get("payload") or 0
+        return list(usage.values())
+
+    async def compact(self, *, full: bool = True) -> CompactionResult:
+        """整理全文索引并压缩数据库文件；full 为假时只做增量回收（需库处于 incremental auto_vacuum 模式）。"""
+        if self._shards is None:
+            return await self._compact(full=full)
+        total = CompactionResult()
+        for path in self._shards.shard_paths():
+            async with self._shards.lease_path(path, create=False) as shard:
+                if shard is None:
+                    continue
+                result = await shard._compact(full=full)
+                total.size_before += result.size_before
+                total.size_after += result.size_after
+                total.files += result.files
+        return total
+
+    async def _compact(self, *, full: bool) -> CompactionResult:
+        if not self._client:
+            return CompactionResult()
+
+        await self.ensure_schema()
+        before = await self._database_size()
+        if self._fts_ready:
+            for table in ("rag_chunks_fts", "rag_summaries_fts"):
+                await self._client.execute(f"INSERT INTO {table}({table}) VALUES ('optimize')")  # type: ignore[union-attr]
+        if full:
+            await self._client.execute("VACUUM")  # type: ignore[union-attr]
+        else:
+            await self._client.execute("PRAGMA incremental_vacuum")  # type: ignore[union-attr]
+        after = await self._database_size()
+        logger.info("向量库压缩完成: before=%d after=%d full=%s", before, after, full)
+        return CompactionResult(size_before=before, size_after=after, files=1)
+
+    async def _database_size(self) -> int:
+        page_count = await self._client.execute("PRAGMA page_count")  # type: ignore[union-attr]
+        page_size = await self._client.execute("PRAGMA page_size")  # type: ignore[union-attr]
+        return int(page_count.rows[0][0]) * int(page_size.rows[0][0])
+
+    async def embedding_backlog(self, embedding_model: str) -> Dict[str, int]:
+        """统计每个项目中不是由 ``embedding_model`` 生成（含未记录模型）的片段与摘要行数，分片模式下汇总全部分片。"""
+        if self._shards is None:
+            return await self._embedding_backlog(embedding_model)
+        backlog: Dict[str, int] = {}
+        for path in self._shards.shard_paths():
+            async with self._shards.lease_path(path, create=False) as shard:
+                if shard is None:
+                    continue
+                for project_id, count in (await shard._embedding_backlog(embedding_model)).items():
+                    backlog[project_id] = backlog.get(project_id, 0) + count
+        return backlog
+
+    async def _embedding_backlog(self, embedding_model: str) -> Dict[str, int]:
+        if not self._client:
+            return {}
+
+        await self.ensure_schema()
+        backlog: Dict[str, int] = {}
+        for table in _EMBEDDING_TEXT_COLUMNS:
+            sql = f"""
+            SELECT project_id, COUNT(*) AS row_count
+            FROM {table}
+            WHERE embedding_model IS NULL OR embedding_model != :embedding_model
+            GROUP BY project_id
+            """
+            result = await self._client.execute(sql, {"embedding_model": embedding_model})  # type: ignore[union-attr]
+            for row in self._iter_rows(result):
+                project_id = row.get("project_id")
+                backlog[project_id] = backlog.get(project_id, 0) + (row.get("row_count") or 0)
+        return backlog
+
+    @_sharded(empty=list)
+    async def stale_embeddings(
+        self,
+        table: str,
+        *,
+        project_id: str,
+        embedding_model: str,
+        after_id: str = "",
+        limit: int = 32,
+    ) -> List[Tuple[str, str]]:
+        """按 ID 顺序分页返回项目中需要重新嵌入的 (记录 ID, 文本)；``after_id`` 为上一页最后一条 ID。"""
+        if not self._client:
+            return []
+
+        if table not in _EMBEDDING_TEXT_COLUMNS:
+            raise ValueError(f"不支持的向量表: {table}")
+        await self.ensure_schema()
+        text_column = _EMBEDDING_TEXT_COLUMNS[table]
+        sql = f"""
+        SELECT id, {text_column} AS body
+        FROM {table}
+        WHERE project_id = :project_id
+          AND (embedding_model IS NULL OR embedding_model != :embedding_model)
+          AND id > :after_id
+        ORDER BY id
+        LIMIT :limit
+        """
+        params = {"project_id": project_id, "embedding_model": embedding_model, "after_id": after_id, "limit": limit}
+        result = await self._client.execute(sql, params)  # type: ignore[union-attr]
+        return [(row.get("id"), row.get("body") or "") for row in self._iter_rows(result)]
+
+    @_sharded(empty=lambda: None)
+    async def update_embeddings(
+        self,
+        table: str,
+        *,
+        project_id: str,
+        embedding_model: str,
+        embeddings: Dict[str, Sequence[float]],
+    ) -> None:
+        """替换已有记录的向量并标记生成模型；正文未变，全文索引无需更新。"""
+        if not self._client or not embeddings:
+            return
+
+        if table not in _EMBEDDING_TEXT_COLUMNS:
+            raise ValueError(f"不支持的向量表: {table}")
+        await self.ensure_schema()
+        sql = f"""
+        UPDATE {table}
+        SET embedding = :embedding, embedding_model = :embedding_model, embedding_dim = :embedding_dim
+        WHERE id = :id AND project_id = :project_id
+        """
+        for record_id, embedding in embeddings.items():
+            await self._client.execute(  # type: ignore[union-attr]
+                sql,
+                {
+                    "id": record_id,
+                    "project_id": project_id,
+                    "embedding": self._to_f32_blob(embedding),
+                    "embedding_model": embedding_model,
+                    "embedding_dim": len(embedding),
+                },
+            )
+        await self._bump_generation([project_id])
+
+    async def close(self) -> None:
+        """关闭底层 libsql 客户端；分片路由实例不持有连接，无需关闭。"""
+        client, self._client = self._client, None
+        if client is not None:
+            try:
+                await client.close()
+            except Exception as exc:  # pragma: no cover - 关闭失败仅记录
+                logger.debug("关闭 libsql 客户端失败: %s", exc)
+
     @staticmethod
     def _to_f32_blob(embedding: Sequence[float]) -> bytes:
         """将向量浮点列表编码为 libsql 可识别的 float32 二进制。"""
@@ -432,24 +1396,127 @@ class VectorStoreService:
         similarity = dot / (norm_a * norm_b)
         return 1.0 - similarity
 
+    async def _snapshot_nearest(
+        self,
+        table: str,
+        *,
+        project_id: str,
+        embedding: Sequence[float],
+        top_k: int,
+        where: str,
+        filter_params: Dict[str, Any],
+    ) -> Optional[List[Tuple[str, float]]]:
+        """用项目向量快照计算余弦距离，返回通过过滤条件的前 top_k 条 (记录 ID, 距离)。
+
+        快照缺失或已过期时读取一次该维度的全部向量重新生成；未启用快照或读写失败时返回 None，由调用方逐行扫描。
+        过滤条件只需查询记录 ID，走 (project_id, chapter_number) 索引，不读取向量列。
+        """
+        snapshots = _get_snapshot_store()
+        if snapshots is None:
+            return None
+        dim = len(embedding)
+        try:
+            generation = await self._generation(project_id)
+            snapshot = snapshots.get(table, project_id, dim, generation)
+            if snapshot is None:
+                result = await self._client.execute(  # type: ignore[union-attr]
+                    f"""
+                    SELECT id, embedding FROM {table}
+                    WHERE project_id = :project_id AND length(embedding) = :embedding_bytes
+                    ORDER BY id
+                    """,
+                    {"project_id": project_id, "embedding_bytes": dim * 4},
+                )
+                rows = list(self._iter_rows(result))
+                await asyncio.to_thread(
+                    write_snapshot,
+                    snapshots.directory,
+                    snapshot_stem(table, project_id, dim),
+                    generation,
+                    [row.get("id") for row in rows],
+                    [bytes(row.get("embedding")) for row in rows],
+                    dim,
+                )
+                snapshot = snapshots.get(table, project_id, dim, generation)
+                if snapshot is None:
+                    return None
+                logger.info(
+                    "已生成向量快照: table=%s project=%s rows=%d dim=%d generation=%d",
+                    table,
+                    project_id,
+                    len(rows),
+                    dim,
+                    generation,
+                )
+            result = await self._client.execute(  # type: ignore[union-attr]
+                f"SELECT id FROM {table} WHERE project_id = :project_id{where}",
+                {"project_id": project_id, **filter_params},
+            )
+            allowed = {row.get("id") for row in self._iter_rows(result)}
+            if VECTORIZED:
+                return snapshot.nearest(embedding, top_k, allowed)
+            # 纯 Python 扫描耗时随项目规模线性增长，交给进程池避免阻塞事件循环
+            return await run_cpu_bound(
+                nearest_in_snapshot,
+                str(snapshot.vector_path),
+                str(snapshot.sidecar_path),
+                list(embedding),
+                top_k,
+                allowed,
+            )
+        except Exception as exc:  # pragma: no cover - 快照不可用时退回逐行扫描
+            logger.warning("向量快照不可用，改为逐行计算: table=%s project=%s error=%s", table, project_id, exc)
+            return None
+
+    async def _rows_by_ids(self, table: str, columns: str, nearest: List[Tuple[str, float]]) -> List[Dict[str, Any]]:
+        """按快照给出的顺序取回记录，并把距离写入 distance 字段；快照生成后被删除的记录会被跳过。"""
+        if not nearest:
+            return []
+        placeholders = ",".join(":id_" + str(idx) for idx in range(len(nearest)))
+        params = {f"id_{idx}": record_id for idx, (record_id, _) in enumerate(nearest)}
+        result = await self._client.execute(  # type: ignore[union-attr]
+            f"SELECT id, {columns} FROM {table} WHERE id IN ({placeholders})",
+            params,
+        )
+        rows = {row.get("id"): row for row in self._iter_rows(result)}
+        return [{**rows[record_id], "distance": distance} for record_id, distance in nearest if record_id in rows]
+
     async def _query_chunks_with_python_similarity(
         self,
         *,
         project_id: str,
         embedding: Sequence[float],
         top_k: int,
+        with_embeddings: bool = False,
+        filters: Optional[RetrievalFilter] = None,
     ) -> List[RetrievedChunk]:
-        sql = """
+        where, filter_params = (filters or RetrievalFilter()).to_sql("rag_chunks")
+        nearest = await self._snapshot_nearest(
+            "rag_chunks",
+            project_id=project_id,
+            embedding=embedding,
+            top_k=top_k,
+            where=where,
+            filter_params=filter_params,
+        )
+        if nearest is not None:
+            columns = "content, chapter_number, chunk_index, chapter_title, COALESCE(metadata, '{}') AS metadata"
+            if with_embeddings:
+                columns += ", embedding"
+            return [self._chunk_from_row(row) for row in await self._rows_by_ids("rag_chunks", columns, nearest)]
+
+        sql = f"""
         SELECT
             content,
             chapter_number,
+            chunk_index,
             chapter_title,
-            COALESCE(metadata, '{}') AS metadata,
+            COALESCE(metadata, '{{}}') AS metadata,
             embedding
         FROM rag_chunks
-        WHERE project_id = :project_id
+        WHERE project_id = :project_id{where}
         """
-        result = await self._client.execute(sql, {"project_id": project_id})  # type: ignore[union-attr]
+        result = await self._client.execute(sql, {"project_id": project_id, **filter_params})  # type: ignore[union-attr]
         scored: List[RetrievedChunk] = []
         for row in self._iter_rows(result):
             stored_embedding = self._from_f32_blob(row.get("embedding"))
@@ -461,6 +1528,8 @@ class VectorStoreService:
                     chapter_title=row.get("chapter_title"),
                     score=distance,
                     metadata=self._parse_metadata(row.get("metadata")),
+                    chunk_index=row.get("chunk_index", 0),
+                    embedding=stored_embedding if with_embeddings else None,
                 )
             )
         scored.sort(key=lambda item: item.score)
@@ -472,17 +1541,31 @@ class VectorStoreService:
         project_id: str,
         embedding: Sequence[float],
         top_k: int,
+        filters: Optional[RetrievalFilter] = None,
     ) -> List[RetrievedSummary]:
-        sql = """
+        where, filter_params = (filters or RetrievalFilter()).to_sql("rag_summaries", with_characters=False)
+        nearest = await self._snapshot_nearest(
+            "rag_summaries",
+            project_id=project_id,
+            embedding=embedding,
+            top_k=top_k,
+            where=where,
+            filter_params=filter_params,
+        )
+        if nearest is not None:
+            rows = await self._rows_by_ids("rag_summaries", "chapter_number, title, summary", nearest)
+            return [self._summary_from_row(row) for row in rows]
+
+        sql = f"""
         SELECT
             chapter_number,
             title,
             summary,
             embedding
         FROM rag_summaries
-        WHERE project_id = :project_id
+        WHERE project_id = :project_id{where}
         """
-        result = await self._client.execute(sql, {"project_id": project_id})  # type: ignore[union-attr]
+        result = await self._client.execute(sql, {"project_id": project_id, **filter_params})  # type: ignore[union-attr]
         scored: List[RetrievedSummary] = []
         for row in self._iter_rows(result):
             stored_embedding = self._from_f32_blob(row.get("embedding"))
@@ -538,7 +1621,12 @@ class VectorStoreService:
 
 
 __all__ = [
+    "ChapterVectorUsage",
+    "CompactionResult",
     "VectorStoreService",
+    "backfill_vector_terms",
+    "close_vector_shards",
+    "RetrievalFilter",
     "RetrievedChunk",
     "RetrievedSummary",
 ]
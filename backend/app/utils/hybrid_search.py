@@ -0,0 +1,98 @@
+"""
+混合检索工具：为 FTS5 全文索引生成中日韩友好的检索词，并用倒数排名融合（RRF）合并多路结果。
+
+SQLite 自带的 unicode61 分词器会把连续的汉字整体当作一个词，无法命中“林远”这类短名。
+这里在写入与查询两侧都把中日韩字符串切成重叠的二元组（单字片段保留为单字），
+拉丁字母与数字按词小写保留，再交给 unicode61 以空格切分，从而获得稳定的子串召回。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+from typing import Callable, Dict, Hashable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# 中日韩表意文字、假名与韩文音节；全角标点不参与检索
+_CJK_RUN_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+")
+_WORD_PATTERN = re.compile(r"[0-9A-Za-z\u00c0-\u024f]+")
+_TOKEN_PATTERN = re.compile(_CJK_RUN_PATTERN.pattern + "|" + _WORD_PATTERN.pattern)
+
+DEFAULT_RRF_K = 60
+MAX_QUERY_TERMS = 96
+
+
+def _iter_terms(text: str) -> Iterator[str]:
+    for match in _TOKEN_PATTERN.finditer(text):
+        token = match.group()
+        if _WORD_PATTERN.fullmatch(token):
+            yield token.lower()
+        elif len(token) == 1:
+            yield token
+        else:
+            for index in range(len(token) - 1):
+                yield token[index:index + 2]
+
+
+def lexical_terms(text: Optional[str]) -> str:
+    """把正文转换为以空格分隔的检索词序列，写入 FTS 表的 terms 列。"""
+    if not text:
+        return ""
+    return " ".join(_iter_terms(text))
+
+
+def build_match_query(text: Optional[str], max_terms: int = MAX_QUERY_TERMS) -> Optional[str]:
+    """把查询文本转换为 FTS5 MATCH 表达式（检索词之间为 OR），没有可用检索词时返回 None。
+
+    检索词按首次出现顺序去重并截断，章节标题等靠前的内容优先保留。
+    """
+    terms: Dict[str, None] = {}
+    for term in _iter_terms(text or ""):
+        terms.setdefault(term, None)
+        if len(terms) >= max_terms:
+            break
+    if not terms:
+        return None
+    # 检索词只含字母、数字与中日韩字符，加双引号即可避免被解析为 FTS5 运算符
+    return " OR ".join(f'"{term}"' for term in terms)
+
+
+def project_token(project_id: str) -> str:
+    """项目在 FTS 表中的隔离标记；对 ID 取摘要，避免连字符等字符被分词器拆开。"""
+    return "p" + hashlib.sha1(project_id.encode("utf-8")).hexdigest()[:20]
+
+
+def scoped_match_query(project_id: str, match: str) -> str:
+    """把 MATCH 表达式限定在指定项目内：项目标记只匹配 project_key 列，检索词只匹配 terms 列。"""
+    return f"project_key:{project_token(project_id)} AND terms:({match})"
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[T]],
+    key: Callable[[T], Hashable],
+    k: int = DEFAULT_RRF_K,
+) -> List[Tuple[T, float]]:
+    """倒数排名融合：每路结果按 1 / (k + 名次) 累加得分，返回按融合得分降序的条目。
+
+    同一条目在多路结果中出现时保留最先出现的那一份对象（调用方通常把向量结果放在第一路）。
+    """
+    scores: Dict[Hashable, float] = {}
+    items: Dict[Hashable, T] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            identity = key(item)
+            scores[identity] = scores.get(identity, 0.0) + 1.0 / (k + rank)
+            items.setdefault(identity, item)
+    ordered = sorted(scores.items(), key=lambda pair: pair[1], reverse=True)
+    return [(items[identity], score) for identity, score in ordered]
+
+
+__all__ = [
+    "DEFAULT_RRF_K",
+    "build_match_query",
+    "lexical_terms",
+    "project_token",
+    "scoped_match_query",
+    "reciprocal_rank_fusion",
+]
@@ -3,7 +3,7 @@
 
 import os
 from dataclasses import asdict, dataclass
-from typing import AsyncGenerator, Dict, List, Optional
+from typing import Any, AsyncGenerator, Dict, List, Optional
 
 from openai import AsyncOpenAI
 
@@ -36,8 +36,9 @@ class LLMClient:
         top_p: Optional[float] = None,
         max_tokens: Optional[int] = None,
         timeout: int = 120,
+        include_usage: bool = False,
         **kwargs,
-    ) -> AsyncGenerator[Dict[str, str], None]:
+    ) -> AsyncGenerator[Dict[str, Any], None]:
         payload = {
             "model": model or os.environ.get("MODEL", "gpt-3.5-turbo"),
             "messages": [msg.to_dict() for msg in messages],
@@ -52,13 +53,30 @@ class LLMClient:
             payload["temperature"] = temperature
         if top_p is not None:
             payload["top_p"] = top_p
+        if include_usage:
+            # 要求上游在流末尾追加一个只含 usage 的分片
+            payload["stream_options"] = {"include_usage": True}
 
         stream = await self._client.chat.completions.create(**payload)
-        async for chunk in stream:
-            if not chunk.choices:
-                continue
-            choice = chunk.choices[0]
-            yield {
-                "content": choice.delta.content,
-                "finish_reason": choice.finish_reason,
-            }
+        try:
+            async for chunk in stream:
+                usage = getattr(chunk, "usage", None)
+                if usage is not None:
+                    yield {
+                        "content": None,
+                        "finish_reason": None,
+                        "usage": {
+                            "prompt_tokens": usage.prompt_tokens,
+                            "completion_tokens": usage.completion_tokens,
+                        },
+                    }
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                yield {
+                    "content": choice.delta.content,
+                    "finish_reason": choice.finish_reason,
+                }
+        finally:
+            # 调用方取消或提前停止读取时立即关闭 HTTP 响应，上游随之停止生成，连接也归还连接池
+            await stream.close()
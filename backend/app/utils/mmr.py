@@ -0,0 +1,142 @@
+"""
+最大边际相关（MMR）重排：在候选片段中贪心挑选既与查询相关、又彼此不重复的子集。
+
+每一步选择使 ``λ·rel(d) - (1-λ)·max sim(d, 已选)`` 最大的候选。相关度默认取与查询的余弦相似度，
+混合检索时应改用融合排名折算的相关度（见 ``rank_relevance``），以保留全文检索提升的命中。
+numpy 为必需依赖，一次性计算候选两两余弦相似度矩阵并按行维护“与已选集合的最大相似度”；
+纯 Python 实现仅在 numpy 无法导入的环境中兜底。
+"""
+
+from __future__ import annotations
+
+import math
+from typing import List, Optional, Sequence
+
+try:  # noqa: SIM105 - 可选依赖
+    import numpy as np
+except ImportError:  # pragma: no cover - 未安装时使用纯 Python 实现
+    np = None  # type: ignore[assignment]
+
+# 是否使用 numpy 的矩阵实现；纯 Python 实现在高维向量上耗时明显更高，调用方可据此决定是否卸载到进程池
+VECTORIZED = np is not None
+
+
+def rank_relevance(count: int, k: int) -> List[float]:
+    """把已排序候选的名次按倒数排名 ``1 / (k + 名次)`` 折算为相关度，并线性归一化到 [0, 1]。"""
+    if count <= 0:
+        return []
+    if count == 1:
+        return [1.0]
+    best, worst = 1.0 / (k + 1), 1.0 / (k + count)
+    return [(1.0 / (k + rank) - worst) / (best - worst) for rank in range(1, count + 1)]
+
+
+def mmr_select(
+    query: Sequence[float],
+    candidates: Sequence[Sequence[float]],
+    top_k: int,
+    lambda_mult: float = 0.7,
+    relevance: Optional[Sequence[float]] = None,
+) -> List[int]:
+    """返回按选择顺序排列的候选下标。
+
+    ``relevance`` 为各候选与查询的相关度，缺省时按余弦相似度计算；
+    缺少向量的候选（空列表）视为与其它候选互不相似。
+    """
+    count = len(candidates)
+    top_k = min(top_k, count)
+    if top_k <= 0:
+        return []
+    if np is not None:
+        return _mmr_numpy(query, candidates, top_k, lambda_mult, relevance)
+    return _mmr_python(query, candidates, top_k, lambda_mult, relevance)
+
+
+def _mmr_numpy(
+    query: Sequence[float],
+    candidates: Sequence[Sequence[float]],
+    top_k: int,
+    lambda_mult: float,
+    relevance: Optional[Sequence[float]],
+) -> List[int]:
+    dim = max((len(vector) for vector in candidates), default=0)
+    matrix = np.zeros((len(candidates), dim), dtype=np.float32)
+    for row, vector in enumerate(candidates):
+        if len(vector) == dim:
+            matrix[row] = vector
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+    if relevance is None:
+        query_vector = np.asarray(query, dtype=np.float32)
+        query_norm = float(np.linalg.norm(query_vector))
+        if dim and query_vector.shape[0] == dim and query_norm > 0:
+            scores = matrix @ (query_vector / query_norm)
+        else:
+            scores = np.zeros(len(candidates), dtype=np.float32)
+    else:
+        scores = np.asarray(relevance, dtype=np.float32)
+
+    similarity = matrix @ matrix.T
+    max_similarity = np.full(len(candidates), -np.inf, dtype=np.float32)
+    available = np.ones(len(candidates), dtype=bool)
+    selected: List[int] = []
+    for _ in range(top_k):
+        if selected:
+            objective = lambda_mult * scores - (1.0 - lambda_mult) * max_similarity
+        else:
+            objective = scores.copy()
+        objective[~available] = -np.inf
+        best = int(np.argmax(objective))
+        selected.append(best)
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, similarity[best])
+    return selected
+
+
+def _mmr_python(
+    query: Sequence[float],
+    candidates: Sequence[Sequence[float]],
+    top_k: int,
+    lambda_mult: float,
+    relevance: Optional[Sequence[float]],
+) -> List[int]:
+    normalized = [_normalize(vector) for vector in candidates]
+    if relevance is None:
+        query_vector = _normalize(query)
+        scores = [_dot(query_vector, vector) for vector in normalized]
+    else:
+        scores = list(relevance)
+
+    max_similarity = [-math.inf] * len(candidates)
+    remaining = set(range(len(candidates)))
+    selected: List[int] = []
+    for _ in range(top_k):
+        if selected:
+            best = max(
+                remaining,
+                key=lambda index: (lambda_mult * scores[index] - (1.0 - lambda_mult) * max_similarity[index], -index),
+            )
+        else:
+            best = max(remaining, key=lambda index: (scores[index], -index))
+        selected.append(best)
+        remaining.discard(best)
+        for index in remaining:
+            max_similarity[index] = max(max_similarity[index], _dot(normalized[best], normalized[index]))
+    return selected
+
+
+def _normalize(vector: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(value * value for value in vector))
+    if norm == 0:
+        return []
+    return [value / norm for value in vector]
+
+
+def _dot(vec_a: Sequence[float], vec_b: Sequence[float]) -> float:
+    if not vec_a or not vec_b or len(vec_a) != len(vec_b):
+        return 0.0
+    return sum(a * b for a, b in zip(vec_a, vec_b))
+
+
+__all__ = ["VECTORIZED", "mmr_select", "rank_relevance"]
@@ -0,0 +1,321 @@
+"""
+导入小说的纯文本处理：章节切分、人名统计、剧情采样与角色高光提取。
+
+本模块只依赖标准库与 app.utils 下的轻量工具，便于在 CPU 卸载进程池中按文件路径直接执行，
+子进程无需导入数据库、LLM 等整套应用依赖。
+"""
+
+from __future__ import annotations
+
+import re
+from bisect import bisect_right
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from .text_scan import IntervalIndex, MultiPatternScanner
+from .text_stream import iter_decoded_blocks, iter_titled_sections
+
+# 行首的章节标题，常见格式：第xxx章、Chapter xxx
+CHAPTER_TITLE_PATTERN = re.compile(
+    r"^\s*第[0-9零一二三四五六七八九十百千]+[章卷回节].*|^\s*Chapter\s+[0-9]+.*",
+    re.MULTILINE,
+)
+
+# 常见对话引导词
+_DIALOGUE_VERBS = r"(?:说|道|问|回答|冷笑|大笑|苦笑|点头|摇头|叹气|叹道|解释|怒道|吼道|低语|传音|喊道|叫道|哭道|骂道)"
+# 模式1: 名字+动词 (e.g. "张三笑道")，限制名字长度为2-4字，排除单字名以减少误报
+_DIALOGUE_NAME_PATTERN = re.compile(fr"([\u4e00-\u9fa5]{{2,4}}){_DIALOGUE_VERBS}")
+# 模式2: 名字+空格/标点+说 (e.g. "张三：") - 剧本模式或特定排版
+_SCRIPT_NAME_PATTERN = re.compile(r"([\u4e00-\u9fa5]{2,4})[：:]\s*“")
+
+# 过滤黑名单（非人名的常用词）
+_CHARACTER_STOP_WORDS = frozenset({
+    "自己", "怎么", "于是", "接着", "忽然", "突然", "虽然", "既然", "如果", "只要", "为了",
+    "并且", "而且", "不仅", "甚至", "难道", "毕竟", "到底", "终于", "立刻", "马上",
+    "缓缓", "轻轻", "大声", "小声", "连忙", "赶紧", "不禁", "不由", "只能", "只好",
+    "众人", "大家", "某人", "那个", "这个", "什么", "此时", "此刻", "随后", "然后",
+    "原来", "其实", "顺便", "根本", "简直", "仿佛", "好像", "似乎", "一直", "曾经",
+    "已经", "正在", "准备", "开始", "继续", "重新", "互相", "彼此", "对方", "两者",
+    "一人", "两人", "三人", "四人", "五人", "少年", "少女", "男子", "女子", "老者",
+    "老头", "大汉", "青年", "中年", "小孩", "丫头", "家伙", "兄弟", "姐妹", "师父",
+    "师兄", "师弟", "师姐", "师妹", "陛下", "殿下", "娘娘", "将军", "大人", "掌门",
+    "宗主", "长老", "护法", "弟子", "属下", "奴才", "微臣", "老夫", "老朽", "在下",
+    "贫道", "本座", "本王", "本宫", "朕", "寡人", "哀家", "这时候", "那个时候",
+    "一声", "一把", "一眼", "一手", "一步", "一下", "一脚", "一口", "一个", "一名", "一位",
+    "今日", "明日", "昨日", "每天", "白天", "晚上", "半夜", "清晨", "黄昏", "刚刚", "刚才",
+    "这里", "那里", "哪里", "那边", "这边", "里面", "外面", "前面", "后面", "上面", "下面",
+    "左边", "右边", "中间", "周围", "四处", "到处", "满脸", "满身", "全身", "浑身",
+    "双手", "双眼", "双脚", "双腿", "两眼", "两手", "两脚", "两腿", "心中", "心里", "心头",
+    "手中", "手里", "手头", "眼中", "眼里", "口中", "嘴里", "身上", "身下", "身边", "身旁",
+    "此时此刻", "不得不", "能不能", "是不是", "会不会", "有没有", "想了想", "摇了摇头", "点了点头"
+})
+
+# 均匀剧情采样的总字数上限与单章截取字数
+_PLOT_SAMPLE_MAX_CHARS = 30000
+_PLOT_SAMPLE_CHAPTER_CHARS = 1000
+
+def _chapter_bounds(body_starts: Sequence[int], body_lengths: Sequence[int], position: int) -> Tuple[int, int]:
+    """返回虚拟全文位置所在章节正文的 [起点, 终点)，高光片段不跨章截取。"""
+    index = bisect_right(body_starts, position) - 1
+    return body_starts[index], body_starts[index] + body_lengths[index]
+
+
+def plot_sample_indices(total_chapters: int) -> List[int]:
+    """均匀剧情采样的章节下标：前 3 章、后 2 章与中间约 25 章。"""
+    if total_chapters <= 10:
+        return list(range(total_chapters))
+
+    indices = [0, 1, 2] # 前3章
+    last_indices = [total_chapters - 2, total_chapters - 1] # 后2章
+
+    start_mid = 3
+    end_mid = total_chapters - 2
+    mid_count = end_mid - start_mid
+
+    if mid_count > 0:
+        target_mid_samples = 25 # 中间取25章
+        step = max(1, mid_count // target_mid_samples)
+        indices.extend(range(start_mid, end_mid, step))
+
+    indices.extend(last_indices)
+    return sorted(set(indices))
+
+
+def format_plot_sample(samples: Sequence[Tuple[int, str, str]]) -> str:
+    """拼接剧情采样 (约 30k 字)，samples 为 (章节下标, 标题, 正文开头) 列表。"""
+    plot_sample_text = ""
+    for i, title, body in sorted(samples):
+        clean_body = body[:_PLOT_SAMPLE_CHAPTER_CHARS].strip()
+        plot_sample_text += f"第{i+1}章 {title}\n{clean_body}\n\n"
+
+    if len(plot_sample_text) > _PLOT_SAMPLE_MAX_CHARS:
+        plot_sample_text = plot_sample_text[:_PLOT_SAMPLE_MAX_CHARS] + "...\n(截断)"
+    return plot_sample_text
+
+
+def count_character_mentions(text: str, counter: Counter) -> None:
+    """
+    基于正则统计一段文本中的人名出现次数，可按章累计到同一个 counter。
+    策略：寻找 "XXX说"、"XXX道" 等高频对话模式。
+    """
+    counter.update(_DIALOGUE_NAME_PATTERN.findall(text))
+    counter.update(_SCRIPT_NAME_PATTERN.findall(text))
+
+
+def rank_potential_characters(counter: Counter, top_n: int = 100) -> List[str]:
+    """按频率挑出最可能的人名，过滤黑名单（非人名的常用词）。"""
+    candidates = []
+    for name, count in counter.most_common():
+        if name not in _CHARACTER_STOP_WORDS and count >= 2: # 至少出现2次
+            candidates.append(name)
+            if len(candidates) >= top_n:
+                break
+
+    return candidates
+
+
+def extract_character_highlights(content: str, characters: List[str], context_window: int = 300) -> str:
+    """
+    为每个潜在角色提取一段“高光时刻”（整段文本已在内存中时使用）。
+    优先选择对话密集或有动作描写的段落。
+    """
+    # 一次扫描拿到所有候选角色的出现位置，避免对每个角色全文 finditer
+    occurrences = MultiPatternScanner(characters).find_all(content)
+    windows = highlight_windows(
+        characters,
+        occurrences,
+        lambda position: (0, len(content)),
+        context_window=context_window,
+    )
+    snippets = {window: content[window[0]:window[1]] for ranges in windows.values() for window in ranges}
+    return pick_character_highlights(characters, windows, snippets)
+
+
+def highlight_windows(
+    characters: Sequence[str],
+    occurrences: Mapping[str, Sequence[int]],
+    bounds_of: Callable[[int], Tuple[int, int]],
+    context_window: int = 300,
+) -> Dict[str, List[Tuple[int, int]]]:
+    """
+    计算每个角色的候选片段范围 (start, end)。
+    只需要检查前几个和中间几个出现位置，不必遍历所有，节省时间
+    采样点：前3次，中间3次，最后3次；bounds_of 给出出现位置所在文本段的边界。
+    """
+    windows: Dict[str, List[Tuple[int, int]]] = {}
+    for char in characters:
+        starts = occurrences.get(char)
+        if not starts:
+            continue
+
+        total = len(starts)
+        if total <= 10:
+            sample_indices = range(total)
+        else:
+            sample_indices = list(range(3)) + list(range(total//2 - 1, total//2 + 2)) + list(range(total-3, total))
+
+        ranges = []
+        for idx in sample_indices:
+            if idx < 0 or idx >= total: continue
+            match_start = starts[idx]
+            lower, upper = bounds_of(match_start)
+            start = max(lower, match_start - context_window)
+            end = min(upper, match_start + len(char) + context_window)
+            ranges.append((start, end))
+        windows[char] = ranges
+    return windows
+
+
+def pick_character_highlights(
+    characters: Sequence[str],
+    windows: Mapping[str, Sequence[Tuple[int, int]]],
+    snippets: Mapping[Tuple[int, int], str],
+) -> str:
+    """按对话密度为每个角色选出一段不重复的片段。"""
+    highlights = []
+    # 记录已使用的文本范围 (start, end)，避免重复
+    used_ranges = IntervalIndex()
+
+    for char in characters:
+        best_score = -1
+        best_snippet = ""
+        best_range = (0, 0)
+
+        for start, end in windows.get(char, ()):
+            # 如果这个范围已经被大幅占用了，跳过
+            if used_ranges.overlaps(start + 50, end - 50): # 允许边缘少量重叠
+                continue
+
+            snippet = snippets[(start, end)]
+
+            # 评分：双引号数量（对话）+ 标点符号丰富度
+            score = snippet.count('“') * 2 + snippet.count('”') * 2 + snippet.count('！') + snippet.count('？')
+
+            if score > best_score:
+                best_score = score
+                best_snippet = snippet
+                best_range = (start, end)
+
+        if best_snippet:
+            # 清理首尾不完整的句子
+            # 简单处理：找到第一个换行符和最后一个换行符
+            first_nl = best_snippet.find('\n')
+            last_nl = best_snippet.rfind('\n')
+            if first_nl != -1 and last_nl != -1 and first_nl < last_nl:
+                clean_snippet = best_snippet[first_nl:last_nl].strip()
+            else:
+                clean_snippet = best_snippet.strip()
+
+            if len(clean_snippet) > 50: # 太短的不要
+                highlights.append(f"--- 【{char}】的出场片段 ---\n{clean_snippet}\n")
+                used_ranges.add(*best_range)
+
+    return "\n".join(highlights)
+
+
+def iter_novel_chapters(
+    path: str,
+    encoding: str,
+    block_size: int,
+    on_read: Optional[Callable[[int], None]] = None,
+) -> Iterator[Tuple[str, str]]:
+    """流式读取小说文件并逐章产出 (标题, 正文)。"""
+    blocks = iter_decoded_blocks(path, encoding, block_size, on_read)
+    return iter_titled_sections(blocks, CHAPTER_TITLE_PATTERN)
+
+
+@dataclass
+class NovelSurvey:
+    """首轮扫描结果：只保留章节标题、正文长度与候选人名。"""
+
+    titles: List[str]
+    body_lengths: List[int]
+    potential_characters: List[str]
+
+
+def survey_novel_file(path: str, encoding: str, block_size: int, top_n: int = 150) -> NovelSurvey:
+    """扫描整份文件，统计章节结构与对话人名（供进程池执行）。"""
+    titles: List[str] = []
+    body_lengths: List[int] = []
+    mention_counter: Counter = Counter()
+    for chap_title, chap_body in iter_novel_chapters(path, encoding, block_size):
+        titles.append(chap_title)
+        body_lengths.append(len(chap_body))
+        count_character_mentions(chap_body, mention_counter)
+    return NovelSurvey(
+        titles=titles,
+        body_lengths=body_lengths,
+        potential_characters=rank_potential_characters(mention_counter, top_n=top_n),
+    )
+
+
+def sample_novel_file(
+    path: str,
+    encoding: str,
+    block_size: int,
+    body_lengths: Sequence[int],
+    characters: Sequence[str],
+    context_window: int = 200,
+) -> Tuple[str, str]:
+    """
+    生成分析用的两份样本（供进程池执行），返回 (剧情采样, 角色高光片段)。
+    第一轮读取完成剧情采样与角色出现位置扫描，第二轮只截取候选片段所在的章节。
+    """
+    # 章节正文在“虚拟全文”中的起点：各章之间以一个换行分隔
+    body_starts: List[int] = []
+    offset = 0
+    for length in body_lengths:
+        body_starts.append(offset)
+        offset += length + 1
+
+    plot_indices = set(plot_sample_indices(len(body_lengths)))
+    plot_samples: List[Tuple[int, str, str]] = []
+    scanner = MultiPatternScanner(characters)
+    occurrences: Dict[str, List[int]] = {}
+    for index, (chap_title, chap_body) in enumerate(iter_novel_chapters(path, encoding, block_size)):
+        if index in plot_indices:
+            plot_samples.append((index, chap_title, chap_body[:_PLOT_SAMPLE_CHAPTER_CHARS]))
+        base = body_starts[index]
+        for name, starts in scanner.find_all(chap_body).items():
+            occurrences.setdefault(name, []).extend(base + start for start in starts)
+
+    windows = highlight_windows(
+        characters,
+        occurrences,
+        lambda position: _chapter_bounds(body_starts, body_lengths, position),
+        context_window=context_window,
+    )
+    del occurrences
+
+    wanted: Dict[int, List[Tuple[int, int]]] = {}
+    for ranges in windows.values():
+        for window in ranges:
+            wanted.setdefault(bisect_right(body_starts, window[0]) - 1, []).append(window)
+    snippets: Dict[Tuple[int, int], str] = {}
+    if wanted:
+        last_index = max(wanted)
+        for index, (_, chap_body) in enumerate(iter_novel_chapters(path, encoding, block_size)):
+            base = body_starts[index]
+            for start, end in wanted.get(index, ()):
+                snippets[(start, end)] = chap_body[start - base:end - base]
+            if index >= last_index:
+                break
+
+    return format_plot_sample(plot_samples), pick_character_highlights(characters, windows, snippets)
+
+
+__all__ = [
+    "CHAPTER_TITLE_PATTERN",
+    "NovelSurvey",
+    "count_character_mentions",
+    "extract_character_highlights",
+    "format_plot_sample",
+    "highlight_windows",
+    "iter_novel_chapters",
+    "pick_character_highlights",
+    "plot_sample_indices",
+    "rank_potential_characters",
+    "sample_novel_file",
+    "survey_novel_file",
+]
@@ -0,0 +1,221 @@
+"""
+流式输出的增量解析：边接收 token 边剥离 <think> 块，并逐步解码 full_content 字符串值。
+
+每个分片只处理一次，收尾时无需再对整段输出做正则扫描；流被截断时也能直接拿到已解码的正文。
+"""
+
+from __future__ import annotations
+
+import json
+import re
+from typing import List, Optional, Tuple
+
+_THINK_OPEN = "<think>"
+_THINK_CLOSE = "</think>"
+
+# 定位正文字段，与 json_extract 的兜底提取保持同一口径
+_CONTENT_KEY = re.compile(r'"(?:full_)?content"\s*:\s*"')
+# 字段名被切分到两个分片之间时，需要保留的最长尾部
+_KEY_CARRY = 64
+_PLAIN_RUN = re.compile(r'[^"\\]*')
+_SIMPLE_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_HEX_DIGITS = frozenset("0123456789abcdefABCDEF")
+_STRUCTURAL = frozenset(",:}]")
+_WHITESPACE = frozenset(" \t\r\n")
+
+
+def _partial_tag_suffix(text: str, tag: str) -> int:
+    """返回 text 末尾可能是 tag 前缀的长度，用于把跨分片的标签留到下一次处理。"""
+    for size in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:size]):
+            return size
+    return 0
+
+
+class ThinkTagStripper:
+    """增量剥离 <think>...</think>，结果与 json_utils.remove_think_tags（不含 strip）一致。"""
+
+    def __init__(self) -> None:
+        self._inside = False
+        self._carry = ""
+        self._hidden: List[str] = []
+
+    def feed(self, chunk: str) -> str:
+        text = self._carry + chunk
+        self._carry = ""
+        visible: List[str] = []
+        position = 0
+        while position < len(text):
+            if self._inside:
+                close = text.find(_THINK_CLOSE, position)
+                if close == -1:
+                    keep = _partial_tag_suffix(text, _THINK_CLOSE)
+                    self._hidden.append(text[position : len(text) - keep])
+                    self._carry = text[len(text) - keep :]
+                    break
+                self._hidden.clear()
+                self._inside = False
+                position = close + len(_THINK_CLOSE)
+            else:
+                start = text.find(_THINK_OPEN, position)
+                if start == -1:
+                    keep = _partial_tag_suffix(text, _THINK_OPEN)
+                    visible.append(text[position : len(text) - keep])
+                    self._carry = text[len(text) - keep :]
+                    break
+                visible.append(text[position:start])
+                self._inside = True
+                position = start + len(_THINK_OPEN)
+        return "".join(visible)
+
+    def finish(self) -> str:
+        """流结束：未闭合的 <think> 与原实现一样原样保留。"""
+        if self._inside:
+            tail = _THINK_OPEN + "".join(self._hidden) + self._carry
+        else:
+            tail = self._carry
+        self._inside = False
+        self._carry = ""
+        self._hidden.clear()
+        return tail
+
+
+class ChapterStreamParser:
+    """
+    章节生成流的增量解析器。
+
+    ``feed`` 接收原始分片，返回本次新解码出的正文；``text`` 为剥离 <think> 后的完整输出，
+    ``content`` 为目前解码出的 full_content（或 content）值。字符串内未转义的引号沿用
+    json_extract 的判定：其后（跳过空白）紧跟 ``, : } ]`` 或输出结束才视为闭合。
+    """
+
+    def __init__(self) -> None:
+        self._think = ThinkTagStripper()
+        self._visible: List[str] = []
+        self._text_cache: Optional[str] = None
+        self._content: List[str] = []
+        self._pending = ""
+        self._found = False
+        self._complete = False
+        self._finished = False
+
+    @property
+    def text(self) -> str:
+        if self._text_cache is None:
+            self._text_cache = "".join(self._visible)
+        return self._text_cache
+
+    @property
+    def content(self) -> str:
+        return "".join(self._content)
+
+    @property
+    def found(self) -> bool:
+        """是否已经定位到正文字段。"""
+        return self._found
+
+    @property
+    def complete(self) -> bool:
+        """正文字段是否已读到闭合引号。"""
+        return self._complete
+
+    @property
+    def truncated(self) -> bool:
+        """流已结束，正文字段却没有闭合，说明输出在正文中途被截断。"""
+        return self._finished and self._found and not self._complete
+
+    def feed(self, chunk: str) -> str:
+        if not chunk or self._finished:
+            return ""
+        return self._consume(self._think.feed(chunk), final=False)
+
+    def finish(self) -> str:
+        if self._finished:
+            return ""
+        delta = self._consume(self._think.finish(), final=True)
+        self._finished = True
+        self._pending = ""
+        return delta
+
+    def _consume(self, visible: str, *, final: bool) -> str:
+        if visible:
+            self._visible.append(visible)
+            self._text_cache = None
+        if self._complete:
+            return ""
+        buffer = self._pending + visible
+        self._pending = ""
+        if not self._found:
+            match = _CONTENT_KEY.search(buffer)
+            if match is None:
+                self._pending = buffer[-_KEY_CARRY:]
+                return ""
+            self._found = True
+            buffer = buffer[match.end() :]
+        return self._decode(buffer, final)
+
+    def _decode(self, buffer: str, final: bool) -> str:
+        decoded: List[str] = []
+        length = len(buffer)
+        position = 0
+        while position < length:
+            end = _PLAIN_RUN.match(buffer, position).end()
+            if end > position:
+                decoded.append(buffer[position:end])
+                position = end
+                if position >= length:
+                    break
+
+            if buffer[position] == "\\":
+                escape = self._decode_escape(buffer, position, final)
+                if escape is None:
+                    # 转义序列被切断在分片末尾，留待下一个分片；流已结束则丢弃残缺的转义
+                    if not final:
+                        self._pending = buffer[position:]
+                    break
+                value, position = escape
+                decoded.append(value)
+                continue
+
+            lookahead = position + 1
+            while lookahead < length and buffer[lookahead] in _WHITESPACE:
+                lookahead += 1
+            if lookahead >= length and not final:
+                # 引号之后暂时只有空白，尚无法判断是否闭合
+                self._pending = buffer[position:]
+                break
+            if lookahead >= length or buffer[lookahead] in _STRUCTURAL:
+                self._complete = True
+                break
+            decoded.append('"')
+            position += 1
+
+        delta = "".join(decoded)
+        if delta:
+            self._content.append(delta)
+        return delta
+
+    @staticmethod
+    def _decode_escape(buffer: str, position: int, final: bool) -> Optional[Tuple[str, int]]:
+        if position + 1 >= len(buffer):
+            return None
+        marker = buffer[position + 1]
+        if marker != "u":
+            return _SIMPLE_ESCAPES.get(marker, marker), position + 2
+        digits = buffer[position + 2 : position + 6]
+        if len(digits) < 4:
+            return None
+        if not all(char in _HEX_DIGITS for char in digits):
+            return "u", position + 2
+        code = int(digits, 16)
+        if 0xD800 <= code < 0xDC00:
+            # 代理对需要等到低位一起解码
+            pair = buffer[position + 6 : position + 12]
+            if len(pair) < 6 and not final:
+                return None
+            if len(pair) == 6 and pair.startswith("\\u") and all(char in _HEX_DIGITS for char in pair[2:]):
+                return json.loads('"%s"' % buffer[position : position + 12]), position + 12
+        return chr(code), position + 6
+
+
+__all__ = ["ThinkTagStripper", "ChapterStreamParser"]
@@ -0,0 +1,380 @@
+"""
+章节正文切分：默认使用内置的边界切分器，也可切换为 LangChain 递归切分器，
+或按嵌入模型的 token 数切分（见 ``split_into_token_chunks``）。
+
+内置切分器优先在段落、句子边界处切分，重叠部分从完整句子起头，片段质量更好，
+速度也略快于 LangChain 切分器（见 benchmarks/run_benchmarks.py 中的 chunker.* 基准）。
+
+内置切分器不预先扫描整章：每个窗口先用 rfind 反向查找换行（段落/行边界），
+没有换行时用带贪婪前缀的正则从窗口末尾回溯到最后一个句末，重叠起点则向前匹配到第一个句子边界即停；
+全程只计算 (起点, 终点) 偏移，最终按偏移切出各段文本，不产生中间副本。
+token 预算切分器需要逐句计数，仍按整章建立句子边界索引。
+
+切分参数全部显式传入，不读取全局配置，便于在 CPU 卸载进程池中直接调用。
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from .tokenizer import Tokenizer, get_tokenizer
+
+logger = logging.getLogger(__name__)
+
+try:  # noqa: SIM105 - 提示缺少可选依赖
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+except ImportError:  # pragma: no cover - 未安装时会走后备方案
+    RecursiveCharacterTextSplitter = None  # type: ignore[assignment]
+
+
+CHUNK_SEPARATORS = [
+    "\n\n",
+    "\n",
+    "。", "！", "？",
+    "!", "?", "；", ";",
+    "，", ",",
+    " ",
+]
+
+CHUNK_STRATEGIES = ("native", "langchain")
+
+# 边界等级，数值越大越适合作为切分点
+LEVEL_WORD = 0
+LEVEL_CLAUSE = 1
+LEVEL_SENTENCE = 2
+LEVEL_LINE = 3
+LEVEL_PARAGRAPH = 4
+
+# 各等级边界的识别规则；句末标点连同其后的右引号/括号一起归入前一句。
+# 每条规则都以单个字符类开头，正则引擎可以先按字符类快速定位候选位置
+_CLOSING_TAIL = r"[。！？!?；;…”’\"'』」》）)\]]*"
+_CLOSING_CHARS = frozenset("。！？!?；;…”’\"'』」》）)]")
+# 英文句点后须跟空白，排除小数与缩写中的点
+_SENTENCE_END = r"[。！？!?；;….](?<!\.(?!\s))" + _CLOSING_TAIL
+_LEVEL_PATTERNS = (
+    re.compile(r"[ \t　]+"),
+    re.compile(r"[，,、：:]" + _CLOSING_TAIL),
+    re.compile(_SENTENCE_END),
+    re.compile(r"\n\s*"),
+    re.compile(r"\n[ \t\r　]*\n\s*"),
+)
+
+_INLINE_SPACE = frozenset(" \t\r　")
+_LAST_SENTENCE = re.compile(r"(?s:.*)(?P<mark>" + _SENTENCE_END + ")")
+# 换行或句末，换行之后不再吸收右引号（那是下一行的开头）
+_LINE_OR_SENTENCE = re.compile(r"[\n。！？!?；;….](?<!\.(?!\s))(?:(?<!\n)" + _CLOSING_TAIL + ")?")
+
+# 切分点距窗口起点至少为目标长度的该比例，避免为了对齐段落切出过短的片段
+_MIN_CHUNK_RATIO = 0.5
+
+
+class BoundaryIndex:
+    """
+    正文边界索引：``positions(level)`` 返回等级不低于 level 的全部边界位置（升序），供 token 预算切分器逐句计数；
+    段落、换行、句子三级各在首次用到时扫描一遍正文并缓存。
+
+    字符切分器只调用 ``best_split`` 与 ``first_after``，二者只扫描给定窗口，不建立整章索引。
+    边界位置指向分隔符之后的第一个字符，即下一段的起点；片段首尾的空白在生成跨度时剔除。
+    """
+
+    __slots__ = ("text", "start", "end", "_positions")
+
+    def __init__(self, text: str, start: int = 0, end: Optional[int] = None) -> None:
+        self.text = text
+        self.start = start
+        self.end = len(text) if end is None else end
+        self._positions: List[Optional[List[int]]] = [None] * (LEVEL_PARAGRAPH + 1)
+
+    def positions(self, level: int) -> List[int]:
+        level = max(level, LEVEL_SENTENCE)
+        cached = self._positions[level]
+        if cached is None:
+            found = [match.end() for match in _LEVEL_PATTERNS[level].finditer(self.text, self.start, self.end)]
+            if level < LEVEL_PARAGRAPH:
+                # 两个有序列表拼接后排序，timsort 会按归并处理
+                found += self.positions(level + 1)
+                found.sort()
+            cached = self._positions[level] = found
+        return cached
+
+    def best_split(self, lower: int, upper: int) -> Optional[int]:
+        """返回 [lower, upper] 内等级最高、位置最靠后的边界，只扫描该窗口。"""
+        text = self.text
+        line = None
+        newline = text.rfind("\n", lower - 1, upper)
+        while newline >= 0:
+            if line is None:
+                line = newline + 1
+            # 换行前只隔着行内空白又是换行，即空行分隔的段落边界
+            before = newline - 1
+            while before >= self.start and text[before] in _INLINE_SPACE:
+                before -= 1
+            if before >= self.start and text[before] == "\n":
+                return newline + 1
+            newline = text.rfind("\n", lower - 1, newline)
+        if line is not None:
+            return line
+        # 贪婪前缀从窗口末尾回溯，第一次成功即为窗口内最后一个句子边界
+        endpos = upper
+        while endpos >= lower:
+            match = _LAST_SENTENCE.match(text, lower - 1, endpos)
+            if match is None:
+                break
+            # 句末标点后的右引号/括号越过窗口时放弃该边界，而不是把引号留给下一段
+            if match.end() < self.end and text[match.end()] in _CLOSING_CHARS:
+                endpos = match.start("mark")
+                continue
+            return match.end()
+        for level in (LEVEL_CLAUSE, LEVEL_WORD):
+            position = None
+            for match in _LEVEL_PATTERNS[level].finditer(text, lower, upper):
+                position = match.end()
+            if position is not None:
+                return position
+        return None
+
+    def first_after(self, lower: int, upper: int) -> Optional[int]:
+        """返回 [lower, upper) 内第一个句子及以上等级的边界，没有时取第一个分句边界；正则匹配到第一处即停止。"""
+        for pattern in (_LINE_OR_SENTENCE, _LEVEL_PATTERNS[LEVEL_CLAUSE]):
+            match = pattern.search(self.text, lower - 1, upper)
+            if match is not None and match.end() < upper:
+                return match.end()
+        return None
+
+
+class TextChunker:
+    """按固定配置切分文本的边界切分器，实例无状态，可按配置复用。"""
+
+    __slots__ = ("chunk_size", "overlap", "min_chunk")
+
+    def __init__(self, chunk_size: int, overlap: int) -> None:
+        self.chunk_size = chunk_size
+        self.overlap = min(overlap, chunk_size // 2)
+        self.min_chunk = max(1, int(chunk_size * _MIN_CHUNK_RATIO))
+
+    def split_spans(self, text: str, start: int = 0, end: Optional[int] = None) -> List[Tuple[int, int]]:
+        """返回 text[start:end] 各片段在 text 中的 (起点, 终点) 偏移，片段首尾已去除空白。"""
+        start, stop = _strip_bounds(text, start, len(text) if end is None else end)
+        if start >= stop:
+            return []
+
+        index = BoundaryIndex(text, start, stop)
+        best_split, first_after = index.best_split, index.first_after
+        chunk_size, min_chunk, overlap = self.chunk_size, self.min_chunk, self.overlap
+        spans: List[Tuple[int, int]] = []
+        covered = start
+        while True:
+            limit = start + chunk_size
+            end = stop if limit >= stop else best_split(start + min_chunk, limit) or limit
+
+            span_start, span_end = _strip_bounds(text, start, end)
+            # 终点未越过上一片段的片段已被其完整包含，再嵌入一次只是重复
+            if span_start < span_end and span_end > covered:
+                spans.append((span_start, span_end))
+                covered = span_end
+            if end >= stop:
+                return spans
+            # 重叠部分从完整的句子（其次是分句）开始，找不到时不保留重叠，避免从半句话起头
+            start = (first_after(max(end - overlap, start + 1), end) or end) if overlap else end
+
+    def split(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.split_spans(text)]
+
+
+class TokenChunker:
+    """
+    按 token 预算切分的边界索引切分器：以句子为最小单位累加 token 数，
+    在不超过预算的前提下优先止于段落、换行处；重叠部分同样由完整句子组成。
+
+    单句超出预算时先按字符切分器细分，字符数按该句的 token 密度折算。
+    """
+
+    __slots__ = ("max_tokens", "overlap_tokens", "min_tokens", "tokenizer")
+
+    def __init__(self, max_tokens: int, overlap_tokens: int, tokenizer: Tokenizer) -> None:
+        self.max_tokens = max_tokens
+        self.overlap_tokens = min(overlap_tokens, max_tokens // 2)
+        self.min_tokens = max(1, int(max_tokens * _MIN_CHUNK_RATIO))
+        self.tokenizer = tokenizer
+
+    def split_spans(self, text: str) -> List[Tuple[int, int]]:
+        """返回各片段在 text 中的 (起点, 终点) 偏移，片段首尾已去除空白。"""
+        start, stop = _strip_bounds(text, 0, len(text))
+        if start >= stop:
+            return []
+
+        index = BoundaryIndex(text, start, stop)
+        pieces, tokens, levels = self._sentence_pieces(text, index, start, stop)
+        spans: List[Tuple[int, int]] = []
+        first = 0
+        while first < len(pieces):
+            total = 0
+            last = first
+            cut, cut_level = None, -1
+            # 至少收入一句；在已达最小预算的候选切分点中取等级最高、位置最靠后的一个
+            while last < len(pieces) and (last == first or total + tokens[last] <= self.max_tokens):
+                total += tokens[last]
+                last += 1
+                if total >= self.min_tokens and levels[last - 1] >= cut_level:
+                    cut, cut_level = last, levels[last - 1]
+            cut = cut or last
+
+            span_start, span_end = _strip_bounds(text, pieces[first][0], pieces[cut - 1][1])
+            if span_start < span_end and (not spans or span_end > spans[-1][1]):
+                spans.append((span_start, span_end))
+            if cut >= len(pieces):
+                break
+
+            # 从切分点向前回收完整句子作为下一片段的重叠，且必须向前推进
+            next_first, overlap = cut, 0
+            while next_first - 1 > first and overlap + tokens[next_first - 1] <= self.overlap_tokens:
+                next_first -= 1
+                overlap += tokens[next_first]
+            first = next_first
+        return spans
+
+    def split(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.split_spans(text)]
+
+    def _sentence_pieces(
+        self,
+        text: str,
+        index: BoundaryIndex,
+        start: int,
+        stop: int,
+    ) -> Tuple[List[Tuple[int, int]], List[int], List[int]]:
+        """按句子边界把正文拆成连续的小段，返回各段跨度、token 数与段尾边界等级。"""
+        paragraph_ends = set(index.positions(LEVEL_PARAGRAPH))
+        line_ends = set(index.positions(LEVEL_LINE))
+        pieces: List[Tuple[int, int]] = []
+        tokens: List[int] = []
+        levels: List[int] = []
+        previous = start
+        for boundary in index.positions(LEVEL_SENTENCE) + [stop]:
+            if boundary <= previous or boundary > stop:
+                continue
+            count = self.tokenizer.count(text[previous:boundary])
+            if boundary == stop or boundary in paragraph_ends:
+                level = LEVEL_PARAGRAPH
+            elif boundary in line_ends:
+                level = LEVEL_LINE
+            else:
+                level = LEVEL_SENTENCE
+            if count <= self.max_tokens:
+                pieces.append((previous, boundary))
+                tokens.append(count)
+                levels.append(level)
+            else:
+                chars = max(16, int((boundary - previous) * self.max_tokens / count * 0.9))
+                parts = get_text_chunker(chars, 0).split_spans(text, previous, boundary)
+                for position, (part_start, part_end) in enumerate(parts):
+                    pieces.append((part_start, part_end))
+                    tokens.append(self.tokenizer.count(text[part_start:part_end]))
+                    levels.append(level if position == len(parts) - 1 else LEVEL_CLAUSE)
+            previous = boundary
+        return pieces, tokens, levels
+
+
+def _strip_bounds(text: str, start: int, end: int) -> Tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+@lru_cache(maxsize=8)
+def get_text_chunker(chunk_size: int, overlap: int) -> TextChunker:
+    """按参数缓存内置切分器，每个进程每种配置只创建一次。"""
+    return TextChunker(chunk_size, overlap)
+
+
+@lru_cache(maxsize=8)
+def get_token_chunker(max_tokens: int, overlap_tokens: int, model: Optional[str]) -> TokenChunker:
+    """按参数与嵌入模型缓存 token 预算切分器。"""
+    return TokenChunker(max_tokens, overlap_tokens, get_tokenizer(model))
+
+
+@lru_cache(maxsize=8)
+def _get_text_splitter(chunk_size: int, overlap: int) -> Optional["RecursiveCharacterTextSplitter"]:
+    """按参数缓存 LangChain 文本切分器，每个进程只初始化一次。"""
+    if RecursiveCharacterTextSplitter is None:
+        logger.warning("未安装 langchain-text-splitters，章节切分将回退至内置策略。")
+        return None
+
+    splitter = RecursiveCharacterTextSplitter(
+        separators=CHUNK_SEPARATORS,
+        chunk_size=chunk_size,
+        chunk_overlap=overlap,
+        keep_separator=False,
+        strip_whitespace=True,
+    )
+    logger.info(
+        "已初始化 LangChain 文本切分器: chunk_size=%d overlap=%d",
+        chunk_size,
+        overlap,
+    )
+    return splitter
+
+
+def split_into_chunks(text: str, chunk_size: int, chunk_overlap: int, strategy: str = "native") -> List[str]:
+    """按照给定的 chunk 大小与重叠度切分章节正文，strategy 取值见 CHUNK_STRATEGIES。"""
+    if not text or text.isspace():
+        return []
+
+    overlap = min(chunk_overlap, chunk_size // 2)
+    if strategy == "langchain":
+        splitter = _get_text_splitter(chunk_size, overlap)
+        if splitter:
+            parts = [segment.strip() for segment in splitter.split_text(text.strip())]
+            filtered = [part for part in parts if part]
+            if filtered:
+                logger.debug(
+                    "使用 LangChain 文本切分器完成分段: count=%d chunk_size=%d overlap=%d",
+                    len(filtered),
+                    chunk_size,
+                    overlap,
+                )
+                return filtered
+
+    chunks = get_text_chunker(chunk_size, overlap).split(text)
+    logger.debug(
+        "使用内置策略完成章节切分: count=%d chunk_size=%d overlap=%d",
+        len(chunks),
+        chunk_size,
+        overlap,
+    )
+    return chunks
+
+
+def split_into_token_chunks(text: str, max_tokens: int, overlap_tokens: int, model: Optional[str]) -> List[str]:
+    """按嵌入模型的 token 计数切分章节正文，使每段尽量填满 max_tokens 预算。"""
+    if not text or text.isspace():
+        return []
+
+    chunker = get_token_chunker(max_tokens, overlap_tokens, model)
+    chunks = chunker.split(text)
+    logger.debug(
+        "按 token 预算完成章节切分: count=%d max_tokens=%d overlap=%d tokenizer=%s",
+        len(chunks),
+        max_tokens,
+        chunker.overlap_tokens,
+        chunker.tokenizer.name,
+    )
+    return chunks
+
+
+__all__ = [
+    "BoundaryIndex",
+    "CHUNK_SEPARATORS",
+    "CHUNK_STRATEGIES",
+    "TextChunker",
+    "TokenChunker",
+    "get_text_chunker",
+    "get_token_chunker",
+    "split_into_chunks",
+    "split_into_token_chunks",
+]
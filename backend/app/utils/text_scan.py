@@ -0,0 +1,113 @@
+"""
+长文本扫描工具：多模式一次性匹配与区间重叠索引。
+
+MultiPatternScanner 将所有候选词构建为前缀树（Aho-Corasick 的 goto 结构），
+再编译为一条正则交给 re 引擎在 C 层推进，一次扫描即可拿到全部词的出现位置；
+纯 Python 逐字符实现的自动机在百万字级文本上反而比 re 慢。
+"""
+
+from __future__ import annotations
+
+import re
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_TERMINAL = ""
+
+
+class MultiPatternScanner:
+    """多模式匹配器：一次扫描返回每个模式的全部起始位置。
+
+    对单个模式而言，返回结果与 ``re.finditer(re.escape(pattern), text)`` 完全一致
+    （同一模式自身不重叠）；不同模式之间允许互相重叠或互为前缀。
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = list(dict.fromkeys(p for p in patterns if p))
+        self._trie: Dict[str, dict] = {}
+        for pattern in self.patterns:
+            node = self._trie
+            for ch in pattern:
+                node = node.setdefault(ch, {})
+            node[_TERMINAL] = {}
+        self._regex: Optional[re.Pattern[str]] = (
+            re.compile(self._compile_node(self._trie)) if self.patterns else None
+        )
+
+    @classmethod
+    def _compile_node(cls, node: Dict[str, dict]) -> str:
+        # 同一层的分支首字符互不相同，贪婪匹配天然得到该位置上的最长模式
+        branches = [re.escape(ch) + cls._compile_node(child) for ch, child in sorted(node.items()) if ch != _TERMINAL]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if _TERMINAL in node:
+            if len(branches) == 1:
+                body = "(?:" + body + ")"
+            body += "?"
+        return body
+
+    def _prefix_patterns(self, matched: str) -> List[str]:
+        """沿前缀树返回 matched 的所有前缀中属于模式集合的部分（含自身）。"""
+        found: List[str] = []
+        node = self._trie
+        for index, ch in enumerate(matched):
+            node = node[ch]
+            if _TERMINAL in node:
+                found.append(matched[: index + 1])
+        return found
+
+    def find_all(self, text: str) -> Dict[str, List[int]]:
+        """扫描一次文本，返回 {模式: [起始位置, ...]}，未出现的模式不会出现在结果中。"""
+        positions: Dict[str, List[int]] = {}
+        if not text or self._regex is None:
+            return positions
+
+        next_allowed: Dict[str, int] = {}
+        search = self._regex.search
+        match = search(text)
+        while match is not None:
+            start = match.start()
+            for pattern in self._prefix_patterns(match.group()):
+                # 与 re.finditer 对齐：同一模式的两次命中不能重叠
+                if start >= next_allowed.get(pattern, 0):
+                    positions.setdefault(pattern, []).append(start)
+                    next_allowed[pattern] = start + len(pattern)
+            # 从下一个字符继续，才能捕获与当前命中交叠的其他模式
+            match = search(text, start + 1)
+        return positions
+
+
+class IntervalIndex:
+    """闭区间集合的重叠查询索引。
+
+    按起点有序保存区间，并记录最长区间长度；查询时只需二分定位起点落在
+    ``[start - max_length, end]`` 内的少量候选，避免逐个比较全部已有区间。
+    """
+
+    def __init__(self) -> None:
+        self._intervals: List[Tuple[int, int]] = []
+        self._max_length = 0
+
+    def __len__(self) -> int:
+        return len(self._intervals)
+
+    def add(self, start: int, end: int) -> None:
+        if end < start:
+            start, end = end, start
+        insort(self._intervals, (start, end))
+        self._max_length = max(self._max_length, end - start)
+
+    def overlaps(self, start: int, end: int) -> bool:
+        """判断 [start, end] 是否与任一已有区间相交（端点相接也算相交）。"""
+        if not self._intervals:
+            return False
+        lo = bisect_left(self._intervals, (start - self._max_length, -1))
+        hi = bisect_right(self._intervals, (end, float("inf")))
+        for s, e in self._intervals[lo:hi]:
+            if not (end < s or start > e):
+                return True
+        return False
+
+
+__all__ = ["MultiPatternScanner", "IntervalIndex"]
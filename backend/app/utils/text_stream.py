@@ -0,0 +1,115 @@
+"""
+大文本流式处理工具：增量编码探测、分块解码与按标题行切分章节。
+
+所有函数只在内存中保留当前块与当前章节，便于处理数十 MB 的上传文件。
+"""
+
+from __future__ import annotations
+
+import codecs
+import re
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+class IncrementalEncodingDetector:
+    """按块喂入字节，同时用多个候选编码做严格增量解码，解码失败的候选即被淘汰。"""
+
+    def __init__(self, candidates: Sequence[str] = ("utf-8", "gbk")):
+        self._candidates = list(candidates)
+        self._decoders = {name: codecs.getincrementaldecoder(name)() for name in self._candidates}
+
+    def feed(self, data: bytes) -> None:
+        for name, decoder in list(self._decoders.items()):
+            try:
+                decoder.decode(data, final=False)
+            except UnicodeDecodeError:
+                del self._decoders[name]
+
+    def finish(self) -> Optional[str]:
+        """返回第一个完整通过校验的候选编码，全部失败时返回 None。"""
+        for name in self._candidates:
+            decoder = self._decoders.get(name)
+            if decoder is None:
+                continue
+            try:
+                decoder.decode(b"", final=True)
+            except UnicodeDecodeError:
+                continue
+            return name
+        return None
+
+
+def iter_decoded_blocks(
+    path: str,
+    encoding: str,
+    block_size: int,
+    on_read: Optional[Callable[[int], None]] = None,
+) -> Iterator[str]:
+    """按块读取文件并增量解码，多字节字符跨块时由解码器自动拼接。"""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    with open(path, "rb") as handle:
+        while True:
+            block = handle.read(block_size)
+            if not block:
+                break
+            text = decoder.decode(block)
+            if on_read:
+                on_read(len(block))
+            if text:
+                yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def iter_titled_sections(
+    blocks: Iterable[str],
+    title_pattern: re.Pattern[str],
+    preface_title: str = "序章",
+) -> Iterator[Tuple[str, str]]:
+    """按标题行把文本块流切分为 (标题, 正文)。
+
+    与 ``re.split(title_pattern, 全文)`` 的结果一致：首个标题前的非空内容作为 preface_title 一章，
+    标题与正文都会 strip，正文为空的章节被丢弃。title_pattern 需以 MULTILINE 编译且只匹配单行。
+    每次只处理到最后一个换行符为止，未结束的行留到下一块，因此标题不会被块边界截断。
+    """
+    title: Optional[str] = None
+    pieces: List[str] = []
+    carry = ""
+
+    def _section() -> Optional[Tuple[str, str]]:
+        body = "".join(pieces).strip()
+        if not body:
+            return None
+        return (preface_title if title is None else title, body)
+
+    def _consume(text: str) -> Iterator[Tuple[str, str]]:
+        nonlocal title, pieces
+        position = 0
+        for match in title_pattern.finditer(text):
+            pieces.append(text[position:match.start()])
+            section = _section()
+            if section:
+                yield section
+            title = match.group().strip()
+            pieces = []
+            position = match.end()
+        pieces.append(text[position:])
+
+    for block in blocks:
+        text = carry + block if carry else block
+        cut = text.rfind("\n") + 1
+        if cut == 0:
+            carry = text
+            continue
+        carry = text[cut:]
+        yield from _consume(text[:cut])
+
+    if carry:
+        yield from _consume(carry)
+    section = _section()
+    if section:
+        yield section
+
+
+__all__ = ["IncrementalEncodingDetector", "iter_decoded_blocks", "iter_titled_sections"]
@@ -0,0 +1,164 @@
+"""
+嵌入模型分词器注册表：按模型名称提供 token 计数与截断，用于按 token 预算切分章节、
+以及在调用嵌入接口前拦截超出模型输入上限的文本。
+
+OpenAI 系列模型在安装 tiktoken 时使用其 BPE 编码精确计数；未安装或编码文件无法加载时，
+与本地模型一样退回按字符类别估算（中日韩字符约 1 个 token，其余字符约 4 个一个 token）。
+新的模型可以通过 ``register_embedding_model`` 注册自己的分词器与输入上限。
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, List, Optional, Protocol
+
+logger = logging.getLogger(__name__)
+
+try:  # noqa: SIM105 - 可选依赖
+    import tiktoken
+except ImportError:  # pragma: no cover - 未安装时使用估算分词器
+    tiktoken = None  # type: ignore[assignment]
+
+# 中日韩表意文字、假名、全角标点与全角字符
+_WIDE_CHAR_PATTERN = re.compile(r"[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+
+
+class Tokenizer(Protocol):
+    """分词器只需要提供计数与按 token 截断两项能力。"""
+
+    name: str
+
+    def count(self, text: str) -> int:
+        ...
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        ...
+
+
+class EstimatingTokenizer:
+    """按字符类别估算 token 数，不依赖任何词表，适合本地模型与缺少 tiktoken 的环境。"""
+
+    def __init__(self, name: str = "estimate", wide_char_tokens: float = 1.0, chars_per_token: float = 4.0) -> None:
+        self.name = name
+        self.wide_char_tokens = wide_char_tokens
+        self.chars_per_token = chars_per_token
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        rest = _WIDE_CHAR_PATTERN.sub("", text)
+        wide = len(text) - len(rest)
+        narrow = len("".join(rest.split()))  # 空白不计入
+        return int(wide * self.wide_char_tokens + narrow / self.chars_per_token + 0.999)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if self.count(text) <= max_tokens:
+            return text
+        # token 数随前缀长度单调不减，二分查找不超过上限的最长前缀
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count(text[:middle]) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        return text[:low]
+
+
+class TiktokenTokenizer:
+    """基于 tiktoken BPE 编码的精确分词器。"""
+
+    def __init__(self, encoding_name: str) -> None:
+        self.name = encoding_name
+        self._encoding = tiktoken.get_encoding(encoding_name)
+
+    def count(self, text: str) -> int:
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        tokens = self._encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return self._encoding.decode(tokens[:max_tokens])
+
+
+def tiktoken_or_estimate(encoding_name: str, wide_char_tokens: float) -> Callable[[], Tokenizer]:
+    """优先使用 tiktoken；未安装或编码文件加载失败（如离线环境）时退回估算。"""
+
+    def factory() -> Tokenizer:
+        if tiktoken is not None:
+            try:
+                return TiktokenTokenizer(encoding_name)
+            except Exception as exc:  # pragma: no cover - 编码文件需要联网下载
+                logger.warning("加载 tiktoken 编码失败，改用估算分词器: encoding=%s error=%s", encoding_name, exc)
+        return EstimatingTokenizer(f"estimate:{encoding_name}", wide_char_tokens=wide_char_tokens)
+
+    return factory
+
+
+@dataclass(frozen=True)
+class EmbeddingModelSpec:
+    """嵌入模型的分词方式与单次输入上限（token），按模型名前缀匹配。"""
+
+    prefix: str
+    tokenizer_factory: Callable[[], Tokenizer]
+    max_input_tokens: Optional[int] = None
+
+
+# cl100k 对常用汉字大多编码为 1 个 token，生僻字为 2~3 个，估算时取偏保守的均值
+_EMBEDDING_MODELS: List[EmbeddingModelSpec] = [
+    EmbeddingModelSpec("text-embedding-3", tiktoken_or_estimate("cl100k_base", 1.3), 8191),
+    EmbeddingModelSpec("text-embedding-ada-002", tiktoken_or_estimate("cl100k_base", 1.3), 8191),
+    EmbeddingModelSpec("nomic-embed-text", EstimatingTokenizer, 2048),
+    EmbeddingModelSpec("bge-m3", EstimatingTokenizer, 8192),
+    EmbeddingModelSpec("mxbai-embed-large", EstimatingTokenizer, 512),
+]
+_DEFAULT_SPEC = EmbeddingModelSpec("", EstimatingTokenizer, None)
+
+
+def register_embedding_model(spec: EmbeddingModelSpec) -> None:
+    """注册（或覆盖）一个嵌入模型的分词方式，后注册的规则优先匹配。"""
+    _EMBEDDING_MODELS.insert(0, spec)
+    get_tokenizer.cache_clear()
+
+
+def _normalize_model_name(model: Optional[str]) -> str:
+    # 兼容 "BAAI/bge-m3"、"nomic-embed-text:latest" 等写法
+    name = (model or "").strip().lower()
+    return name.rsplit("/", 1)[-1].split(":", 1)[0]
+
+
+def embedding_model_spec(model: Optional[str]) -> EmbeddingModelSpec:
+    name = _normalize_model_name(model)
+    for spec in _EMBEDDING_MODELS:
+        if name.startswith(spec.prefix):
+            return spec
+    return _DEFAULT_SPEC
+
+
+@lru_cache(maxsize=16)
+def get_tokenizer(model: Optional[str]) -> Tokenizer:
+    """返回指定嵌入模型的分词器，每个进程每个模型只创建一次。"""
+    tokenizer = embedding_model_spec(model).tokenizer_factory()
+    logger.debug("嵌入模型分词器: model=%s tokenizer=%s", model, tokenizer.name)
+    return tokenizer
+
+
+def max_input_tokens(model: Optional[str]) -> Optional[int]:
+    """返回已知的模型单次输入上限，未知模型返回 None。"""
+    return embedding_model_spec(model).max_input_tokens
+
+
+__all__ = [
+    "EmbeddingModelSpec",
+    "EstimatingTokenizer",
+    "TiktokenTokenizer",
+    "Tokenizer",
+    "get_tokenizer",
+    "max_input_tokens",
+    "register_embedding_model",
+    "tiktoken_or_estimate",
+]
@@ -0,0 +1,57 @@
+"""重构前的内置章节切分实现，仅供 bench_chunker.py 与 run_benchmarks.py 对照边界质量与耗时。
+
+原实现在末尾窗口较短、切分点落在重叠范围内时起点会回退，导致死循环；
+这里只把下一窗口的起点限制为至少前进一个字符，其余逻辑保持原样。
+"""
+
+from typing import Dict, List, Optional
+
+
+def find_split_offset(segment: str) -> Optional[int]:
+    """在片段内部寻找更自然的分割点，优先换行，其次常见标点。"""
+    candidates: Dict[str, int] = {}
+    newline_pos = segment.rfind("\n\n")
+    if newline_pos == -1:
+        newline_pos = segment.rfind("\n")
+    if newline_pos > 0:
+        candidates["newline"] = newline_pos
+
+    punctuation_marks = ["。", "！", "？", "!", "?", ".", ";", "；"]
+    for mark in punctuation_marks:
+        idx = segment.rfind(mark)
+        if idx > 0:
+            candidates.setdefault("punctuation", idx + len(mark))
+
+    if not candidates:
+        return None
+
+    # 选择最接近末尾但又不过短的分割点
+    best_offset = max(candidates.values())
+    if best_offset < len(segment) * 0.4:
+        return None
+    return best_offset
+
+
+def legacy_split(text: str, chunk_size: int, overlap: int) -> List[str]:
+    chunks: List[str] = []
+    start = 0
+    total_length = len(text)
+
+    while start < total_length:
+        end = min(total_length, start + chunk_size)
+        segment = text[start:end]
+
+        split_offset = find_split_offset(segment)
+        if split_offset is not None and start + split_offset < total_length:
+            end = start + split_offset
+            segment = text[start:end]
+
+        chunk_text = segment.strip()
+        if chunk_text:
+            chunks.append(chunk_text)
+
+        if end >= total_length:
+            break
+        start = max(start + 1, end - overlap)
+
+    return chunks
@@ -0,0 +1,119 @@
+"""重构前的 JSON 清洗与章节兜底实现，仅供 bench_json_extract.py 对照行为与耗时。"""
+
+import json
+import re
+
+
+def unwrap_markdown_json(raw_text: str) -> str:
+    if not raw_text:
+        return raw_text
+
+    trimmed = raw_text.strip()
+
+    fence_match = re.search(r"```(?:json|JSON)?\s*(.*?)\s*```", trimmed, re.DOTALL)
+    if fence_match:
+        candidate = fence_match.group(1).strip()
+        if candidate:
+            return candidate
+
+    json_start_candidates = [idx for idx in (trimmed.find("{"), trimmed.find("[")) if idx != -1]
+    if json_start_candidates:
+        start_idx = min(json_start_candidates)
+
+        closing_brace = trimmed.rfind("}")
+        closing_bracket = trimmed.rfind("]")
+        end_idx = max(closing_brace, closing_bracket)
+
+        if end_idx != -1 and end_idx > start_idx:
+            candidate = trimmed[start_idx : end_idx + 1].strip()
+
+            brace_count = candidate.count("{") - candidate.count("}")
+            bracket_count = candidate.count("[") - candidate.count("]")
+
+            if brace_count == 0 and bracket_count == 0:
+                try:
+                    json.loads(candidate)
+                    return candidate
+                except json.JSONDecodeError:
+                    pass
+
+    return trimmed
+
+
+def sanitize_json_like_text(raw_text: str) -> str:
+    if not raw_text:
+        return raw_text
+
+    result = []
+    in_string = False
+    escape_next = False
+    length = len(raw_text)
+    i = 0
+    while i < length:
+        ch = raw_text[i]
+        if in_string:
+            if escape_next:
+                result.append(ch)
+                escape_next = False
+            elif ch == "\\":
+                result.append(ch)
+                escape_next = True
+            elif ch == '"':
+                j = i + 1
+                while j < length and raw_text[j] in " \t\r\n":
+                    j += 1
+
+                if j >= length or raw_text[j] in "}]":
+                    in_string = False
+                    result.append(ch)
+                elif raw_text[j] in ",:":
+                    in_string = False
+                    result.append(ch)
+                else:
+                    result.extend(["\\", '"'])
+            elif ch == "\n":
+                result.extend(["\\", "n"])
+            elif ch == "\r":
+                result.extend(["\\", "r"])
+            elif ch == "\t":
+                result.extend(["\\", "t"])
+            else:
+                result.append(ch)
+        else:
+            if ch == '"':
+                in_string = True
+            result.append(ch)
+        i += 1
+
+    return "".join(result)
+
+
+def recover_chapter_payload(sanitized: str):
+    """writer.generate_chapter 中 JSON 解析失败后的兜底链，返回 (结果, 策略)。"""
+    if not sanitized.strip().startswith("{"):
+        return {"full_content": sanitized}, "plain_text"
+
+    repaired = sanitized.rstrip()
+    if repaired and not repaired.endswith("}"):
+        if repaired.count('"') % 2 == 1:
+            repaired += '"'
+        open_braces = repaired.count("{") - repaired.count("}")
+        repaired += "}" * open_braces
+        try:
+            return json.loads(repaired), "repaired"
+        except json.JSONDecodeError:
+            pass
+
+    match = re.search(r'"(?:full_)?content"\s*:\s*"((?:[^"\\]|\\.)*)"', sanitized, re.DOTALL)
+    if match:
+        extracted = match.group(1)
+        extracted = extracted.replace("\\n", "\n").replace("\\t", "\t").replace('\\"', '"').replace("\\\\", "\\")
+        return {"full_content": extracted}, "content_field"
+
+    match_incomplete = re.search(r'"(?:full_)?content"\s*:\s*"(.*)$', sanitized, re.DOTALL)
+    if match_incomplete:
+        raw_content = match_incomplete.group(1).rstrip('"}]')
+        extracted = raw_content.replace("\\n", "\n").replace("\\t", "\t").replace('\\"', '"').replace("\\\\", "\\")
+        return {"full_content": extracted}, "truncated_content"
+
+    return {"content": sanitized}, "raw"
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""角色高光提取基准：对比逐角色 finditer 与一次性多模式扫描的耗时，并校验结果一致。
+
+用法：python benchmarks/bench_character_highlights.py [--size 5000000] [--names 150] [--seed 7]
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.utils.novel_text import extract_character_highlights
+from app.utils.text_scan import MultiPatternScanner
+
+COMMON_CHARS = (
+    "的一是了我不人在他有这个上们来到时大地为子中你说生国年着就那和要她出也得里后自以会家可下而过天去能对小多然于心"
+    "学么之都好看起发当没成只如事把还用第样道想作种开美总从无情己面最女但现前些所同日手又行意动方期它头经长儿回位分"
+)
+SURNAMES = "赵钱孙李周吴郑王冯陈褚卫蒋沈韩杨朱秦尤许何吕施张孔曹严华金魏陶姜欧阳司马上官"
+GIVEN_CHARS = "伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华玉萍红娥玲芬燕彩春菊兰凤洁梅琳素云莲真环雪荣爱"
+DIALOGUE_VERBS = ["说道：“", "笑道：“", "问道：“", "冷笑道：“", "低声道：“"]
+
+
+def build_names(rng: random.Random, count: int) -> list:
+    names = set()
+    while len(names) < count:
+        name = rng.choice(SURNAMES) + "".join(rng.choice(GIVEN_CHARS) for _ in range(rng.randint(1, 2)))
+        names.add(name)
+        # 刻意制造互为前缀的角色名（如“张三”与“张三丰”），覆盖交叠匹配
+        if rng.random() < 0.1 and len(name) < 4:
+            names.add(name + rng.choice(GIVEN_CHARS))
+    return sorted(names)[:count]
+
+
+def build_novel(rng: random.Random, size: int, names: list) -> str:
+    parts = []
+    total = 0
+    chapter = 1
+    while total < size:
+        roll = rng.random()
+        if roll < 0.002:
+            segment = f"\n第{chapter}章 {''.join(rng.choices(COMMON_CHARS, k=6))}\n"
+            chapter += 1
+        elif roll < 0.06:
+            speaker = rng.choice(names)
+            body = "".join(rng.choices(COMMON_CHARS, k=rng.randint(10, 30)))
+            segment = f"{speaker}{rng.choice(DIALOGUE_VERBS)}{body}{rng.choice('！？。')}”\n"
+        else:
+            segment = "".join(rng.choices(COMMON_CHARS, k=rng.randint(10, 40))) + rng.choice("，。！？\n")
+        parts.append(segment)
+        total += len(segment)
+    return "".join(parts)
+
+
+def legacy_find_all(content: str, characters: list) -> dict:
+    return {
+        char: [m.start() for m in matches]
+        for char in characters
+        if (matches := list(re.finditer(re.escape(char), content)))
+    }
+
+
+def legacy_extract_character_highlights(content: str, characters: list, context_window: int = 300) -> str:
+    """重构前的实现副本，仅用于对照。"""
+    highlights = []
+    used_ranges = []
+
+    def is_overlapping(start, end):
+        for s, e in used_ranges:
+            if not (end < s or start > e):
+                return True
+        return False
+
+    for char in characters:
+        matches = list(re.finditer(re.escape(char), content))
+        if not matches:
+            continue
+        best_score = -1
+        best_snippet = ""
+        best_range = (0, 0)
+        total = len(matches)
+        if total <= 10:
+            sample_indices = range(total)
+        else:
+            sample_indices = list(range(3)) + list(range(total // 2 - 1, total // 2 + 2)) + list(range(total - 3, total))
+        for idx in sample_indices:
+            if idx < 0 or idx >= total:
+                continue
+            m = matches[idx]
+            start = max(0, m.start() - context_window)
+            end = min(len(content), m.end() + context_window)
+            if is_overlapping(start + 50, end - 50):
+                continue
+            snippet = content[start:end]
+            score = snippet.count("“") * 2 + snippet.count("”") * 2 + snippet.count("！") + snippet.count("？")
+            if score > best_score:
+                best_score = score
+                best_snippet = snippet
+                best_range = (start, end)
+        if best_snippet:
+            first_nl = best_snippet.find("\n")
+            last_nl = best_snippet.rfind("\n")
+            if first_nl != -1 and last_nl != -1 and first_nl < last_nl:
+                clean_snippet = best_snippet[first_nl:last_nl].strip()
+            else:
+                clean_snippet = best_snippet.strip()
+            if len(clean_snippet) > 50:
+                highlights.append(f"--- 【{char}】的出场片段 ---\n{clean_snippet}\n")
+                used_ranges.append(best_range)
+    return "\n".join(highlights)
+
+
+def timed(func, *args, repeat: int = 3):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=5_000_000, help="合成小说的字符数")
+    parser.add_argument("--names", type=int, default=150, help="候选角色数量")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    names = build_names(rng, args.names)
+    content = build_novel(rng, args.size, names)
+
+    print(f"文本长度: {len(content):,} 字符, 候选角色: {len(names)}")
+
+    legacy_scan_time, legacy_positions = timed(legacy_find_all, content, names, repeat=args.repeat)
+    scanner_time, scanner_positions = timed(
+        lambda: MultiPatternScanner(names).find_all(content), repeat=args.repeat
+    )
+    print(f"[scan]       逐角色 finditer: {legacy_scan_time:.3f}s  多模式扫描: {scanner_time:.3f}s  "
+          f"加速: {legacy_scan_time / scanner_time:.1f}x")
+
+    legacy_time, legacy_output = timed(
+        legacy_extract_character_highlights, content, names, 200, repeat=args.repeat
+    )
+    current_time, current_output = timed(
+        extract_character_highlights, content, names, 200, repeat=args.repeat
+    )
+    print(f"[highlights] 旧实现: {legacy_time:.3f}s  新实现: {current_time:.3f}s  "
+          f"加速: {legacy_time / current_time:.1f}x")
+
+    consistent = legacy_positions == scanner_positions and legacy_output == current_output
+    print(f"结果一致: {'是' if consistent else '否'}")
+    return 0 if consistent else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
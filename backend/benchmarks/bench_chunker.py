@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""章节切分基准：对比内置边界索引切分器、按 token 预算切分、LangChain 递归切分器与旧的逐窗口 rfind 实现的耗时与边界质量。
+
+边界质量按片段在原文中的位置统计：片段是否止于句末/换行、是否从句首开始，以及片段长度分布；
+“平均 token”按嵌入模型的分词器统计，用于观察片段对嵌入模型输入容量的利用程度。
+同时校验内置切分器的片段完整覆盖原文（空白除外）。
+
+用法：python benchmarks/bench_chunker.py [--chapters 50] [--size 10000] [--chunk-size 480] [--overlap 120]
+                                         [--tokens 512] [--overlap-tokens 64] [--model text-embedding-3-large]
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import fixtures  # noqa: E402
+from _legacy_chunker import legacy_split  # noqa: E402
+from app.utils.text_chunker import get_text_chunker, split_into_chunks, split_into_token_chunks  # noqa: E402
+from app.utils.tokenizer import get_tokenizer  # noqa: E402
+
+SENTENCE_END = set("。！？!?；;…\n")
+CLOSING_QUOTES = set("”’\"'』」》）)]")
+
+
+def locate(text: str, chunks: List[str]) -> List[Tuple[int, int]]:
+    """在原文中定位各片段；LangChain 会丢弃分隔符，因此按顺序从上一片段起点向后查找。"""
+    spans = []
+    cursor = 0
+    for chunk in chunks:
+        position = text.find(chunk, cursor)
+        if position < 0:
+            position = text.find(chunk)
+        spans.append((position, position + len(chunk)))
+        cursor = max(position, 0)
+    return spans
+
+
+def _is_sentence_end(text: str, end: int) -> bool:
+    if end >= len(text):
+        return True
+    tail = end
+    while tail > 0 and text[tail - 1] in CLOSING_QUOTES:
+        tail -= 1
+    return (tail > 0 and text[tail - 1] in SENTENCE_END) or text[end] in SENTENCE_END or text[end].isspace()
+
+
+def _is_sentence_start(text: str, start: int) -> bool:
+    if start <= 0:
+        return True
+    return _is_sentence_end(text, start) or text[start - 1].isspace()
+
+
+def quality(text: str, chunks: List[str], count_tokens: Callable[[str], int]) -> Dict[str, float]:
+    spans = locate(text, chunks)
+    lengths = [len(chunk) for chunk in chunks]
+    return {
+        "count": len(chunks),
+        "ends_clean": sum(_is_sentence_end(text, end) for _, end in spans) / len(spans),
+        "starts_clean": sum(_is_sentence_start(text, start) for start, _ in spans) / len(spans),
+        "mean_len": statistics.fmean(lengths),
+        "min_len": min(lengths),
+        "mean_tokens": statistics.fmean(count_tokens(chunk) for chunk in chunks),
+    }
+
+
+def check_coverage(text: str, chunk_size: int, overlap: int) -> None:
+    covered = bytearray(len(text))
+    for start, end in get_text_chunker(chunk_size, overlap).split_spans(text):
+        assert end - start <= chunk_size, (start, end)
+        covered[start:end] = b"\x01" * (end - start)
+    missing = [i for i, flag in enumerate(covered) if not flag and not text[i].isspace()]
+    assert not missing, f"内置切分器遗漏了 {len(missing)} 个字符，首个位置 {missing[0]}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chapters", type=int, default=50)
+    parser.add_argument("--size", type=int, default=10000, help="每章字数")
+    parser.add_argument("--chunk-size", type=int, default=480)
+    parser.add_argument("--overlap", type=int, default=120)
+    parser.add_argument("--tokens", type=int, default=512, help="按 token 切分时的预算")
+    parser.add_argument("--overlap-tokens", type=int, default=64)
+    parser.add_argument("--model", default="text-embedding-3-large", help="决定分词器的嵌入模型名称")
+    args = parser.parse_args()
+
+    chapters = [fixtures.long_chapter(seed, args.size) for seed in range(args.chapters)]
+    for chapter in chapters:
+        check_coverage(chapter, args.chunk_size, args.overlap)
+
+    overlap = min(args.overlap, args.chunk_size // 2)
+    implementations: Dict[str, Callable[[str], List[str]]] = {
+        "native": lambda text: split_into_chunks(text, args.chunk_size, args.overlap, strategy="native"),
+        "langchain": lambda text: split_into_chunks(text, args.chunk_size, args.overlap, strategy="langchain"),
+        "legacy": lambda text: legacy_split(text.strip(), args.chunk_size, overlap),
+        "tokens": lambda text: split_into_token_chunks(text, args.tokens, args.overlap_tokens, args.model),
+    }
+    tokenizer = get_tokenizer(args.model)
+
+    print(
+        f"{args.chapters} 章 × {args.size} 字，chunk_size={args.chunk_size} overlap={overlap}，"
+        f"tokens={args.tokens} overlap_tokens={args.overlap_tokens} 分词器={tokenizer.name}"
+    )
+    print(
+        f"{'实现':<10}{'每章耗时':>12}{'片段数':>8}{'止于句末':>10}{'始于句首':>10}"
+        f"{'平均长度':>10}{'最短':>6}{'平均token':>10}"
+    )
+    for name, split in implementations.items():
+        split(chapters[0])  # 预热缓存的切分器
+        started = time.perf_counter()
+        outputs = [split(chapter) for chapter in chapters]
+        per_chapter = (time.perf_counter() - started) / len(chapters)
+        stats = [quality(chapter, chunks, tokenizer.count) for chapter, chunks in zip(chapters, outputs)]
+        print(
+            f"{name:<10}{per_chapter * 1e3:>10.3f}ms"
+            f"{statistics.fmean(s['count'] for s in stats):>8.1f}"
+            f"{statistics.fmean(s['ends_clean'] for s in stats):>10.1%}"
+            f"{statistics.fmean(s['starts_clean'] for s in stats):>10.1%}"
+            f"{statistics.fmean(s['mean_len'] for s in stats):>10.1f}"
+            f"{min(s['min_len'] for s in stats):>6}"
+            f"{statistics.fmean(s['mean_tokens'] for s in stats):>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
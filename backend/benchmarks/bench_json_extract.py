@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""JSON 提取/修复基准：对比旧的逐字符实现与 app.utils.json_extract，并用回归语料校验行为一致。
+
+用法：
+    python benchmarks/bench_json_extract.py                    # 校验语料 + 随机模糊测试 + 耗时对比
+    python benchmarks/bench_json_extract.py --build-corpus     # 用旧实现重新生成回归语料
+    python benchmarks/bench_json_extract.py --fuzz 20000 --seed 3 --tokens 16000
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import _legacy_json as legacy  # noqa: E402
+from app.utils.json_extract import extract_json_span, recover_chapter_payload, repair_json_strings  # noqa: E402
+
+CORPUS_PATH = Path(__file__).resolve().parent / "data" / "json_extract_corpus.jsonl"
+
+# 三组实现：名称 -> (旧实现, 新实现)
+FUNCTIONS = {
+    "unwrap": (legacy.unwrap_markdown_json, extract_json_span),
+    "sanitize": (legacy.sanitize_json_like_text, repair_json_strings),
+    "recover": (legacy.recover_chapter_payload, recover_chapter_payload),
+}
+
+# 刻意包含大量结构字符、引号、反斜杠与空白，提高触发边界分支的概率
+TRICKY_TOKENS = [
+    '"', '\\', '\\"', '\\\\', '\\n', "\n", "\r\n", "\t", " ", ",", ":", "{", "}", "[", "]",
+    "```", "```json", "```JSON", "json", '"content"', '"full_content"', '": "', "“", "”",
+    "他说：", "“走吧。”", "夜色", "Lorem", "0", "null", "true",
+]
+PROSE = "夜色如墨，长街尽头传来马蹄声。她停下脚步，回头望去，“是谁？”无人应答。风吹过檐角的铜铃，叮当作响。\n\n"
+
+
+def _random_noise(rng: random.Random, max_tokens: int) -> str:
+    return "".join(rng.choice(TRICKY_TOKENS) for _ in range(rng.randint(0, max_tokens)))
+
+
+def _chapter_body(rng: random.Random, approx_chars: int, loose: bool) -> str:
+    """生成章节正文；loose 时保留未转义的换行与引号，模拟模型输出的“近似 JSON”。"""
+    text = (PROSE * (approx_chars // len(PROSE) + 1))[:approx_chars]
+    if loose:
+        text = text.replace("“", '"', rng.randint(0, 3)).replace("”", '"', rng.randint(0, 3))
+        return text
+    return json.dumps(text, ensure_ascii=False)[1:-1]
+
+
+def make_llm_output(rng: random.Random, approx_chars: int = 200) -> str:
+    """生成一段形似 LLM 章节输出的文本：可能带围栏、前后缀说明、未转义字符或被截断。"""
+    key = rng.choice(["full_content", "content", "summary"])
+    body = _chapter_body(rng, rng.randint(0, approx_chars), loose=rng.random() < 0.6)
+    payload = '{"title": "第%d章", "%s": "%s", "notes": [%s]}' % (
+        rng.randint(1, 99),
+        key,
+        body,
+        ", ".join('"%s"' % _random_noise(rng, 3) for _ in range(rng.randint(0, 2))),
+    )
+    if rng.random() < 0.3:
+        payload = payload.replace(", ", rng.choice([",\n  ", " , ", ",\t"]))
+    if rng.random() < 0.25:
+        payload = payload[: rng.randint(0, len(payload))]
+    if rng.random() < 0.3:
+        fence = rng.choice(["```json", "```JSON", "```", "```json\n", "````"])
+        payload = "%s\n%s\n%s" % (fence, payload, rng.choice(["```", "", "``", "```\n后记"]))
+    if rng.random() < 0.3:
+        payload = rng.choice(["以下是章节内容：\n", "  ", "[注] ", "<output>"]) + payload
+    if rng.random() < 0.3:
+        payload += rng.choice(["\n以上。", "  \n", "]", "}}", '"', "\\"])
+    if rng.random() < 0.2:
+        position = rng.randint(0, len(payload))
+        payload = payload[:position] + _random_noise(rng, 6) + payload[position:]
+    return payload
+
+
+def iter_cases(seed: int, count: int):
+    rng = random.Random(seed)
+    for _ in range(count):
+        if rng.random() < 0.15:
+            yield _random_noise(rng, 40)
+        else:
+            yield make_llm_output(rng)
+
+
+def _apply(func, text):
+    try:
+        return {"ok": func(text)}
+    except Exception as exc:  # noqa: BLE001 - 异常类型本身也是行为的一部分
+        return {"error": type(exc).__name__}
+
+
+def _normalize(value):
+    # recover 返回 (dict, strategy) 元组，JSON 往返后变为列表，统一成列表比较
+    return json.loads(json.dumps(value, ensure_ascii=False))
+
+
+def build_corpus(seed: int, count: int) -> None:
+    CORPUS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with CORPUS_PATH.open("w", encoding="utf-8") as handle:
+        for text in iter_cases(seed, count):
+            record = {"input": text}
+            for name, (old, _new) in FUNCTIONS.items():
+                record[name] = _apply(old, text)
+            handle.write(json.dumps(record, ensure_ascii=False) + "\n")
+    print("已写入 %d 条回归语料：%s" % (count, CORPUS_PATH))
+
+
+def verify_corpus() -> int:
+    if not CORPUS_PATH.exists():
+        print("未找到回归语料，跳过（先运行 --build-corpus）")
+        return 0
+    failures = 0
+    total = 0
+    with CORPUS_PATH.open(encoding="utf-8") as handle:
+        for line in handle:
+            record = json.loads(line)
+            total += 1
+            for name, (_old, new) in FUNCTIONS.items():
+                actual = _normalize(_apply(new, record["input"]))
+                if actual != record[name]:
+                    failures += 1
+                    if failures <= 5:
+                        print("[语料不一致] %s: %r" % (name, record["input"][:200]))
+    print("回归语料：%d 条，不一致 %d 处" % (total, failures))
+    return failures
+
+
+def verify_fuzz(seed: int, count: int) -> int:
+    failures = 0
+    for text in iter_cases(seed, count):
+        for name, (old, new) in FUNCTIONS.items():
+            if _apply(old, text) != _apply(new, text):
+                failures += 1
+                if failures <= 5:
+                    print("[模糊测试不一致] %s: %r" % (name, text[:200]))
+    print("模糊测试：%d 条，不一致 %d 处" % (count, failures))
+    return failures
+
+
+def _best_of(func, text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run_benchmarks(seed: int, tokens: int, repeat: int) -> None:
+    rng = random.Random(seed)
+    # 中文约 1 token ≈ 1.5 字，按此估算 16k token 输出的字符规模
+    chars = int(tokens * 1.5)
+    loose_body = _chapter_body(rng, chars, loose=True)
+    all_names = ("unwrap", "sanitize", "recover")
+    cases = [
+        ("围栏包裹的合法 JSON", "以下是结果：\n```json\n%s\n```" % json.dumps({"full_content": "x" * chars}, ensure_ascii=False), all_names[:2]),
+        ("夹杂说明的合法 JSON", "好的。\n%s\n希望满意。" % json.dumps({"full_content": PROSE * (chars // len(PROSE))}, ensure_ascii=False), all_names[:2]),
+        ("未转义换行与引号", '{"title": "第1章", "full_content": "%s"}' % loose_body, all_names),
+        ("被截断的输出", '{"title": "第1章", "full_content": "%s' % loose_body[: chars * 9 // 10], all_names),
+    ]
+    print("\n输出规模约 %d token（%d 字），取 %d 次最优：" % (tokens, chars, repeat))
+    print("%-20s %-10s %12s %12s %8s" % ("场景", "函数", "旧实现(ms)", "新实现(ms)", "加速"))
+    for label, text, names in cases:
+        for name in names:
+            old, new = FUNCTIONS[name]
+            # recover 在线上接收的是清洗之后的文本
+            text_for = legacy.sanitize_json_like_text(text) if name == "recover" else text
+            old_time = _best_of(old, text_for, repeat)
+            new_time = _best_of(new, text_for, repeat)
+            print(
+                "%-20s %-10s %12.3f %12.3f %7.1fx"
+                % (label, name, old_time * 1000, new_time * 1000, old_time / new_time if new_time else float("inf"))
+            )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--build-corpus", action="store_true", help="用旧实现重新生成回归语料")
+    parser.add_argument("--corpus-size", type=int, default=300)
+    parser.add_argument("--corpus-seed", type=int, default=2024)
+    parser.add_argument("--fuzz", type=int, default=5000, help="额外随机模糊测试的用例数")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--tokens", type=int, default=16000, help="耗时对比使用的输出规模（token）")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.build_corpus:
+        build_corpus(args.corpus_seed, args.corpus_size)
+        return 0
+
+    failures = verify_corpus() + verify_fuzz(args.seed, args.fuzz)
+    run_benchmarks(args.seed, args.tokens, args.repeat)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""基准测试用的合成数据：按固定随机种子生成，保证不同机器、不同提交之间的输入完全一致。
+
+覆盖线上最常见的大输入：长篇中文章节、带思考标签与代码块的 LLM 章节 JSON、
+300 章规模的项目 ORM 对象图、3072 维向量，以及导入时用于角色提取的整本小说。
+"""
+
+import json
+import math
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Tuple
+
+from bench_character_highlights import COMMON_CHARS, build_names, build_novel
+
+from app.models.novel import (
+    BlueprintCharacter,
+    BlueprintRelationship,
+    Chapter,
+    ChapterEvaluation,
+    ChapterOutline,
+    ChapterVersion,
+    NovelBlueprint,
+    NovelConversation,
+    NovelProject,
+)
+
+PUNCTUATION = "，，，。。！？；"
+DIALOGUE_OPENERS = ["说道：“", "低声道：“", "笑道：“", "问：“"]
+_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def chinese_paragraph(rng: random.Random, length: int) -> str:
+    """生成一段约 length 字、带标点与对话的中文段落。"""
+    parts: List[str] = []
+    total = 0
+    while total < length:
+        if rng.random() < 0.15:
+            body = "".join(rng.choices(COMMON_CHARS, k=rng.randint(8, 24)))
+            segment = f"{rng.choice(('林远', '苏晴', '沈墨'))}{rng.choice(DIALOGUE_OPENERS)}{body}{rng.choice('！？。')}”"
+        else:
+            segment = "".join(rng.choices(COMMON_CHARS, k=rng.randint(6, 30))) + rng.choice(PUNCTUATION)
+        parts.append(segment)
+        total += len(segment)
+    return "".join(parts)
+
+
+def long_chapter(seed: int = 1, size: int = 20000) -> str:
+    """生成约 size 字的章节正文，段落之间以空行分隔。"""
+    rng = random.Random(seed)
+    paragraphs: List[str] = []
+    total = 0
+    while total < size:
+        paragraph = chinese_paragraph(rng, rng.randint(120, 600))
+        paragraphs.append(paragraph)
+        total += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def llm_chapter_response(seed: int = 2, size: int = 8000) -> str:
+    """模拟模型返回的章节：思考标签 + Markdown 代码块 + 正文中未转义的换行与引号。"""
+    rng = random.Random(seed)
+    thinking = chinese_paragraph(rng, 1500)
+    content = long_chapter(seed, size)
+    payload = json.dumps({"title": "第十二章 夜雨", "full_content": "__CONTENT__"}, ensure_ascii=False, indent=2)
+    # 模型常把正文原样塞进 JSON 字符串，换行与英文引号都不转义
+    raw_content = content.replace("“", '"', 3)
+    return f"<think>\n{thinking}\n</think>\n\n```json\n{payload.replace('__CONTENT__', raw_content)}\n```\n"
+
+
+def version_contents(seed: int = 3, count: int = 200) -> List[Tuple[Any, Any]]:
+    """生成 _normalize_version_content 的输入：纯文本、JSON 字符串、嵌套字典与列表混合。"""
+    rng = random.Random(seed)
+    samples: List[Tuple[Any, Any]] = []
+    for index in range(count):
+        text = chinese_paragraph(rng, rng.randint(800, 3000))
+        kind = index % 4
+        if kind == 0:
+            samples.append((text, None))
+        elif kind == 1:
+            samples.append((json.dumps({"full_content": text}, ensure_ascii=False), None))
+        elif kind == 2:
+            samples.append(({"chapter": {"content": text, "title": "标题"}}, {"provider": "stub"}))
+        else:
+            samples.append(([{"text": text[:400]}, {"content": text[400:]}], {"content": text}))
+    return samples
+
+
+def build_project(chapter_count: int = 300, versions_per_chapter: int = 3, seed: int = 4) -> NovelProject:
+    """在内存中构造一个完整的项目对象图（不落库），用于序列化基准。"""
+    rng = random.Random(seed)
+    project = NovelProject(
+        id="bench-project",
+        user_id=1,
+        title="基准测试长篇",
+        initial_prompt=chinese_paragraph(rng, 200),
+        status="writing",
+        created_at=_EPOCH,
+        updated_at=_EPOCH,
+    )
+    project.conversations = [
+        NovelConversation(seq=seq, role="user" if seq % 2 == 0 else "assistant", content=chinese_paragraph(rng, 300))
+        for seq in range(40)
+    ]
+    project.blueprint = NovelBlueprint(
+        title=project.title,
+        target_audience="成年读者",
+        genre="玄幻",
+        style="冷峻",
+        tone="沉郁",
+        one_sentence_summary=chinese_paragraph(rng, 60),
+        full_synopsis=chinese_paragraph(rng, 3000),
+        world_setting={"core_rules": chinese_paragraph(rng, 500), "key_locations": [{"name": f"地点{i}"} for i in range(20)]},
+    )
+    names = build_names(rng, 60)
+    project.characters = [
+        BlueprintCharacter(
+            name=name,
+            identity="身份",
+            personality=chinese_paragraph(rng, 80),
+            goals=chinese_paragraph(rng, 60),
+            abilities=chinese_paragraph(rng, 60),
+            relationship_to_protagonist="同伴",
+            extra={"age": rng.randint(12, 80)},
+            position=position,
+        )
+        for position, name in enumerate(names)
+    ]
+    project.relationships_ = [
+        BlueprintRelationship(
+            character_from=names[index],
+            character_to=names[(index + 1) % len(names)],
+            description=chinese_paragraph(rng, 40),
+            position=index,
+        )
+        for index in range(len(names))
+    ]
+    project.outlines = [
+        ChapterOutline(chapter_number=number, title=f"第{number}章", summary=chinese_paragraph(rng, 150))
+        for number in range(1, chapter_count + 1)
+    ]
+    chapters: List[Chapter] = []
+    for number in range(1, chapter_count + 1):
+        created = _EPOCH + timedelta(hours=number)
+        versions = [
+            ChapterVersion(
+                version_label=f"v{index + 1}",
+                content=chinese_paragraph(rng, 3000),
+                created_at=created + timedelta(minutes=index),
+            )
+            for index in range(versions_per_chapter)
+        ]
+        chapter = Chapter(
+            chapter_number=number,
+            real_summary=chinese_paragraph(rng, 120),
+            status="successful",
+            word_count=len(versions[0].content),
+            created_at=created,
+            updated_at=created,
+        )
+        chapter.versions = versions
+        chapter.selected_version = versions[0]
+        chapter.evaluations = [
+            ChapterEvaluation(decision="accept", feedback=chinese_paragraph(rng, 200), created_at=created)
+        ]
+        chapters.append(chapter)
+    project.chapters = chapters
+    return project
+
+
+def unit_vectors(count: int, dim: int = 3072, seed: int = 5) -> List[List[float]]:
+    """生成 count 个 dim 维单位向量。"""
+    rng = random.Random(seed)
+    vectors: List[List[float]] = []
+    for _ in range(count):
+        values = [rng.gauss(0.0, 1.0) for _ in range(dim)]
+        norm = math.sqrt(sum(value * value for value in values)) or 1.0
+        vectors.append([value / norm for value in values])
+    return vectors
+
+
+def novel_with_names(size: int = 2_000_000, name_count: int = 150, seed: int = 7) -> Dict[str, Any]:
+    """生成导入场景的整本小说文本与角色候选名单。"""
+    rng = random.Random(seed)
+    names = build_names(rng, name_count)
+    return {"text": build_novel(rng, size, names), "names": names}
+
+
+__all__ = [
+    "build_project",
+    "chinese_paragraph",
+    "llm_chapter_response",
+    "long_chapter",
+    "novel_with_names",
+    "unit_vectors",
+    "version_contents",
+]
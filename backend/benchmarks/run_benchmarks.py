@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""热点路径微基准：固定合成数据，统计每次调用耗时，结果保存为 JSON 以便跨提交对比。
+
+覆盖 JSON 清洗、章节切分（内置边界索引、LangChain 与旧的逐窗口实现）、章节版本文本归一化、项目序列化、
+向量编解码与 Python 余弦兜底，以及导入小说时的角色提取。
+
+用法：
+    python benchmarks/run_benchmarks.py                          # 运行全部基准并保存到 benchmarks/results/
+    python benchmarks/run_benchmarks.py --filter vector --quick  # 只跑名称包含 vector 的基准，缩短计时
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/baseline.json --fail-on-regression
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+
+# 导入应用模块需要基础配置，基准只用到纯计算逻辑，不会连接数据库
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("DB_PROVIDER", "sqlite")
+
+import fixtures  # noqa: E402
+from _legacy_chunker import legacy_split  # noqa: E402
+from app.schemas.novel import NovelSectionType  # noqa: E402
+from app.services.novel_service import NovelService, _coerce_text, _normalize_version_content  # noqa: E402
+from app.services.vector_snapshots import VectorSnapshotStore, snapshot_stem, write_snapshot  # noqa: E402
+from app.services.vector_store_service import VectorStoreService  # noqa: E402
+from app.utils.hybrid_search import build_match_query, lexical_terms, reciprocal_rank_fusion  # noqa: E402
+from app.utils.json_utils import remove_think_tags, sanitize_json_like_text, unwrap_markdown_json  # noqa: E402
+from app.utils.mmr import mmr_select  # noqa: E402
+from app.utils.novel_text import (  # noqa: E402
+    count_character_mentions,
+    extract_character_highlights,
+    rank_potential_characters,
+)
+from app.utils.text_chunker import split_into_chunks, split_into_token_chunks  # noqa: E402
+
+RESULTS_DIR = BENCH_DIR / "results"
+
+# 准备函数负责构造数据并返回被计时的无参调用，数据构造不计入耗时
+Setup = Callable[[], Callable[[], Any]]
+BENCHMARKS: Dict[str, Setup] = {}
+
+
+def benchmark(name: str) -> Callable[[Setup], Setup]:
+    def decorator(setup: Setup) -> Setup:
+        BENCHMARKS[name] = setup
+        return setup
+
+    return decorator
+
+
+# ---------------------------------------------------------------- JSON 清洗
+
+
+@benchmark("json.remove_think_tags")
+def _bench_remove_think_tags() -> Callable[[], Any]:
+    raw = fixtures.llm_chapter_response()
+    return lambda: remove_think_tags(raw)
+
+
+@benchmark("json.unwrap_markdown_json")
+def _bench_unwrap() -> Callable[[], Any]:
+    raw = remove_think_tags(fixtures.llm_chapter_response())
+    return lambda: unwrap_markdown_json(raw)
+
+
+@benchmark("json.sanitize_json_like_text")
+def _bench_sanitize() -> Callable[[], Any]:
+    raw = unwrap_markdown_json(remove_think_tags(fixtures.llm_chapter_response()))
+    return lambda: sanitize_json_like_text(raw)
+
+
+# ---------------------------------------------------------------- 章节切分
+
+
+@benchmark("chunker.native_10k")
+def _bench_split_native_10k() -> Callable[[], Any]:
+    text = fixtures.long_chapter(size=10000)
+    return lambda: split_into_chunks(text, 480, 120, strategy="native")
+
+
+@benchmark("chunker.native_20k")
+def _bench_split_native() -> Callable[[], Any]:
+    text = fixtures.long_chapter()
+    return lambda: split_into_chunks(text, 480, 120, strategy="native")
+
+
+@benchmark("chunker.langchain_10k")
+def _bench_split_langchain_10k() -> Callable[[], Any]:
+    text = fixtures.long_chapter(size=10000)
+    return lambda: split_into_chunks(text, 480, 120, strategy="langchain")
+
+
+@benchmark("chunker.langchain_20k")
+def _bench_split_langchain() -> Callable[[], Any]:
+    text = fixtures.long_chapter()
+    return lambda: split_into_chunks(text, 480, 120, strategy="langchain")
+
+
+@benchmark("chunker.tokens_10k")
+def _bench_split_tokens_10k() -> Callable[[], Any]:
+    text = fixtures.long_chapter(size=10000)
+    return lambda: split_into_token_chunks(text, 512, 64, "text-embedding-3-large")
+
+
+@benchmark("chunker.legacy_20k")
+def _bench_split_legacy() -> Callable[[], Any]:
+    text = fixtures.long_chapter().strip()
+    return lambda: legacy_split(text, 480, 120)
+
+
+# ---------------------------------------------------------------- 章节版本文本
+
+
+@benchmark("novel.coerce_text_x200")
+def _bench_coerce_text() -> Callable[[], Any]:
+    samples = fixtures.version_contents()
+
+    def run() -> None:
+        for raw, _ in samples:
+            _coerce_text(raw)
+
+    return run
+
+
+@benchmark("novel.normalize_version_content_x200")
+def _bench_normalize_version() -> Callable[[], Any]:
+    samples = fixtures.version_contents()
+
+    def run() -> None:
+        for raw, metadata in samples:
+            _normalize_version_content(raw, metadata)
+
+    return run
+
+
+# ---------------------------------------------------------------- 项目序列化
+
+
+@benchmark("novel.serialize_project_300ch")
+def _bench_serialize_project() -> Callable[[], Any]:
+    project = fixtures.build_project()
+    service = NovelService(None)  # 序列化只读取对象图，不访问会话
+    loop = asyncio.new_event_loop()
+    return lambda: loop.run_until_complete(service._serialize_project(project))
+
+
+@benchmark("novel.section_chapters_300ch")
+def _bench_section_chapters() -> Callable[[], Any]:
+    project = fixtures.build_project()
+    service = NovelService(None)
+    return lambda: service._build_section_response(project, NovelSectionType.CHAPTERS)
+
+
+@benchmark("novel.section_characters")
+def _bench_section_characters() -> Callable[[], Any]:
+    project = fixtures.build_project()
+    service = NovelService(None)
+    return lambda: service._build_section_response(project, NovelSectionType.CHARACTERS)
+
+
+# ---------------------------------------------------------------- 向量
+
+
+@benchmark("vector.to_f32_blob_3072")
+def _bench_to_blob() -> Callable[[], Any]:
+    vector = fixtures.unit_vectors(1)[0]
+    return lambda: VectorStoreService._to_f32_blob(vector)
+
+
+@benchmark("vector.from_f32_blob_3072")
+def _bench_from_blob() -> Callable[[], Any]:
+    blob = VectorStoreService._to_f32_blob(fixtures.unit_vectors(1)[0])
+    return lambda: VectorStoreService._from_f32_blob(blob)
+
+
+@benchmark("vector.cosine_distance_3072")
+def _bench_cosine() -> Callable[[], Any]:
+    vec_a, vec_b = fixtures.unit_vectors(2)
+    return lambda: VectorStoreService._cosine_distance(vec_a, vec_b)
+
+
+@benchmark("vector.python_scan_200x3072")
+def _bench_python_scan() -> Callable[[], Any]:
+    """模拟 libsql 不支持向量函数时的兜底路径：逐行解码 BLOB 并计算余弦距离后排序。"""
+    query, *rows = fixtures.unit_vectors(201)
+    blobs = [VectorStoreService._to_f32_blob(row) for row in rows]
+
+    def run() -> List[float]:
+        distances = [
+            VectorStoreService._cosine_distance(query, VectorStoreService._from_f32_blob(blob))
+            for blob in blobs
+        ]
+        return sorted(distances)[:6]
+
+    return run
+
+
+@benchmark("vector.snapshot_nearest_200x3072")
+def _bench_snapshot_nearest() -> Callable[[], Any]:
+    """与 python_scan 相同的数据，改为从 mmap 快照计算距离（安装 numpy 时为矩阵乘法）。"""
+    query, *rows = fixtures.unit_vectors(201)
+    workdir = tempfile.TemporaryDirectory(prefix="arboris-bench-")
+    ids = [f"chunk-{index}" for index in range(len(rows))]
+    stem = snapshot_stem("rag_chunks", "bench", len(query))
+    write_snapshot(Path(workdir.name), stem, 1, ids, [VectorStoreService._to_f32_blob(row) for row in rows], len(query))
+    snapshot = VectorSnapshotStore(Path(workdir.name)).get("rag_chunks", "bench", len(query), 1)
+    allowed = set(ids)
+
+    def run() -> Any:
+        # 闭包持有临时目录，计时结束前不会被清理
+        assert workdir
+        return snapshot.nearest(query, 6, allowed)
+
+    return run
+
+
+
+@benchmark("vector.lexical_terms_480")
+def _bench_lexical_terms() -> Callable[[], Any]:
+    """写入每个片段时生成全文索引检索词的开销。"""
+    text = fixtures.long_chapter(size=480)
+    return lambda: lexical_terms(text)
+
+
+@benchmark("vector.match_query_outline")
+def _bench_match_query() -> Callable[[], Any]:
+    text = fixtures.long_chapter(seed=3, size=300)
+    return lambda: build_match_query(text)
+
+
+@benchmark("vector.rrf_2x20")
+def _bench_rrf() -> Callable[[], Any]:
+    vector_hits = list(range(20))
+    lexical_hits = list(range(10, 30))
+    return lambda: reciprocal_rank_fusion([vector_hits, lexical_hits], key=lambda item: item)
+
+
+
+@benchmark("vector.mmr_20x3072")
+def _bench_mmr() -> Callable[[], Any]:
+    """从 20 个候选中挑选 5 个片段；安装 numpy 时走矩阵实现。"""
+    query, *candidates = fixtures.unit_vectors(21)
+    return lambda: mmr_select(query, candidates, 5, 0.7)
+
+
+# ---------------------------------------------------------------- 导入角色提取
+
+
+@benchmark("import.count_character_mentions_2m")
+def _bench_count_mentions() -> Callable[[], Any]:
+    novel = fixtures.novel_with_names()
+
+    def run() -> List[str]:
+        counter: Counter = Counter()
+        count_character_mentions(novel["text"], counter)
+        return rank_potential_characters(counter, top_n=150)
+
+    return run
+
+
+@benchmark("import.extract_character_highlights_2m")
+def _bench_highlights() -> Callable[[], Any]:
+    novel = fixtures.novel_with_names()
+    return lambda: extract_character_highlights(novel["text"], novel["names"])
+
+
+# ---------------------------------------------------------------- 计时与报告
+
+
+def measure(call: Callable[[], Any], min_time: float, repeats: int) -> Dict[str, Any]:
+    """预热一次后自动确定每轮循环次数，使单轮耗时不低于 min_time，再重复 repeats 轮取统计量。"""
+    started = time.perf_counter()
+    call()
+    single = max(time.perf_counter() - started, 1e-9)
+    loops = max(1, int(min_time / single))
+
+    per_call: List[float] = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(loops):
+            call()
+        per_call.append((time.perf_counter() - started) / loops)
+
+    return {
+        "loops": loops,
+        "repeats": repeats,
+        "min": min(per_call),
+        "median": statistics.median(per_call),
+        "mean": statistics.fmean(per_call),
+        "stdev": statistics.stdev(per_call) if len(per_call) > 1 else 0.0,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BENCH_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip() or None
+
+
+def _format_seconds(value: float) -> str:
+    if value >= 1:
+        return f"{value:.3f}s"
+    if value >= 1e-3:
+        return f"{value * 1e3:.3f}ms"
+    return f"{value * 1e6:.2f}µs"
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline_path: Path, threshold: float) -> List[str]:
+    """按中位数与基线对比，返回变慢超过阈值的基准名称。"""
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8")).get("benchmarks", {})
+    regressions: List[str] = []
+    print(f"\n对比基线 {baseline_path}（阈值 ±{threshold:.0%}）")
+    for name, stats in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            print(f"  {name:<42} 基线中不存在")
+            continue
+        ratio = stats["median"] / previous["median"] - 1
+        if ratio > threshold:
+            verdict = "变慢"
+            regressions.append(name)
+        elif ratio < -threshold:
+            verdict = "变快"
+        else:
+            verdict = "持平"
+        print(
+            f"  {name:<42} {_format_seconds(previous['median']):>12} -> "
+            f"{_format_seconds(stats['median']):>12} {ratio:+7.1%} {verdict}"
+        )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="运行热点路径微基准并保存结果")
+    parser.add_argument("--filter", default="", help="只运行名称包含该子串的基准")
+    parser.add_argument("--quick", action="store_true", help="缩短计时，用于快速冒烟")
+    parser.add_argument("--repeats", type=int, default=None, help="重复轮数，默认 7（--quick 为 3）")
+    parser.add_argument("--min-time", type=float, default=None, help="单轮最短耗时（秒），默认 0.2（--quick 为 0.02）")
+    parser.add_argument("--save", type=Path, default=None, help="结果 JSON 路径，默认 benchmarks/results/<时间戳>.json")
+    parser.add_argument("--no-save", action="store_true", help="不保存结果")
+    parser.add_argument("--compare", type=Path, default=None, help="与之前保存的结果 JSON 对比")
+    parser.add_argument("--threshold", type=float, default=0.10, help="判定变慢/变快的中位数变化比例")
+    parser.add_argument("--fail-on-regression", action="store_true", help="存在变慢的基准时以非零状态退出")
+    parser.add_argument("--list", action="store_true", help="列出全部基准名称")
+    args = parser.parse_args()
+
+    if args.list:
+        print("\n".join(BENCHMARKS))
+        return 0
+
+    repeats = args.repeats or (3 if args.quick else 7)
+    min_time = args.min_time or (0.02 if args.quick else 0.2)
+    selected = [name for name in BENCHMARKS if args.filter in name]
+    if not selected:
+        print(f"没有名称包含 {args.filter!r} 的基准")
+        return 1
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for name in selected:
+        call = BENCHMARKS[name]()
+        stats = measure(call, min_time, repeats)
+        results[name] = stats
+        print(
+            f"{name:<42} median {_format_seconds(stats['median']):>12}  "
+            f"min {_format_seconds(stats['min']):>12}  ±{_format_seconds(stats['stdev']):>10}  (loops={stats['loops']})"
+        )
+
+    report = {
+        "metadata": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "quick": args.quick,
+            "repeats": repeats,
+            "min_time": min_time,
+        },
+        "benchmarks": results,
+    }
+
+    if not args.no_save:
+        path = args.save or RESULTS_DIR / f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\n结果已保存到 {path}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions and args.fail_on_regression:
+            print(f"\n{len(regressions)} 项基准变慢超过 {args.threshold:.0%}: {', '.join(regressions)}")
+            return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
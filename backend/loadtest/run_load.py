@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""端到端压测：N 个虚拟用户并发走真实业务流程，统计各步骤的延迟分位数与错误率。
+
+场景（按 --mix 权重随机抽取）：
+    write   新建项目 -> 概念对话至完成 -> 生成蓝图 -> 生成第 1 章 -> 选择版本 -> 编辑正文 -> 读取
+    import  上传生成的 TXT 小说 -> 订阅导入进度直到完成 -> 读取项目
+    read    列出项目 -> 读取项目详情、各区段与章节
+
+用法（先启动 loadtest/stub_llm.py 与后端）：
+    python loadtest/run_load.py --base-url http://127.0.0.1:8000 --configure-stub http://127.0.0.1:9100/v1
+    python loadtest/run_load.py --users 20 --duration 120 --mix write=1,import=1,read=6 --label mysql --json out.json
+
+数据库对比：分别以 DB_PROVIDER=sqlite 与 DB_PROVIDER=mysql 启动后端，用相同参数各跑一次，
+通过 --label 区分报告。--configure-stub 会以管理员身份把 llm.base_url / embedding.base_url
+指向桩服务并放开每日请求上限，正式环境请勿使用。
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+PROSE = "夜色如墨，长街尽头传来马蹄声。沈砚停下脚步，回头望去，“是谁？”无人应答。风吹过檐角的铜铃，叮当作响。\n"
+
+
+@dataclass
+class StepStats:
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    statuses: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+
+class Recorder:
+    """按步骤名记录耗时与状态码；失败的请求同样计入延迟，便于观察超时的影响。"""
+
+    def __init__(self) -> None:
+        self.steps: Dict[str, StepStats] = defaultdict(StepStats)
+        self.scenarios: Dict[str, StepStats] = defaultdict(StepStats)
+
+    async def call(
+        self,
+        client: httpx.AsyncClient,
+        step: str,
+        method: str,
+        url: str,
+        *,
+        expected: Tuple[int, ...] = (200, 201),
+        **kwargs: Any,
+    ) -> Optional[httpx.Response]:
+        stats = self.steps[step]
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as exc:
+            stats.latencies.append(time.perf_counter() - started)
+            stats.errors += 1
+            stats.statuses[type(exc).__name__] += 1
+            return None
+        stats.latencies.append(time.perf_counter() - started)
+        stats.statuses[str(response.status_code)] += 1
+        if response.status_code not in expected:
+            stats.errors += 1
+            return None
+        return response
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(stats: Dict[str, StepStats]) -> Dict[str, Dict[str, Any]]:
+    summary: Dict[str, Dict[str, Any]] = {}
+    for name, item in sorted(stats.items()):
+        ordered = sorted(item.latencies)
+        count = len(ordered)
+        summary[name] = {
+            "count": count,
+            "errors": item.errors,
+            "error_rate": round(item.errors / count, 4) if count else 0.0,
+            "mean_ms": round(statistics.fmean(ordered) * 1000, 1) if ordered else 0.0,
+            "p50_ms": round(_percentile(ordered, 0.50) * 1000, 1),
+            "p90_ms": round(_percentile(ordered, 0.90) * 1000, 1),
+            "p95_ms": round(_percentile(ordered, 0.95) * 1000, 1),
+            "p99_ms": round(_percentile(ordered, 0.99) * 1000, 1),
+            "max_ms": round(ordered[-1] * 1000, 1) if ordered else 0.0,
+            "statuses": dict(item.statuses),
+        }
+    return summary
+
+
+def print_table(title: str, summary: Dict[str, Dict[str, Any]]) -> None:
+    print(f"\n{title}")
+    header = f"{'step':<28}{'count':>7}{'err%':>8}{'p50':>10}{'p90':>10}{'p95':>10}{'p99':>10}{'max':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, row in summary.items():
+        print(
+            f"{name:<28}{row['count']:>7}{row['error_rate'] * 100:>7.1f}%"
+            f"{row['p50_ms']:>10.0f}{row['p90_ms']:>10.0f}{row['p95_ms']:>10.0f}{row['p99_ms']:>10.0f}{row['max_ms']:>10.0f}"
+        )
+    print("(单位: ms)")
+
+
+# -------------------- 场景 --------------------
+
+
+class VirtualUser:
+    def __init__(self, index: int, client: httpx.AsyncClient, recorder: Recorder, args: argparse.Namespace) -> None:
+        self.index = index
+        self.client = client
+        self.recorder = recorder
+        self.args = args
+        self.rng = random.Random(f"{args.seed}-{index}")
+        self.project_ids: List[str] = []
+
+    async def login(self, username: str, password: str) -> bool:
+        response = await self.recorder.call(
+            self.client, "auth.token", "POST", "/api/auth/token", data={"username": username, "password": password}
+        )
+        if response is None:
+            return False
+        self.client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+        return True
+
+    async def scenario_write(self) -> bool:
+        call = self.recorder.call
+        created = await call(
+            self.client,
+            "novels.create",
+            "POST",
+            "/api/novels",
+            json={"title": f"压测项目 {self.index}", "initial_prompt": "一个关于江湖与背叛的故事"},
+        )
+        if created is None:
+            return False
+        project_id = created.json()["id"]
+        self.project_ids.append(project_id)
+
+        state: Dict[str, Any] = {}
+        for turn in range(self.args.max_converse_turns):
+            reply = await call(
+                self.client,
+                "concept.converse",
+                "POST",
+                f"/api/novels/{project_id}/concept/converse",
+                json={"user_input": {"id": None, "value": f"第 {turn + 1} 轮设想：{PROSE}"}, "conversation_state": state},
+            )
+            if reply is None:
+                return False
+            data = reply.json()
+            state = data.get("conversation_state") or {}
+            if data.get("is_complete"):
+                break
+
+        blueprint = await call(self.client, "blueprint.generate", "POST", f"/api/novels/{project_id}/blueprint/generate")
+        if blueprint is None:
+            return False
+
+        generated = await call(
+            self.client,
+            "chapter.generate",
+            "POST",
+            f"/api/writer/novels/{project_id}/chapters/generate",
+            json={"chapter_number": 1},
+        )
+        if generated is None:
+            return False
+        selected = await call(
+            self.client,
+            "chapter.select",
+            "POST",
+            f"/api/writer/novels/{project_id}/chapters/select",
+            json={"chapter_number": 1, "version_index": 0},
+        )
+        if selected is None:
+            return False
+        edited = await call(
+            self.client,
+            "chapter.edit",
+            "POST",
+            f"/api/writer/novels/{project_id}/chapters/edit",
+            json={"chapter_number": 1, "content": PROSE * self.rng.randint(20, 60)},
+        )
+        if edited is None:
+            return False
+        return await self._read_project(project_id)
+
+    async def scenario_import(self) -> bool:
+        call = self.recorder.call
+        text = "".join(
+            f"第{number}章 风起{number}\n" + PROSE * self.args.import_chapter_lines for number in range(1, self.args.import_chapters + 1)
+        )
+        uploaded = await call(
+            self.client,
+            "import.upload",
+            "POST",
+            "/api/novels/import",
+            files={"file": (f"loadtest-{uuid.uuid4().hex[:8]}.txt", text.encode("utf-8"), "text/plain")},
+        )
+        if uploaded is None:
+            return False
+        payload = uploaded.json()
+        self.project_ids.append(payload["id"])
+
+        stats = self.recorder.steps["import.job"]
+        started = time.perf_counter()
+        final: Optional[Dict[str, Any]] = None
+        try:
+            async with self.client.stream("GET", f"/api/novels/import/jobs/{payload['job_id']}/events") as response:
+                event = None
+                async for line in response.aiter_lines():
+                    if line.startswith("event: "):
+                        event = line[len("event: ") :]
+                    elif line.startswith("data: ") and event == "done":
+                        final = json.loads(line[len("data: ") :])
+                        break
+        except httpx.HTTPError as exc:
+            stats.statuses[type(exc).__name__] += 1
+        stats.latencies.append(time.perf_counter() - started)
+        status = (final or {}).get("status", "unknown")
+        stats.statuses[status] += 1
+        if status != "succeeded":
+            stats.errors += 1
+            return False
+        return await self._read_project(payload["id"])
+
+    async def scenario_read(self) -> bool:
+        listed = await self.recorder.call(self.client, "novels.list", "GET", "/api/novels")
+        if listed is None:
+            return False
+        projects = listed.json()
+        if not projects:
+            return True
+        return await self._read_project(self.rng.choice(projects)["id"])
+
+    async def _read_project(self, project_id: str) -> bool:
+        call = self.recorder.call
+        ok = await call(self.client, "novels.get", "GET", f"/api/novels/{project_id}") is not None
+        for section in ("overview", "characters", "chapter_outline", "chapters"):
+            ok &= await call(self.client, "novels.section", "GET", f"/api/novels/{project_id}/sections/{section}") is not None
+        # 导入或刚生成的项目至少有第 1 章；尚未生成时接口返回 404 也属于正常读取
+        ok &= (
+            await call(self.client, "novels.chapter", "GET", f"/api/novels/{project_id}/chapters/1", expected=(200, 404))
+            is not None
+        )
+        return ok
+
+    async def cleanup(self) -> None:
+        if self.project_ids:
+            await self.recorder.call(self.client, "novels.delete", "DELETE", "/api/novels", json=self.project_ids)
+
+
+# -------------------- 编排 --------------------
+
+
+def parse_mix(value: str) -> List[Tuple[str, float]]:
+    mix: List[Tuple[str, float]] = []
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ("write", "import", "read"):
+            raise argparse.ArgumentTypeError(f"未知场景: {name}")
+        mix.append((name, float(weight or 1)))
+    return [(name, weight) for name, weight in mix if weight > 0]
+
+
+async def prepare(args: argparse.Namespace, client: httpx.AsyncClient) -> List[Tuple[str, str]]:
+    """以管理员身份准备压测账号，必要时把模型配置指向桩服务。"""
+    response = await client.post("/api/auth/token", data={"username": args.admin_user, "password": args.admin_password})
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    if args.configure_stub:
+        configs = {
+            "llm.base_url": args.configure_stub,
+            "llm.api_key": "stub-key",
+            "llm.model": "stub-model",
+            "embedding.provider": "openai",
+            "embedding.base_url": args.configure_stub,
+            "embedding.api_key": "stub-key",
+            "embedding.model": "stub-embedding",
+        }
+        for key, value in configs.items():
+            (await client.put(f"/api/admin/system-configs/{key}", json={"key": key, "value": value}, headers=headers)).raise_for_status()
+        (
+            await client.put("/api/admin/settings/daily-request-limit", json={"limit": 1_000_000}, headers=headers)
+        ).raise_for_status()
+        print(f"已将 LLM 与嵌入配置指向 {args.configure_stub}")
+
+    accounts: List[Tuple[str, str]] = []
+    password = "loadtest-pass"
+    for index in range(args.users):
+        username = f"{args.user_prefix}{index}"
+        created = await client.post(
+            "/api/admin/users", json={"username": username, "password": password}, headers=headers
+        )
+        # 已存在的账号直接复用
+        if created.status_code not in (201, 400):
+            created.raise_for_status()
+        accounts.append((username, password))
+    return accounts
+
+
+async def run_user(
+    index: int,
+    account: Tuple[str, str],
+    recorder: Recorder,
+    args: argparse.Namespace,
+    mix: List[Tuple[str, float]],
+    deadline: float,
+) -> None:
+    timeout = httpx.Timeout(args.timeout, connect=10.0)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=timeout) as client:
+        user = VirtualUser(index, client, recorder, args)
+        if not await user.login(*account):
+            return
+        names = [name for name, _ in mix]
+        weights = [weight for _, weight in mix]
+        iterations = 0
+        while time.perf_counter() < deadline and (not args.iterations or iterations < args.iterations):
+            scenario = user.rng.choices(names, weights)[0]
+            stats = recorder.scenarios[scenario]
+            started = time.perf_counter()
+            try:
+                ok = await getattr(user, f"scenario_{scenario}")()
+            except Exception as exc:  # noqa: BLE001 - 单个场景异常不应中断整个压测
+                stats.statuses[type(exc).__name__] += 1
+                ok = False
+            stats.latencies.append(time.perf_counter() - started)
+            if not ok:
+                stats.errors += 1
+            iterations += 1
+            if args.think_time:
+                await asyncio.sleep(user.rng.uniform(0, args.think_time))
+        if args.cleanup:
+            await user.cleanup()
+
+
+async def main_async(args: argparse.Namespace) -> int:
+    mix = parse_mix(args.mix)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60.0) as admin_client:
+        accounts = await prepare(args, admin_client)
+
+    recorder = Recorder()
+    started = time.perf_counter()
+    deadline = started + args.duration
+    tasks = []
+    for index, account in enumerate(accounts):
+        tasks.append(asyncio.create_task(run_user(index, account, recorder, args, mix, deadline)))
+        if args.ramp_up:
+            await asyncio.sleep(args.ramp_up / max(1, len(accounts)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    steps = summarize(recorder.steps)
+    scenarios = summarize(recorder.scenarios)
+    total_requests = sum(row["count"] for row in steps.values())
+    total_errors = sum(row["errors"] for row in steps.values())
+    print(f"\n[{args.label}] users={args.users} elapsed={elapsed:.1f}s requests={total_requests} "
+          f"throughput={total_requests / elapsed:.2f} req/s error_rate={total_errors / max(1, total_requests):.2%}")
+    print_table("场景", scenarios)
+    print_table("步骤", steps)
+
+    if args.json:
+        report = {
+            "label": args.label,
+            "base_url": args.base_url,
+            "users": args.users,
+            "mix": dict(mix),
+            "elapsed_seconds": round(elapsed, 2),
+            "requests": total_requests,
+            "errors": total_errors,
+            "throughput_rps": round(total_requests / elapsed, 3),
+            "scenarios": scenarios,
+            "steps": steps,
+        }
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, ensure_ascii=False, indent=2)
+        print(f"报告已写入 {args.json}")
+    return 1 if total_errors and args.fail_on_error else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=5, help="并发虚拟用户数")
+    parser.add_argument("--duration", type=float, default=60.0, help="压测时长（秒）")
+    parser.add_argument("--iterations", type=int, default=0, help="每个用户最多执行的场景数，0 表示只受时长限制")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="在该秒数内逐个启动虚拟用户")
+    parser.add_argument("--think-time", type=float, default=0.0, help="场景之间随机等待的上限（秒）")
+    parser.add_argument("--mix", default="write=1,import=1,read=4", help="场景权重，如 write=1,import=0,read=4")
+    parser.add_argument("--timeout", type=float, default=900.0, help="单个请求超时（秒），章节生成可能很慢")
+    parser.add_argument("--max-converse-turns", type=int, default=6)
+    parser.add_argument("--import-chapters", type=int, default=30)
+    parser.add_argument("--import-chapter-lines", type=int, default=40)
+    parser.add_argument("--admin-user", default="admin")
+    parser.add_argument("--admin-password", default="ChangeMe123!")
+    parser.add_argument("--user-prefix", default="loadtest_")
+    parser.add_argument("--configure-stub", metavar="URL", help="把 LLM/嵌入配置指向桩服务，例如 http://127.0.0.1:9100/v1")
+    parser.add_argument("--cleanup", action="store_true", help="结束后删除压测创建的项目")
+    parser.add_argument("--label", default="default", help="报告标签，例如 sqlite / mysql")
+    parser.add_argument("--json", help="把汇总结果写入该 JSON 文件")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fail-on-error", action="store_true", help="存在失败请求时以非零状态退出")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main_async(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""OpenAI 兼容的本地桩服务：模拟 chat.completions 流式输出与 embeddings，用于压测时替代真实大模型。
+
+按系统提示词中的特征字段判断调用来源（概念对话、蓝图、章节正文、摘要、大纲、评审、角色鉴别），
+返回后端各流程能够解析的 JSON 或纯文本；输出速率、首 token 延迟、截断与错误比例均可配置。
+
+用法：
+    python loadtest/stub_llm.py --port 9100 --tokens-per-second 300 --first-token-ms 500
+    python loadtest/stub_llm.py --truncate-rate 0.1 --error-rate 0.02 --rate-limit-rate 0.02
+
+后端通过现有配置接入（管理后台或 loadtest/run_load.py --configure-stub 写入系统配置）：
+    llm.base_url        = http://127.0.0.1:9100/v1
+    embedding.base_url  = http://127.0.0.1:9100/v1
+    embedding.provider  = openai
+
+运行中可访问 GET /stub/stats 查看各类调用次数与注入的故障数。
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+import uuid
+from collections import Counter
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterator, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+SENTENCES = [
+    "夜色如墨，长街尽头传来急促的马蹄声。",
+    "她停下脚步，回头望去，“是谁？”却无人应答。",
+    "风吹过檐角的铜铃，叮当作响，像是某种古老的暗号。",
+    "沈砚握紧了手中的旧剑，剑鞘上的裂纹在月光下分外清晰。",
+    "“你终于来了。”灰袍老人放下茶盏，语气平静得近乎冷漠。",
+    "城墙上的火把一盏接一盏熄灭，黑暗像潮水一样漫过来。",
+    "他想起师父临终前的嘱托，心口一阵发紧。",
+    "远处钟楼敲响三更，巡夜人的梆子声断断续续。",
+    "“这件事，不能让第三个人知道。”她压低声音，目光扫过窗外。",
+    "雨点砸在青石板上，溅起细碎的水花，也掩住了脚步声。",
+]
+NAMES = ["沈砚", "林晚", "顾长风", "苏青禾", "陆九渊", "白鹭", "秦怀", "温如玉"]
+
+_NAME_LIST_SECTION = re.compile(r"【潜在角色名单】\s*\n(.+)")
+
+
+@dataclass
+class StubOptions:
+    tokens_per_second: float = 200.0
+    first_token_ms: float = 400.0
+    jitter: float = 0.2
+    chars_per_token: float = 1.5
+    chapter_chars: int = 3000
+    summary_chars: int = 300
+    outline_chapters: int = 10
+    converse_turns: int = 3
+    truncate_rate: float = 0.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    disconnect_rate: float = 0.0
+    embedding_dim: int = 1024
+    embedding_ms: float = 30.0
+    seed: Optional[int] = None
+
+
+class StubState:
+    def __init__(self, options: StubOptions) -> None:
+        self.options = options
+        self.rng = random.Random(options.seed)
+        self.calls: Counter = Counter()
+        self.faults: Counter = Counter()
+        self.in_flight = 0
+        self.started_at = time.time()
+
+
+# -------------------- 响应内容 --------------------
+
+
+def _prose(rng: random.Random, chars: int) -> str:
+    parts: List[str] = []
+    total = 0
+    while total < chars:
+        paragraph = "".join(rng.choice(SENTENCES) for _ in range(rng.randint(2, 5)))
+        parts.append(paragraph)
+        total += len(paragraph)
+    return "\n\n".join(parts)[:chars]
+
+
+def classify(system_prompt: str) -> str:
+    """按提示词中的特征字段识别调用来源，顺序有意义：写作与评审提示词同样提到 chapter_outline。"""
+    if "ai_message" in system_prompt:
+        return "converse"
+    if "full_content" in system_prompt:
+        return "chapter"
+    if "best_choice" in system_prompt:
+        return "evaluation"
+    if "角色鉴别" in system_prompt:
+        return "characters"
+    if '"chapters"' in system_prompt:
+        return "outline"
+    if "chapter_outline" in system_prompt:
+        return "blueprint"
+    return "summary"
+
+
+def _outline_items(rng: random.Random, start: int, count: int) -> List[Dict[str, Any]]:
+    return [
+        {"chapter_number": number, "title": f"第{number}章 {rng.choice(NAMES)}的抉择", "summary": _prose(rng, 80)}
+        for number in range(start, start + count)
+    ]
+
+
+def build_response(kind: str, messages: List[Dict[str, Any]], state: StubState) -> str:
+    rng = state.rng
+    options = state.options
+    user_text = "\n".join(str(msg.get("content") or "") for msg in messages if msg.get("role") == "user")
+
+    if kind == "converse":
+        turn = sum(1 for msg in messages if msg.get("role") == "user")
+        payload = {
+            "ai_message": _prose(rng, 200),
+            "ui_control": {
+                "type": "single_choice",
+                "options": [{"id": f"option_{i}", "label": rng.choice(SENTENCES)[:12]} for i in range(1, 4)],
+                "placeholder": "请继续描述你的想法",
+            },
+            "conversation_state": {"turn": turn},
+            "is_complete": turn >= options.converse_turns,
+        }
+        return json.dumps(payload, ensure_ascii=False)
+
+    if kind == "blueprint":
+        names = rng.sample(NAMES, 4)
+        payload = {
+            "title": f"{rng.choice(NAMES)}传",
+            "target_audience": "成年读者",
+            "genre": "武侠",
+            "style": "冷峻克制",
+            "tone": "悬疑",
+            "one_sentence_summary": _prose(rng, 40),
+            "full_synopsis": _prose(rng, 600),
+            "world_setting": {"core_rules": _prose(rng, 120), "key_locations": [], "factions": []},
+            "characters": [{"name": name, "identity": "剑客", "personality": _prose(rng, 40)} for name in names],
+            "relationships": [
+                {"character_from": names[0], "character_to": names[1], "description": "师徒"},
+                {"character_from": names[2], "character_to": names[3], "description": "宿敌"},
+            ],
+            "chapter_outline": _outline_items(rng, 1, options.outline_chapters),
+        }
+        return json.dumps(payload, ensure_ascii=False)
+
+    if kind == "chapter":
+        return json.dumps({"full_content": _prose(rng, options.chapter_chars)}, ensure_ascii=False)
+
+    if kind == "outline":
+        start, count = 1, 5
+        try:
+            wait = json.loads(user_text).get("wait_to_generate", {})
+            start, count = int(wait.get("start_chapter", 1)), int(wait.get("num_chapters", 5))
+        except (ValueError, AttributeError):
+            pass
+        return json.dumps({"chapters": _outline_items(rng, start, count)}, ensure_ascii=False)
+
+    if kind == "evaluation":
+        payload = {
+            "best_choice": 1,
+            "reason_for_choice": _prose(rng, 120),
+            "evaluation": {"version1": {"pros": [_prose(rng, 40)], "cons": [_prose(rng, 40)]}},
+        }
+        return json.dumps(payload, ensure_ascii=False)
+
+    if kind == "characters":
+        match = _NAME_LIST_SECTION.search(user_text)
+        candidates = [name.strip() for name in match.group(1).split(",")] if match else NAMES
+        return json.dumps([name for name in candidates if name][:8], ensure_ascii=False)
+
+    return _prose(rng, options.summary_chars)
+
+
+# -------------------- 流式协议 --------------------
+
+
+def _tokens(text: str, chars_per_token: float) -> Iterator[str]:
+    step = max(1, round(chars_per_token))
+    for start in range(0, len(text), step):
+        yield text[start : start + step]
+
+
+def _chunk(completion_id: str, model: str, delta: Dict[str, Any], finish_reason: Optional[str]) -> str:
+    body = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(body, ensure_ascii=False)}\n\n"
+
+
+def _jittered(rng: random.Random, value: float, jitter: float) -> float:
+    return max(0.0, value * (1 + rng.uniform(-jitter, jitter)))
+
+
+async def _stream(
+    text: str,
+    *,
+    model: str,
+    truncate: bool,
+    disconnect: bool,
+    include_usage: bool,
+    prompt_tokens: int,
+    state: StubState,
+):
+    options = state.options
+    rng = state.rng
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    tokens = list(_tokens(text, options.chars_per_token))
+    finish_reason = "stop"
+    if truncate and len(tokens) > 2:
+        tokens = tokens[: int(len(tokens) * rng.uniform(0.5, 0.9))]
+        finish_reason = "length"
+    cut_at = int(len(tokens) * rng.uniform(0.2, 0.8)) if disconnect else None
+
+    state.in_flight += 1
+    try:
+        await asyncio.sleep(_jittered(rng, options.first_token_ms, options.jitter) / 1000)
+        yield _chunk(completion_id, model, {"role": "assistant", "content": ""}, None)
+        # 每 20ms 左右批量发送一组 token，避免高速率下每个 token 都 sleep 一次
+        per_tick = max(1, math.ceil(options.tokens_per_second * 0.02)) if options.tokens_per_second > 0 else len(tokens)
+        for index in range(0, len(tokens), per_tick):
+            if cut_at is not None and index >= cut_at:
+                state.faults["disconnect"] += 1
+                # 不发送结束标记直接断开，客户端会看到连接被意外中断
+                raise ConnectionAbortedError("stub injected disconnect")
+            for token in tokens[index : index + per_tick]:
+                yield _chunk(completion_id, model, {"content": token}, None)
+            if options.tokens_per_second > 0:
+                await asyncio.sleep(_jittered(rng, per_tick / options.tokens_per_second, options.jitter))
+        yield _chunk(completion_id, model, {}, finish_reason)
+        if include_usage:
+            usage = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(tokens),
+                    "total_tokens": prompt_tokens + len(tokens),
+                },
+            }
+            yield f"data: {json.dumps(usage)}\n\n"
+        yield "data: [DONE]\n\n"
+    finally:
+        state.in_flight -= 1
+
+
+def _inject_error(state: StubState) -> Optional[JSONResponse]:
+    rng = state.rng
+    options = state.options
+    if options.rate_limit_rate and rng.random() < options.rate_limit_rate:
+        state.faults["rate_limit"] += 1
+        return JSONResponse(
+            status_code=429,
+            headers={"Retry-After": "1"},
+            content={"error": {"message": "stub rate limit", "type": "rate_limit_error"}},
+        )
+    if options.error_rate and rng.random() < options.error_rate:
+        state.faults["server_error"] += 1
+        return JSONResponse(
+            status_code=500,
+            content={"error": {"message": "stub injected failure", "type": "server_error"}},
+        )
+    return None
+
+
+def create_app(options: StubOptions) -> FastAPI:
+    state = StubState(options)
+    app = FastAPI(title="Arboris LLM Stub")
+
+    @app.get("/v1/models")
+    async def list_models() -> Dict[str, Any]:
+        return {"object": "list", "data": [{"id": "stub-model", "object": "model", "owned_by": "stub"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages") or []
+        system_prompt = "\n".join(str(msg.get("content") or "") for msg in messages if msg.get("role") == "system")
+        kind = classify(system_prompt)
+        state.calls[kind] += 1
+
+        error = _inject_error(state)
+        if error is not None:
+            return error
+
+        model = body.get("model") or "stub-model"
+        text = build_response(kind, messages, state)
+        prompt_chars = sum(len(str(msg.get("content") or "")) for msg in messages)
+        prompt_tokens = int(prompt_chars / options.chars_per_token)
+        truncate = bool(options.truncate_rate) and state.rng.random() < options.truncate_rate
+        if truncate:
+            state.faults["truncated"] += 1
+
+        if not body.get("stream"):
+            await asyncio.sleep(_jittered(state.rng, options.first_token_ms, options.jitter) / 1000)
+            completion_tokens = math.ceil(len(text) / options.chars_per_token)
+            if options.tokens_per_second > 0:
+                await asyncio.sleep(completion_tokens / options.tokens_per_second)
+            return {
+                "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": text},
+                        "finish_reason": "length" if truncate else "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            }
+
+        disconnect = bool(options.disconnect_rate) and state.rng.random() < options.disconnect_rate
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+        return StreamingResponse(
+            _stream(
+                text,
+                model=model,
+                truncate=truncate,
+                disconnect=disconnect,
+                include_usage=include_usage,
+                prompt_tokens=prompt_tokens,
+                state=state,
+            ),
+            media_type="text/event-stream",
+        )
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        state.calls["embedding"] += 1
+        error = _inject_error(state)
+        if error is not None:
+            return error
+        inputs = body.get("input")
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        await asyncio.sleep(_jittered(state.rng, options.embedding_ms, options.jitter) / 1000)
+        data = []
+        for index, text in enumerate(inputs or []):
+            # 同一文本得到同一向量，检索结果在多轮压测之间保持稳定
+            seed = int.from_bytes(hashlib.blake2b(str(text).encode("utf-8"), digest_size=8).digest(), "big")
+            vector_rng = random.Random(seed)
+            vector = [vector_rng.gauss(0.0, 1.0) for _ in range(options.embedding_dim)]
+            norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+            data.append({"object": "embedding", "index": index, "embedding": [value / norm for value in vector]})
+        tokens = sum(int(len(str(text)) / options.chars_per_token) for text in inputs or [])
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model") or "stub-embedding",
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.get("/stub/stats")
+    async def stats() -> Dict[str, Any]:
+        return {
+            "options": asdict(options),
+            "uptime_seconds": round(time.time() - state.started_at, 1),
+            "in_flight": state.in_flight,
+            "calls": dict(state.calls),
+            "faults": dict(state.faults),
+        }
+
+    return app
+
+
+def main() -> None:
+    defaults = StubOptions()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second, help="单个流的输出速率，0 表示不限速")
+    parser.add_argument("--first-token-ms", type=float, default=defaults.first_token_ms, help="首 token 延迟")
+    parser.add_argument("--jitter", type=float, default=defaults.jitter, help="延迟与速率的随机浮动比例")
+    parser.add_argument("--chars-per-token", type=float, default=defaults.chars_per_token)
+    parser.add_argument("--chapter-chars", type=int, default=defaults.chapter_chars, help="章节正文长度")
+    parser.add_argument("--summary-chars", type=int, default=defaults.summary_chars)
+    parser.add_argument("--outline-chapters", type=int, default=defaults.outline_chapters, help="蓝图中的章节数")
+    parser.add_argument("--converse-turns", type=int, default=defaults.converse_turns, help="第几轮对话返回 is_complete")
+    parser.add_argument("--truncate-rate", type=float, default=defaults.truncate_rate, help="以 finish_reason=length 截断的比例")
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="直接返回 500 的比例")
+    parser.add_argument("--rate-limit-rate", type=float, default=defaults.rate_limit_rate, help="直接返回 429 的比例")
+    parser.add_argument("--disconnect-rate", type=float, default=defaults.disconnect_rate, help="流式输出中途断开的比例")
+    parser.add_argument("--embedding-dim", type=int, default=defaults.embedding_dim)
+    parser.add_argument("--embedding-ms", type=float, default=defaults.embedding_ms)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    options = StubOptions(
+        **{field: getattr(args, field) for field in asdict(defaults) if hasattr(args, field)}
+    )
+    uvicorn.run(create_app(options), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+import os
+
+# 导入 app 之前补齐必需的配置；测试各自创建临时 SQLite 数据库，不会读写 storage/arboris.db
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("DB_PROVIDER", "sqlite")
+os.environ.setdefault("DEBUG", "false")
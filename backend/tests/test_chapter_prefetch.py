@@ -0,0 +1,103 @@
+"""下一章预取：SQLite 上不在后台写库；生成时写作要求单独检索，纲要部分可命中预取结果。"""
+
+import asyncio
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.db.base import Base
+from app.models import Chapter, ChapterOutline, ChapterVersion, NovelProject, User
+from app.services.chapter_context_service import ChapterContextService, ChapterRAGContext
+from app.services.chapter_prefetch_service import build_chapter_setup, save_pending_summaries
+from app.services.llm_service import LLMService
+from app.services.novel_service import NovelService
+from app.services.vector_store_service import RetrievedChunk, RetrievedSummary
+
+
+async def _fake_summary(self, content, **kwargs):
+    return "第一章摘要"
+
+
+async def _prepare_without_writes(db_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with factory() as session:
+        session.add(User(id=1, username="writer", hashed_password="x"))
+        session.add(NovelProject(id="p1", user_id=1, title="测试项目"))
+        session.add(ChapterOutline(project_id="p1", chapter_number=2, title="第二章", summary="下山"))
+        chapter = Chapter(project_id="p1", chapter_number=1)
+        session.add(chapter)
+        await session.flush()
+        version = ChapterVersion(chapter_id=chapter.id, content="第一章正文")
+        session.add(version)
+        await session.flush()
+        chapter.selected_version_id = version.id
+        await session.commit()
+
+    async with factory() as session:
+        novel_service = NovelService(session)
+        project = await novel_service.ensure_project_owner("p1", 1)
+        setup = await build_chapter_setup(
+            session, novel_service, LLMService(session), project, 2, 1, persist_summaries=False
+        )
+        assert not session.new and not session.dirty
+
+    async with factory() as session:
+        project = await NovelService(session).ensure_project_owner("p1", 1)
+        assert project.chapters[0].real_summary is None
+        await save_pending_summaries(session, project, setup)
+
+    async with factory() as session:
+        project = await NovelService(session).ensure_project_owner("p1", 1)
+        saved = project.chapters[0].real_summary
+    await engine.dispose()
+    return setup, saved
+
+
+def test_prefetch_defers_summary_writes_to_the_request(tmp_path, monkeypatch):
+    monkeypatch.setattr(LLMService, "get_summary", _fake_summary)
+    setup, saved = asyncio.run(_prepare_without_writes(tmp_path / "prefetch.db"))
+
+    assert setup.pending_summaries == {1: "第一章摘要"}
+    assert setup.previous_summary_text == "第一章摘要"
+    assert saved == "第一章摘要"
+
+
+def _chunk(chapter_number, chunk_index):
+    return RetrievedChunk(
+        content=f"{chapter_number}-{chunk_index}",
+        chapter_number=chapter_number,
+        chapter_title=None,
+        score=0.1,
+        metadata={},
+        chunk_index=chunk_index,
+    )
+
+
+def test_writing_notes_are_retrieved_separately_and_fused(monkeypatch):
+    contexts = {
+        "第二章\n下山": ChapterRAGContext(
+            query="第二章\n下山",
+            chunks=[_chunk(1, 0), _chunk(1, 3)],
+            summaries=[RetrievedSummary(chapter_number=1, title="第一章", summary="摘要", score=0.1)],
+        ),
+        "多写师父": ChapterRAGContext(query="多写师父", chunks=[_chunk(1, 3), _chunk(1, 7)], summaries=[]),
+    }
+    queries = []
+
+    async def _fake_retrieve(self, *, project_id, query_text, user_id, filters=None, **kwargs):
+        queries.append(query_text)
+        return contexts[query_text]
+
+    monkeypatch.setattr(ChapterContextService, "retrieve_for_generation", _fake_retrieve)
+    service = ChapterContextService(llm_service=None)
+    context = asyncio.run(
+        service.retrieve_with_notes(project_id="p1", query_text="第二章\n下山", writing_notes="多写师父", user_id=1)
+    )
+
+    assert queries == ["第二章\n下山", "多写师父"]
+    assert [(chunk.chapter_number, chunk.chunk_index) for chunk in context.chunks] == [(1, 3), (1, 0), (1, 7)]
+    assert [summary.chapter_number for summary in context.summaries] == [1]
+    # 融合结果是新对象，不改动缓存中共享的上下文
+    assert len(contexts["第二章\n下山"].chunks) == 2
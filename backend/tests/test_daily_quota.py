@@ -0,0 +1,64 @@
+"""每日限额预占与调用方会话的交互：编辑章节后生成摘要的流程在 SQLite 上不能因自身持有的写锁而失败。"""
+
+import asyncio
+from datetime import date
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.db.base import Base
+from app.models import Chapter, ChapterVersion, NovelProject, User, UserDailyRequest
+from app.services import llm_service as llm_service_module
+from app.services.llm_service import LLMService
+from app.services.usage_buffer import DailyQuotaReserver
+from app.utils.llm_tool import LLMClient
+
+
+async def _fake_stream_chat(self, messages, **kwargs):
+    yield {"content": "本章摘要", "finish_reason": "stop"}
+
+
+async def _edit_then_summarize(db_path: str, monkeypatch) -> None:
+    # 忙等待超时设得很短：一旦预占另开连接等待调用方自己的写锁，测试会很快以 database is locked 失败
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}", connect_args={"timeout": 1})
+    factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with factory() as session:
+        session.add(User(id=1, username="writer", hashed_password="x"))
+        session.add(NovelProject(id="p1", user_id=1, title="测试项目"))
+        chapter = Chapter(project_id="p1", chapter_number=1)
+        session.add(chapter)
+        await session.flush()
+        version = ChapterVersion(chapter_id=chapter.id, content="原始正文")
+        session.add(version)
+        await session.flush()
+        chapter.selected_version_id = version.id
+        await session.commit()
+        version_id = version.id
+
+    monkeypatch.setattr(llm_service_module, "daily_quota", DailyQuotaReserver(block_size=5, session_factory=factory))
+    async with factory() as session:
+        # 与 writer.edit_chapter 相同：先改正文，再在同一会话中调用摘要；配置查询会把改动 autoflush 出去
+        version = await session.get(ChapterVersion, version_id)
+        version.content = "编辑后的正文"
+        summary = await LLMService(session).get_summary("编辑后的正文", user_id=1, system_prompt="请总结")
+        await session.commit()
+    assert summary == "本章摘要"
+
+    async with factory() as session:
+        assert (await session.get(ChapterVersion, version_id)).content == "编辑后的正文"
+        reserved = await session.scalar(
+            select(UserDailyRequest.request_count).where(
+                UserDailyRequest.user_id == 1, UserDailyRequest.request_date == date.today()
+            )
+        )
+    assert reserved == 5
+    await engine.dispose()
+
+
+def test_edit_then_summary_reserves_quota_without_self_lock(tmp_path, monkeypatch):
+    monkeypatch.setenv("LLM_API_KEY", "test-key")
+    monkeypatch.setattr(LLMClient, "stream_chat", _fake_stream_chat)
+    asyncio.run(_edit_then_summarize(str(tmp_path / "quota.db"), monkeypatch))
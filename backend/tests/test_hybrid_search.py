@@ -0,0 +1,24 @@
+"""全文检索的项目隔离：正文中恰好含有其他项目标记的片段不能跨项目命中。"""
+
+import sqlite3
+
+from app.utils.hybrid_search import build_match_query, lexical_terms, project_token, scoped_match_query
+
+
+def test_scoped_match_query_ignores_project_token_in_text():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE VIRTUAL TABLE chunks_fts USING fts5(project_key, terms, record_id UNINDEXED, tokenize = 'unicode61')")
+    rows = [
+        ("a1", "alpha", "林远走进山门"),
+        # 其他项目的片段正文里含有 alpha 的项目标记
+        ("b1", "beta", f"林远走进山门 {project_token('alpha')}"),
+    ]
+    for record_id, project_id, text in rows:
+        conn.execute(
+            "INSERT INTO chunks_fts (project_key, terms, record_id) VALUES (?, ?, ?)",
+            (project_token(project_id), lexical_terms(text), record_id),
+        )
+
+    match = scoped_match_query("alpha", build_match_query("林远"))
+    hits = [row[0] for row in conn.execute("SELECT record_id FROM chunks_fts WHERE chunks_fts MATCH ?", (match,))]
+    assert hits == ["a1"]
@@ -0,0 +1,98 @@
+"""导入任务中断后的项目收尾：不能让项目停留在 importing/analyzing。"""
+
+import asyncio
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.db.base import Base
+from app.models import Chapter, NovelProject, User
+from app.services import import_service as import_service_module
+from app.services.background_jobs import JOB_CANCELLED, JOB_FAILED, BackgroundJobRegistry
+from app.services.import_service import IMPORT_JOB_KIND, ImportService, SpooledNovelFile
+from app.services.novel_service import NovelService
+
+NOVEL_TEXT = "".join(f"第{n}章 标题{n}\n这是第{n}章的正文，林远走进了山门。\n\n" for n in range(1, 4))
+
+
+async def _inline_cpu_bound(func, *args, cost=None, **kwargs):
+    return func(*args, **kwargs)
+
+
+async def _analysis_unavailable(self, *args, **kwargs):
+    raise ValueError("模型服务不可用")
+
+
+async def _persist_unavailable(self, *args, **kwargs):
+    raise RuntimeError("磁盘已满")
+
+
+async def _run_import(tmp_path, monkeypatch, cancel_in_phase=None):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'import.db'}")
+    factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with factory() as session:
+        session.add(User(id=1, username="writer", hashed_password="x"))
+        await session.commit()
+
+    monkeypatch.setattr(import_service_module, "AsyncSessionLocal", factory)
+    monkeypatch.setattr(import_service_module, "run_cpu_bound", _inline_cpu_bound)
+
+    novel_path = tmp_path / "novel.txt"
+    novel_path.write_text(NOVEL_TEXT, encoding="utf-8")
+    source = SpooledNovelFile(str(novel_path), "novel.txt", "utf-8", novel_path.stat().st_size)
+
+    registry = BackgroundJobRegistry()
+    job = registry.create(IMPORT_JOB_KIND, 1)
+    registry.start(job, lambda current: ImportService._run_import_job(current, 1, source))
+    if cancel_in_phase:
+        await job.wait_until(lambda current: current.phase == cancel_in_phase, timeout=10)
+        registry.cancel(job.id)
+    await job.wait_until(lambda current: current.finished, timeout=10)
+
+    async with factory() as session:
+        projects = (await session.execute(select(NovelProject))).scalars().all()
+        chapters = await session.scalar(select(func.count(Chapter.id)))
+    await engine.dispose()
+    return job, projects, chapters
+
+
+def test_analysis_failure_finalizes_project(tmp_path, monkeypatch):
+    monkeypatch.setattr(ImportService, "_filter_characters_only", _analysis_unavailable)
+    job, projects, chapters = asyncio.run(_run_import(tmp_path, monkeypatch))
+
+    assert job.status == JOB_FAILED
+    assert [project.status for project in projects] == ["blueprint_ready"]
+    assert job.result["project_id"] == projects[0].id
+    assert chapters == 3
+
+
+def test_persist_failure_removes_partial_project(tmp_path, monkeypatch):
+    monkeypatch.setattr(NovelService, "bulk_import_chapters", _persist_unavailable)
+    job, projects, chapters = asyncio.run(_run_import(tmp_path, monkeypatch))
+
+    assert job.status == JOB_FAILED
+    assert projects == []
+    assert chapters == 0
+
+
+async def _analysis_hangs(self, *args, **kwargs):
+    await asyncio.Event().wait()
+
+
+def test_cancel_during_analysis_keeps_chapters(tmp_path, monkeypatch):
+    monkeypatch.setattr(ImportService, "_filter_characters_only", _analysis_hangs)
+    job, projects, chapters = asyncio.run(_run_import(tmp_path, monkeypatch, cancel_in_phase="census"))
+
+    assert job.status == JOB_CANCELLED
+    assert [project.status for project in projects] == ["blueprint_ready"]
+    assert chapters == 3
+
+
+def test_cancel_during_persist_removes_partial_project(tmp_path, monkeypatch):
+    monkeypatch.setattr(NovelService, "bulk_import_chapters", _analysis_hangs)
+    job, projects, chapters = asyncio.run(_run_import(tmp_path, monkeypatch, cancel_in_phase="persist"))
+
+    assert job.status == JOB_CANCELLED
+    assert projects == []
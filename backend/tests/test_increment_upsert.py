@@ -0,0 +1,36 @@
+"""计数 upsert：MySQL / SQLite 之外的数据库走“更新，未命中再插入”的通用路径。"""
+
+import asyncio
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.db.base import Base
+from app.models import UsageMetric
+from app.repositories.base import execute_increment_upsert
+
+
+async def _increment_twice(db_path: str, dialect_name: str) -> int:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    # 改写方言名让 SQLite 走通用路径，SQL 仍由 SQLite 方言编译执行
+    engine.sync_engine.dialect.name = dialect_name
+    factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with factory() as session:
+        for amount in (3, 4):
+            await execute_increment_upsert(
+                session, UsageMetric, {"key": "api_request_count", "value": amount}, conflict_columns=["key"], counter="value"
+            )
+        await session.commit()
+        value = await session.scalar(select(UsageMetric.value).where(UsageMetric.key == "api_request_count"))
+    await engine.dispose()
+    return value
+
+
+def test_increment_upsert_native_sqlite(tmp_path):
+    assert asyncio.run(_increment_twice(str(tmp_path / "native.db"), "sqlite")) == 7
+
+
+def test_increment_upsert_portable_fallback(tmp_path):
+    assert asyncio.run(_increment_twice(str(tmp_path / "fallback.db"), "postgresql")) == 7
@@ -0,0 +1,103 @@
+"""LLM 调度器：按用户权重公平放行；未获放行的调用退还每日额度。"""
+
+import asyncio
+from datetime import date
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.llm_scheduler import LLMScheduler
+from app.services.usage_buffer import DailyQuotaReserver
+
+
+def _scheduler(**overrides):
+    options = dict(
+        max_concurrency=1,
+        tokens_per_minute=0,
+        max_queue=64,
+        queue_timeout=0,
+        background_share=0.5,
+        rate_limit_cooldown=10,
+    )
+    options.update(overrides)
+    return LLMScheduler(**options)
+
+
+async def _admission_order(scheduler, requests):
+    order = []
+    gate = asyncio.Event()
+
+    async def _call(user_id):
+        async with scheduler.slot("p", user_id=user_id, cost=100):
+            order.append(user_id)
+            await asyncio.sleep(0)
+
+    async def _blocker():
+        async with scheduler.slot("p", user_id=None, cost=1):
+            await gate.wait()
+
+    blocker = asyncio.create_task(_blocker())
+    await asyncio.sleep(0)
+    tasks = []
+    for user_id in requests:
+        tasks.append(asyncio.create_task(_call(user_id)))
+        await asyncio.sleep(0)
+    gate.set()
+    await asyncio.gather(blocker, *tasks)
+    return order
+
+
+def test_weighted_user_is_admitted_more_often():
+    scheduler = _scheduler(user_weights={1: 2.0})
+    order = asyncio.run(_admission_order(scheduler, [1, 2] * 6))
+    # 两个用户同时积压时，权重为 2 的用户先后放行次数约为另一用户的两倍
+    assert order[:9].count(1) == 6
+    assert scheduler.stats()["weighted_users"] == 1
+
+
+def test_equal_weights_alternate():
+    order = asyncio.run(_admission_order(_scheduler(), [1, 2] * 4))
+    assert order == [1, 2] * 4
+
+
+async def _rejected_call(refunds):
+    scheduler = _scheduler(max_queue=1)
+    gate = asyncio.Event()
+
+    async def _holder():
+        async with scheduler.slot("p", user_id=1):
+            await gate.wait()
+
+    async def _waiter():
+        async with scheduler.slot("p", user_id=2):
+            pass
+
+    holder = asyncio.create_task(_holder())
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(_waiter())
+    await asyncio.sleep(0)
+    with pytest.raises(HTTPException) as excinfo:
+        async with scheduler.slot("p", user_id=3, on_rejected=lambda: refunds.append(3)):
+            pass
+    gate.set()
+    await asyncio.gather(holder, waiter)
+    return excinfo.value.status_code
+
+
+def test_rejected_call_triggers_refund():
+    refunds = []
+    assert asyncio.run(_rejected_call(refunds)) == 429
+    assert refunds == [3]
+
+
+def test_daily_quota_refund_returns_unit_to_block():
+    reserver = DailyQuotaReserver(block_size=5, session_factory=None)
+    today = date.today()
+    reserver._blocks[7] = (today, 0)
+    reserver._exhausted[7] = (today, 10)
+
+    reserver.refund(7)
+
+    assert reserver._blocks[7] == (today, 1)
+    assert 7 not in reserver._exhausted
+    assert reserver.stats()["refunds"] == 1
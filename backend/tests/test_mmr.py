@@ -0,0 +1,23 @@
+"""MMR 重排：传入按融合名次折算的相关度时，不能退回纯余弦排序。"""
+
+from app.utils import mmr
+from app.utils.mmr import mmr_select, rank_relevance
+
+
+def test_rank_relevance_is_normalized_and_decreasing():
+    scores = rank_relevance(5, 60)
+    assert scores[0] == 1.0 and scores[-1] == 0.0
+    assert scores == sorted(scores, reverse=True)
+    assert rank_relevance(1, 60) == [1.0]
+    assert rank_relevance(0, 60) == []
+
+
+def test_fused_rank_is_kept_over_cosine():
+    query = [1.0, 0.0]
+    # 第 1 名是全文检索提升的命中，与查询向量夹角较大；余弦排序会把它排到最后
+    candidates = [[0.2, 1.0], [1.0, 0.05], [1.0, 0.1]]
+    relevance = rank_relevance(len(candidates), 60)
+
+    assert mmr_select(query, candidates, 2, 0.7)[0] == 1
+    assert mmr_select(query, candidates, 2, 0.7, relevance) == [0, 1]
+    assert mmr._mmr_python(query, candidates, 2, 0.7, relevance) == [0, 1]
@@ -0,0 +1,44 @@
+"""内置切分器：每个片段的终点都必须越过上一片段（否则是被完整包含的重复片段），切分点优先取段落与句末。"""
+
+import random
+
+from app.utils.text_chunker import TextChunker, TokenChunker
+from app.utils.tokenizer import get_tokenizer
+
+FRAGMENTS = ["林远", "。", "，", "\n", "\n\n", " ", "山门", "abc", "！", "”"]
+
+
+def _random_texts(count: int):
+    rng = random.Random(7)
+    for _ in range(count):
+        yield rng, "".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(5, 80)))
+
+
+def _assert_advancing(spans):
+    for previous, current in zip(spans, spans[1:]):
+        assert current[1] > previous[1], spans
+
+
+def test_text_chunker_spans_always_advance():
+    for rng, text in _random_texts(3000):
+        chunker = TextChunker(rng.randint(8, 30), rng.randint(0, 15))
+        _assert_advancing(chunker.split_spans(text))
+
+
+def test_token_chunker_spans_always_advance():
+    tokenizer = get_tokenizer(None)
+    for rng, text in _random_texts(1000):
+        chunker = TokenChunker(rng.randint(6, 20), rng.randint(0, 10), tokenizer)
+        _assert_advancing(chunker.split_spans(text))
+
+
+def test_text_chunker_prefers_paragraphs_and_keeps_closing_quotes():
+    text = "甲" * 30 + "。\n\n" + "乙" * 25 + "！”" + "丙" * 8 + "，" + "丁" * 30
+    chunks = TextChunker(40, 0).split(text)
+    assert chunks[:2] == ["甲" * 30 + "。", "乙" * 25 + "！”"]
+
+    # 句末标点在窗口内、右引号越过窗口时，退回上一个句末，而不是让下一段以引号开头
+    text = "甲" * 20 + "！" + "甲" * 18 + "。”" + "乙" * 30
+    chunks = TextChunker(40, 0).split(text)
+    assert chunks[0] == "甲" * 20 + "！"
+    assert not any(chunk.startswith("”") for chunk in chunks)
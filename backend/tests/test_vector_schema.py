@@ -0,0 +1,78 @@
+"""向量库建表检查：同一地址在进程内只执行一次，历史记录的全文索引由显式补建完成。"""
+
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.services import vector_store_service
+from app.services.vector_store_service import VectorStoreService
+
+pytest.importorskip("libsql_client")
+
+
+def _recording(store: VectorStoreService) -> list:
+    executed = []
+    execute = store._client.execute
+
+    async def _execute(sql, *args, **kwargs):
+        executed.append(" ".join(sql.split()))
+        return await execute(sql, *args, **kwargs)
+
+    store._client.execute = _execute
+    return executed
+
+
+async def _scenario(url: str) -> None:
+    first = VectorStoreService(url=url)
+    await first.ensure_schema()
+    # 模拟全文索引建立之前写入的历史片段
+    await first._client.execute(
+        "INSERT INTO rag_chunks (id, project_id, chapter_number, chunk_index, content, embedding) "
+        "VALUES ('c1', 'p1', 1, 0, '青云宗掌门', x'00')"
+    )
+
+    second = VectorStoreService(url=url)
+    executed = _recording(second)
+    await second.ensure_schema()
+    assert executed == []
+    assert second._fts_ready
+
+    assert await second.backfill_terms() == 1
+    assert any("INSERT INTO rag_chunks_fts" in sql for sql in executed)
+    assert await second.backfill_terms() == 0
+
+    await first.close()
+    await second.close()
+
+
+def test_schema_checked_once_per_url(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "vector_db_url", f"file:{tmp_path / 'vectors.db'}")
+    monkeypatch.setattr(vector_store_service, "_ready_schemas", {})
+    asyncio.run(_scenario(f"file:{tmp_path / 'vectors.db'}"))
+
+
+async def _legacy_scenario(url: str) -> None:
+    legacy = VectorStoreService(url=url)
+    await legacy._client.execute(
+        "CREATE TABLE rag_chunks (id TEXT PRIMARY KEY, project_id TEXT NOT NULL, chapter_number INTEGER NOT NULL, "
+        "chunk_index INTEGER NOT NULL, chapter_title TEXT, content TEXT NOT NULL, embedding BLOB NOT NULL, metadata TEXT)"
+    )
+    executed = _recording(legacy)
+    await legacy.ensure_schema()
+    assert "ALTER TABLE rag_chunks ADD COLUMN embedding_model TEXT" in executed
+    assert "ALTER TABLE rag_chunks ADD COLUMN embedding_dim INTEGER" in executed
+
+    later = VectorStoreService(url=url)
+    executed = _recording(later)
+    await later.ensure_schema()
+    assert not any(sql.startswith(("PRAGMA table_info", "ALTER TABLE")) for sql in executed)
+
+    await legacy.close()
+    await later.close()
+
+
+def test_model_columns_migrated_once_per_url(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "vector_db_url", f"file:{tmp_path / 'legacy.db'}")
+    monkeypatch.setattr(vector_store_service, "_ready_schemas", {})
+    asyncio.run(_legacy_scenario(f"file:{tmp_path / 'legacy.db'}"))
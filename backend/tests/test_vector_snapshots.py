@@ -0,0 +1,31 @@
+"""向量快照最近邻：进程池入口与 numpy / 纯 Python 两种实现结果一致。"""
+
+from array import array
+
+from app.services import vector_snapshots
+from app.services.vector_snapshots import nearest_in_snapshot, write_snapshot
+
+VECTORS = {
+    "a": [1.0, 0.0, 0.0],
+    "b": [0.8, 0.6, 0.0],
+    "c": [0.0, 1.0, 0.0],
+    "d": [0.0, 0.0, 2.0],
+}
+
+
+def test_nearest_in_snapshot_numpy_and_python_agree(tmp_path, monkeypatch):
+    ids = sorted(VECTORS)
+    blobs = [array("f", VECTORS[record_id]).tobytes() for record_id in ids]
+    write_snapshot(tmp_path, "rag_chunks_test_d3", 1, ids, blobs, 3)
+
+    vector_path = tmp_path / "rag_chunks_test_d3_g1.f32"
+    sidecar_path = tmp_path / "rag_chunks_test_d3_g1.json"
+    query = [1.0, 0.2, 0.0]
+    expected = nearest_in_snapshot(str(vector_path), str(sidecar_path), query, 2, {"a", "b", "c"})
+    assert [record_id for record_id, _ in expected] == ["a", "b"]
+
+    monkeypatch.setattr(vector_snapshots, "np", None)
+    fallback = nearest_in_snapshot(str(vector_path), str(sidecar_path), query, 2, {"a", "b", "c"})
+    assert [record_id for record_id, _ in fallback] == ["a", "b"]
+    for (_, left), (_, right) in zip(expected, fallback):
+        assert abs(left - right) < 1e-6
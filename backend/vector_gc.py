@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""清理向量库中的孤儿数据（项目或章节已删除）并压缩数据库文件"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal, engine
+from app.services.vector_maintenance_service import VectorMaintenanceService
+from app.services.vector_store_service import VectorStoreService, close_vector_shards
+
+
+async def collect_garbage(dry_run: bool, compact: bool) -> int:
+    if not settings.vector_store_enabled:
+        print("⚠️ 向量库未启用，无需清理")
+        return 1
+
+    vector_store = VectorStoreService()
+    try:
+        async with AsyncSessionLocal() as session:
+            report = await VectorMaintenanceService(session, vector_store).collect_garbage(
+                dry_run=dry_run,
+                compact=compact,
+            )
+    finally:
+        await vector_store.close()
+        await close_vector_shards()
+        await engine.dispose()
+
+    print(f"🔍 扫描项目 {report.scanned_projects} 个，向量记录 {report.scanned_rows} 条")
+    if not report.items:
+        print("✅ 没有发现孤儿向量")
+    for item in report.items:
+        reason = "项目已删除" if item.reason == "project_deleted" else "章节已删除"
+        print(
+            f"   - 项目: {item.project_id}（{reason}），章节 {len(item.chapters)} 个，"
+            f"片段 {item.chunks} 条，摘要 {item.summaries} 条，{item.payload_bytes} 字节"
+        )
+
+    action = "待删除" if report.dry_run else "已删除"
+    print(f"{action}: 片段 {report.chunks_deleted} 条，摘要 {report.summaries_deleted} 条，{report.payload_bytes} 字节")
+    if report.compacted:
+        print(f"🗜️ 压缩: {report.size_before} → {report.size_after} 字节，回收 {report.reclaimed_bytes} 字节")
+    print(f"⏱️ 耗时 {report.elapsed_seconds} 秒")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dry-run", action="store_true", help="只统计孤儿向量，不执行删除")
+    parser.add_argument("--no-vacuum", action="store_true", help="删除后不执行 VACUUM")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🧹 向量库回收")
+    print("=" * 60)
+    return asyncio.run(collect_garbage(args.dry_run, not args.no_vacuum))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
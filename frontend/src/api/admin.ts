@@ -48,6 +48,82 @@ export interface Statistics {
   api_request_count: number
 }
 
+export interface EventLoopLagStats {
+  enabled: boolean
+  interval_ms: number
+  samples: number
+  window: number
+  current_ms: number
+  mean_ms: number
+  p50_ms: number
+  p95_ms: number
+  p99_ms: number
+  max_ms: number
+  stall_threshold_ms: number
+  stalls: number
+  last_stall_at: number | null
+  last_stall_ms: number
+}
+
+export interface CpuExecutorStats {
+  enabled: boolean
+  max_workers: number
+  inline_threshold: number
+  pending: number
+  busy_seconds: number
+  submitted: number
+  inline: number
+  completed: number
+  failed: number
+  pool_restarts: number
+}
+
+export interface UsageBufferStats {
+  interval_seconds: number
+  pending: Record<string, number>
+  flushes: number
+  flushed_total: number
+  pending_rows: number
+  flushed_rows: number
+  dropped_rows: number
+  failed_flushes: number
+  last_flush_at?: number | null
+  last_error?: string | null
+}
+
+export interface DailyQuotaStats {
+  block_size: number
+  reserved_users: number
+  reserved_remaining: number
+  local_grants: number
+  reservations: number
+  rejections: number
+  refunds: number
+}
+
+export interface RuntimeStats {
+  event_loop: EventLoopLagStats
+  cpu_executor: CpuExecutorStats
+  usage_buffer: UsageBufferStats
+  daily_quota: DailyQuotaStats
+  background_jobs: Record<string, number>
+}
+
+export interface LLMUsageSummary {
+  user_id?: number | null
+  username?: string | null
+  model?: string | null
+  endpoint?: string | null
+  calls: number
+  failed_calls: number
+  prompt_tokens: number
+  completion_tokens: number
+  output_chars: number
+  total_duration_seconds: number
+  avg_duration_ms: number
+  avg_ttft_ms?: number | null
+}
+
 export interface AdminUser {
   id: number
   username: string
@@ -155,6 +231,14 @@ export class AdminAPI {
     return this.request('/stats')
   }
 
+  static getRuntimeStats(): Promise<RuntimeStats> {
+    return this.request('/runtime')
+  }
+
+  static getLLMUsage(days = 7): Promise<LLMUsageSummary[]> {
+    return this.request(`/llm-usage?days=${days}`)
+  }
+
   // Users
   static listUsers(): Promise<AdminUser[]> {
     return this.request('/users')
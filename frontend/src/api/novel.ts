@@ -51,6 +51,17 @@ export interface NovelProject {
   total_word_count: number
 }
 
+export interface ImportJobStatus {
+  job_id: string
+  status: 'pending' | 'running' | 'succeeded' | 'failed' | 'cancelled'
+  phase: string
+  progress: number
+  counts: Record<string, number>
+  project_id?: string | null
+  message?: string | null
+  error?: string | null
+}
+
 export interface NovelProjectSummary {
   id: string
   title: string
@@ -163,7 +174,7 @@ export class NovelAPI {
     })
   }
 
-  static async importNovel(file: File): Promise<{ id: string }> {
+  static async importNovel(file: File): Promise<{ id: string; job_id: string }> {
     const formData = new FormData()
     formData.append('file', file)
     return request(`${NOVELS_BASE}/import`, {
@@ -175,6 +186,69 @@ export class NovelAPI {
     })
   }
 
+  static async getImportJob(jobId: string): Promise<ImportJobStatus> {
+    return request(`${NOVELS_BASE}/import/jobs/${jobId}`)
+  }
+
+  static async cancelImportJob(jobId: string): Promise<ImportJobStatus> {
+    return request(`${NOVELS_BASE}/import/jobs/${jobId}/cancel`, {
+      method: 'POST'
+    })
+  }
+
+  // 订阅导入进度的 SSE 流，任务结束时返回最终状态；任务不存在（如服务已重启）时返回 null。
+  // EventSource 无法携带 Authorization 头，因此用 fetch 逐块读取事件流
+  static async watchImportJob(
+    jobId: string,
+    onProgress: (job: ImportJobStatus) => void,
+    signal?: AbortSignal
+  ): Promise<ImportJobStatus | null> {
+    const authStore = useAuthStore()
+    const headers = new Headers({ Accept: 'text/event-stream' })
+    if (authStore.isAuthenticated && authStore.token) {
+      headers.set('Authorization', `Bearer ${authStore.token}`)
+    }
+
+    const response = await fetch(`${NOVELS_BASE}/import/jobs/${jobId}/events`, { headers, signal })
+    if (response.status === 401) {
+      authStore.logout()
+      router.push('/login')
+      throw new Error('会话已过期，请重新登录')
+    }
+    if (response.status === 404) {
+      return null
+    }
+    if (!response.ok || !response.body) {
+      throw new Error(`请求失败，状态码: ${response.status}`)
+    }
+
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+    let latest: ImportJobStatus | null = null
+    while (true) {
+      const { value, done } = await reader.read()
+      if (done) return latest
+      buffer += decoder.decode(value, { stream: true })
+      let separator = buffer.indexOf('\n\n')
+      while (separator !== -1) {
+        const lines = buffer.slice(0, separator).split('\n')
+        buffer = buffer.slice(separator + 2)
+        separator = buffer.indexOf('\n\n')
+        const event = lines.find(line => line.startsWith('event:'))?.slice(6).trim()
+        const data = lines.filter(line => line.startsWith('data:')).map(line => line.slice(5).trim()).join('\n')
+        // 以冒号开头的心跳注释没有 data 行，直接跳过
+        if (!data) continue
+        latest = JSON.parse(data) as ImportJobStatus
+        if (event === 'done') {
+          await reader.cancel()
+          return latest
+        }
+        onProgress(latest)
+      }
+    }
+  }
+
   static async getNovel(projectId: string): Promise<NovelProject> {
     return request(`${NOVELS_BASE}/${projectId}`)
   }